@@ -0,0 +1,94 @@
+"""
+Benchmark harness for remote-archive operations.
+
+Runs the archive operations of a measurement ingest against the in-memory
+archive backend with a simulated network latency and bandwidth, and reports
+wall time and number of round trips per phase. No SMB share is required.
+
+Usage
+-----
+python benchmarks/bench_archive_backend.py --latency 20 --bandwidth 10 --files 50
+(latency in ms, bandwidth per connection in MB/s)
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+import specatalog.data_management.measurement_management as mm
+from specatalog.data_management.archive_backends import MemoryBackend
+from specatalog.data_management.archive_manager import SpecatalogArchive
+
+DSC = "BSEQ\tBIG\nIKKF\tREAL\nIRFMT\tD\nXPTS\t{n}\nXMIN\t3300\nXWID\t200\n"
+
+
+def make_measurement(root: Path, n_files: int, n_points: int) -> Path:
+    """Creates a local measurement directory M1 with n_files BES3T spectra."""
+    local = SpecatalogArchive(False, str(root))
+    mm._create_measurement_dir(local, 1)
+    raw = root / "data" / "M1" / "raw"
+    for n in range(n_files):
+        (raw / f"spectrum_{n}.DSC").write_text(DSC.format(n=n_points))
+        np.random.default_rng(n).random(n_points).astype(">f8").tofile(
+            raw / f"spectrum_{n}.DTA"
+        )
+    mm._raw_data_to_hdf5(local, 1, "bruker_bes3t")
+    return root / "data" / "M1"
+
+
+def phase(label: str, backend: MemoryBackend, func) -> None:
+    backend.reset_stats()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    mb = backend.bytes_transferred / 1e6
+    print(f"{label:<24}{elapsed:8.3f} s {backend.round_trips:6d} trips {mb:8.2f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=10.0, help="ms")
+    parser.add_argument("--bandwidth", type=float, default=50.0, help="MB/s")
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--points", type=int, default=20_000)
+    parser.add_argument("--workers", type=int, default=4, help="parallel uploads")
+    args = parser.parse_args()
+
+    backend = MemoryBackend(latency=args.latency / 1e3, bandwidth=args.bandwidth * 1e6)
+    remote = SpecatalogArchive(False, backend=backend)
+    remote.make_dir("data")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        src = make_measurement(Path(tmpdir), args.files, args.points)
+
+        phase(
+            "upload directory",
+            backend,
+            lambda: remote.copy_directory_to_archive(src, "data/M0", workers=1),
+        )
+        phase(
+            f"upload ({args.workers} workers)",
+            backend,
+            lambda: remote.copy_directory_to_archive(
+                src, "data/M1", workers=args.workers
+            ),
+        )
+        phase("list raw files", backend, lambda: mm._list_files(remote, 1, "raw"))
+        phase(
+            "raw_data_to_hdf5",
+            backend,
+            lambda: mm._raw_data_to_hdf5(remote, 1, "bruker_bes3t"),
+        )
+
+        def read_h5():
+            with remote.open_measurement_h5_file("data/M1/measurement_M1.h5", "r") as f:
+                f["raw_data/data_real_0"][()]
+
+        phase("read hdf5", backend, read_h5)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark for parsing Bruker BES3T headers (.DSC).
+
+Parses every .DSC file of a corpus directory (recursively) with
+read_dsc_file() and parse_field_params() and reports the throughput. If no
+corpus is given, a synthetic corpus is generated in a temporary directory.
+
+Usage
+-----
+python benchmarks/bench_bruker_headers.py /path/to/dsc/corpus --repeat 3
+python benchmarks/bench_bruker_headers.py --synthetic 2000
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from specatalog.data_management.data_loader import parse_field_params, read_dsc_file
+
+
+SYNTHETIC_HEADER = """#DESC	1.2 * DESCRIPTOR INFORMATION ***********************
+DSRC	EXP
+BSEQ	BIG
+IKKF	REAL
+XTYP	IDX
+YTYP	NODATA
+IRFMT	D
+XPTS	{xpts}
+XMIN	3300.000000
+XWID	200.000000
+TITL	'synthetic spectrum {n}'
+#SPL	1.2 * STANDARD PARAMETER LAYER
+{spl}
+#MHL	1.0 * MANIPULATION HISTORY LAYER by BRUKER
+{mhl}
+"""
+
+
+def make_synthetic_corpus(directory: Path, n_files: int) -> None:
+    spl = "\n".join(f"PAR{i}\t{i * 0.125:.6f}" for i in range(300))
+    mhl = "\n".join(f"HIST{i}\t'step {i}'" for i in range(2000))
+    for n in range(n_files):
+        text = SYNTHETIC_HEADER.format(xpts=1024 + n, n=n, spl=spl, mhl=mhl)
+        (directory / f"spectrum_{n}.DSC").write_text(text, encoding="latin-1")
+
+
+def run(corpus: Path, repeat: int) -> None:
+    files = sorted(corpus.rglob("*.DSC")) + sorted(corpus.rglob("*.dsc"))
+    if not files:
+        raise SystemExit(f"No .DSC files found in {corpus}")
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for file in files:
+            parse_field_params(read_dsc_file(file))
+        best = min(best, time.perf_counter() - start)
+
+    print(f"files:        {len(files)}")
+    print(f"best of {repeat}:    {best:.3f} s")
+    print(f"throughput:   {len(files) / best:.0f} headers/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("corpus", nargs="?", type=Path, help="directory of DSC files")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--synthetic", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.corpus is not None:
+        run(args.corpus, args.repeat)
+    else:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            make_synthetic_corpus(Path(tmpdir), args.synthetic)
+            run(Path(tmpdir), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
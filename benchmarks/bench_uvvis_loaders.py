@@ -0,0 +1,105 @@
+"""
+Benchmark for the UV-vis text loaders.
+
+Generates large synthetic exports in the Ulm and Freiburg formats and
+measures the throughput of load_uvvis_ulm() and load_uvvis_freiburg(). If
+pandas is installed, the previous two-pass pandas implementation is timed
+as reference.
+
+Usage
+-----
+python benchmarks/bench_uvvis_loaders.py --points 200000 --files 20
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from specatalog.data_management.data_loader import (
+    load_uvvis_freiburg,
+    load_uvvis_ulm,
+)
+
+
+def write_exports(directory: Path, n_points: int, n_files: int) -> tuple[list, list]:
+    wavelength = np.linspace(1100, 190, n_points)
+    ulm_files, freiburg_files = [], []
+    for n in range(n_files):
+        intensity = np.random.default_rng(n).random(n_points)
+        rows = "".join(f"{w:.3f}\t{i:.6f}\n" for w, i in zip(wavelength, intensity))
+
+        ulm = directory / f"ulm_{n}.txt"
+        ulm.write_text(
+            "TITLE\tsynthetic\nDATA TYPE\tUV/VIS SPECTRUM\nXUNITS\tNM\n"
+            "YUNITS\tABSORBANCE\nXYDATA\n" + rows + "##### Extended Information\n"
+            "[Comments]\nScan Speed\tMedium\n"
+        )
+        ulm_files.append(ulm)
+
+        freiburg = directory / f"freiburg_{n}.txt"
+        freiburg.write_text(f"synthetic {n}\nWavelength (nm)\tAbs\n" + rows)
+        freiburg_files.append(freiburg)
+    return ulm_files, freiburg_files
+
+
+def pandas_reference(path: Path, skiprows: int) -> None:
+    import pandas as pd
+
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        for _ in f:
+            pass
+    pd.read_csv(
+        path,
+        usecols=[0, 1],
+        names=["lambda", "int"],
+        skiprows=skiprows,
+        sep=r"\s+",
+        engine="python",
+    )
+
+
+def timed(label: str, func, files: list, n_points: int) -> None:
+    start = time.perf_counter()
+    for file in files:
+        func(file)
+    elapsed = time.perf_counter() - start
+    rate = len(files) * n_points / elapsed / 1e6
+    print(f"{label:<28}{elapsed:8.3f} s {rate:8.2f} Mpoints/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--points", type=int, default=100_000)
+    parser.add_argument("--files", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        ulm_files, freiburg_files = write_exports(Path(tmpdir), args.points, args.files)
+
+        timed("load_uvvis_ulm", load_uvvis_ulm, ulm_files, args.points)
+        timed("load_uvvis_freiburg", load_uvvis_freiburg, freiburg_files, args.points)
+
+        try:
+            import pandas  # noqa: F401
+        except ImportError:
+            print("pandas not installed, reference skipped")
+            return
+        timed(
+            "pandas reference (ulm)",
+            lambda p: pandas_reference(p, 5),
+            ulm_files,
+            args.points,
+        )
+        timed(
+            "pandas reference (freiburg)",
+            lambda p: pandas_reference(p, 2),
+            freiburg_files,
+            args.points,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -30,6 +30,15 @@ target_metadata = Model.metadata
 # ... etc.
 
 
+def include_object(object, name, type_, reflected, compare_to):
+    """Ignore the full-text search columns and indexes (not in the models)."""
+    if type_ == "column" and name == "search_vector":
+        return False
+    if type_ == "index" and reflected and compare_to is None:
+        return not (name.endswith("_search_vector") or name.endswith("_trgm"))
+    return True
+
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
@@ -46,6 +55,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -68,7 +78,11 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
-        context.configure(connection=connection, target_metadata=target_metadata)
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
+        )
 
         with context.begin_transaction():
             context.run_migrations()
@@ -0,0 +1,57 @@
+"""add full-text and trigram search
+
+Revision ID: 7a3c91d2e4f5
+Revises: 00555547b637
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "7a3c91d2e4f5"
+down_revision: Union[str, Sequence[str], None] = "00555547b637"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# generated tsvector columns; the columns are not part of the ORM models and
+# are only used by crud_db.read.search
+SEARCH_COLUMNS = {
+    "molecules": ("name", "molecular_formula", "additional_info"),
+    "measurements": ("additional_info", "series", "solvent"),
+}
+# trigram indexes for the "did you mean" suggestions
+TRIGRAM_COLUMNS = {"molecules": "name", "measurements": "series"}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for table, columns in SEARCH_COLUMNS.items():
+        document = " || ' ' || ".join(f"coalesce({c}, '')" for c in columns)
+        op.execute(
+            f"ALTER TABLE {table} ADD COLUMN search_vector tsvector "
+            f"GENERATED ALWAYS AS (to_tsvector('simple', {document})) STORED"
+        )
+        op.execute(
+            f"CREATE INDEX ix_{table}_search_vector ON {table} "
+            "USING gin (search_vector)"
+        )
+    for table, column in TRIGRAM_COLUMNS.items():
+        op.execute(
+            f"CREATE INDEX ix_{table}_{column}_trgm ON {table} "
+            f"USING gin ({column} gin_trgm_ops)"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, column in TRIGRAM_COLUMNS.items():
+        op.execute(f"DROP INDEX IF EXISTS ix_{table}_{column}_trgm")
+    for table in SEARCH_COLUMNS:
+        op.execute(f"DROP INDEX IF EXISTS ix_{table}_search_vector")
+        op.execute(f"ALTER TABLE {table} DROP COLUMN search_vector")
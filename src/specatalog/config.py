@@ -19,8 +19,38 @@ f.close()
 BASE_PATH = Path(defaults["archive_path"]).resolve()
 MEASUREMENTS_PATH = Path("data")
 MOLECULES_PATH = Path("molecules")
+# deleted directories are moved here until the database changes are committed
+TRASH_PATH = Path("trash")
 
 REMOTE_ARCHIVE = defaults["remote_archive"]
+# storage backend of the archive: "local", "smb" or "memory" (testing only)
+ARCHIVE_BACKEND = defaults.get("archive_backend", "smb" if REMOTE_ARCHIVE else "local")
+# number of parallel uploads when a measurement directory is copied
+UPLOAD_WORKERS = defaults.get("upload_workers", 4)
+# number of parallel reads of measurement files (load_many, stacking)
+READ_WORKERS = defaults.get("read_workers", 8)
+# store raw files once in archive/blobs and hard link them into measurements
+# (only if the archive filesystem supports hard links)
+DEDUPLICATE_RAW_DATA = defaults.get("deduplicate_raw_data", False)
+# hash of manifests and blobs: "blake2b", "xxh3_128" (fast-hash extra) or
+# "blake3"; all clients of an archive should use the same algorithm
+HASH_ALGORITHM = defaults.get("hash_algorithm", "blake2b")
+# format of new measurement files: "hdf5" or "zarr" (see measurement_store)
+MEASUREMENT_FORMAT = defaults.get("measurement_format", "hdf5")
+# layout of the raw data in the measurement files: "indexed" (one dataset
+# per raw file) or "stacked" (one resizable dataset per quantity)
+RAW_DATA_LAYOUT = defaults.get("raw_data_layout", "indexed")
+# memory budget (bytes) of the cache of decoded datasets in hdf5_reader;
+# 0 disables it (see hdf5_reader.enable_dataset_cache)
+DATASET_CACHE_BYTES = defaults.get("dataset_cache_bytes", 0)
+# database of the job queue (SQLAlchemy URL)
+JOB_DATABASE_URL = defaults.get(
+    "job_database_url", f"sqlite:///{Path.home() / '.specatalog' / 'jobs.sqlite'}"
+)
+# running jobs without a heartbeat for this many seconds are requeued (the
+# worker was killed); jobs that were started job_max_attempts times fail
+JOB_LEASE_SECONDS = defaults.get("job_lease_seconds", 120)
+JOB_MAX_ATTEMPTS = defaults.get("job_max_attempts", 2)
 
 # remote login
 HOST = defaults["host"]
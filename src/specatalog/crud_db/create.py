@@ -1,6 +1,8 @@
 import specatalog.models.molecules as mol
 
-from typing import TypeVar
+import uuid
+import sqlalchemy as alc
+from typing import Sequence, TypeVar
 from specatalog.models.creation_pydantic_measurements import MeasurementModel
 from specatalog.models.measurements import Measurement
 from specatalog.models.creation_pydantic_molecules import MoleculeModel
@@ -170,3 +172,244 @@ def create_new_molecule(data: molecule_model_pyd) -> molecule_model_alc:
 
     with db_session() as session:
         return _create_new_molecule(data, session)
+
+
+def _bulk_insert(
+    session: db_session, model_class: type, rows: list[dict], path_key: str, prefix: str
+) -> list[int]:
+    """
+    Inserts rows of one model class with one multi-row INSERT per table of the
+    joined-inheritance hierarchy and sets the path column to <prefix><id> with
+    one UPDATE.
+
+    The path column is unique, so every row gets a random placeholder first.
+    The placeholders are returned together with the new ids and assign the
+    ids to the rows independent of the order of the returned rows.
+
+    Returns
+    -------
+    list[int]
+        IDs of the new rows in the order of rows.
+    """
+    mapper = alc.inspect(model_class)
+    discriminator = mapper.get_property_by_column(mapper.polymorphic_on).key
+    tables = []
+    for m in reversed(list(mapper.iterate_to_root())):
+        if m.local_table not in tables:
+            tables.append(m.local_table)
+    base, children = tables[0], tables[1:]
+
+    placeholders = [f"pending/{uuid.uuid4().hex}" for _ in rows]
+    values = [
+        {**row, discriminator: mapper.polymorphic_identity, path_key: placeholder}
+        for row, placeholder in zip(rows, placeholders)
+    ]
+
+    def table_rows(table):
+        columns = {
+            col.name: mapper.get_property_by_column(col).key
+            for col in table.columns
+            if not col.primary_key
+        }
+        return [
+            {name: v[key] for name, key in columns.items() if key in v} for v in values
+        ]
+
+    path_col = base.c[mapper.get_property(path_key).columns[0].name]
+    result = session.execute(
+        alc.insert(base).returning(base.c.id, path_col), table_rows(base)
+    )
+    id_of = {placeholder: id_ for id_, placeholder in result}
+    ids = [id_of[placeholder] for placeholder in placeholders]
+
+    for table in children:
+        pk = next(iter(table.primary_key)).name
+        session.execute(
+            alc.insert(table),
+            [{pk: id_, **row} for id_, row in zip(ids, table_rows(table))],
+        )
+
+    session.execute(
+        alc.update(base)
+        .where(base.c.id.in_(ids))
+        .values({path_col: alc.literal(prefix) + alc.cast(base.c.id, alc.String)})
+    )
+    return ids
+
+
+def _create_new_measurements(
+    data: Sequence[measurement_model_pyd], session: db_session
+) -> list[int]:
+    """
+    Create many new database entries for the measurement table with a
+    constant number of statements.
+
+    All models are checked and all molecular ids are resolved with one query
+    before anything is written. The entries are inserted in bulk (one INSERT
+    per table and measurement class) and their paths are set with one UPDATE.
+
+    Parameters
+    ----------
+    data : Sequence[MeasurementModel]
+        Models from models.creation_pydantic_measurements. The models can be
+        of different subclasses.
+    session: db_session
+        Object of the class db_session.
+
+    Raises
+    ------
+    TypeError
+        If an element is not a measurement model with a measurement class.
+    ValueError
+        If a molecular id does not exist in the database.
+
+    Returns
+    -------
+    list[int]
+        IDs of the new measurements in the order of data.
+    """
+    for d in data:
+        if not isinstance(d, MeasurementModel) or not hasattr(d, "measurement_class"):
+            raise TypeError(f"{d!r} is not a model of a measurement method.")
+
+    molecular_ids = {d.molecular_id for d in data}
+    found = set(
+        session.scalars(
+            alc.select(mol.Molecule.id).where(mol.Molecule.id.in_(molecular_ids))
+        )
+    )
+    missing = sorted(molecular_ids - found)
+    if missing:
+        raise ValueError(
+            "No molecules with the IDs "
+            + ", ".join(f"MOL{i}" for i in missing)
+            + " found."
+        )
+
+    groups: dict[type, list[int]] = {}
+    for i, d in enumerate(data):
+        groups.setdefault(d.measurement_class, []).append(i)
+
+    ids = [0] * len(data)
+    for measurement_class, indices in groups.items():
+        rows = [
+            {
+                k: _enum_to_value(v)
+                for k, v in data[i].model_dump(exclude={"measurement_class"}).items()
+            }
+            for i in indices
+        ]
+        new_ids = _bulk_insert(
+            session, measurement_class, rows, "path", f"{MEASUREMENTS_PATH}/M"
+        )
+        for i, id_ in zip(indices, new_ids):
+            ids[i] = id_
+    return ids
+
+
+def create_new_measurements(data: Sequence[measurement_model_pyd]) -> list[int]:
+    """
+    Create many new database entries for the measurement table at once.
+
+    In contrast to calling create_new_measurement in a loop, the number of
+    database round trips does not grow with the number of measurements. The
+    entries are created in one transaction: if one model is invalid, no entry
+    is created.
+
+    Parameters
+    ----------
+    data : Sequence[MeasurementModel]
+        Models from models.creation_pydantic_measurements.
+
+    Raises
+    ------
+    TypeError
+        If an element is not a measurement model with a measurement class.
+    ValueError
+        If a molecular id does not exist in the database.
+
+    Returns
+    -------
+    list[int]
+        IDs of the new measurements in the order of data.
+
+    Example
+    -------
+    >>> ids = create_new_measurements([model_1, model_2, model_3])
+    """
+    with db_session() as session:
+        return _create_new_measurements(data, session)
+
+
+def _create_new_molecules(
+    data: Sequence[molecule_model_pyd], session: db_session
+) -> list[int]:
+    """
+    Create many new database entries for the molecule table with a constant
+    number of statements (see _create_new_measurements).
+
+    Parameters
+    ----------
+    data : Sequence[MoleculeModel]
+        Models from models.creation_pydantic_molecules.
+    session: db_session
+        Object of the class db_session.
+
+    Raises
+    ------
+    TypeError
+        If an element is not a molecule model with a model class.
+
+    Returns
+    -------
+    list[int]
+        IDs of the new molecules in the order of data.
+    """
+    for d in data:
+        if not isinstance(d, MoleculeModel) or not hasattr(d, "model_class"):
+            raise TypeError(f"{d!r} is not a model of a molecule group.")
+
+    groups: dict[type, list[int]] = {}
+    for i, d in enumerate(data):
+        groups.setdefault(d.model_class, []).append(i)
+
+    ids = [0] * len(data)
+    for model_class, indices in groups.items():
+        rows = [
+            {
+                k: _enum_to_value(v)
+                for k, v in data[i].model_dump(exclude={"model_class"}).items()
+            }
+            for i in indices
+        ]
+        new_ids = _bulk_insert(
+            session, model_class, rows, "structural_formula", f"{MOLECULES_PATH}/MOL"
+        )
+        for i, id_ in zip(indices, new_ids):
+            ids[i] = id_
+    return ids
+
+
+def create_new_molecules(data: Sequence[molecule_model_pyd]) -> list[int]:
+    """
+    Create many new database entries for the molecule table at once with a
+    constant number of database round trips. The entries are created in one
+    transaction.
+
+    Parameters
+    ----------
+    data : Sequence[MoleculeModel]
+        Models from models.creation_pydantic_molecules.
+
+    Raises
+    ------
+    TypeError
+        If an element is not a molecule model with a model class.
+
+    Returns
+    -------
+    list[int]
+        IDs of the new molecules in the order of data.
+    """
+    with db_session() as session:
+        return _create_new_molecules(data, session)
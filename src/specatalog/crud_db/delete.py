@@ -1,9 +1,34 @@
 from specatalog.models.measurements import Measurement
 from specatalog.models.molecules import Molecule
 from specatalog.models.base import TimeStampedModel
+import specatalog.crud_db.read as r
 
 from specatalog.main import db_session
 
+import sqlalchemy as alc
+from dataclasses import dataclass, field
+
+# maximal number of ids in one IN clause
+_ID_CHUNK_SIZE = 10000
+
+
+@dataclass
+class DeleteWhereResult:
+    """
+    Result of a deletion by filter.
+
+    Attributes
+    ----------
+    molecule_ids : list[int]
+        IDs of the deleted molecules.
+    measurement_ids : list[int]
+        IDs of the deleted measurements (including the measurements of the
+        deleted molecules).
+    """
+
+    molecule_ids: list[int] = field(default_factory=list)
+    measurement_ids: list[int] = field(default_factory=list)
+
 
 def _delete_object(obj: TimeStampedModel, session: db_session):
     """
@@ -66,9 +91,9 @@ def delete_molecule(mol_id: int):
     """
     with db_session() as session:
         molecule = session.query(Molecule).filter_by(id=mol_id).first()
-    if molecule is None:
-        raise ValueError(f"No molecule with the ID MOL{mol_id} found.")
-    delete_object(molecule)
+        if molecule is None:
+            raise ValueError(f"No molecule with the ID MOL{mol_id} found.")
+        _delete_object(molecule, session)
     return
 
 
@@ -94,6 +119,96 @@ def delete_measurement(ms_id: int):
     """
     with db_session() as session:
         measurement = session.query(Measurement).filter_by(id=ms_id).first()
-    if measurement is None:
-        raise ValueError(f"No measurement with the ID M{ms_id} found.")
-    delete_object(measurement)
+        if measurement is None:
+            raise ValueError(f"No measurement with the ID M{ms_id} found.")
+        _delete_object(measurement, session)
+
+
+def _delete_where(
+    filters: r.filter_model_type, session: db_session, dry_run: bool = False
+) -> DeleteWhereResult:
+    """
+    Delete all database entries that match a filter model.
+
+    The ids of the matching entries (and of the measurements of matching
+    molecules) are selected first; the entries are then deleted with one
+    DELETE statement on the base table. The rows of the subclass tables and
+    the measurements of deleted molecules are removed by the ON DELETE
+    CASCADE foreign keys.
+
+    Parameters
+    ----------
+    filters : filter_model_type
+        Filter model from crud_db.read. The class of the filter model
+        determines the table (e.g. CWEPRFilter -> only cwEPR measurements).
+    session: db_session
+        Object of the class db_session.
+    dry_run : bool, optional
+        If True, nothing is deleted. The default is False.
+
+    Returns
+    -------
+    DeleteWhereResult
+        IDs of the deleted molecules and measurements.
+
+    """
+    model = filters.model
+    ids = session.scalars(
+        alc.select(model.id).where(*r._filter_conditions(filters))
+    ).all()
+    result = DeleteWhereResult()
+
+    if issubclass(model, Molecule):
+        result.molecule_ids = list(ids)
+        for start in range(0, len(ids), _ID_CHUNK_SIZE):
+            chunk = ids[start : start + _ID_CHUNK_SIZE]
+            result.measurement_ids += session.scalars(
+                alc.select(Measurement.id).where(Measurement.molecular_id.in_(chunk))
+            ).all()
+    else:
+        result.measurement_ids = list(ids)
+
+    if dry_run:
+        return result
+
+    base = alc.inspect(model).base_mapper.local_table
+    for start in range(0, len(ids), _ID_CHUNK_SIZE):
+        chunk = ids[start : start + _ID_CHUNK_SIZE]
+        session.execute(alc.delete(base).where(base.c.id.in_(chunk)))
+    session.expire_all()
+    r.forget_measurements(result.measurement_ids)
+    return result
+
+
+def delete_where(
+    filters: r.filter_model_type, dry_run: bool = False
+) -> DeleteWhereResult:
+    """
+    Delete all database entries that match a filter model with a constant
+    number of statements. Deleting molecules deletes their measurements, too.
+    The archive is not changed; use helpers.full_entry.delete_full_where to
+    delete the directories of the entries as well.
+
+    Parameters
+    ----------
+    filters : filter_model_type
+        Filter model from crud_db.read. The class of the filter model
+        determines the table (e.g. CWEPRFilter -> only cwEPR measurements).
+    dry_run : bool, optional
+        If True, nothing is deleted and the entries that would be deleted are
+        returned. The default is False.
+
+    Returns
+    -------
+    DeleteWhereResult
+        IDs of the deleted molecules and measurements.
+
+    Example
+    -------
+    >>> result = delete_where(MeasurementFilter(series="test"), dry_run=True)
+    >>> len(result.measurement_ids)
+    12
+
+    """
+    with db_session() as session:
+        return _delete_where(filters, session, dry_run)
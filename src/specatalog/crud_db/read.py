@@ -5,8 +5,12 @@ import specatalog.models.creation_pydantic_measurements as cpm
 import specatalog.models.creation_pydantic_molecules as cpmol
 from specatalog.main import db_session
 
-from sqlalchemy.orm import selectinload
-from typing import Union
+import difflib
+from dataclasses import dataclass, field
+
+from sqlalchemy import and_, event, func, literal, literal_column, or_, select
+from sqlalchemy.orm import Session, selectinload
+from typing import Iterable, Union
 
 
 # %%
@@ -77,6 +81,66 @@ ordering_model_type = Union[tuple(ordering.values())]
 """
 
 
+def _filter_conditions(filters: filter_model_type) -> list:
+    """
+    Translate a filter model into SQL conditions on the table of the filter
+    model (see run_query for the operators).
+
+    Parameters
+    ----------
+    filters : filter_model
+        Pydantic model from one of the Filter-classes.
+
+    Raises
+    ------
+    ValueError
+        An error is raised if the filter model contains attributes that are
+        not part of the table or an unknown operator.
+
+    Returns
+    -------
+    list
+        SQLAlchemy expressions that are combined with AND.
+
+    """
+    model = filters.model
+    conditions = []
+    filter_dict_raw = filters.model_dump(exclude_none=True, exclude={"model"})
+    filter_dict = {k: hf._enum_to_value(v) for k, v in filter_dict_raw.items()}
+    for key, value in filter_dict.items():
+        if "__" in key:
+            field_name, op = key.split("__", 1)
+        else:
+            field_name, op = key, "eq"
+
+        if not hasattr(model, field_name):
+            raise ValueError(f"'{field_name}' not valid for {model.__tablename__}")
+
+        column = getattr(model, field_name)
+
+        if op == "eq":
+            conditions.append(column == value)
+        elif op == "ne":
+            conditions.append(column != value)
+        elif op == "gt":
+            conditions.append(column > value)
+        elif op == "ge":
+            conditions.append(column >= value)
+        elif op == "lt":
+            conditions.append(column < value)
+        elif op == "le":
+            conditions.append(column <= value)
+        elif op == "like":
+            conditions.append(column.like(value))
+        elif op == "ilike":
+            conditions.append(column.ilike(value))
+        elif op == "contains":
+            conditions.append(column.contains(value))
+        else:
+            raise ValueError(f"Unknown operator: {op}")
+    return conditions
+
+
 def _run_query(
     filters: filter_model_type, ordering: ordering_model_type, session: db_session
 ) -> list:
@@ -120,39 +184,7 @@ def _run_query(
         query = query.options(selectinload(model.molecule))
 
     # process filters
-    filter_dict_raw = filters.model_dump(exclude_none=True, exclude={"model"})
-    filter_dict = {k: hf._enum_to_value(v) for k, v in filter_dict_raw.items()}
-    for key, value in filter_dict.items():
-        if "__" in key:
-            field_name, op = key.split("__", 1)
-        else:
-            field_name, op = key, "eq"
-
-        if not hasattr(model, field_name):
-            raise ValueError(f"'{field_name}' not valid for {model.__tablename__}")
-
-        column = getattr(model, field_name)
-
-        if op == "eq":
-            query = query.filter(column == value)
-        elif op == "ne":
-            query = query.filter(column != value)
-        elif op == "gt":
-            query = query.filter(column > value)
-        elif op == "ge":
-            query = query.filter(column >= value)
-        elif op == "lt":
-            query = query.filter(column < value)
-        elif op == "le":
-            query = query.filter(column <= value)
-        elif op == "like":
-            query = query.filter(column.like(value))
-        elif op == "ilike":
-            query = query.filter(column.ilike(value))
-        elif op == "contains":
-            query = query.filter(column.contains(value))
-        else:
-            raise ValueError(f"Unknown operator: {op}")
+    query = query.filter(*_filter_conditions(filters))
 
     # process ordering
     if ordering:
@@ -203,3 +235,244 @@ def run_query(filters: filter_model_type, ordering: ordering_model_type = None)
 
     with db_session() as session:
         return _run_query(filters, ordering, session)
+
+
+# %%
+"""
+****************************************
+********** Existence checks ************
+****************************************
+
+"""
+
+# ids of measurements that were found in the database by this process; they
+# are removed when the measurements (or their molecules) are deleted
+_existing_measurements: set[int] = set()
+
+
+@event.listens_for(Session, "after_flush")
+def _forget_deleted(session, flush_context) -> None:
+    for obj in session.deleted:
+        if isinstance(obj, mol.Molecule):
+            # the measurements are deleted by the database (ON DELETE CASCADE)
+            _existing_measurements.clear()
+        elif isinstance(obj, ms.Measurement):
+            _existing_measurements.discard(obj.id)
+
+
+def forget_measurements(ids=None) -> None:
+    """
+    Removes measurements from the cache of measurement_exists, e.g. after
+    they were deleted with a bulk statement.
+
+    Parameters
+    ----------
+    ids : iterable of int, optional
+        Measurement IDs. The default is None (clear the cache).
+    """
+    if ids is None:
+        _existing_measurements.clear()
+    else:
+        _existing_measurements.difference_update(ids)
+
+
+def _measurement_exists(ms_id: int, session: db_session) -> bool:
+    """
+    Checks with a SELECT 1 whether a measurement exists; found ids are
+    cached (see measurement_exists).
+    """
+    if ms_id in _existing_measurements:
+        return True
+    stmt = select(literal(1)).where(ms.Measurement.id == ms_id)
+    if session.execute(stmt).first() is None:
+        return False
+    _existing_measurements.add(ms_id)
+    return True
+
+
+def _measurements_exist(ids: Iterable[int], session: db_session) -> list[int]:
+    """
+    Checks several measurements with one query; found ids are cached (see
+    measurement_exists).
+
+    Returns
+    -------
+    list[int]
+        The ids that do not exist, in the given order.
+    """
+    unknown = [i for i in ids if i not in _existing_measurements]
+    if not unknown:
+        return []
+    found = set(
+        session.scalars(select(ms.Measurement.id).where(ms.Measurement.id.in_(unknown)))
+    )
+    _existing_measurements.update(found)
+    return [i for i in unknown if i not in found]
+
+
+def measurement_exists(ms_id: int) -> bool:
+    """
+    Checks whether a measurement exists in the database. Unlike run_query no
+    objects are loaded; ids that were found are cached in the process, so
+    repeated checks do not query the database. Deleting measurements or
+    molecules through the ORM or crud_db.delete removes them from the cache.
+
+    Parameters
+    ----------
+    ms_id : int
+        Measurement ID.
+
+    Returns
+    -------
+    bool
+        True if the measurement exists.
+    """
+    if ms_id in _existing_measurements:
+        return True
+    with db_session() as session:
+        return _measurement_exists(ms_id, session)
+
+
+# %%
+"""
+****************************************
+********** Full-text search ************
+****************************************
+
+"""
+
+# columns of the search documents per base table; on PostgreSQL they are
+# combined into the generated column search_vector (see the migration
+# 7a3c91d2e4f5_add_full_text_search)
+SEARCH_COLUMNS = {
+    "molecules": ("name", "molecular_formula", "additional_info"),
+    "measurements": ("additional_info", "series", "solvent"),
+}
+# columns that are used for "did you mean" suggestions
+SUGGESTION_COLUMNS = {"molecules": "name", "measurements": "series"}
+SUGGESTION_COUNT = 5
+
+
+@dataclass
+class SearchResult:
+    """
+    Result of a full-text search.
+
+    Attributes
+    ----------
+    entries : list
+        Matching database entries, best matches first.
+    suggestions : list[str]
+        Similar terms ("did you mean") if nothing was found.
+    """
+
+    entries: list = field(default_factory=list)
+    suggestions: list[str] = field(default_factory=list)
+
+
+def _base_table(model) -> str:
+    return model.__mapper__.base_mapper.class_.__tablename__
+
+
+def _suggest(query: str, model, session: db_session) -> list[str]:
+    """Terms of the suggestion column that are similar to the query."""
+    table = _base_table(model)
+    column = getattr(model, SUGGESTION_COLUMNS[table])
+    if session.get_bind().dialect.name == "postgresql":
+        rows = (
+            session.query(column)
+            .filter(column.op("%")(query))
+            .distinct()
+            .order_by(func.similarity(column, query).desc())
+            .limit(SUGGESTION_COUNT)
+            .all()
+        )
+        return [row[0] for row in rows]
+    terms = [row[0] for row in session.query(column).distinct() if row[0]]
+    return difflib.get_close_matches(query, terms, n=SUGGESTION_COUNT, cutoff=0.6)
+
+
+def _search(query: str, model, session: db_session, limit: int = 100) -> SearchResult:
+    """
+    Searches the text columns of molecules or measurements (see SEARCH_COLUMNS)
+    for a query. On PostgreSQL the generated tsvector column search_vector is
+    used (web search syntax, ranked by ts_rank) and suggestions are found with
+    trigram similarity. Other databases fall back to a case-insensitive
+    substring search for every word of the query.
+
+    Parameters
+    ----------
+    query : str
+        Search words.
+    model
+        Table class that is searched (e.g. ms.Measurement, mol.Molecule or one
+        of their subclasses).
+    session : db_session
+        Object of the class db_session.
+    limit : int, optional
+        Maximum number of entries. The default is 100.
+
+    Returns
+    -------
+    SearchResult
+        Matching entries and suggestions if nothing was found.
+    """
+    query = query.strip()
+    if not query:
+        return SearchResult()
+    table = _base_table(model)
+    q = session.query(model)
+    if hasattr(model, "molecule"):
+        q = q.options(selectinload(model.molecule))
+
+    if session.get_bind().dialect.name == "postgresql":
+        ts_query = func.websearch_to_tsquery("simple", query)
+        vector = literal_column(f"{table}.search_vector")
+        q = q.filter(vector.op("@@")(ts_query)).order_by(
+            func.ts_rank(vector, ts_query).desc()
+        )
+    else:
+        columns = [getattr(model, c) for c in SEARCH_COLUMNS[table]]
+        q = q.filter(
+            and_(
+                *(
+                    or_(*(c.ilike(f"%{word}%") for c in columns))
+                    for word in query.split()
+                )
+            )
+        ).order_by(model.id)
+
+    entries = q.limit(limit).all()
+    if entries:
+        return SearchResult(entries)
+    return SearchResult(suggestions=_suggest(query, model, session))
+
+
+def search(query: str, model=ms.Measurement, limit: int = 100) -> SearchResult:
+    """
+    Full-text search over the free-text columns of measurements (additional
+    info, series, solvent) or molecules (name, formula, additional info). If
+    nothing matches, similar terms are returned as suggestions.
+
+    Parameters
+    ----------
+    query : str
+        Search words, e.g. "PDI toluene". On PostgreSQL the web search syntax
+        is supported ("quoted phrases", or, -excluded).
+    model, optional
+        Table class that is searched. The default is ms.Measurement.
+    limit : int, optional
+        Maximum number of entries. The default is 100.
+
+    Returns
+    -------
+    SearchResult
+        Matching entries (best matches first) and suggestions.
+
+    Examples
+    --------
+    >>> result = search("PDI", mol.Molecule)
+    >>> result.entries or result.suggestions
+    """
+    with db_session() as session:
+        return _search(query, model, session, limit)
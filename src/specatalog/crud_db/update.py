@@ -1,11 +1,14 @@
 import specatalog.models.measurements as ms
 import specatalog.models.molecules as mol
-from specatalog.models.base import TimeStampedModel
+from specatalog.models.base import TimeStampedModel, _utc_now
 from specatalog.main import db_session
 import specatalog.models.creation_pydantic_measurements as cpm
 import specatalog.models.creation_pydantic_molecules as cpmol
 
 import specatalog.helpers.helper_functions as hf
+import specatalog.crud_db.read as r
+import sqlalchemy as alc
+from sqlalchemy.orm import ColumnProperty
 from typing import Union
 
 
@@ -52,6 +55,16 @@ update_model_type = Union[tuple(updates.values())]
 
 """
 
+# components of the names of multi-component molecules
+_NAME_COMPONENTS = {
+    "rp": ["radical_1", "linker", "radical_2", "name_suffix"],
+    "tdp": ["chromophore", "linker", "doublet", "name_suffix"],
+    "ttp": ["triplet_1", "linker", "triplet_2", "name_suffix"],
+}
+
+# maximal number of ids in one IN clause
+_ID_CHUNK_SIZE = 10000
+
 
 def _update_model(
     entry: TimeStampedModel, update_data: update_model_type, session: db_session
@@ -155,15 +168,8 @@ def _automatic_name_update(entry: TimeStampedModel, update_data: update_model_ty
     None
 
     """
-    # map components of the molecules
-    group_keys = {
-        "rp": ["radical_1", "linker", "radical_2", "name_suffix"],
-        "tdp": ["chromophore", "linker", "doublet", "name_suffix"],
-        "ttp": ["triplet_1", "linker", "triplet_2", "name_suffix"],
-    }
-
     # check if a molecule name is changed by the update_data
-    keys_to_check = [k for keys in group_keys.values() for k in keys]
+    keys_to_check = [k for keys in _NAME_COMPONENTS.values() for k in keys]
     if not any(k in update_data for k in keys_to_check):
         return  # if not: do nothing
 
@@ -177,8 +183,123 @@ def _automatic_name_update(entry: TimeStampedModel, update_data: update_model_ty
             return getattr(entry, field)
 
     # build name
-    values = [get_value(k) for k in group_keys[entry.group]]
+    values = [get_value(k) for k in _NAME_COMPONENTS[entry.group]]
     values = values = [v for v in values if v not in (None, "", " ")]
     entry.name = "-".join(values)
 
     return
+
+
+def _update_where(
+    filters: r.filter_model_type,
+    update_data: update_model_type,
+    session: db_session,
+    dry_run: bool = False,
+) -> int:
+    """
+    Update all database entries that match a filter model.
+
+    The ids of the matching entries are selected with one query; each table
+    of the joined-inheritance hierarchy that contains updated columns is then
+    changed with one UPDATE statement. No entries are loaded into the
+    session.
+
+    Parameters
+    ----------
+    filters : filter_model_type
+        Filter model from crud_db.read. The class of the filter model
+        determines the table (e.g. CWEPRFilter -> only cwEPR measurements).
+    update_data : update_model_type
+        Update model. The fields that are set are changed in all entries.
+    session: db_session
+        Object of the class db_session.
+    dry_run : bool, optional
+        If True, the entries are only counted. The default is False.
+
+    Raises
+    ------
+    ValueError
+        An error is raised if the update model contains attributes that are not
+        part of the table of the filter model or components of the name of a
+        multi-component molecule (use update_model for these).
+
+    Returns
+    -------
+    int
+        Number of matching (dry_run) or updated entries.
+
+    """
+    model = filters.model
+    mapper = alc.inspect(model)
+    data_raw = update_data.model_dump(exclude_none=True)
+    data = {k: hf._enum_to_value(v) for k, v in data_raw.items()}
+
+    name_components = {k for keys in _NAME_COMPONENTS.values() for k in keys}
+    values: dict[alc.Table, dict] = {}
+    for field, value in data.items():
+        prop = mapper.attrs.get(field)
+        if not isinstance(prop, ColumnProperty):
+            raise ValueError(f"{field} not valid.")
+        if field in name_components and hasattr(model, "group"):
+            raise ValueError(
+                f"{field} is part of the molecule name; use update_model instead."
+            )
+        column = prop.columns[0]
+        values.setdefault(column.table, {})[column.name] = value
+
+    ids = session.scalars(
+        alc.select(model.id).where(*r._filter_conditions(filters))
+    ).all()
+    if dry_run or not values:
+        return len(ids)
+
+    base = mapper.base_mapper.local_table
+    values.setdefault(base, {})["updated_at"] = _utc_now()
+    for table, table_values in values.items():
+        for start in range(0, len(ids), _ID_CHUNK_SIZE):
+            chunk = ids[start : start + _ID_CHUNK_SIZE]
+            session.execute(
+                alc.update(table).where(table.c.id.in_(chunk)).values(table_values)
+            )
+    return len(ids)
+
+
+def update_where(
+    filters: r.filter_model_type, update_data: update_model_type, dry_run: bool = False
+) -> int:
+    """
+    Update all database entries that match a filter model with a constant
+    number of statements, e.g. to correct a value in many measurements.
+
+    Parameters
+    ----------
+    filters : filter_model_type
+        Filter model from crud_db.read. The class of the filter model
+        determines the table (e.g. CWEPRFilter -> only cwEPR measurements).
+    update_data : update_model_type
+        Update model. The fields that are set are changed in all entries. It
+        may contain the fields of the table of the filter model only.
+    dry_run : bool, optional
+        If True, nothing is changed and the number of entries that would be
+        updated is returned. The default is False.
+
+    Raises
+    ------
+    ValueError
+        An error is raised if the update model contains attributes that are not
+        part of the table of the filter model or components of the name of a
+        multi-component molecule (use update_model for these).
+
+    Returns
+    -------
+    int
+        Number of matching (dry_run) or updated entries.
+
+    Example
+    -------
+    >>> update_where(MeasurementFilter(solvent="tol"), MeasurementUpdate(solvent="toluene"))
+    3000
+
+    """
+    with db_session() as session:
+        return _update_where(filters, update_data, session, dry_run)
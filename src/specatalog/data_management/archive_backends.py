@@ -0,0 +1,796 @@
+"""
+Storage backends for the measurement archive. SpecatalogArchive delegates
+all file operations to one of the backends below; paths are always given
+relative to the archive root. New backends have to implement the abstract
+methods of ArchiveBackend.
+"""
+
+import inspect
+import io
+import itertools
+import os
+import shutil
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import Callable, NamedTuple, Optional, Union
+
+import smbclient as smb
+import smbclient.shutil as smb_shutil
+from smbprotocol import MAX_PAYLOAD_SIZE
+
+
+class EntryInfo(NamedTuple):
+    """Metadata of a directory entry as returned by ArchiveBackend.scandir."""
+
+    name: str
+    is_dir: bool
+    size: int
+    mtime: float
+
+
+# chunk size for local copies that are hashed on the way
+COPY_CHUNK_SIZE = 1024**2
+
+
+@dataclass
+class TransferStats:
+    """
+    Summary of an upload to the archive.
+
+    Attributes
+    ----------
+    files : int
+        Number of transferred files.
+    bytes : int
+        Number of transferred bytes.
+    seconds : float
+        Wall time of the transfer.
+    hashes : dict[str, str]
+        Content hashes computed during the upload (path relative to the
+        target directory -> hex digest). Only filled if a hasher_factory was
+        given.
+    deduplicated : int
+        Number of files that were not uploaded because their content was
+        already in the archive.
+    """
+
+    files: int
+    bytes: int
+    seconds: float
+    hashes: dict[str, str] = field(default_factory=dict)
+    deduplicated: int = 0
+
+    @property
+    def throughput(self) -> float:
+        """Transferred bytes per second."""
+        return self.bytes / self.seconds if self.seconds else float("inf")
+
+    def __str__(self) -> str:
+        return (
+            f"{self.files} files, {self.bytes / 1e6:.1f} MB in "
+            f"{self.seconds:.2f} s ({self.throughput / 1e6:.1f} MB/s)"
+        )
+
+
+class ArchiveBackend(ABC):
+    """Abstract file operations on an archive root."""
+
+    #: True if the files are not reachable through the local filesystem
+    remote: bool = True
+
+    @property
+    @abstractmethod
+    def root(self) -> Path:
+        """Root of the archive (for display and error messages)."""
+
+    def local_path(self, p: Union[str, Path]) -> Optional[Path]:
+        """Filesystem path of p if it can be accessed directly, else None."""
+        return None
+
+    @abstractmethod
+    def listdir(self, p: Union[str, Path]) -> list[str]:
+        """Names of the entries of directory p."""
+
+    def scandir(self, p: Union[str, Path]) -> list[EntryInfo]:
+        """Names, types, sizes and mtimes of the entries of directory p.
+        Backends should override this to fetch everything in one call."""
+        return [
+            EntryInfo(name, self.isdir(Path(p) / name), 0, 0.0)
+            for name in self.listdir(p)
+        ]
+
+    @abstractmethod
+    def exists(self, p: Union[str, Path]) -> bool:
+        """True if p exists."""
+
+    @abstractmethod
+    def isdir(self, p: Union[str, Path]) -> bool:
+        """True if p is a directory."""
+
+    @abstractmethod
+    def isfile(self, p: Union[str, Path]) -> bool:
+        """True if p is a file."""
+
+    @abstractmethod
+    def makedirs(self, p: Union[str, Path]) -> None:
+        """Create directory p including its parents (no error if it exists)."""
+
+    @abstractmethod
+    def upload(self, src: Union[str, Path], p: Union[str, Path], hasher=None) -> None:
+        """Copy the local file src to p. If a hasher (hashlib-like object) is
+        given, it is updated with the file content while it is copied."""
+
+    @abstractmethod
+    def download(self, p: Union[str, Path], dst: Union[str, Path]) -> None:
+        """Copy the file p to the local path dst."""
+
+    @abstractmethod
+    def unlink(self, p: Union[str, Path]) -> None:
+        """Delete file p."""
+
+    @abstractmethod
+    def rmtree(self, p: Union[str, Path]) -> None:
+        """Delete directory p with all its contents."""
+
+    def link(self, src: Union[str, Path], p: Union[str, Path]) -> None:
+        """Create p as hard link to the archive file src."""
+        raise NotImplementedError(f"{type(self).__name__} has no hard links.")
+
+    def nlink(self, p: Union[str, Path]) -> int:
+        """Number of hard links of file p."""
+        return 1
+
+    def rename(self, src: Union[str, Path], p: Union[str, Path]) -> None:
+        """Move the file or directory src to p. An existing file at p is
+        replaced."""
+        raise NotImplementedError(f"{type(self).__name__} cannot rename.")
+
+    @abstractmethod
+    def open(self, p: Union[str, Path], mode: str = "r", encoding: str = "utf-8"):
+        """Open file p; returns a file object usable as context manager."""
+
+    def upload_tree(
+        self,
+        src: Union[str, Path],
+        p: Union[str, Path],
+        workers: int = 1,
+        hasher_factory: Optional[Callable] = None,
+        exclude: tuple[str, ...] = (),
+    ) -> TransferStats:
+        """Copy the local directory src to p. p must not exist yet. The files
+        are uploaded by `workers` threads in parallel. If hasher_factory is
+        given, every file is hashed with a new hasher while it is copied.
+        Subdirectories listed in exclude (relative posix paths) are skipped."""
+        start = time.perf_counter()
+        src = Path(src)
+        if self.exists(p):
+            raise FileExistsError(f"{self.root / p} already exists.")
+
+        files = []
+        leaf_dirs = []
+        for dirpath, dirnames, filenames in os.walk(src):
+            rel = Path(dirpath).relative_to(src)
+            dirnames[:] = [d for d in dirnames if (rel / d).as_posix() not in exclude]
+            if not dirnames:
+                leaf_dirs.append(rel)
+            for f in filenames:
+                local = Path(dirpath) / f
+                files.append((local.stat().st_size, local, rel / f))
+
+        # makedirs creates the parents as well
+        for d in leaf_dirs:
+            self.makedirs(Path(p) / d)
+
+        hashes = {}
+
+        def upload(file):
+            _, local, rel = file
+            hasher = hasher_factory() if hasher_factory else None
+            self.upload(local, Path(p) / rel, hasher=hasher)
+            if hasher is not None:
+                hashes[rel.as_posix()] = hasher.hexdigest()
+
+        # largest files first, so that all workers finish at about the same time
+        files.sort(key=lambda f: f[0], reverse=True)
+        if workers > 1 and len(files) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(upload, files))
+        else:
+            for file in files:
+                upload(file)
+
+        return TransferStats(
+            len(files), sum(f[0] for f in files), time.perf_counter() - start, hashes
+        )
+
+    def download_tree(self, p: Union[str, Path], dst: Union[str, Path]) -> None:
+        """Copy the directory p to the local path dst."""
+        dst = Path(dst)
+        dst.mkdir(parents=True, exist_ok=True)
+        for entry in self.scandir(p):
+            if entry.is_dir:
+                self.download_tree(Path(p) / entry.name, dst / entry.name)
+            else:
+                self.download(Path(p) / entry.name, dst / entry.name)
+
+
+class LocalBackend(ArchiveBackend):
+    """Archive in a directory of the local (or mounted) filesystem."""
+
+    remote = False
+
+    def __init__(self, local_path: Union[str, Path]) -> None:
+        self._root = Path(local_path)
+
+    @property
+    def root(self) -> Path:
+        return self._root
+
+    def local_path(self, p: Union[str, Path]) -> Path:
+        return self._root / p
+
+    def listdir(self, p):
+        return os.listdir(self._root / p)
+
+    def scandir(self, p):
+        with os.scandir(self._root / p) as it:
+            entries = []
+            for e in it:
+                st = e.stat()
+                is_dir = e.is_dir()
+                entries.append(
+                    EntryInfo(e.name, is_dir, 0 if is_dir else st.st_size, st.st_mtime)
+                )
+            return entries
+
+    def exists(self, p):
+        return (self._root / p).exists()
+
+    def isdir(self, p):
+        return (self._root / p).is_dir()
+
+    def isfile(self, p):
+        return (self._root / p).is_file()
+
+    def makedirs(self, p):
+        (self._root / p).mkdir(parents=True, exist_ok=True)
+
+    def upload(self, src, p, hasher=None):
+        if hasher is None:
+            shutil.copy2(src, self._root / p)
+            return
+        with open(src, "rb") as fsrc, open(self._root / p, "wb") as fdst:
+            while chunk := fsrc.read(COPY_CHUNK_SIZE):
+                hasher.update(chunk)
+                fdst.write(chunk)
+        shutil.copystat(src, self._root / p)
+
+    def download(self, p, dst):
+        shutil.copy2(self._root / p, dst)
+
+    def unlink(self, p):
+        (self._root / p).unlink()
+
+    def link(self, src, p):
+        os.link(self._root / src, self._root / p)
+
+    def rename(self, src, p):
+        os.replace(self._root / src, self._root / p)
+
+    def nlink(self, p):
+        return (self._root / p).stat().st_nlink
+
+    def rmtree(self, p):
+        shutil.rmtree(self._root / p)
+
+    def open(self, p, mode="r", encoding="utf-8"):
+        if "b" in mode:
+            return open(self._root / p, mode=mode)
+        return open(self._root / p, mode=mode, encoding=encoding)
+
+    def download_tree(self, p, dst):
+        shutil.copytree(self._root / p, dst, dirs_exist_ok=True)
+
+
+class _HashingReader:
+    """
+    Wraps a binary file and feeds everything that is read to a hasher. If the
+    copy is repeated (retry after a broken connection), the bytes that were
+    already hashed are not hashed again.
+    """
+
+    def __init__(self, hasher) -> None:
+        self.hasher = hasher
+        self._hashed = 0
+        self._pos = 0
+        self._file = None
+
+    def wrap(self, f) -> "_HashingReader":
+        self._file = f
+        self._pos = 0
+        return self
+
+    def read(self, n: int = -1) -> bytes:
+        data = self._file.read(n)
+        start = self._pos
+        self._pos += len(data)
+        if self._pos > self._hashed:
+            self.hasher.update(data[max(self._hashed - start, 0) :])
+            self._hashed = self._pos
+        return data
+
+
+def _write_sequential(fsrc, fdst, chunk_size: int) -> None:
+    """Copy the local file fsrc to the unbuffered file fdst chunk by chunk."""
+    while data := fsrc.read(chunk_size):
+        view = memoryview(data)
+        while view:
+            view = view[fdst.write(view) :]
+
+
+def _can_pipeline(fdst) -> bool:
+    """
+    True if fdst offers the smbprotocol internals used by _write_pipelined
+    (Open.write with send=False, Connection.send and sequence_window; tested
+    with smbprotocol 1.17).
+    """
+    fd = getattr(fdst, "fd", None)
+    connection = getattr(fd, "connection", None)
+    if not all(
+        hasattr(connection, name)
+        for name in ("send", "sequence_window", "max_write_size")
+    ) or not hasattr(fd, "tree_connect"):
+        return False
+    try:
+        return "send" in inspect.signature(fd.write).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def _write_pipelined(fsrc, fdst, chunk_size: int, depth: int) -> None:
+    """
+    Copy the local file fsrc to the unbuffered smbclient file fdst with up to
+    `depth` write requests in flight, so that the link is not idle while the
+    client waits for the responses of the server. This uses internals of
+    smbprotocol; if they are not available, the file is written sequentially.
+    """
+    if not _can_pipeline(fdst):
+        _write_sequential(fsrc, fdst, chunk_size)
+        return
+    fd = fdst.fd
+    connection = fd.connection
+    sid = fd.tree_connect.session.session_id
+    tid = fd.tree_connect.tree_connect_id
+    chunk_size = min(chunk_size, connection.max_write_size)
+    charge = -(-chunk_size // MAX_PAYLOAD_SIZE)
+
+    pending = deque()
+    offset = 0
+    data = fsrc.read(chunk_size)
+    while data or pending:
+        window = connection.sequence_window
+        credits = window["high"] - window["low"]
+        if data and len(pending) < depth and credits >= charge:
+            message, receive = fd.write(data, offset=offset, send=False)
+            request = connection.send(
+                message, sid=sid, tid=tid, credit_request=charge * depth
+            )
+            pending.append((receive, request, len(data)))
+            offset += len(data)
+            data = fsrc.read(chunk_size)
+        elif pending:
+            receive, request, length = pending.popleft()
+            if receive(request) != length:
+                raise OSError(f"Incomplete write to {fd.file_name}.")
+        else:
+            # not enough credits for a large request, smbclient splits it up
+            fdst.seek(offset)
+            view = memoryview(data)
+            while view:
+                view = view[fdst.write(view) :]
+            offset += len(data)
+            data = fsrc.read(chunk_size)
+
+
+class SMBBackend(ArchiveBackend):
+    """Archive on an SMB share, accessed with smbclient. All operations run
+    on the calling thread's session of the connection manager's pool and are
+    retried after a reconnect if the connection breaks. Uploads are written in
+    large pipelined chunks; upload_tree spreads the files over the sessions of
+    the pool."""
+
+    #: size of a single write request (limited by the server's maximum)
+    chunk_size = 8 * 1024**2
+    #: number of write requests in flight per file
+    pipeline_depth = 4
+
+    def __init__(self, connection=None) -> None:
+        if connection is None:
+            from specatalog.data_management.archive_manager import (
+                get_connection_manager,
+            )
+
+            connection = get_connection_manager()
+        connection.ensure_connection()
+        self.connection = connection
+        self._root = connection.remote_path()
+
+    @property
+    def root(self) -> Path:
+        return self._root
+
+    def path_to_unc(self, p: Union[str, Path]) -> str:
+        """Convert an archive path to the UNC path format."""
+        parts = (self._root / p).parts
+        s = "\\".join(parts)
+        return rf"\\{s}"
+
+    def listdir(self, p):
+        return self.connection.call(smb.listdir, self.path_to_unc(p))
+
+    def scandir(self, p):
+        return self.connection.call(self._scandir, self.path_to_unc(p))
+
+    @staticmethod
+    def _scandir(unc: str, **kwargs) -> list[EntryInfo]:
+        # the directory query already returns sizes, times and attributes
+        # (smb_info); stat() would cost another round trip per entry
+        entries = []
+        with smb.scandir(unc, **kwargs) as it:
+            for e in it:
+                info = e.smb_info
+                is_dir = e.is_dir()
+                entries.append(
+                    EntryInfo(
+                        e.name,
+                        is_dir,
+                        0 if is_dir else info.end_of_file,
+                        info.last_write_time.timestamp(),
+                    )
+                )
+        return entries
+
+    def exists(self, p):
+        return self.connection.call(smb.path.exists, self.path_to_unc(p))
+
+    def isdir(self, p):
+        return self.connection.call(smb.path.isdir, self.path_to_unc(p))
+
+    def isfile(self, p):
+        return self.connection.call(smb.path.isfile, self.path_to_unc(p))
+
+    def makedirs(self, p):
+        self.connection.call(smb.makedirs, self.path_to_unc(p), exist_ok=True)
+
+    def upload(self, src, p, hasher=None):
+        reader = None if hasher is None else _HashingReader(hasher)
+        self.connection.call(self._upload, src, self.path_to_unc(p), reader)
+
+    def _upload(
+        self, src: Union[str, Path], unc: str, reader: "_HashingReader", **kwargs
+    ) -> None:
+        with (
+            open(src, "rb") as fsrc,
+            smb.open_file(unc, mode="wb", buffering=0, **kwargs) as fdst,
+        ):
+            if reader is not None:
+                fsrc = reader.wrap(fsrc)
+            _write_pipelined(fsrc, fdst, self.chunk_size, self.pipeline_depth)
+        smb_shutil.copystat(str(src), unc, **kwargs)
+
+    def download(self, p, dst):
+        self.connection.call(smb_shutil.copy2, self.path_to_unc(p), str(dst))
+
+    def unlink(self, p):
+        self.connection.call(smb.unlink, self.path_to_unc(p))
+
+    def link(self, src, p):
+        self.connection.call(smb.link, self.path_to_unc(src), self.path_to_unc(p))
+
+    def rename(self, src, p):
+        self.connection.call(smb.replace, self.path_to_unc(src), self.path_to_unc(p))
+
+    def nlink(self, p):
+        return self.connection.call(smb.stat, self.path_to_unc(p)).st_nlink
+
+    def rmtree(self, p):
+        self.connection.call(smb_shutil.rmtree, self.path_to_unc(p))
+
+    def open(self, p, mode="r", encoding="utf-8"):
+        if "b" in mode:
+            return self.connection.call(smb.open_file, self.path_to_unc(p), mode=mode)
+        return self.connection.call(
+            smb.open_file, self.path_to_unc(p), mode=mode, encoding=encoding
+        )
+
+    def download_tree(self, p, dst):
+        self.connection.call(
+            smb_shutil.copytree, self.path_to_unc(p), str(dst), dirs_exist_ok=True
+        )
+
+
+class _MemoryFile(io.BytesIO):
+    """Writable in-memory file that stores its content on close."""
+
+    def __init__(self, backend: "MemoryBackend", key: str, initial: bytes = b""):
+        super().__init__(initial)
+        self._backend = backend
+        self._key = key
+
+    def close(self) -> None:
+        if not self.closed:
+            value = self.getvalue()
+            self._backend._transfer(len(value))
+            self._backend._store(self._key, value)
+        super().close()
+
+
+class MemoryBackend(ArchiveBackend):
+    """
+    In-memory stand-in for a remote archive. Every operation counts as one
+    network round trip and can be slowed down by a simulated latency and
+    bandwidth, so remote-archive performance can be measured and tested
+    without a real SMB share.
+
+    Parameters
+    ----------
+    latency : float, optional
+        Simulated round-trip time per operation in seconds. The default is 0.
+    bandwidth : float, optional
+        Simulated bandwidth in bytes per second for file contents. The
+        default is None (unlimited).
+
+    Attributes
+    ----------
+    round_trips : int
+        Number of simulated round trips since creation or reset_stats().
+    bytes_transferred : int
+        Number of file bytes sent or received.
+    """
+
+    def __init__(self, latency: float = 0.0, bandwidth: Optional[float] = None):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self._files: dict[str, bytes] = {}
+        self._mtimes: dict[str, float] = {}
+        # hard links share the inode number
+        self._inodes: dict[str, int] = {}
+        self._next_inode = itertools.count()
+        self._dirs: set[str] = {""}
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    @property
+    def root(self) -> Path:
+        return Path("memory:")
+
+    def reset_stats(self) -> None:
+        """Reset the round-trip and transfer counters."""
+        self.round_trips = 0
+        self.bytes_transferred = 0
+
+    @staticmethod
+    def _key(p: Union[str, Path]) -> str:
+        key = PurePosixPath(Path(p).as_posix()).as_posix()
+        return "" if key == "." else key.strip("/")
+
+    def _round_trip(self) -> None:
+        with self._lock:
+            self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _transfer(self, n_bytes: int) -> None:
+        with self._lock:
+            self.bytes_transferred += n_bytes
+        if self.bandwidth:
+            time.sleep(n_bytes / self.bandwidth)
+
+    def _store(self, key: str, data: bytes) -> None:
+        with self._lock:
+            self._files[key] = data
+            self._mtimes[key] = time.time()
+            self._inodes[key] = next(self._next_inode)
+
+    def _children(self, key: str) -> list[str]:
+        prefix = f"{key}/" if key else ""
+        names = set()
+        for entry in list(self._files) + list(self._dirs):
+            if entry and entry.startswith(prefix):
+                names.add(entry[len(prefix) :].split("/", 1)[0])
+        return sorted(names)
+
+    def listdir(self, p):
+        self._round_trip()
+        key = self._key(p)
+        if key not in self._dirs:
+            raise FileNotFoundError(f"No such directory: {key}")
+        return self._children(key)
+
+    def scandir(self, p):
+        names = self.listdir(p)
+        key = self._key(p)
+        entries = []
+        for name in names:
+            child = f"{key}/{name}" if key else name
+            if child in self._files:
+                entries.append(
+                    EntryInfo(name, False, len(self._files[child]), self._mtimes[child])
+                )
+            else:
+                entries.append(EntryInfo(name, True, 0, 0.0))
+        return entries
+
+    def exists(self, p):
+        self._round_trip()
+        key = self._key(p)
+        return key in self._files or key in self._dirs
+
+    def isdir(self, p):
+        self._round_trip()
+        return self._key(p) in self._dirs
+
+    def isfile(self, p):
+        self._round_trip()
+        return self._key(p) in self._files
+
+    def makedirs(self, p):
+        self._round_trip()
+        parts = self._key(p).split("/")
+        with self._lock:
+            for n in range(1, len(parts) + 1):
+                self._dirs.add("/".join(parts[:n]))
+
+    def _check_parent(self, key: str) -> None:
+        parent = key.rsplit("/", 1)[0] if "/" in key else ""
+        if parent not in self._dirs:
+            raise FileNotFoundError(f"No such directory: {parent}")
+
+    def upload(self, src, p, hasher=None):
+        self._round_trip()
+        key = self._key(p)
+        self._check_parent(key)
+        data = Path(src).read_bytes()
+        if hasher is not None:
+            hasher.update(data)
+        self._transfer(len(data))
+        self._store(key, data)
+
+    def download(self, p, dst):
+        self._round_trip()
+        key = self._key(p)
+        if key not in self._files:
+            raise FileNotFoundError(f"No such file: {key}")
+        data = self._files[key]
+        self._transfer(len(data))
+        Path(dst).write_bytes(data)
+
+    def unlink(self, p):
+        self._round_trip()
+        key = self._key(p)
+        if key not in self._files:
+            raise FileNotFoundError(f"No such file: {key}")
+        with self._lock:
+            del self._files[key]
+            del self._mtimes[key]
+            del self._inodes[key]
+
+    def link(self, src, p):
+        self._round_trip()
+        src_key = self._key(src)
+        key = self._key(p)
+        if src_key not in self._files:
+            raise FileNotFoundError(f"No such file: {src_key}")
+        self._check_parent(key)
+        if key in self._files or key in self._dirs:
+            raise FileExistsError(f"File exists: {key}")
+        with self._lock:
+            self._files[key] = self._files[src_key]
+            self._mtimes[key] = self._mtimes[src_key]
+            self._inodes[key] = self._inodes[src_key]
+
+    def nlink(self, p):
+        self._round_trip()
+        key = self._key(p)
+        if key not in self._files:
+            raise FileNotFoundError(f"No such file: {key}")
+        inode = self._inodes[key]
+        return sum(1 for i in self._inodes.values() if i == inode)
+
+    def rename(self, src, p):
+        self._round_trip()
+        src_key = self._key(src)
+        key = self._key(p)
+        self._check_parent(key)
+        with self._lock:
+            if src_key in self._files:
+                for table in (self._files, self._mtimes, self._inodes):
+                    table[key] = table.pop(src_key)
+                return
+            if src_key not in self._dirs:
+                raise FileNotFoundError(f"No such file or directory: {src_key}")
+            if key in self._dirs or key in self._files:
+                raise FileExistsError(f"File exists: {key}")
+
+            def moved(k: str) -> str:
+                return key + k[len(src_key) :]
+
+            prefix = f"{src_key}/"
+            for table in (self._files, self._mtimes, self._inodes):
+                for k in [k for k in table if k.startswith(prefix)]:
+                    table[moved(k)] = table.pop(k)
+            self._dirs = {
+                moved(d) if d == src_key or d.startswith(prefix) else d
+                for d in self._dirs
+            }
+
+    def rmtree(self, p):
+        self._round_trip()
+        key = self._key(p)
+        if key not in self._dirs:
+            raise FileNotFoundError(f"No such directory: {key}")
+        prefix = f"{key}/"
+        with self._lock:
+            self._files = {
+                k: v for k, v in self._files.items() if not k.startswith(prefix)
+            }
+            self._mtimes = {k: self._mtimes[k] for k in self._files}
+            self._inodes = {k: self._inodes[k] for k in self._files}
+            self._dirs = {
+                d for d in self._dirs if d != key and not d.startswith(prefix)
+            }
+
+    def open(self, p, mode="r", encoding="utf-8"):
+        self._round_trip()
+        key = self._key(p)
+        if "r" in mode and "+" not in mode:
+            if key not in self._files:
+                raise FileNotFoundError(f"No such file: {key}")
+            data = self._files[key]
+            self._transfer(len(data))
+            f = io.BytesIO(data)
+        else:
+            self._check_parent(key)
+            initial = self._files.get(key, b"") if "a" in mode else b""
+            f = _MemoryFile(self, key, initial)
+            if "a" in mode:
+                f.seek(0, io.SEEK_END)
+        if "b" in mode:
+            return f
+        return io.TextIOWrapper(f, encoding=encoding)
+
+
+BACKENDS = {
+    "local": LocalBackend,
+    "smb": SMBBackend,
+    "memory": MemoryBackend,
+}
+
+
+def create_backend(kind: str, local_path: Union[str, Path] = "") -> ArchiveBackend:
+    """Create an archive backend.
+
+    Parameters
+    ----------
+    kind : str
+        One of "local", "smb" or "memory".
+    local_path : Union[str, Path], optional
+        Root directory for the local backend.
+
+    Returns
+    -------
+    ArchiveBackend
+        The backend instance.
+    """
+    if kind not in BACKENDS:
+        raise ValueError(
+            f"Unknown archive backend '{kind}'. Valid: {', '.join(BACKENDS)}."
+        )
+    if kind == "local":
+        return LocalBackend(local_path)
+    return BACKENDS[kind]()
@@ -1,21 +1,88 @@
-from typing import Union
-
-from smbclient import register_session, delete_session
-from pathlib import Path
-import os
-import smbclient as smb
+from typing import Callable, Optional, Union
+
+from smbclient import register_session, reset_connection_cache
+from smbprotocol.exceptions import (
+    SMBConnectionClosed,
+    SMBOSError,
+    UserSessionDeleted,
+)
+from smbprotocol.header import NtStatus
+from pathlib import Path, PurePosixPath
 from contextlib import contextmanager
 import h5py
+import itertools
 import tempfile
-import smbclient.shutil as smb_shutil
-import shutil
-from specatalog.config import HOST, USERNAME, SHARE, PWD
+import threading
+import time
+from specatalog.config import HOST, USERNAME, SHARE, PWD, UPLOAD_WORKERS
+from specatalog.data_management.archive_backends import (
+    ArchiveBackend,
+    EntryInfo,
+    TransferStats,
+    create_backend,
+)
+from specatalog.data_management.measurement_store import STORES, format_of
+
+
+# errors after which the SMB session is re-established and the call retried
+_RECONNECT_STATUS = {
+    NtStatus.STATUS_USER_SESSION_DELETED,
+    NtStatus.STATUS_NETWORK_NAME_DELETED,
+}
+
+
+def _is_connection_error(err: Exception) -> bool:
+    """True if err means that the SMB connection or session is broken."""
+    if isinstance(err, SMBOSError):
+        return err.ntstatus in _RECONNECT_STATUS
+    return isinstance(
+        err,
+        (SMBConnectionClosed, UserSessionDeleted, ConnectionError, TimeoutError),
+    )
+
+
+class _PooledSession:
+    """One SMB connection of the pool with its own smbclient connection cache."""
+
+    def __init__(self) -> None:
+        self.cache: dict = {}
+        self.session = None
+        self.last_used = 0.0
+        self.lock = threading.Lock()
 
 
 class SMBConnectionManager:
-    """Manages SMB network connections for the archive."""
+    """Manages SMB network connections for the archive.
 
-    def __init__(self) -> None:
+    The manager holds a pool of SMB sessions, each on its own connection. A
+    thread always uses the same session of the pool (per-thread affinity).
+    Sessions that were idle for longer than health_check_interval are checked
+    with an SMB echo before they are used again, and operations run with call()
+    are retried after reconnecting with exponential backoff if the connection
+    breaks.
+
+    Parameters
+    ----------
+    pool_size : int, optional
+        Maximum number of parallel SMB sessions. If None, the configured
+        number of upload workers is used.
+    max_retries : int, optional
+        Number of reconnection attempts per operation. The default is 3.
+    backoff : float, optional
+        Wait time in seconds before the first retry; it doubles with every
+        further attempt. The default is 0.5.
+    health_check_interval : float, optional
+        Idle time in seconds after which a session is checked before it is
+        used. The default is 60.
+    """
+
+    def __init__(
+        self,
+        pool_size: Optional[int] = None,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        health_check_interval: float = 60.0,
+    ) -> None:
         """Initialize the SMB connection manager with configuration."""
         self.host = HOST
         self.username = USERNAME
@@ -23,15 +90,27 @@ class SMBConnectionManager:
         self.share = SHARE
         self.connection = None
 
+        self.pool_size = max(pool_size or UPLOAD_WORKERS, 1)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.health_check_interval = health_check_interval
+        self._pool = [_PooledSession() for _ in range(self.pool_size)]
+        self._next_slot = itertools.count()
+        self._local = threading.local()
+
     def connect(self) -> None:
-        """Establish connection to the SMB server."""
-        self.connection = register_session(
-            self.host, username=self.username, password=self.password
-        )
+        """Establish the connection of the calling thread to the SMB server."""
+        slot = self._slot()
+        with slot.lock:
+            self._reconnect_slot(slot)
+        self.connection = slot.session
 
     def disconnect(self) -> None:
-        """Close the SMB connection."""
-        delete_session(self.host)
+        """Close all SMB connections of the pool."""
+        for slot in self._pool:
+            with slot.lock:
+                self._close_slot(slot)
+        self.connection = None
 
     def ensure_connection(self) -> None:
         """Ensure an active connection exists, connecting if needed."""
@@ -53,6 +132,115 @@ class SMBConnectionManager:
         """
         return Path(f"{self.host}/{self.share}")
 
+    def session(self) -> dict:
+        """Get the smbclient connection cache of the calling thread's session.
+        The session is opened on first use and checked (and re-established if
+        necessary) when it was idle for longer than health_check_interval.
+
+        Returns
+        -------
+        dict
+            Connection cache to pass as connection_cache to smbclient
+            functions.
+        """
+        slot = self._slot()
+        with slot.lock:
+            if slot.session is None:
+                self._reconnect_slot(slot)
+            elif time.monotonic() - slot.last_used > self.health_check_interval:
+                if not self._is_healthy(slot):
+                    self._reconnect_slot(slot)
+            slot.last_used = time.monotonic()
+        return slot.cache
+
+    def call(self, func: Callable, *args, **kwargs):
+        """Run func(*args, connection_cache=..., **kwargs) on the session of
+        the calling thread. If the connection breaks, the session is
+        re-established with exponential backoff and the call is repeated.
+
+        Parameters
+        ----------
+        func : Callable
+            smbclient function (or a function passing connection_cache on
+            to smbclient).
+
+        Returns
+        -------
+        Any
+            The return value of func.
+        """
+        for attempt in range(self.max_retries + 1):
+            cache = self.session()
+            try:
+                return func(*args, connection_cache=cache, **kwargs)
+            except Exception as err:
+                if attempt == self.max_retries or not _is_connection_error(err):
+                    raise
+                slot = self._slot()
+                with slot.lock:
+                    self._close_slot(slot)
+                time.sleep(self.backoff * 2**attempt)
+
+    def _slot(self) -> _PooledSession:
+        """Pool session of the calling thread (assigned round robin)."""
+        slot = getattr(self._local, "slot", None)
+        if slot is None:
+            slot = self._pool[next(self._next_slot) % self.pool_size]
+            self._local.slot = slot
+        return slot
+
+    def _reconnect_slot(self, slot: _PooledSession) -> None:
+        """(Re-)open the session of slot with exponential backoff."""
+        for attempt in range(self.max_retries + 1):
+            self._close_slot(slot)
+            try:
+                slot.session = register_session(
+                    self.host,
+                    username=self.username,
+                    password=self.password,
+                    connection_cache=slot.cache,
+                )
+                slot.last_used = time.monotonic()
+                return
+            except Exception as err:
+                # smbprotocol raises ValueError if the server is unreachable
+                retry = _is_connection_error(err) or isinstance(err, ValueError)
+                if attempt == self.max_retries or not retry:
+                    raise
+                time.sleep(self.backoff * 2**attempt)
+
+    @staticmethod
+    def _close_slot(slot: _PooledSession) -> None:
+        slot.session = None
+        reset_connection_cache(fail_on_error=False, connection_cache=slot.cache)
+
+    @staticmethod
+    def _is_healthy(slot: _PooledSession) -> bool:
+        try:
+            slot.session.connection.echo(sid=slot.session.session_id, timeout=10)
+        except Exception:
+            return False
+        return True
+
+
+_connection_manager: Optional[SMBConnectionManager] = None
+_connection_manager_lock = threading.Lock()
+
+
+def get_connection_manager() -> SMBConnectionManager:
+    """Get the SMB connection manager shared by the whole process.
+
+    Returns
+    -------
+    SMBConnectionManager
+        The manager (created on first use)
+    """
+    global _connection_manager
+    with _connection_manager_lock:
+        if _connection_manager is None:
+            _connection_manager = SMBConnectionManager()
+        return _connection_manager
+
 
 def create_archive(use_remote_archive: bool, local_path: str = "") -> Path:
     """Create and return an archive path.
@@ -70,19 +258,55 @@ def create_archive(use_remote_archive: bool, local_path: str = "") -> Path:
         Path to the archive
     """
     if use_remote_archive:
-        connection = SMBConnectionManager()
-        connection.connect()
+        connection = get_connection_manager()
+        connection.ensure_connection()
         return connection.remote_path()
     else:
         archive = Path(local_path)
         return archive
 
 
+def _archive_key(p: Union[str, Path]) -> str:
+    """Normalized posix form of an archive path ("" for the root)."""
+    key = PurePosixPath(Path(p).as_posix()).as_posix().strip("/")
+    return "" if key == "." else key
+
+
+def _is_related(a: str, b: str) -> bool:
+    """True if a and b are equal or one of them contains the other."""
+    if a == "" or b == "" or a == b:
+        return True
+    return a.startswith(b + "/") or b.startswith(a + "/")
+
+
+class _MetadataSnapshot:
+    """Directory listings and path checks cached during a metadata snapshot."""
+
+    def __init__(self) -> None:
+        self.listings: dict[str, dict[str, EntryInfo]] = {}
+        self.checks: dict[tuple[str, str], bool] = {}
+
+    def invalidate(self, key: str) -> None:
+        """Forget everything cached about key, its parents and its contents."""
+        self.listings = {
+            k: v for k, v in self.listings.items() if not _is_related(k, key)
+        }
+        self.checks = {
+            k: v for k, v in self.checks.items() if not _is_related(k[1], key)
+        }
+
+
 class SpecatalogArchive:
     """Handles file operations for the measurement archive. All file operations
-    run relative to the archive root (self.archive)."""
-
-    def __init__(self, use_remote_archive: bool, local_path: str = "") -> None:
+    run relative to the archive root (self.archive) and are delegated to a
+    storage backend (see archive_backends)."""
+
+    def __init__(
+        self,
+        use_remote_archive: bool,
+        local_path: str = "",
+        backend: Union[str, ArchiveBackend, None] = None,
+    ) -> None:
         """Initialize the archive handler.
 
         Parameters
@@ -91,9 +315,102 @@ class SpecatalogArchive:
             Whether to use remote SMB archive
         local_path : str, optional
             Local path if not using remote archive
+        backend : Union[str, ArchiveBackend, None], optional
+            Backend instance or backend name ("local", "smb", "memory"). If
+            None, the backend is chosen from use_remote_archive.
+        """
+        if backend is None:
+            backend = "smb" if use_remote_archive else "local"
+        if isinstance(backend, str):
+            backend = create_backend(backend, local_path)
+        self.backend = backend
+        self.archive = backend.root
+        self.use_remote_archive = backend.remote
+        self._local = threading.local()
+
+    @contextmanager
+    def metadata_snapshot(self):
+        """Context manager that caches directory listings and existence/type
+        checks in the calling thread until it is left. Every directory is
+        fetched with a single scandir call, so repeated calls of exists(),
+        isdir(), isfile(), list_files() and measurement_path() do not cause
+        further round trips to the archive. Write operations through this
+        object drop the affected cache entries; changes made by others are
+        not seen while the snapshot is active. Nested snapshots share the
+        cache of the outermost one.
+
+        Example
+        -------
+        >>> with archive.metadata_snapshot():
+        >>>     names = archive.list_files("data/M1/raw")
+        >>>     archive.exists("data/M1/raw/spectrum.DTA")  # no round trip
+        """
+        if getattr(self._local, "snapshot", None) is not None:
+            yield
+            return
+
+        self._local.snapshot = _MetadataSnapshot()
+        try:
+            yield
+        finally:
+            self._local.snapshot = None
+
+    def _invalidate(self, p: Union[str, Path]) -> None:
+        """Drop cached metadata of p after a write operation."""
+        snapshot = getattr(self._local, "snapshot", None)
+        if snapshot is not None:
+            snapshot.invalidate(_archive_key(p))
+
+    def _check(self, check: str, p: Union[str, Path]) -> bool:
+        """Answer exists/isdir/isfile from the snapshot if possible."""
+        snapshot = getattr(self._local, "snapshot", None)
+        if snapshot is None:
+            return getattr(self.backend, check)(p)
+
+        key = _archive_key(p)
+        if key == "" or key in snapshot.listings:
+            return check != "isfile"
+
+        parent, _, name = key.rpartition("/")
+        if parent in snapshot.listings:
+            entry = snapshot.listings[parent].get(name)
+            if entry is None:
+                return False
+            if check == "isdir":
+                return entry.is_dir
+            if check == "isfile":
+                return not entry.is_dir
+            return True
+
+        if snapshot.checks.get(("exists", key)) is False:
+            return False
+        if (check, key) not in snapshot.checks:
+            snapshot.checks[(check, key)] = getattr(self.backend, check)(p)
+        return snapshot.checks[(check, key)]
+
+    def scandir(self, p: Union[str, Path]) -> list[EntryInfo]:
+        """Get names, types, sizes and modification times of all entries of
+        a directory with a single call to the archive.
+
+        Parameters
+        ----------
+        p : Union[str, Path]
+            Directory path
+
+        Returns
+        -------
+        list[EntryInfo]
+            One entry (name, is_dir, size, mtime) per file or directory.
         """
-        self.archive = create_archive(use_remote_archive, local_path)
-        self.use_remote_archive = use_remote_archive
+        snapshot = getattr(self._local, "snapshot", None)
+        if snapshot is None:
+            return self.backend.scandir(p)
+
+        key = _archive_key(p)
+        if key not in snapshot.listings:
+            entries = self.backend.scandir(p)
+            snapshot.listings[key] = {e.name: e for e in entries}
+        return list(snapshot.listings[key].values())
 
     def path_to_unc(self, p: Union[str, Path]) -> str:
         """Convert local path to UNC path format.
@@ -126,10 +443,9 @@ class SpecatalogArchive:
         list[str]
             List of filenames
         """
-        if self.use_remote_archive:
-            return smb.listdir(self.path_to_unc(p))
-        else:
-            return os.listdir(self.archive / p)
+        if getattr(self._local, "snapshot", None) is not None:
+            return [e.name for e in self.scandir(p)]
+        return self.backend.listdir(p)
 
     def exists(self, p: Union[str, Path]) -> bool:
         """Check if path exists.
@@ -144,10 +460,37 @@ class SpecatalogArchive:
         bool
             True if path exists
         """
-        if self.use_remote_archive:
-            return smb.path.exists(self.path_to_unc(p))
-        else:
-            return (self.archive / p).exists()
+        return self._check("exists", p)
+
+    def isdir(self, p: Union[str, Path]) -> bool:
+        """Check if path is a directory.
+
+        Parameters
+        ----------
+        p : Union[str, Path]
+            Path to check
+
+        Returns
+        -------
+        bool
+            True if path is a directory
+        """
+        return self._check("isdir", p)
+
+    def isfile(self, p: Union[str, Path]) -> bool:
+        """Check if path is a file.
+
+        Parameters
+        ----------
+        p : Union[str, Path]
+            Path to check
+
+        Returns
+        -------
+        bool
+            True if path is a file
+        """
+        return self._check("isfile", p)
 
     def make_dir(self, p: Union[str, Path]) -> None:
         """Create directory.
@@ -157,12 +500,12 @@ class SpecatalogArchive:
         p : Union[str, Path]
             Directory path to create
         """
-        if self.use_remote_archive:
-            smb.makedirs(self.path_to_unc(p), exist_ok=True)
-        else:
-            (self.archive / p).mkdir(parents=True, exist_ok=True)
+        self.backend.makedirs(p)
+        self._invalidate(p)
 
-    def copy_to_archive(self, src: Union[str, Path], dst_p: Union[str, Path]) -> None:
+    def copy_to_archive(
+        self, src: Union[str, Path], dst_p: Union[str, Path], hasher=None
+    ) -> None:
         """Copy file to archive.
 
         Parameters
@@ -171,12 +514,12 @@ class SpecatalogArchive:
             Source file path
         dst_p : Union[str, Path]
             Destination path in archive
+        hasher : optional
+            Hash object (e.g. manifest.new_hasher()) that is updated with the
+            file content during the copy
         """
-        if self.use_remote_archive:
-            dst = self.path_to_unc(dst_p)
-            smb_shutil.copy2(str(src), dst)
-        else:
-            shutil.copy2(src, self.archive / dst_p)
+        self.backend.upload(src, dst_p, hasher=hasher)
+        self._invalidate(dst_p)
 
     def delete_file(self, p: Union[str, Path]) -> None:
         """Delete file from archive.
@@ -186,10 +529,61 @@ class SpecatalogArchive:
         p : Union[str, Path]
             Path of file to delete
         """
-        if self.use_remote_archive:
-            smb.unlink(self.path_to_unc(p))
-        else:
-            (self.archive / p).unlink()
+        self.backend.unlink(p)
+        self._invalidate(p)
+
+    def link(self, src_p: Union[str, Path], dst_p: Union[str, Path]) -> None:
+        """Create a hard link to a file of the archive.
+
+        Parameters
+        ----------
+        src_p : Union[str, Path]
+            Existing file in archive
+        dst_p : Union[str, Path]
+            Path of the new link in archive
+
+        Raises
+        ------
+        NotImplementedError
+            If the backend does not support hard links
+        """
+        self.backend.link(src_p, dst_p)
+        self._invalidate(dst_p)
+
+    def nlink(self, p: Union[str, Path]) -> int:
+        """Get the number of hard links of a file.
+
+        Parameters
+        ----------
+        p : Union[str, Path]
+            Path of file
+
+        Returns
+        -------
+        int
+            Number of hard links (1 for a file without further links)
+        """
+        return self.backend.nlink(p)
+
+    def rename(self, src_p: Union[str, Path], dst_p: Union[str, Path]) -> None:
+        """Move a file or directory within the archive. An existing file at
+        dst_p is replaced.
+
+        Parameters
+        ----------
+        src_p : Union[str, Path]
+            Existing file or directory in archive
+        dst_p : Union[str, Path]
+            New path in archive
+
+        Raises
+        ------
+        NotImplementedError
+            If the backend cannot rename
+        """
+        self.backend.rename(src_p, dst_p)
+        self._invalidate(src_p)
+        self._invalidate(dst_p)
 
     def delete_folder(self, p: Union[str, Path]) -> None:
         """Delete directory from archive.
@@ -199,10 +593,8 @@ class SpecatalogArchive:
         p : Union[str, Path]
             Path of directory to delete
         """
-        if self.use_remote_archive:
-            smb_shutil.rmtree(self.path_to_unc(p))
-        else:
-            shutil.rmtree(self.archive / p)
+        self.backend.rmtree(p)
+        self._invalidate(p)
 
     @contextmanager
     def open_file(self, p: Union[str, Path], mode: str = "r", encoding: str = "utf-8"):
@@ -222,18 +614,45 @@ class SpecatalogArchive:
         file
             Open file object
         """
-        if self.use_remote_archive:
-            remote_path = self.path_to_unc(p)
-            with smb.open_file(remote_path, mode=mode, encoding=encoding) as file:
+        try:
+            with self.backend.open(p, mode=mode, encoding=encoding) as file:
                 yield file
-        else:
-            print(self.archive / p)
-            with open(self.archive / p, mode=mode, encoding=encoding) as file:
+        finally:
+            if mode.strip("bt") != "r":
+                self._invalidate(p)
+
+    @contextmanager
+    def open_measurement_file(self, p: Union[str, Path], mode: str):
+        """Context manager for measurement files of any format (see
+        measurement_store). The format is chosen by the suffix of p: Zarr
+        stores (.zarr) are opened without copying the whole store, HDF5
+        files with open_measurement_h5_file.
+
+        Parameters
+        ----------
+        p : Union[str, Path]
+            Path of the measurement file
+        mode : str
+            File opening mode ("r", "a" or "w")
+
+        Yields
+        ------
+        h5py.File or measurement_store.ZarrGroup
+            Root group of the measurement file
+        """
+        store = STORES[format_of(p)]
+        try:
+            with store.open(self, p, mode) as file:
                 yield file
+        finally:
+            if mode != "r":
+                self._invalidate(p)
 
     @contextmanager
     def open_measurement_h5_file(self, p: Union[str, Path], mode: str):
-        """Context manager for HDF5 files with remote sync.
+        """Context manager for HDF5 files with remote sync. For backends
+        without direct filesystem access the file is copied to a temporary
+        directory and, unless opened read-only, copied back afterwards.
 
         Parameters
         ----------
@@ -247,23 +666,28 @@ class SpecatalogArchive:
         h5py.File
             Open HDF5 file object
         """
-        if self.use_remote_archive:
+        try:
+            direct_path = self.backend.local_path(p)
+            if direct_path is not None:
+                with h5py.File(direct_path, mode=mode) as file:
+                    yield file
+                return
+
             with tempfile.TemporaryDirectory() as tmpdir:
-                remote_path = self.path_to_unc(p)
                 local_path = Path(tmpdir) / p
                 local_path.parent.mkdir(parents=True, exist_ok=True)
 
-                if self.exists(p):
-                    smb_shutil.copy2(str(remote_path), str(local_path))
+                if mode != "w" and self.exists(p):
+                    self.backend.download(p, local_path)
 
                 with h5py.File(local_path, mode=mode) as file:
                     yield file
 
-                smb_shutil.copy2(str(local_path), remote_path)
-
-        else:
-            with h5py.File(self.archive / p, mode=mode) as file:
-                yield file
+                if mode != "r":
+                    self.backend.upload(local_path, p)
+        finally:
+            if mode != "r":
+                self._invalidate(p)
 
     @contextmanager
     def temporary_path(self, p: Union[str, Path]):
@@ -279,32 +703,23 @@ class SpecatalogArchive:
         Path
             Path to local temporary copy
         """
-        if self.use_remote_archive:
-            with tempfile.TemporaryDirectory() as tmpdir:
-                local_path = Path(tmpdir) / Path(p).name
-
-                remote_path = self.path_to_unc(p)
-
-                if smb.path.isdir(remote_path):
-                    smb_shutil.copytree(
-                        remote_path,
-                        str(local_path),
-                    )
-
-                elif smb.path.isfile(remote_path):
-                    smb_shutil.copy2(
-                        remote_path,
-                        str(local_path),
-                    )
+        direct_path = self.backend.local_path(p)
+        if direct_path is not None:
+            yield direct_path
+            return
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            local_path = Path(tmpdir) / Path(p).name
+
+            if self.isdir(p):
+                self.backend.download_tree(p, local_path)
+            elif self.isfile(p):
+                self.backend.download(p, local_path)
+            else:
+                raise FileNotFoundError(
+                    f"Remote path does not exist: {self.archive / p}"
+                )
 
-                else:
-                    raise FileNotFoundError(
-                        f"Remote path does not exist: {remote_path}"
-                    )
-
-                yield local_path
-        else:
-            local_path = self.archive / p
             yield local_path
 
     def measurement_path(self, ms_id: Union[str, int]) -> Path:
@@ -336,9 +751,14 @@ class SpecatalogArchive:
             return Path(p)
 
     def copy_directory_to_archive(
-        self, src: Union[str, Path], dst_p: Union[str, Path]
-    ) -> None:
-        """Copy directory to archive.
+        self,
+        src: Union[str, Path],
+        dst_p: Union[str, Path],
+        workers: Optional[int] = None,
+        hasher_factory: Optional[Callable] = None,
+        exclude: tuple[str, ...] = (),
+    ) -> TransferStats:
+        """Copy directory to archive. The files are uploaded in parallel.
 
         Parameters
         ----------
@@ -346,23 +766,30 @@ class SpecatalogArchive:
             Source directory path
         dst_p : Union[str, Path]
             Destination path in archive
-        """
-        src = Path(src)
+        workers : Optional[int], optional
+            Number of parallel uploads. If None, the configured number
+            (upload_workers, default 4) is used.
+        hasher_factory : Optional[Callable], optional
+            Function returning a new hash object (e.g. manifest.new_hasher).
+            If given, every file is hashed during the upload and the digests
+            are returned in TransferStats.hashes.
+        exclude : tuple[str, ...], optional
+            Subdirectories of src (relative posix paths) that are not copied
 
-        if self.use_remote_archive:
-            dst = self.path_to_unc(dst_p)
-
-            smb_shutil.copytree(
-                str(src),
-                dst,
-                dirs_exist_ok=False,
-            )
-
-        else:
-            dst = self.archive / dst_p
-
-            shutil.copytree(
-                src,
-                dst,
-                dirs_exist_ok=False,
+        Returns
+        -------
+        TransferStats
+            Number of files and bytes, duration and throughput of the upload
+        """
+        if workers is None:
+            workers = UPLOAD_WORKERS
+        try:
+            return self.backend.upload_tree(
+                Path(src),
+                dst_p,
+                workers=workers,
+                hasher_factory=hasher_factory,
+                exclude=exclude,
             )
+        finally:
+            self._invalidate(dst_p)
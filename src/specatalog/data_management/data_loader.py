@@ -2,7 +2,7 @@ import numpy as np
 from pathlib import Path
 import warnings
 import re
-import pandas as pd
+from functools import lru_cache
 
 from typing import List, Union
 
@@ -13,44 +13,91 @@ to measurement_management.SUPPORTED_FORMATS."""
  (https://github.com/BertainaS/epyrtools)"""
 
 
-# Regular expression to check if a string can be converted to a number
-_NUMBER_RE = re.compile(r"^[+-]?(\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?$")
+# Regular expression that classifies a value as int or float in one match
+_VALUE_RE = re.compile(
+    r"(?P<int>[+-]?\d+)|(?P<float>[+-]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?)"
+)
 
+# Regular expression for a "KEY value" line; keys have to start with a letter
+_KEY_VALUE_RE = re.compile(r"([^\W\d_]\S*)(?:\s+(.*))?", re.DOTALL)
 
-def read_par_file(par_file_path: Path) -> dict:
-    """Reads a Bruker ESP/WinEPR .par file (key-value pairs)."""
+
+def _logical_lines(f, continuation: bool):
+    """Yields stripped lines of a file; optionally joins continued lines."""
+    pending = ""
+    for raw_line in f:
+        line = raw_line.strip()
+        if not continuation:
+            yield line
+            continue
+        # Handle line continuation characters '\'
+        if line.endswith("\\"):
+            pending += line[:-1]
+            continue
+        yield (pending + line).replace("\\n", "\n")  # Replace escaped newlines
+        pending = ""
+    if pending:  # Remove trailing '\' even if it's the last line
+        yield pending.replace("\\n", "\n")
+
+
+def _read_key_value_lines(
+    file_path: Path, continuation: bool = False, stop_key: str | None = None
+) -> dict:
+    """
+    Single-pass tokenizer for Bruker parameter files (DSC/PAR). The file is
+    streamed line by line; reading stops as soon as a line starting with
+    stop_key is reached, so the remaining part of the file is never read.
+
+    Parameters
+    ----------
+    file_path : Path
+        Path to the parameter file.
+    continuation : bool, optional
+        If True, lines ending with a backslash are joined with the next line
+        and escaped newlines are replaced. The default is False.
+    stop_key : str, optional
+        Key (case-insensitive) at which parsing stops. The default is None.
+
+    Returns
+    -------
+    dict
+        Key-value pairs as strings. Surrounding single quotes are removed
+        from the values.
+    """
     parameters = {}
-    if not par_file_path.is_file():
-        raise FileNotFoundError(f"Cannot find the parameter file {par_file_path}")
+    match_line = _KEY_VALUE_RE.fullmatch
+    stop = stop_key.upper() if stop_key else None
 
-    try:
-        with open(par_file_path, "r", encoding="latin-1") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
+    with open(file_path, "r", encoding="latin-1") as f:
+        for line in _logical_lines(f, continuation):
+            if not line:
+                continue
+            # Stop if e.g. the Manipulation History Layer is reached
+            if stop is not None and line[: len(stop)].upper() == stop:
+                if len(line) == len(stop) or line[len(stop)].isspace():
+                    break
 
-                parts = line.split(maxsplit=1)
-                if len(parts) < 1:
-                    continue
+            m = match_line(line)
+            if m is None:  # Skip lines not starting with a letter (comments)
+                continue
 
-                key = parts[0]
-                # Check if key starts with a letter (basic validation)
-                if not key[0].isalpha():
-                    continue
+            key, value = m.groups()
+            value = value.strip() if value else ""
+            # Remove surrounding single quotes if present
+            if len(value) >= 2 and value[0] == "'" and value[-1] == "'":
+                value = value[1:-1]
+            parameters[key] = value
 
-                value = parts[1].strip() if len(parts) > 1 else ""
+    return parameters
 
-                # Remove surrounding single quotes if present
-                if len(value) >= 2 and value.startswith("'") and value.endswith("'"):
-                    value = value[1:-1]
 
-                # Basic cleaning of key for dictionary access if needed
-                # Note: Bruker keys are typically valid identifiers
-                # if not key.isidentifier():
-                #    key = re.sub(r'\W|^(?=\d)', '_', key) # Simple sanitization
+def read_par_file(par_file_path: Path) -> dict:
+    """Reads a Bruker ESP/WinEPR .par file (key-value pairs)."""
+    if not par_file_path.is_file():
+        raise FileNotFoundError(f"Cannot find the parameter file {par_file_path}")
 
-                parameters[key] = value
+    try:
+        parameters = _read_key_value_lines(par_file_path)
     except Exception as e:
         raise IOError(f"Error reading PAR file {par_file_path}: {e}") from e
 
@@ -69,59 +116,18 @@ def read_par_file(par_file_path: Path) -> dict:
 
 
 def read_dsc_file(dsc_file_path: Path) -> dict:
-    """Reads a Bruker BES3T .DSC file (key-value pairs, handles line continuation)."""
-    parameters = {}
+    """Reads a Bruker BES3T .DSC file (key-value pairs, handles line continuation).
+    Parsing stops at the Manipulation History Layer (#MHL)."""
     if not dsc_file_path.is_file():
         raise FileNotFoundError(f"Cannot find the descriptor file {dsc_file_path}")
 
-    lines = []
     try:
-        with open(dsc_file_path, "r", encoding="latin-1") as f:
-            lines = f.readlines()
+        parameters = _read_key_value_lines(
+            dsc_file_path, continuation=True, stop_key="#MHL"
+        )
     except Exception as e:
         raise IOError(f"Error reading DSC file {dsc_file_path}: {e}") from e
 
-    processed_lines = []
-    i = 0
-    while i < len(lines):
-        line = lines[i].strip()
-        # Handle line continuation characters '\'
-        while line.endswith("\\"):
-            i += 1
-            if i < len(lines):
-                line = line[:-1] + lines[i].strip()
-            else:
-                line = line[:-1]  # Remove trailing '\' even if it's the last line
-        processed_lines.append(line.replace("\\n", "\n"))  # Replace escaped newlines
-        i += 1
-
-    for line in processed_lines:
-        if not line:
-            continue
-
-        parts = line.split(maxsplit=1)
-        if len(parts) < 1:
-            continue
-
-        key = parts[0]
-        # Stop if Manipulation History Layer is reached
-        if key.upper() == "#MHL":
-            break
-        # Skip lines not starting with a letter (comments, etc.)
-        if not key[0].isalpha():
-            continue
-
-        value = parts[1].strip() if len(parts) > 1 else ""
-
-        # Remove surrounding single quotes if present
-        if len(value) >= 2 and value.startswith("'") and value.endswith("'"):
-            value = value[1:-1]
-
-        # Basic cleaning of key if needed (Bruker keys usually okay)
-        # if not key.isidentifier():
-        #     key = re.sub(r'\W|^(?=\d)', '_', key)
-
-        parameters[key] = value
     if parameters.get("XNAM"):
         parameters["XAXIS_NAME"] = parameters["XNAM"]
         parameters["XAXIS_UNIT"] = parameters["XUNI"]
@@ -132,32 +138,30 @@ def read_dsc_file(dsc_file_path: Path) -> dict:
     return parameters
 
 
+@lru_cache(maxsize=8192)
+def _parse_value(value: str) -> int | float | str:
+    """
+    Converts a single string to int or float if possible. The results are
+    cached because the same values (e.g. 'BIG', '1024', 'true') occur in
+    almost every Bruker header.
+    """
+    m = _VALUE_RE.fullmatch(value)
+    if m is None:
+        return value  # Keep as string if not number-like
+    if m.lastgroup == "int":
+        return int(value)
+    return float(value)
+
+
 def parse_field_params(parameters: dict) -> dict:
     """
     Attempts to convert string values in a dictionary to numbers (int or float).
     """
-    parsed_params: dict[str, int | float | str] = {}
-    for key, value in parameters.items():
-        if isinstance(value, str):
-            # Try converting to int
-            try:
-                parsed_params[key] = int(value)
-                continue
-            except ValueError:
-                pass
-            # Try converting to float
-            try:
-                # Use regex for more robust float check if needed,
-                # but direct conversion attempt is usually fine
-                if _NUMBER_RE.match(value):
-                    parsed_params[key] = float(value)
-                else:
-                    parsed_params[key] = value  # Keep as string if not number-like
-            except ValueError:
-                parsed_params[key] = value  # Keep original string if conversion fails
-        else:
-            parsed_params[key] = value  # Keep non-string values as they are
-    return parsed_params
+    parse = _parse_value
+    return {
+        key: parse(value) if isinstance(value, str) else value
+        for key, value in parameters.items()
+    }
 
 
 def get_matrix(
@@ -232,11 +236,21 @@ def get_matrix(
         )
         raw_data = raw_data[:n_values_to_read]
 
+    # Convert to native byte order in place (the array is owned, no copy)
+    if not raw_data.dtype.isnative:
+        raw_data = raw_data.byteswap(inplace=True).view(
+            raw_data.dtype.newbyteorder("=")
+        )
+
     # Combine real and imaginary parts if complex
     if is_complex_flag:
         if raw_data.size % 2 != 0:
             raise ValueError("Read odd number of values for complex data.")
-        data = raw_data[::2] + 1j * raw_data[1::2]
+        if raw_data.dtype.kind == "f":
+            # interleaved (re, im) pairs are the memory layout of complex
+            data = raw_data.view(np.result_type(raw_data.dtype, np.complex64))
+        else:
+            data = raw_data[::2] + 1j * raw_data[1::2]
     else:
         data = raw_data
 
@@ -289,32 +303,32 @@ def BrukerListFiles(path, recursive=False):
     return sorted(files)
 
 
-def load_bruker_bes3t(full_base_name: Path, file_extension: str, scaling: str) -> tuple:
+def _bes3t_dimensions(parameters: dict) -> List[int]:
+    """Reads the dimensions [nx, ny, nz] from the (unparsed) DSC parameters."""
+    try:
+        nx = int(parameters.get("XPTS", 0))
+        ny = int(parameters.get("YPTS", 1))
+        nz = int(parameters.get("ZPTS", 1))
+    except (ValueError, TypeError) as e:
+        raise ValueError(
+            f"Could not parse dimensions (XPTS/YPTS/ZPTS) from DSC file: {e}"
+        ) from e
+    if nx == 0:
+        raise ValueError("XPTS is missing or zero in DSC file.")
+    return [nx, ny, nz]
+
+
+def _bes3t_data_format(parameters: dict) -> tuple:
     """
-    Loads Bruker BES3T data (.DTA, .DSC).
+    Determines the layout of the binary data from the (unparsed) DSC
+    parameters.
 
     Args:
-        full_base_name: Path object without extension.
-        file_extension: The original file extension (e.g., '.dta', '.dsc').
-        scaling: Scaling string (e.g., 'nP G').
+        parameters: Parameters as returned by read_dsc_file.
 
     Returns:
-        tuple: (data, abscissa, parameters)
+        tuple: (is_complex, n_data_values, dimensions, byte_order, number_format)
     """
-    full_base_name = Path(full_base_name)
-    # Determine DSC and DTA file extensions, respecting case
-    dsc_extension = ".dsc"
-    dta_extension = ".dta"
-    if file_extension.isupper():
-        dsc_extension = dsc_extension.upper()
-        dta_extension = dta_extension.upper()
-
-    dsc_file = full_base_name.with_suffix(dsc_extension)
-    dta_file = full_base_name.with_suffix(dta_extension)
-
-    # Read descriptor file
-    parameters = read_dsc_file(dsc_file)
-
     # --- Determine complexity, dimensions, byte order, format ---
     is_complex = np.array([False])  # Default to real
     n_data_values = 1
@@ -326,17 +340,7 @@ def load_bruker_bes3t(full_base_name: Path, file_extension: str, scaling: str) -
         warnings.warn("IKKF not found in .DSC file. Assuming IKKF=REAL.")
 
     # Dimensions
-    try:
-        nx = int(parameters.get("XPTS", 0))
-        ny = int(parameters.get("YPTS", 1))
-        nz = int(parameters.get("ZPTS", 1))
-    except (ValueError, TypeError) as e:
-        raise ValueError(
-            f"Could not parse dimensions (XPTS/YPTS/ZPTS) from DSC file: {e}"
-        ) from e
-    if nx == 0:
-        raise ValueError("XPTS is missing or zero in DSC file.")
-    dimensions = [nx, ny, nz]
+    dimensions = _bes3t_dimensions(parameters)
 
     # Byte Order
     byte_order = "ieee-be"  # Default big-endian
@@ -382,6 +386,27 @@ def load_bruker_bes3t(full_base_name: Path, file_extension: str, scaling: str) -
             # Raise error? MATLAB code enforces identity. Let's warn for now.
             # raise ValueError("IRFMT and IIFMT in DSC file must be identical.")
 
+    return is_complex, n_data_values, dimensions, byte_order, number_format
+
+
+def _bes3t_abscissa(
+    parameters: dict, dimensions: List[int], full_base_name: Path, file_extension: str
+):
+    """
+    Constructs the axes of BES3T data from the (unparsed) DSC parameters.
+    Only companion files of non-linear axes (.XGF/.YGF/.ZGF) are read, the
+    data file itself is never touched.
+
+    Args:
+        parameters: Parameters as returned by read_dsc_file.
+        dimensions: List of dimensions [nx, ny, nz].
+        full_base_name: Path object without extension.
+        file_extension: The original file extension (e.g., '.dta', '.dsc').
+
+    Returns:
+        np.ndarray, list of np.ndarray or None: The axis for 1D data, a list
+        of axes for multidimensional data.
+    """
     # --- Construct Abscissa ---
     abscissa_list = [None] * 3  # X, Y, Z
     axis_names = ["X", "Y", "Z"]
@@ -484,6 +509,43 @@ def load_bruker_bes3t(full_base_name: Path, file_extension: str, scaling: str) -
     else:
         abscissa = None  # No axes defined
 
+    return abscissa
+
+
+def load_bruker_bes3t(full_base_name: Path, file_extension: str, scaling: str) -> tuple:
+    """
+    Loads Bruker BES3T data (.DTA, .DSC).
+
+    Args:
+        full_base_name: Path object without extension.
+        file_extension: The original file extension (e.g., '.dta', '.dsc').
+        scaling: Scaling string (e.g., 'nP G').
+
+    Returns:
+        tuple: (data, abscissa, parameters)
+    """
+    full_base_name = Path(full_base_name)
+    # Determine DSC and DTA file extensions, respecting case
+    dsc_extension = ".dsc"
+    dta_extension = ".dta"
+    if file_extension.isupper():
+        dsc_extension = dsc_extension.upper()
+        dta_extension = dta_extension.upper()
+
+    dsc_file = full_base_name.with_suffix(dsc_extension)
+    dta_file = full_base_name.with_suffix(dta_extension)
+
+    # Read descriptor file
+    parameters = read_dsc_file(dsc_file)
+
+    # --- Determine complexity, dimensions, byte order, format ---
+    is_complex, n_data_values, dimensions, byte_order, number_format = (
+        _bes3t_data_format(parameters)
+    )
+
+    # --- Construct Abscissa ---
+    abscissa = _bes3t_abscissa(parameters, dimensions, full_base_name, file_extension)
+
     # --- Read Data Matrix ---
     # Assuming single data value type for now (n_data_values=1)
     # NOTE: Multiple data values per point (n_data_values > 1) not yet supported\n    # This would require handling interleaved data formats in some BES3T files
@@ -610,57 +672,136 @@ def load_bruker_bes3t(full_base_name: Path, file_extension: str, scaling: str) -
     return data, abscissa, parameters
 
 
-def load_cw_epr(path: str):
+def _esp_abscissa(parameters: dict):
+    """
+    Constructs the linear x-axis of Bruker ESP/WinEPR data from the
+    (unparsed) PAR parameters. Returns None if the axis cannot be determined.
+    """
+    try:
+        n_points = int(parameters.get("ANZ") or parameters.get("RES"))
+        if "XXLB" in parameters and "XXWI" in parameters:
+            minimum = float(parameters["XXLB"])
+            width = float(parameters["XXWI"])
+        else:
+            center = float(parameters["HCF"])
+            width = float(parameters["HSW"])
+            minimum = center - width / 2
+    except (KeyError, ValueError, TypeError):
+        return None
+    return np.linspace(minimum, minimum + width, n_points)
+
+
+def read_bruker_header(path: Union[str, Path]) -> tuple:
+    """
+    Reads only the parameters of Bruker data (BES3T .DSC or ESP .par) and
+    computes the axes without reading the binary data file (.DTA/.spc).
+    Use this function whenever only metadata are needed, e.g. to fill in
+    frequency band, temperature or number of scans.
+
+    Args:
+        path: Path to the data or parameter file, with or without extension.
+            Without extension (or with .DSC/.DTA) the BES3T format is
+            assumed, .par/.spc selects the ESP format.
+
+    Returns:
+        tuple: (parameters, abscissa). The parameters are parsed to numbers
+        where possible.
+    """
     path = Path(path)
+    suffix = path.suffix
+    if suffix.lower() in (".par", ".spc"):
+        par_file = path.with_suffix(".PAR" if suffix.isupper() else ".par")
+        parameters = read_par_file(par_file)
+        abscissa = _esp_abscissa(parameters)
+        return parse_field_params(parameters), abscissa
 
-    dta = path.with_suffix(".DTA")
-    dsc = path.with_suffix(".DSC")
+    file_extension = suffix if suffix.lower() in (".dsc", ".dta") else ".DSC"
+    dsc_extension = ".DSC" if file_extension.isupper() else ".dsc"
+    parameters = read_dsc_file(path.with_suffix(dsc_extension))
 
-    dsc_file = open(dsc, "r")
-    dsc_lines = dsc_file.readlines()
-    dsc_file.close()
+    dimensions = _bes3t_dimensions(parameters)
+    abscissa = _bes3t_abscissa(parameters, dimensions, path, file_extension)
 
-    meta = {}
-    for line in dsc_lines:
-        line = line.strip()
-        if line.startswith("*") or line.startswith("\n") or line.startswith("#"):
-            pass
-        else:
-            if line and line[0].isupper():
-                kv_pair = re.split(r"\t| {4}", line)
-                value = " ".join(kv_pair[1:])
-                value = value.strip()
-                meta[kv_pair[0]] = value
-            else:
-                pass
+    return parse_field_params(parameters), abscissa
 
-    meta = parse_field_params(meta)
-    dta_file = open(dta, "rb")
-    data_type = np.dtype(">f8")
-    spc_full = np.fromfile(dta_file, data_type).astype(float)
-    dta_file.close()
 
-    if meta["IKKF"] == "CPLX":
-        # take every second value as real or imag part
-        spc_real = spc_full[0 : len(spc_full) : 2]
-        spc_imag = spc_full[1 : len(spc_full) : 2]
+def read_bruker_headers(path: Union[str, Path], recursive: bool = False) -> dict:
+    """
+    Reads the parameters of all Bruker EPR data files in a directory. Only
+    the parameter files are read, so scanning large directories transfers
+    only a few kilobytes per spectrum.
 
+    Args:
+        path (str or Path): Path to the folder containing Bruker files.
+        recursive (bool, optional): If True, search subfolders recursively.
+            Defaults to False.
+
+    Returns:
+        dict[Path, dict]: Parsed parameters for each data file. Files whose
+        header cannot be read are skipped with a warning.
+    """
+    headers = {}
+    for file in BrukerListFiles(path, recursive=recursive):
+        try:
+            headers[file], _ = read_bruker_header(file)
+        except (OSError, ValueError) as e:
+            warnings.warn(f"Could not read header of {file}: {e}")
+    return headers
+
+
+def load_cw_epr(path: str):
+    """
+    Load cwEPR data in the Bruker BES3T format (.DSC/.DTA). The data are read
+    with load_bruker_bes3t, so the header is parsed only once and the binary
+    data are not copied for the conversion to native byte order.
+
+    Parameters
+    ----------
+    path : str
+        Path to the data files. The extension (.DTA/.DSC or .dta/.dsc)
+        selects the case of the file names; without extension upper case
+        is assumed.
+
+    Returns
+    -------
+    spc_real : np.ndarray
+        Real part of the spectrum.
+    spc_imag : np.ndarray or None
+        Imaginary part of the spectrum; None for real data.
+    field : np.ndarray
+        Magnetic field axis.
+    meta : dict
+        Parameters of the DSC-file.
+
+    Notes
+    -----
+    The spectra keep the number format of the DTA-file (IRFMT), e.g. float32
+    for IRFMT=F; they are no longer converted to float64. Parameters after
+    the Manipulation History Layer (#MHL) of the DSC-file are not read.
+
+    """
+    path = Path(path)
+    extension = ".DTA"
+    if path.suffix.lower() in (".dta", ".dsc"):
+        path, extension = path.with_suffix(""), path.suffix
+    data, abscissa, meta = load_bruker_bes3t(path, extension, "")
+
+    if np.iscomplexobj(data):
+        spc_real = data.real
+        spc_imag = data.imag
     else:
-        spc_real = spc_full
+        spc_real = data
         spc_imag = None
 
-    x_min = float(meta["XMIN"])
-    x_wid = float(meta["XWID"])
-    x_pts = int(meta["XPTS"])
-
-    field = np.linspace(x_min, x_min + x_wid, x_pts)
+    field = abscissa[0] if isinstance(abscissa, list) else abscissa
 
     return spc_real, spc_imag, field, meta
 
 
 def load_uvvis_ulm(path: str):
     """
-    Load UVvis-data from the spectrometer located at Ulm.
+    Load UVvis-data from the spectrometer located at Ulm. Header, data and
+    footer are read in a single pass over the file.
 
     Parameters
     ----------
@@ -678,51 +819,43 @@ def load_uvvis_ulm(path: str):
 
     """
     meta = {}
+    data_lines = []
     current_section = "header"
 
     with open(path, "r", encoding="utf-8", errors="ignore") as f:
-        for line_number, line in enumerate(f):
+        for line in f:
             line = line.strip()
 
             # Leere Zeilen ignorieren
             if not line:
                 continue
+
+            if current_section == "data":
+                if line.startswith("###"):
+                    current_section = "footer"
+                else:
+                    data_lines.append(line)
+                continue
+
             if line.startswith("XYDATA"):
-                data_start = line_number + 1
                 current_section = "data"
+                continue
 
-            if current_section == "header":
+            if current_section == "header" or not line.startswith("["):
                 kv_pair = line.split("\t")
                 meta[kv_pair[0]] = " ".join(kv_pair[1:])
 
-            if current_section == "footer":
-                if line.startswith("["):
-                    continue
-                else:
-                    kv_pair = line.split("\t")
-                    meta[kv_pair[0]] = " ".join(kv_pair[1:])
-
             if line.startswith("###"):
-                data_stop = line_number - 1
                 current_section = "footer"
 
-    data = pd.read_csv(
-        path,
-        usecols=[0, 1],
-        names=["lambda", "int"],
-        skiprows=(data_start),
-        skipfooter=(line_number - data_stop),
-        sep="\s+",
-        engine="python",
-    )
-    wavelength = data["lambda"].to_numpy()
-    intensity = data["int"].to_numpy()
+    wavelength, intensity = _two_columns(data_lines, path)
     return wavelength, intensity, meta
 
 
 def load_uvvis_freiburg(path: str):
     """
-    Load UVvis-data from the spectrometer located at Freiburg.
+    Load UVvis-data from the spectrometer located at Freiburg. The two header
+    rows and the data are read in a single pass over the file.
 
     Parameters
     ----------
@@ -740,30 +873,46 @@ def load_uvvis_freiburg(path: str):
 
     """
     path = Path(path).with_suffix(".txt")
-    data = pd.read_csv(
-        path,
-        usecols=[0, 1],
-        names=["lambda", "int"],
-        skiprows=(2),
-        sep="\s+",
-        engine="python",
-    )
-    wavelength = data["lambda"]
-    intensity = data["int"]
-
-    meta = {}
-    meta["wavestart"] = float(wavelength.iloc[-1])
-    meta["waveend"] = float(wavelength.iloc[0])
-    meta["npoints"] = int(len(wavelength))
-    meta["interval"] = round(float(wavelength.iloc[1] - wavelength.iloc[0]), 2)
 
     with open(path, "r", encoding="utf-8", errors="ignore") as f:
         row1 = f.readline().strip()
         row2 = f.readline().strip()
         row2 = row2.split("\t")
+        wavelength, intensity = _two_columns(f, path)
+
+    meta = {}
+    meta["wavestart"] = float(wavelength[-1])
+    meta["waveend"] = float(wavelength[0])
+    meta["npoints"] = int(len(wavelength))
+    meta["interval"] = round(float(wavelength[1] - wavelength[0]), 2)
 
     meta["name"] = row1
     meta["x name"] = row1[0]
     meta["y name"] = row2[1]
 
-    return wavelength.to_numpy(), intensity.to_numpy(), meta
+    return wavelength, intensity, meta
+
+
+def _two_columns(lines, path) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Parses the first two whitespace separated numeric columns of a text
+    block with NumPy's C parser.
+
+    Parameters
+    ----------
+    lines : iterable of str
+        Lines of the data block (a list or an open file positioned at the
+        first data row).
+    path : str
+        Path of the file, used for error messages.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        The first and the second column as contiguous arrays.
+    """
+    try:
+        data = np.loadtxt(lines, usecols=(0, 1), ndmin=2)
+    except ValueError as e:
+        raise ValueError(f"Could not read the data columns of {path}: {e}") from e
+    return np.ascontiguousarray(data[:, 0]), np.ascontiguousarray(data[:, 1])
@@ -0,0 +1,426 @@
+"""
+Content-addressed storage of raw data files. Every raw file is stored once
+as blob under blobs/<ab>/<hash> in the archive (<ab> are the first two
+characters of the hash), and the files in data/M<ms_id>/raw are hard links
+to the blobs. A raw dataset that is registered for several measurements
+therefore takes space only once, and its upload is skipped if the blob
+already exists. The hash algorithm of the blobs is recorded in
+blobs/algorithm when the blob store is created (the configured
+hash_algorithm) and used by all clients afterwards.
+
+On backends or filesystems without hard links (tested once per archive)
+the raw files are copied normally and no blobs are stored. The blob store is
+off by default (deduplicate_raw_data in the configuration) and should only
+be enabled if the archive supports hard links. Blobs are not
+deleted together with a measurement; prune_blobs() removes blobs that are no
+longer linked from any measurement.
+"""
+
+import argparse
+import re
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from typing import Optional, Union
+
+import specatalog.data_management.manifest as mf
+from specatalog.config import DEDUPLICATE_RAW_DATA, UPLOAD_WORKERS
+from specatalog.data_management.archive_backends import TransferStats
+from specatalog.main import archive
+
+BLOB_DIR = Path("blobs")
+BLOB_ALGORITHM_FILE = BLOB_DIR / "algorithm"
+
+# archive -> True if hard links can be created in the blob store
+_link_support: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def blob_path(digest: str) -> Path:
+    """
+    Path of the blob of a content hash relative to the archive root.
+
+    Parameters
+    ----------
+    digest : str
+        Hex digest of the file content (hash algorithm of the blob store).
+
+    Returns
+    -------
+    Path
+        blobs/<first two characters>/<digest>
+    """
+    return BLOB_DIR / digest[:2] / digest
+
+
+def _hash_local_file(path: Union[str, Path], algorithm: Optional[str] = None) -> str:
+    """Hashes a local file (default: configured HASH_ALGORITHM)."""
+    hasher = mf.new_hasher(algorithm)
+    with open(path, "rb") as f:
+        while chunk := f.read(mf.HASH_CHUNK_SIZE):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _supports_links(archive_obj) -> bool:
+    """
+    Tests once per archive whether hard links can be created in the blob
+    store (e.g. not on exFAT/NTFS/CIFS mounts or SMB shares without hard
+    links). Without links a blob would only double the stored data.
+    """
+    supported = _link_support.get(archive_obj)
+    if supported is None:
+        probe = BLOB_DIR / ".link_probe"
+        archive_obj.make_dir(BLOB_DIR)
+        with archive_obj.open_file(probe, "w") as f:
+            f.write("")
+        try:
+            archive_obj.link(probe, probe.with_suffix(".lnk"))
+            archive_obj.delete_file(probe.with_suffix(".lnk"))
+            supported = True
+        except (NotImplementedError, OSError):
+            print("The archive has no hard links, raw data are not deduplicated.")
+            supported = False
+        archive_obj.delete_file(probe)
+        _link_support[archive_obj] = supported
+    return supported
+
+
+def _blob_algorithm(archive_obj) -> str:
+    """
+    Hash algorithm of the blob store. A new blob store records the
+    configured HASH_ALGORITHM, so clients with other settings or packages
+    still name the blobs of the same content alike.
+    """
+    if archive_obj.exists(BLOB_ALGORITHM_FILE):
+        with archive_obj.open_file(BLOB_ALGORITHM_FILE, "r") as f:
+            return f.read().strip()
+    archive_obj.make_dir(BLOB_DIR)
+    with archive_obj.open_file(BLOB_ALGORITHM_FILE, "w") as f:
+        f.write(mf.HASH_ALGORITHM)
+    return mf.HASH_ALGORITHM
+
+
+def _store_blob(archive_obj, src: Union[str, Path], digest: str) -> bool:
+    """
+    Uploads src as blob unless the blob already exists.
+
+    Returns
+    -------
+    bool
+        True if the blob already existed (upload skipped).
+    """
+    blob = blob_path(digest)
+    if archive_obj.exists(blob):
+        return True
+    archive_obj.make_dir(blob.parent)
+    archive_obj.copy_to_archive(src, blob)
+    return False
+
+
+def _link_blob(archive_obj, digest: str, dst_p: Union[str, Path]) -> None:
+    """
+    Creates dst_p as hard link to the blob of digest. The link is created
+    under a temporary name first and then replaces an existing file at
+    dst_p (which may be a link to another blob and is never written into).
+    """
+    dst_p = Path(dst_p)
+    tmp_p = dst_p.with_name(f".{dst_p.name}.tmp")
+    if archive_obj.exists(tmp_p):
+        archive_obj.delete_file(tmp_p)
+    archive_obj.link(blob_path(digest), tmp_p)
+    archive_obj.rename(tmp_p, dst_p)
+
+
+def _store_raw_file(
+    archive_obj,
+    src: Union[str, Path],
+    dst_p: Union[str, Path],
+    digest: Optional[str] = None,
+) -> bool:
+    """
+    Stores a local raw file at dst_p in the archive as link to its blob.
+    The archive must support hard links (see _supports_links).
+
+    Parameters
+    ----------
+    archive_obj
+        Archive object with file operations.
+    src : Union[str, Path]
+        Local raw data file.
+    dst_p : Union[str, Path]
+        Target path in the archive.
+    digest : str, optional
+        Hash of src with the configured HASH_ALGORITHM if already known.
+
+    Returns
+    -------
+    bool
+        True if the content was already in the archive (upload skipped).
+    """
+    algorithm = _blob_algorithm(archive_obj)
+    if digest is None or algorithm != mf.HASH_ALGORITHM:
+        digest = _hash_local_file(src, algorithm)
+    duplicate = _store_blob(archive_obj, src, digest)
+    _link_blob(archive_obj, digest, dst_p)
+    return duplicate
+
+
+def _upload_measurement(
+    archive_obj,
+    src: Union[str, Path],
+    dst_p: Union[str, Path],
+    workers: Optional[int] = None,
+    digests: Optional[dict[str, str]] = None,
+) -> TransferStats:
+    """
+    Copies a local measurement directory to the archive. The raw files are
+    stored as links to blobs (see module description), all other files are
+    copied. If the archive has no hard links, all files are copied. The
+    hashes of all files are returned for the manifest.
+
+    Parameters
+    ----------
+    archive_obj
+        Archive object with file operations.
+    src : Union[str, Path]
+        Local measurement directory.
+    dst_p : Union[str, Path]
+        Target directory in the archive (must not exist).
+    workers : Optional[int], optional
+        Number of parallel uploads (default: configured upload_workers).
+    digests : Optional[dict[str, str]], optional
+        Known hashes (configured HASH_ALGORITHM) of raw files by path
+        relative to src (e.g. "raw/spectrum.DTA"), these files are not
+        hashed again.
+
+    Returns
+    -------
+    TransferStats
+        Statistics of the upload; deduplicated counts the raw files whose
+        upload was skipped.
+    """
+    src = Path(src)
+    raw_dir = src / "raw"
+    if (
+        not DEDUPLICATE_RAW_DATA
+        or not raw_dir.is_dir()
+        or not _supports_links(archive_obj)
+    ):
+        return archive_obj.copy_directory_to_archive(
+            src, dst_p, workers=workers, hasher_factory=mf.new_hasher
+        )
+
+    start = time.perf_counter()
+    workers = workers or UPLOAD_WORKERS
+    raw_files = sorted(p for p in raw_dir.rglob("*") if p.is_file())
+    known = digests or {}
+    # hashes for the manifest and names of the blobs
+    digests = {
+        f: known.get(f.relative_to(src).as_posix()) or _hash_local_file(f)
+        for f in raw_files
+    }
+    algorithm = _blob_algorithm(archive_obj)
+    blobs = digests
+    if algorithm != mf.HASH_ALGORITHM:
+        blobs = {f: _hash_local_file(f, algorithm) for f in raw_files}
+
+    stats = archive_obj.copy_directory_to_archive(
+        src, dst_p, workers=workers, hasher_factory=mf.new_hasher, exclude=("raw",)
+    )
+
+    # every distinct content is uploaded once
+    unique = {digest: f for f, digest in blobs.items()}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        existed = dict(
+            zip(
+                unique,
+                pool.map(lambda d: _store_blob(archive_obj, unique[d], d), unique),
+            )
+        )
+
+    for f in raw_files:
+        rel = f.relative_to(src)
+        archive_obj.make_dir(Path(dst_p) / rel.parent)
+        _link_blob(archive_obj, blobs[f], Path(dst_p) / rel)
+        stats.hashes[rel.as_posix()] = digests[f]
+
+    stats.files += len(raw_files)
+    stats.bytes += sum(unique[d].stat().st_size for d in unique if not existed[d])
+    stats.deduplicated = len(raw_files) - sum(not e for e in existed.values())
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+@dataclass
+class MigrationResult:
+    """
+    Result of the migration of an archive to the blob store.
+
+    Attributes
+    ----------
+    files : int
+        Number of raw files that were checked.
+    linked : int
+        Number of raw files that are now links to blobs.
+    saved_bytes : int
+        Storage freed by replacing duplicates with links.
+    """
+
+    files: int = 0
+    linked: int = 0
+    saved_bytes: int = 0
+
+
+def _measurement_ids(archive_obj) -> list[int]:
+    return sorted(
+        int(name[1:])
+        for name in archive_obj.list_files("data")
+        if re.fullmatch(r"M\d+", name)
+    )
+
+
+def _migrate_to_blob_store(archive_obj) -> MigrationResult:
+    """
+    Converts the raw files of all measurements to links to blobs. Files are
+    not transferred: the first copy of a content becomes the blob (by
+    linking), all further copies are replaced by links to it. Hashes are
+    taken from the manifests if they are up to date and use the algorithm of
+    the blob store, otherwise the files are read and hashed.
+
+    Parameters
+    ----------
+    archive_obj
+        Archive object with file operations.
+
+    Raises
+    ------
+    NotImplementedError
+        If the archive backend does not support hard links.
+
+    Returns
+    -------
+    MigrationResult
+        Number of files and freed storage.
+    """
+    result = MigrationResult()
+    blob_algorithm = _blob_algorithm(archive_obj)
+    for ms_id in _measurement_ids(archive_obj):
+        with archive_obj.metadata_snapshot():
+            base = archive_obj.measurement_path(ms_id)
+            if not archive_obj.isdir(base / "raw"):
+                continue
+            manifest = mf._read_manifest(archive_obj, ms_id) or {"files": {}}
+            algorithm = manifest.get("algorithm")
+
+            for entry in archive_obj.scandir(base / "raw"):
+                if entry.is_dir:
+                    continue
+                result.files += 1
+                rel = f"raw/{entry.name}"
+                p = base / rel
+                if archive_obj.nlink(p) > 1:  # already linked
+                    continue
+
+                record = manifest["files"].get(rel)
+                if (
+                    record is not None
+                    and algorithm == blob_algorithm
+                    and record["size"] == entry.size
+                    and abs(record["mtime"] - entry.mtime) <= mf._MTIME_TOLERANCE
+                ):
+                    digest = record["hash"]
+                else:
+                    digest = mf._hash_archive_file(archive_obj, p, blob_algorithm)
+
+                blob = blob_path(digest)
+                if archive_obj.exists(blob):
+                    # the copy is only replaced once the link exists
+                    tmp = p.with_name(f".{p.name}.tmp")
+                    archive_obj.link(blob, tmp)
+                    archive_obj.rename(tmp, p)
+                    result.saved_bytes += entry.size
+                else:
+                    archive_obj.make_dir(blob.parent)
+                    archive_obj.link(p, blob)
+                result.linked += 1
+    return result
+
+
+def migrate_to_blob_store() -> MigrationResult:
+    """
+    Converts the raw files of all measurements in the archive to hard links
+    to content-addressed blobs, so that identical raw files are stored only
+    once. The migration can be repeated; files that are already linked are
+    skipped.
+
+    Raises
+    ------
+    NotImplementedError
+        If the archive backend does not support hard links.
+
+    Returns
+    -------
+    MigrationResult
+        Number of files and freed storage.
+    """
+    return _migrate_to_blob_store(archive)
+
+
+def _prune_blobs(archive_obj) -> int:
+    """
+    Deletes all blobs that are not linked from any measurement.
+
+    Parameters
+    ----------
+    archive_obj
+        Archive object with file operations.
+
+    Returns
+    -------
+    int
+        Number of deleted blobs.
+    """
+    if not archive_obj.exists(BLOB_DIR):
+        return 0
+    deleted = 0
+    for prefix in archive_obj.scandir(BLOB_DIR):
+        if not prefix.is_dir:
+            continue
+        for entry in archive_obj.scandir(BLOB_DIR / prefix.name):
+            p = PurePosixPath(BLOB_DIR.as_posix(), prefix.name, entry.name)
+            if not entry.is_dir and archive_obj.nlink(p) == 1:
+                archive_obj.delete_file(p)
+                deleted += 1
+    return deleted
+
+
+def prune_blobs() -> int:
+    """
+    Deletes all blobs of the archive that are no longer linked from any
+    measurement (e.g. after measurements were deleted).
+
+    Returns
+    -------
+    int
+        Number of deleted blobs.
+    """
+    return _prune_blobs(archive)
+
+
+def deduplicate_cli(argv: Optional[list[str]] = None) -> None:
+    """Command line tool: migrate the archive to the blob store / prune."""
+    parser = argparse.ArgumentParser(
+        description="Store identical raw files of the archive only once."
+    )
+    parser.add_argument("--prune", action="store_true", help="only delete unused blobs")
+    args = parser.parse_args(argv)
+
+    if not args.prune:
+        result = _migrate_to_blob_store(archive)
+        print(
+            f"{result.linked} of {result.files} raw files linked, "
+            f"{result.saved_bytes / 1e6:.1f} MB freed."
+        )
+    print(f"{_prune_blobs(archive)} unused blobs deleted.")
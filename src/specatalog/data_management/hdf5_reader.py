@@ -1,9 +1,202 @@
+import os
+import stat
+import threading
 import h5py
 from specatalog.crud_db import read as r
-from typing import Any, Literal
+from typing import Any, Literal, Optional, Sequence, Union
 import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from specatalog.main import archive
+from dataclasses import dataclass
+from pathlib import Path
+from specatalog.config import DATASET_CACHE_BYTES, MEASUREMENTS_PATH, READ_WORKERS
+from specatalog.main import archive, db_session
+from specatalog.data_management.measurement_management import (
+    OVERVIEW_GROUP,
+    SERIES_INDEX,
+    SERIES_SOURCES,
+    new_overview_to_hdf5,
+)
+import specatalog.data_management.measurement_store as mst
+
+
+@dataclass
+class CacheStats:
+    """Counters of the dataset cache (see dataset_cache_stats)."""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    entries: int = 0
+    bytes: int = 0
+    max_bytes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of lookups that were answered from the cache."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class DatasetCache:
+    """
+    Thread-safe LRU cache of decoded datasets with a memory budget. Entries
+    are keyed by (file path, dataset path, file version), where the version
+    is the modification time and size of the file, so a rewritten file is
+    never served from stale entries. Cached arrays are read-only because
+    they are shared by all callers of the process.
+
+    Parameters
+    ----------
+    max_bytes : int
+        Maximum total size of the cached arrays. The least recently used
+        arrays are evicted when it is exceeded; arrays larger than the
+        budget are not cached.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = int(max_bytes)
+        self._entries: OrderedDict[tuple, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = CacheStats(max_bytes=self.max_bytes)
+
+    def get(self, key: tuple) -> Optional[np.ndarray]:
+        """Cached array of key or None (counted as hit or miss)."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self._stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats.hits += 1
+            return value
+
+    def put(self, key: tuple, value: np.ndarray) -> np.ndarray:
+        """Store value as read-only array and evict the least recently used
+        entries until the budget is kept. Returns the read-only array."""
+        value.setflags(write=False)
+        if value.nbytes > self.max_bytes:
+            return value
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._stats.bytes -= old.nbytes
+            self._entries[key] = value
+            self._stats.bytes += value.nbytes
+            while self._stats.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._stats.bytes -= evicted.nbytes
+                self._stats.evictions += 1
+        return value
+
+    def clear(self) -> None:
+        """Remove all entries (the counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+            self._stats.bytes = 0
+
+    def stats(self) -> CacheStats:
+        """Copy of the current counters."""
+        with self._lock:
+            return CacheStats(
+                hits=self._stats.hits,
+                misses=self._stats.misses,
+                evictions=self._stats.evictions,
+                entries=len(self._entries),
+                bytes=self._stats.bytes,
+                max_bytes=self.max_bytes,
+            )
+
+
+_dataset_cache: Optional[DatasetCache] = (
+    DatasetCache(DATASET_CACHE_BYTES) if DATASET_CACHE_BYTES > 0 else None
+)
+
+
+def enable_dataset_cache(max_bytes: int = 512 * 1024**2) -> None:
+    """
+    Cache decoded datasets of files that are opened read-only (load_h5,
+    load_from_id, load_many) in this process. Repeated reads of an
+    unchanged file return the cached arrays, which are read-only; copy them
+    before changing them in place. An existing cache is replaced.
+
+    Parameters
+    ----------
+    max_bytes : int, optional
+        Memory budget of the cache. The default is 512 MiB.
+
+    Example
+    -------
+    >>> enable_dataset_cache(2 * 1024**3)
+    >>> for ms_id in ids:
+    >>>     with load_from_id(ms_id) as (obj, f):
+    >>>         analyse(obj.raw_data.data_real_0)
+    >>> print(dataset_cache_stats())
+    """
+    global _dataset_cache
+    if max_bytes <= 0:
+        raise ValueError("max_bytes must be positive.")
+    _dataset_cache = DatasetCache(max_bytes)
+
+
+def disable_dataset_cache() -> None:
+    """Stop caching datasets and release the cached arrays."""
+    global _dataset_cache
+    _dataset_cache = None
+
+
+def dataset_cache_stats() -> Optional[CacheStats]:
+    """
+    Hits, misses, evictions, number of entries and size of the dataset
+    cache, or None if it is disabled.
+    """
+    cache = _dataset_cache
+    return None if cache is None else cache.stats()
+
+
+def _file_version(archive_obj, p: Union[str, Path]) -> Optional[tuple]:
+    """Modification time and size of a file in the archive (None if it does
+    not exist or is a directory, e.g. a Zarr store, whose chunks can change
+    without changing its mtime)."""
+    local = archive_obj.backend.local_path(p)
+    if local is not None:
+        try:
+            st = os.stat(local)
+        except FileNotFoundError:
+            return None
+        if stat.S_ISDIR(st.st_mode):
+            return None
+        return (st.st_mtime_ns, st.st_size)
+    p = Path(p)
+    for entry in archive_obj.scandir(p.parent):
+        if entry.name == p.name and not entry.is_dir:
+            return (entry.mtime, entry.size)
+    return None
+
+
+def _cache_prefix(archive_obj, p: Union[str, Path]) -> Optional[tuple]:
+    """(file path, version) that identifies the datasets of a file in the
+    cache, or None if caching is disabled."""
+    if _dataset_cache is None:
+        return None
+    version = _file_version(archive_obj, p)
+    return None if version is None else (Path(p).as_posix(), version)
+
+
+def _read_dataset(node, prefix: Optional[tuple]) -> Any:
+    """Read a dataset, through the dataset cache if prefix is given."""
+    cache = _dataset_cache
+    if prefix is None or cache is None:
+        return node[()]
+    key = (prefix[0], node.name, prefix[1])
+    value = cache.get(key)
+    if value is None:
+        value = node[()]
+        if isinstance(value, np.ndarray):
+            value = cache.put(key, value)
+    return value
 
 
 class H5Object:
@@ -16,7 +209,10 @@ class H5Object:
     Using the set_attr()- / set_dataset()-method new data can be added to the
     object or existing data are updated. Using the delete_attr()- /
     delete_dataset()- method data can be deleted. After all changes are done
-    they are wirtten to the hdf5-file using the sync()-method.
+    they are wirtten to the hdf5-file using the sync()-method. Using the
+    get_overview()-method a downsampled version of a large dataset can be read
+    for plotting. The overview group of the file is not loaded into the
+    object (see get_overview).
 
     Parameters
     ----------
@@ -31,6 +227,10 @@ class H5Object:
         the sync()-method. If set to False the "synced"-changes are only
         written to the file when it is closed manually using f.close().
         The default is True.
+    cache_prefix : Optional[tuple], optional
+        (file path, version) of the file. If given, the datasets are read
+        through the dataset cache (see enable_dataset_cache). Only used for
+        read-only objects. The default is None.
 
     Attributes
     ----------
@@ -51,7 +251,11 @@ class H5Object:
     """
 
     def __init__(
-        self, h5node: h5py.File, writable: bool = False, auto_flush: bool = True
+        self,
+        h5node: h5py.File,
+        writable: bool = False,
+        auto_flush: bool = True,
+        cache_prefix: Optional[tuple] = None,
     ):
         self._node = h5node
         self._writable = writable
@@ -61,15 +265,26 @@ class H5Object:
         self._datasets_keys = set()
         self._attrs_to_delete = set()
         self._datasets_to_delete = set()
+        self._datasets_changed = set()
 
         self._auto_flush = auto_flush
 
-        # load groups and datasets recursively
+        if writable:
+            cache_prefix = None
+
+        # load groups and datasets recursively, the overview pyramid is only
+        # read on request (get_overview)
         for key, item in h5node.items():
-            if isinstance(item, h5py.Group):
-                setattr(self, key, H5Object(item, writable=writable))
+            if key == OVERVIEW_GROUP and h5node.name == "/":
+                continue
+            if mst.is_group(item):
+                setattr(
+                    self,
+                    key,
+                    H5Object(item, writable=writable, cache_prefix=cache_prefix),
+                )
             else:
-                setattr(self, key, item[()])  # Dataset laden
+                setattr(self, key, _read_dataset(item, cache_prefix))
                 self._datasets_keys.add(key)
 
         # load attributes of the groups
@@ -108,7 +323,9 @@ class H5Object:
 
     def set_dataset(self, key: str, value: np.ndarray):
         """
-        Set a new dataset or update an exising dataset of the H5Object.
+        Set a new dataset or update an exising dataset of the H5Object. If
+        the dataset has an overview (see get_overview), it is regenerated at
+        the next call of the sync()-method.
 
         Parameters
         ----------
@@ -131,6 +348,7 @@ class H5Object:
         """
         setattr(self, key, value)
         self._datasets_keys.add(key)
+        self._datasets_changed.add(key)
         if key in self._attrs_keys:
             self._attrs_keys.remove(key)
 
@@ -156,8 +374,9 @@ class H5Object:
 
     def delete_dataset(self, key: str):
         """
-        Delete a dataset from the object and mark it to be deleted from the
-        hdf5-file at the next call of the sync()-method.
+        Delete a dataset from the object and mark it to be deleted (together
+        with its overview) from the hdf5-file at the next call of the
+        sync()-method.
 
         Parameters
         ----------
@@ -171,6 +390,7 @@ class H5Object:
         """
         self._datasets_to_delete.add(key)
         self._datasets_keys.discard(key)
+        self._datasets_changed.discard(key)
         if hasattr(self, key):
             delattr(self, key)
 
@@ -199,10 +419,13 @@ class H5Object:
                 del self._node.attrs[key]
         self._attrs_to_delete.clear()
 
-        # delete datasets
+        # delete datasets and their overviews
+        h5_file = self._node.file
         for key in self._datasets_to_delete:
             if key in self._node:
                 del self._node[key]
+            if key not in self._datasets_keys and self._overview_path(key) in h5_file:
+                del h5_file[self._overview_path(key)]
         self._datasets_to_delete.clear()
 
         # update attributes
@@ -220,6 +443,12 @@ class H5Object:
                 del self._node[key]
             self._node.create_dataset(key, data=value)
 
+            # the overview of a replaced dataset is regenerated
+            if key in self._datasets_changed and self._overview_path(key) in h5_file:
+                del h5_file[self._overview_path(key)]
+                new_overview_to_hdf5(value, h5_file, self._node.name.strip("/"), key)
+        self._datasets_changed.clear()
+
         # sync recursively for all groups
         for key, value in self.__dict__.items():
             if isinstance(value, H5Object):
@@ -229,6 +458,88 @@ class H5Object:
         if self._auto_flush:
             self._node.file.flush()
 
+    def _overview_path(self, key: str) -> str:
+        """Path of the overview of the dataset key of this group."""
+        group_path = self._node.name.strip("/")
+        return "/".join(p for p in (OVERVIEW_GROUP, group_path, key) if p)
+
+    def get_overview(self, key: str, width: int) -> dict[str, np.ndarray]:
+        """
+        Get a downsampled version of a dataset that fits a plot of the given
+        pixel width. The coarsest overview level that still has at least
+        `width` points along the last axis is read from the file. If no
+        overview level is fine enough, the full-resolution dataset is
+        returned.
+
+        Parameters
+        ----------
+        key : str
+            Name of the dataset in this group (e.g. "data_real_0").
+        width : int
+            Number of points (pixels) that are required along the last axis.
+
+        Raises
+        ------
+        KeyError
+            If the dataset does not exist in this group.
+
+        Returns
+        -------
+        dict[str, np.ndarray]
+            Dictionary with the keys "min", "max" and "mean" (arrays of the
+            chosen level) and "bin_size" (number of original points per bin
+            along each axis).
+
+        Example
+        -------
+        >>> with load_from_id(222) as (obj, f):
+        >>>    ov = obj.raw_data.get_overview("data_real_0", 800)
+        >>> plt.fill_between(range(len(ov["min"])), ov["min"], ov["max"])
+
+        """
+        group_path = self._node.name.strip("/")
+        return _read_overview(
+            self._node.file, "/".join(p for p in (group_path, key) if p), width
+        )
+
+
+def _read_overview(h5_file, key: str, width: int) -> dict[str, np.ndarray]:
+    """
+    Reads the overview level of the dataset key (path in the file) that fits
+    the given width (see H5Object.get_overview). Only the chosen level is
+    read.
+    """
+    overview = h5_file.get(f"{OVERVIEW_GROUP}/{key}")
+
+    chosen = None
+    if overview is not None:
+        n = 0
+        while f"level_{n}" in overview:
+            level = overview[f"level_{n}"]
+            if level["mean"].shape[-1] < width:
+                break
+            chosen = level
+            n += 1
+
+    if chosen is not None:
+        return {
+            "min": chosen["min"][()],
+            "max": chosen["max"][()],
+            "mean": chosen["mean"][()],
+            "bin_size": chosen.attrs["bin_size"],
+        }
+
+    node = h5_file.get(key)
+    if not mst.is_dataset(node):
+        raise KeyError(f"No dataset '{key}' in the file.")
+    data = node[()]
+    return {
+        "min": data,
+        "max": data,
+        "mean": data,
+        "bin_size": np.ones(data.ndim, dtype=int),
+    }
+
 
 @contextmanager
 def load_h5(
@@ -236,11 +547,13 @@ def load_h5(
 ) -> tuple[H5Object, h5py.File]:
     """
     Loads an HDF5 file and returns it as an H5Object along with the underlying h5py.File.
+    Zarr measurement files (.zarr) are opened the same way; instead of the
+    h5py.File their root group (measurement_store.ZarrGroup) is returned.
 
     Parameters
     ----------
     filename : str
-        Path to the HDF5 file.
+        Path to the HDF5 file (or Zarr store).
     mode : Literal["r", "a", "w"], optional
         File access mode:
         - "r": Read-only (default)
@@ -250,19 +563,29 @@ def load_h5(
     Yields
     ------
     tuple[H5Object, h5py.File]
-        The H5Object wrapper and the raw h5py.File object.
+        The H5Object wrapper and the raw h5py.File object. If the dataset
+        cache is enabled and mode is "r", the datasets are read-only arrays.
     """
-    with archive.open_measurement_h5_file(filename, mode=mode) as f:
-        obj = H5Object(f, writable=(mode != "r"))
+    prefix = _cache_prefix(archive, filename) if mode == "r" else None
+    with archive.open_measurement_file(filename, mode=mode) as f:
+        obj = H5Object(f, writable=(mode != "r"), cache_prefix=prefix)
         yield obj, f
 
 
+def measurement_file(ms_id: int) -> Path:
+    """Path of the hdf5-file of a measurement relative to the archive root
+    (without checking that it exists). Use
+    measurement_store.find_measurement_file to find Zarr stores as well."""
+    return MEASUREMENTS_PATH / f"M{ms_id}" / mst.measurement_file_name(ms_id)
+
+
 @contextmanager
 def load_from_id(
-    ms_id: int, mode: Literal["r", "a"] = "r"
+    ms_id: int, mode: Literal["r", "a"] = "r", trust_archive: bool = False
 ) -> tuple[H5Object, h5py.File]:
     """
-    Load a hdf5-measurement-file from the archive as a H5Object.
+    Load a hdf5-measurement-file from the archive as a H5Object. If the
+    measurement is stored as Zarr store, the store is loaded instead.
 
     Parameters
     ----------
@@ -273,6 +596,11 @@ def load_from_id(
         - "r": Read-only (default)
         - "a": Append to existing file
         - "w": Overwrite existing file
+    trust_archive : bool, optional
+        If True, the database is not queried; the measurement exists if its
+        file exists in the archive. Otherwise the ID is checked with
+        crud_db.read.measurement_exists (cached after the first check). The
+        default is False.
 
     Raises
     ------
@@ -292,12 +620,234 @@ def load_from_id(
     >>>    int = obj.raw_data.intensity_0
     >>> print(int)
     """
-    find_measurement = r.MeasurementFilter(id=ms_id)
-    m = r.run_query(find_measurement)
-    if len(m) == 0:
+    if not trust_archive and not r.measurement_exists(ms_id):
+        raise ValueError(f"No measurement with the id={ms_id} found.")
+    p = mst.find_measurement_file(archive, ms_id)
+    if trust_archive and not archive.exists(p):
         raise ValueError(f"No measurement with the id={ms_id} found.")
 
-    with load_h5(
-        archive.measurement_path(ms_id) / f"measurement_M{ms_id}.h5", mode=mode
-    ) as (obj, f):
+    with load_h5(p, mode=mode) as (obj, f):
         yield obj, f
+
+
+def _get_overview(archive_obj, ms_id: int, key: str, width: int) -> dict:
+    """Reads one overview level of a dataset of a measurement (see
+    get_overview)."""
+    p = mst.find_measurement_file(archive_obj, ms_id)
+    with archive_obj.open_measurement_file(p, "r") as f:
+        return _read_overview(f, key, width)
+
+
+def get_overview(ms_id: int, key: str, width: int) -> dict[str, np.ndarray]:
+    """
+    Reads a downsampled version of a dataset of a measurement that fits a
+    plot of the given pixel width. In contrast to load_from_id only the
+    chosen overview level is read from the file (see H5Object.get_overview).
+
+    Parameters
+    ----------
+    ms_id : int
+        Measurement ID number.
+    key : str
+        Path of the dataset, e.g. "raw_data/data_real_0".
+    width : int
+        Number of points (pixels) that are required along the last axis.
+
+    Raises
+    ------
+    KeyError
+        If the dataset does not exist.
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        Dictionary with the keys "min", "max", "mean" and "bin_size".
+
+    Example
+    -------
+    >>> ov = get_overview(222, "raw_data/data_real_0", 800)
+    >>> plt.fill_between(range(len(ov["min"])), ov["min"], ov["max"])
+    """
+    return _get_overview(archive, ms_id, key, width)
+
+
+def _load_series(
+    archive_obj, ms_id: int, quantity: str, rows: Optional[slice] = None
+) -> tuple[np.ndarray, list[str]]:
+    """Reads rows of a quantity of the stacked raw data layout (see
+    load_series)."""
+    p = mst.find_measurement_file(archive_obj, ms_id)
+    with archive_obj.open_measurement_file(p, "r") as f:
+        grp = f.get("raw_data")
+        if grp is None or SERIES_INDEX not in grp or quantity not in grp:
+            raise KeyError(f"Measurement {ms_id} has no raw data series '{quantity}'.")
+        rows = slice(None) if rows is None else rows
+        data = grp[quantity][rows]
+        # h5py returns the names as bytes, Zarr as str
+        sources = [
+            s.decode() if isinstance(s, bytes) else str(s)
+            for s in grp[SERIES_SOURCES][rows]
+        ]
+    return data, sources
+
+
+def load_series(
+    ms_id: int, quantity: str = "data_real", rows: Optional[slice] = None
+) -> tuple[np.ndarray, list[str]]:
+    """
+    Reads a series of raw data that was stored in the stacked layout (see
+    measurement_management.raw_data_to_hdf5) as one array. Only the
+    requested rows are read from the file.
+
+    Parameters
+    ----------
+    ms_id : int
+        Measurement ID number.
+    quantity : str, optional
+        Name of the quantity, e.g. "data_real", "xaxis" or "intensity". The
+        default is "data_real".
+    rows : Optional[slice], optional
+        Rows of the series (one per raw file). The default is None (all).
+
+    Raises
+    ------
+    KeyError
+        If the measurement has no series of this quantity.
+
+    Returns
+    -------
+    tuple[np.ndarray, list[str]]
+        Array of shape (rows, *shape of one raw dataset) and the names of
+        the raw files of the rows.
+
+    Example
+    -------
+    >>> data, sources = load_series(222, rows=slice(10, 20))
+    """
+    return _load_series(archive, ms_id, quantity, rows)
+
+
+def _read_keys(
+    archive_obj, ms_id: int, datasets: Sequence[str], attrs: Sequence[str]
+) -> dict[str, Any]:
+    """
+    Reads only the given datasets and attributes of a measurement file.
+    Attributes are given as "<group>/<name>" ("<name>" for the file itself).
+    Keys that do not exist are returned as None.
+    """
+    values = {}
+    p = mst.find_measurement_file(archive_obj, ms_id)
+    prefix = _cache_prefix(archive_obj, p) if datasets else None
+    with archive_obj.open_measurement_file(p, "r") as f:
+        for key in datasets:
+            node = f.get(key)
+            values[key] = _read_dataset(node, prefix) if mst.is_dataset(node) else None
+        for key in attrs:
+            group, _, name = key.rpartition("/")
+            node = f.get(group) if group else f
+            values[key] = None if node is None else node.attrs.get(name)
+    return values
+
+
+def _load_many(
+    archive_obj,
+    session: db_session,
+    ids: Sequence[int],
+    datasets: Sequence[str] = (),
+    attrs: Sequence[str] = (),
+    workers: Optional[int] = None,
+) -> dict[int, dict[str, Any]]:
+    """
+    Reads datasets and attributes of several measurement files concurrently
+    (see load_many).
+
+    Parameters
+    ----------
+    archive_obj
+        Archive object with file operations.
+    session : db_session
+        Object of the class db_session.
+    ids : Sequence[int]
+        Measurement IDs.
+    datasets : Sequence[str], optional
+        Paths of the datasets, e.g. "raw_data/data_real_0".
+    attrs : Sequence[str], optional
+        Paths of the attributes, e.g. "raw_data/MWFQ".
+    workers : Optional[int], optional
+        Number of files that are read in parallel.
+
+    Raises
+    ------
+    ValueError
+        If any of the measurements does not exist.
+
+    Returns
+    -------
+    dict[int, dict[str, Any]]
+        Requested values per measurement in the order of ids.
+    """
+    ids = list(dict.fromkeys(int(i) for i in ids))
+    missing = r._measurements_exist(ids, session)
+    if missing:
+        raise ValueError(f"No measurements with the ids {missing} found.")
+
+    with ThreadPoolExecutor(max_workers=workers or READ_WORKERS) as pool:
+        results = pool.map(
+            lambda ms_id: _read_keys(archive_obj, ms_id, datasets, attrs), ids
+        )
+        return dict(zip(ids, results))
+
+
+def load_many(
+    ids: Sequence[int],
+    datasets: Sequence[str] = (),
+    attrs: Sequence[str] = (),
+    workers: Optional[int] = None,
+    as_frame: bool = False,
+):
+    """
+    Reads selected datasets and attributes from the hdf5-files of many
+    measurements. All IDs are checked with one database query and the files
+    are opened concurrently; only the requested keys are read, not the whole
+    file as with load_from_id.
+
+    Parameters
+    ----------
+    ids : Sequence[int]
+        Measurement IDs.
+    datasets : Sequence[str], optional
+        Paths of the datasets, e.g. ["raw_data/data_real_0",
+        "raw_data/field_0"].
+    attrs : Sequence[str], optional
+        Paths of the attributes as "<group>/<name>", e.g. ["raw_data/MWFQ"].
+        Attributes of the file itself are given by their name only.
+    workers : Optional[int], optional
+        Number of files that are read in parallel. The default is the
+        configured read_workers.
+    as_frame : bool, optional
+        Return a pandas DataFrame (index: measurement ID, columns: keys)
+        instead of a dictionary. The default is False.
+
+    Raises
+    ------
+    ValueError
+        If any of the measurements does not exist.
+
+    Returns
+    -------
+    dict[int, dict[str, Any]] or pandas.DataFrame
+        Requested values per measurement in the order of ids. Keys that do
+        not exist in a file are None.
+
+    Example
+    -------
+    >>> data = load_many(
+    >>>     range(100, 600), datasets=["raw_data/data_real_0"], attrs=["raw_data/MWFQ"]
+    >>> )
+    >>> data[222]["raw_data/MWFQ"]
+    """
+    with db_session() as session:
+        values = _load_many(archive, session, ids, datasets, attrs, workers)
+    if as_frame:
+        return pd.DataFrame.from_dict(values, orient="index")
+    return values
@@ -0,0 +1,469 @@
+"""
+Integrity manifests of the measurement directories. Every measurement
+directory can contain a JSON file data/M<ms_id>/manifest that lists size,
+modification time and content hash of all files of the directory. The hashes
+are computed while the files are copied to the archive, so no extra read is
+needed. A verification compares the manifest with the archive and only
+rehashes files whose size or modification time changed (or all files with
+full=True).
+
+The measurement file (measurement_M<ms_id>.h5 or the Zarr store
+measurement_M<ms_id>.zarr) is not part of the manifest: it is changed by
+every evaluation that is saved, so the manifest covers the files that are
+not supposed to change (raw data, scripts, images, ...).
+
+New manifests use the configured hash algorithm (hash_algorithm, default
+blake2b from the standard library; xxh3_128 and blake3 are faster but need
+the packages xxhash or blake3). The algorithm is stored in the manifest and
+its files are always hashed with it, independent of the configuration.
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import Optional, Union
+
+from specatalog.config import HASH_ALGORITHM
+from specatalog.data_management.measurement_store import (
+    MEASUREMENT_FORMATS,
+    measurement_file_name,
+)
+from specatalog.main import archive
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
+MANIFEST_NAME = "manifest"
+MANIFEST_VERSION = 1
+HASH_CHUNK_SIZE = 1024**2
+# package of the hash algorithms that are not in the standard library
+_HASH_PACKAGES = {"xxh3_128": "xxhash", "blake3": "blake3"}
+
+# modification times closer than this (in seconds) count as equal
+_MTIME_TOLERANCE = 1e-3
+
+
+def new_hasher(algorithm: Optional[str] = None):
+    """
+    Creates a new hash object with update() and hexdigest() methods.
+
+    Parameters
+    ----------
+    algorithm : Optional[str], optional
+        "blake2b", "xxh3_128" or "blake3". The default is None (the
+        configured HASH_ALGORITHM).
+
+    Raises
+    ------
+    ValueError
+        If the algorithm is unknown or its package is not installed.
+
+    Returns
+    -------
+    Hash object.
+    """
+    algorithm = algorithm or HASH_ALGORITHM
+    if algorithm == "xxh3_128" and xxhash is not None:
+        return xxhash.xxh3_128()
+    if algorithm == "blake3" and blake3 is not None:
+        return blake3.blake3()
+    if algorithm == "blake2b":
+        return hashlib.blake2b(digest_size=16)
+    if algorithm in _HASH_PACKAGES:
+        raise ValueError(
+            f"Hash algorithm '{algorithm}' needs the package "
+            f"{_HASH_PACKAGES[algorithm]}, which is not installed."
+        )
+    raise ValueError(f"Hash algorithm '{algorithm}' is unknown.")
+
+
+@dataclass
+class VerifyResult:
+    """
+    Result of the verification of a measurement directory.
+
+    Attributes
+    ----------
+    ms_id : int
+        Measurement ID number.
+    modified : list[str]
+        Files whose size or modification time changed and whose content
+        differs from the manifest.
+    touched : list[str]
+        Files whose size or modification time changed, but whose content is
+        unchanged.
+    corrupted : list[str]
+        Files with unchanged size and modification time but a different
+        content (only found with full=True).
+    missing : list[str]
+        Files in the manifest that are not in the archive.
+    untracked : list[str]
+        Files in the archive that are not in the manifest.
+    rehashed : int
+        Number of files that were read and hashed.
+    """
+
+    ms_id: int
+    modified: list[str] = field(default_factory=list)
+    touched: list[str] = field(default_factory=list)
+    corrupted: list[str] = field(default_factory=list)
+    missing: list[str] = field(default_factory=list)
+    untracked: list[str] = field(default_factory=list)
+    rehashed: int = 0
+
+    @property
+    def ok(self) -> bool:
+        """True if the directory matches its manifest."""
+        return not (self.modified or self.corrupted or self.missing or self.untracked)
+
+
+def _untracked_names(ms_id: Union[str, int]) -> set[str]:
+    """Top level names of a measurement directory that are not tracked."""
+    names = {measurement_file_name(ms_id, fmt) for fmt in MEASUREMENT_FORMATS}
+    names.add(MANIFEST_NAME)
+    return names
+
+
+def _scan_measurement(archive_obj, ms_id: Union[str, int]) -> dict:
+    """
+    Collects size and modification time of all files of a measurement
+    directory with one scandir call per directory. The manifest and the
+    measurement file are skipped.
+
+    Returns
+    -------
+    dict
+        Path relative to the measurement directory -> EntryInfo.
+    """
+    base = archive_obj.measurement_path(ms_id)
+    skip = _untracked_names(ms_id)
+    files = {}
+    todo = [PurePosixPath()]
+    while todo:
+        rel = todo.pop()
+        for entry in archive_obj.scandir(base / rel):
+            if rel == PurePosixPath() and entry.name in skip:
+                continue
+            if entry.is_dir:
+                todo.append(rel / entry.name)
+            else:
+                files[(rel / entry.name).as_posix()] = entry
+    return files
+
+
+def _hash_archive_file(archive_obj, p: Union[str, Path], algorithm: str) -> str:
+    """Hashes a file of the archive while streaming it."""
+    hasher = new_hasher(algorithm)
+    with archive_obj.open_file(p, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _read_manifest(archive_obj, ms_id: Union[str, int]) -> Optional[dict]:
+    """Reads the manifest of a measurement (None if there is none)."""
+    p = archive_obj.measurement_path(ms_id) / MANIFEST_NAME
+    if not archive_obj.exists(p):
+        return None
+    with archive_obj.open_file(p, "r") as f:
+        return json.load(f)
+
+
+def _write_manifest(archive_obj, ms_id: Union[str, int], manifest: dict) -> None:
+    p = archive_obj.measurement_path(ms_id) / MANIFEST_NAME
+    manifest["files"] = dict(sorted(manifest["files"].items()))
+    with archive_obj.open_file(p, "w") as f:
+        json.dump(manifest, f, indent=1)
+
+
+def _entry_record(entry, digest: str) -> dict:
+    return {"size": entry.size, "mtime": entry.mtime, "hash": digest}
+
+
+def _create_manifest(
+    archive_obj, ms_id: Union[str, int], hashes: Optional[dict[str, str]] = None
+) -> dict:
+    """
+    Creates (or replaces) the manifest of a measurement directory.
+
+    Parameters
+    ----------
+    archive_obj
+        Archive object with file operations.
+    ms_id : Union[str, int]
+        Measurement ID number.
+    hashes : Optional[dict[str, str]], optional
+        Hashes that were already computed during the upload (path relative to
+        the measurement directory -> digest of HASH_ALGORITHM). All other
+        files are read from the archive and hashed.
+
+    Returns
+    -------
+    dict
+        The manifest.
+    """
+    hashes = hashes or {}
+    with archive_obj.metadata_snapshot():
+        base = archive_obj.measurement_path(ms_id)
+        files = {}
+        for rel, entry in _scan_measurement(archive_obj, ms_id).items():
+            digest = hashes.get(rel)
+            if digest is None:
+                digest = _hash_archive_file(archive_obj, base / rel, HASH_ALGORITHM)
+            files[rel] = _entry_record(entry, digest)
+
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "algorithm": HASH_ALGORITHM,
+            "files": files,
+        }
+        _write_manifest(archive_obj, ms_id, manifest)
+    return manifest
+
+
+def create_manifest(ms_id: Union[str, int]) -> dict:
+    """
+    Creates (or replaces) the manifest data/M<ms_id>/manifest with size,
+    modification time and hash of all files of the measurement directory
+    except the measurement file.
+
+    Parameters
+    ----------
+    ms_id : Union[str, int]
+        Measurement ID number.
+
+    Returns
+    -------
+    dict
+        The manifest.
+    """
+    return _create_manifest(archive, ms_id)
+
+
+def _record_files(
+    archive_obj, ms_id: Union[str, int], hashes: dict[str, Optional[str]]
+) -> None:
+    """
+    Updates single entries of an existing manifest after files were copied
+    to or deleted from the measurement directory. Nothing happens if the
+    measurement has no manifest.
+
+    Parameters
+    ----------
+    archive_obj
+        Archive object with file operations.
+    ms_id : Union[str, int]
+        Measurement ID number.
+    hashes : dict[str, Optional[str]]
+        Path relative to the measurement directory -> digest of
+        HASH_ALGORITHM computed during the copy, or None for deleted files.
+        If the manifest uses another algorithm, the files are rehashed.
+    """
+    with archive_obj.metadata_snapshot():
+        manifest = _read_manifest(archive_obj, ms_id)
+        if manifest is None:
+            return
+
+        base = archive_obj.measurement_path(ms_id)
+        skip = _untracked_names(ms_id)
+        algorithm = manifest["algorithm"]
+        for rel, digest in hashes.items():
+            if PurePosixPath(rel).parts[0] in skip:
+                continue
+            if digest is None:
+                manifest["files"].pop(rel, None)
+                continue
+            if algorithm != HASH_ALGORITHM:
+                # the manifest was written with another algorithm
+                digest = _hash_archive_file(archive_obj, base / rel, algorithm)
+            parent = PurePosixPath(rel).parent
+            entries = {e.name: e for e in archive_obj.scandir(base / parent)}
+            entry = entries[PurePosixPath(rel).name]
+            manifest["files"][rel] = _entry_record(entry, digest)
+        _write_manifest(archive_obj, ms_id, manifest)
+
+
+def _verify_manifest(
+    archive_obj, ms_id: Union[str, int], full: bool = False, update: bool = False
+) -> VerifyResult:
+    """
+    Compares a measurement directory with its manifest.
+
+    Parameters
+    ----------
+    archive_obj
+        Archive object with file operations.
+    ms_id : Union[str, int]
+        Measurement ID number.
+    full : bool, optional
+        If True, all files are rehashed. Otherwise only files whose size or
+        modification time changed. The default is False.
+    update : bool, optional
+        If True, the manifest is updated to the current state of the
+        directory afterwards. The default is False.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the measurement has no manifest.
+    ValueError
+        If the hash algorithm of the manifest is not available.
+
+    Returns
+    -------
+    VerifyResult
+        The differences between the directory and the manifest.
+    """
+    with archive_obj.metadata_snapshot():
+        manifest = _read_manifest(archive_obj, ms_id)
+        if manifest is None:
+            raise FileNotFoundError(f"No manifest for measurement M{ms_id}.")
+
+        base = archive_obj.measurement_path(ms_id)
+        algorithm = manifest["algorithm"]
+        # manifests of older versions contain the measurement file
+        skip = _untracked_names(ms_id)
+        recorded = manifest["files"] = {
+            rel: record
+            for rel, record in manifest["files"].items()
+            if PurePosixPath(rel).parts[0] not in skip
+        }
+        current = _scan_measurement(archive_obj, ms_id)
+        result = VerifyResult(ms_id=int(ms_id))
+
+        for rel in sorted(recorded.keys() - current.keys()):
+            result.missing.append(rel)
+            del recorded[rel]
+
+        for rel, entry in sorted(current.items()):
+            record = recorded.get(rel)
+            if record is None:
+                result.untracked.append(rel)
+                if update:
+                    digest = _hash_archive_file(archive_obj, base / rel, algorithm)
+                    recorded[rel] = _entry_record(entry, digest)
+                    result.rehashed += 1
+                continue
+
+            changed = (
+                entry.size != record["size"]
+                or abs(entry.mtime - record["mtime"]) > _MTIME_TOLERANCE
+            )
+            if not (changed or full):
+                continue
+
+            digest = _hash_archive_file(archive_obj, base / rel, algorithm)
+            result.rehashed += 1
+            if digest != record["hash"]:
+                (result.modified if changed else result.corrupted).append(rel)
+            elif changed:
+                result.touched.append(rel)
+            recorded[rel] = _entry_record(entry, digest)
+
+        if update:
+            _write_manifest(archive_obj, ms_id, manifest)
+    return result
+
+
+def verify_manifest(
+    ms_id: Union[str, int], full: bool = False, update: bool = False
+) -> VerifyResult:
+    """
+    Compares a measurement directory with its manifest. Only files whose
+    size or modification time changed are read and rehashed, unless
+    full=True.
+
+    Parameters
+    ----------
+    ms_id : Union[str, int]
+        Measurement ID number.
+    full : bool, optional
+        If True, all files are rehashed (finds silent corruption). The
+        default is False.
+    update : bool, optional
+        If True, the manifest is updated to the current state of the
+        directory afterwards. The default is False.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the measurement has no manifest.
+    ValueError
+        If the hash algorithm of the manifest is not available.
+
+    Returns
+    -------
+    VerifyResult
+        The differences between the directory and the manifest.
+
+    Example
+    -------
+    >>> result = verify_manifest(222)
+    >>> if not result.ok:
+    >>>     print(result.modified, result.missing)
+    """
+    return _verify_manifest(archive, ms_id, full, update)
+
+
+def verify_archive_cli(argv: Optional[list[str]] = None) -> None:
+    """Command line tool: verify the manifests of measurement directories."""
+    parser = argparse.ArgumentParser(
+        description="Verify measurement directories against their manifests."
+    )
+    parser.add_argument(
+        "ids", nargs="*", type=int, help="measurement ids (default: all)"
+    )
+    parser.add_argument("--full", action="store_true", help="rehash all files")
+    parser.add_argument(
+        "--update", action="store_true", help="write the changes to the manifests"
+    )
+    parser.add_argument(
+        "--create", action="store_true", help="create missing manifests"
+    )
+    args = parser.parse_args(argv)
+
+    ids = args.ids
+    if not ids:
+        ids = sorted(
+            int(name[1:])
+            for name in archive.list_files("data")
+            if re.fullmatch(r"M\d+", name)
+        )
+
+    failed = 0
+    for ms_id in ids:
+        try:
+            result = _verify_manifest(archive, ms_id, args.full, args.update)
+        except FileNotFoundError:
+            if args.create:
+                _create_manifest(archive, ms_id)
+                print(f"M{ms_id}: manifest created")
+            else:
+                print(f"M{ms_id}: no manifest")
+                failed += 1
+            continue
+        except ValueError as e:  # algorithm of the manifest not installed
+            print(f"M{ms_id}: {e}")
+            failed += 1
+            continue
+
+        if result.ok:
+            print(f"M{ms_id}: ok ({result.rehashed} files rehashed)")
+            continue
+        failed += 1
+        for label in ("modified", "corrupted", "missing", "untracked"):
+            for rel in getattr(result, label):
+                print(f"M{ms_id}: {label}: {rel}")
+
+    sys.exit(1 if failed else 0)
@@ -1,18 +1,37 @@
+import time
 from pathlib import Path
-from typing import Union, Optional, Literal
+from typing import Callable, Literal, Optional, Union
 
 import h5py
 
 import specatalog.data_management.data_loader as l
+import specatalog.data_management.manifest as mf
+import specatalog.data_management.deduplication as dd
+import specatalog.data_management.measurement_store as mst
+from specatalog.config import DEDUPLICATE_RAW_DATA, MEASUREMENT_FORMAT, RAW_DATA_LAYOUT
 import numpy as np
 from specatalog.main import archive
 
 CATEGORIES = ["raw", "scripts", "figures", "additional_info", "literature"]
 
+# downsampled versions of the main datasets for fast plotting
+OVERVIEW_GROUP = "overview"
+OVERVIEW_MIN_POINTS = 256
+
+# layouts of the group raw_data: one dataset per raw file and quantity
+# (data_real_0, data_real_1, ...) or one resizable dataset per quantity with
+# one row per raw file (data_real[0], data_real[1], ...) and an index with
+# the time of addition and the (variable-length) name of the raw file per row
+RAW_DATA_LAYOUTS = ("indexed", "stacked")
+SERIES_INDEX = "series_index"
+SERIES_SOURCES = "series_sources"
+SERIES_INDEX_CHUNKS = 256
+
 
 def _create_measurement_dir(archive_obj, ms_id: int) -> str:
     """
-    Creates a new measurement directory structure with HDF5 file.
+    Creates a new measurement directory structure with HDF5 file (or Zarr
+    store, depending on the configured measurement_format).
 
     Parameters
     ----------
@@ -47,12 +66,12 @@ def _create_measurement_dir(archive_obj, ms_id: int) -> str:
         p_sub = f"{p}/{subdir}"
         archive_obj.make_dir(p_sub)
 
-    p_measurement = f"{p}/measurement_M{ms_id}.h5"
+    p_measurement = f"{p}/{mst.measurement_file_name(ms_id, MEASUREMENT_FORMAT)}"
 
     if archive_obj.exists(p_measurement):
         raise FileExistsError(f"HDF5 file {p_measurement} already exists!")
 
-    with archive_obj.open_measurement_h5_file(p_measurement, "w") as f:
+    with archive_obj.open_measurement_file(p_measurement, "w") as f:
         f.create_group("raw_data")
         f.create_group("corrected_data")
         f.create_group("evaluations")
@@ -87,8 +106,13 @@ def create_measurement_dir(ms_id: int) -> str:
 
 
 def _new_file_to_archive(
-    archive_obj, src: Union[str, Path], ms_id: int, category: str, update: bool = False
-) -> None:
+    archive_obj,
+    src: Union[str, Path],
+    ms_id: int,
+    category: str,
+    update: bool = False,
+    deduplicate: Optional[bool] = None,
+) -> str:
     """
     Copies a file to the archive measurement directory.
 
@@ -105,6 +129,9 @@ def _new_file_to_archive(
         additional_info, literature).
     update : bool, optional
         If False, raises error when file exists (default: False).
+    deduplicate : Optional[bool], optional
+        Store raw files as links to blobs (see deduplication). The default
+        is None (the configured deduplicate_raw_data).
 
     Raises
     ------
@@ -117,10 +144,13 @@ def _new_file_to_archive(
 
     Returns
     -------
-    None
+    str
+        Hash of the file (manifest hash algorithm).
     """
 
     src = Path(src)
+    if deduplicate is None:
+        deduplicate = DEDUPLICATE_RAW_DATA
 
     # check category
     if category not in CATEGORIES:
@@ -145,9 +175,21 @@ def _new_file_to_archive(
                 f"File at {dst_file} already exists! Use new name or update-function instead"
             )
 
-    archive_obj.copy_to_archive(src, dst_file)
+    if category == "raw" and deduplicate and dd._supports_links(archive_obj):
+        # raw files are stored once as blob and linked into the measurement
+        digest = dd._hash_local_file(src)
+        dd._store_raw_file(archive_obj, src, dst_file, digest)
+    else:
+        if archive_obj.exists(dst_file):
+            # replace instead of overwriting, the file may be a hard link
+            archive_obj.delete_file(dst_file)
+        # the hash for the manifest is computed during the copy
+        hasher = mf.new_hasher()
+        archive_obj.copy_to_archive(src, dst_file, hasher=hasher)
+        digest = hasher.hexdigest()
+    mf._record_files(archive_obj, ms_id, {f"{category}/{src.name}": digest})
     print(f"Copied {src} to {dst_file}")
-    return
+    return digest
 
 
 def new_file_to_archive(
@@ -213,12 +255,123 @@ def new_dataset_to_hdf5(
     return
 
 
+def _overview_levels(data: np.ndarray) -> list[dict[str, np.ndarray]]:
+    """
+    Computes a pyramid of downsampled versions of an array. Every level
+    halves all axes that are longer than OVERVIEW_MIN_POINTS and stores the
+    minimum, maximum and mean of each bin. The levels are computed
+    successively from the previous level, so the full array is only read
+    once.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        Real-valued array with one or more dimensions.
+
+    Returns
+    -------
+    list[dict[str, np.ndarray]]
+        One dictionary per level (finest first) with the keys "min", "max",
+        "mean" and "bin_size" (number of original points per bin along each
+        axis).
+    """
+    minimum = np.asarray(data, dtype=float)
+    maximum = minimum
+    total = minimum
+    count = np.ones(minimum.shape)
+    bin_size = np.ones(minimum.ndim, dtype=int)
+
+    levels = []
+    while True:
+        axes = [ax for ax, n in enumerate(minimum.shape) if n > OVERVIEW_MIN_POINTS]
+        if not axes:
+            break
+
+        for ax in axes:
+            idx = np.arange(0, minimum.shape[ax], 2)
+            minimum = np.minimum.reduceat(minimum, idx, axis=ax)
+            maximum = np.maximum.reduceat(maximum, idx, axis=ax)
+            total = np.add.reduceat(total, idx, axis=ax)
+            count = np.add.reduceat(count, idx, axis=ax)
+            bin_size[ax] *= 2
+
+        levels.append(
+            {
+                "min": minimum,
+                "max": maximum,
+                "mean": total / count,
+                "bin_size": bin_size.copy(),
+            }
+        )
+
+    return levels
+
+
+def new_overview_to_hdf5(
+    data: Optional[np.ndarray], h5_file: h5py.File, group_name: str, dataset_name: str
+) -> None:
+    """
+    Writes a pyramid of downsampled versions of a dataset to the group
+    overview/<group_name>/<dataset_name> of an HDF5 file. Each level is stored
+    as group level_<n> with the datasets min, max and mean and the attribute
+    bin_size. Level 0 is the finest level (bins of two points along each long
+    axis). Use H5Object.get_overview() to read the level that fits a plot.
+
+    Parameters
+    ----------
+    data : Optional[np.ndarray]
+        Data array of the main dataset. If None, complex or non-numeric, no
+        action is taken.
+    h5_file : h5py.File
+        Open HDF5 file object.
+    group_name : str
+        Name of the group that contains the main dataset.
+    dataset_name : str
+        Name of the main dataset the overview belongs to.
+
+    Returns
+    -------
+    None
+    """
+    if data is None:
+        return
+    data = np.asarray(data)
+    if np.iscomplexobj(data) or not np.issubdtype(data.dtype, np.number):
+        return
+
+    grp = h5_file.require_group(f"{OVERVIEW_GROUP}/{group_name}")
+    if dataset_name in grp:
+        del grp[dataset_name]
+    ds_grp = grp.create_group(dataset_name)
+    ds_grp.attrs["shape"] = data.shape
+
+    for n, level in enumerate(_overview_levels(data)):
+        level_grp = ds_grp.create_group(f"level_{n}")
+        level_grp.attrs["bin_size"] = level["bin_size"]
+        for key in ("min", "max", "mean"):
+            level_grp.create_dataset(key, data=level[key])
+    return
+
+
+def _with_suffix(base: Path, suffix: str) -> Path:
+    """
+    Local file base + suffix in the case in which it exists (e.g. .DSC or
+    .dsc, depending on the software that saved it). If there is no such
+    file, base + suffix is returned.
+    """
+    for variant in (suffix, suffix.upper(), suffix.lower()):
+        if base.with_suffix(variant).exists():
+            return base.with_suffix(variant)
+    return base.with_suffix(suffix)
+
+
 def _raw_data_to_folder(
     archive_obj,
     raw_data_path: str,
     fmt: Literal["bruker_bes3t", "cw_epr", "uvvis_ulm", "uvvis_freiburg"],
     ms_id: int,
-) -> None:
+    deduplicate: Optional[bool] = None,
+) -> dict[str, str]:
     """
     Copies raw data files to the archive directory. Existing data with the same
     name get overwritten. The data are saved at
@@ -233,6 +386,9 @@ def _raw_data_to_folder(
         Data format identifier.
     ms_id : int
         Measurement ID number.
+    deduplicate : Optional[bool], optional
+        Store the files as links to blobs (see deduplication). The default
+        is None (the configured deduplicate_raw_data).
 
     Raises
     ------
@@ -243,35 +399,42 @@ def _raw_data_to_folder(
 
     Returns
     -------
-    None
+    dict[str, str]
+        Hashes of the copied files by path relative to the measurement
+        directory (e.g. "raw/spectrum.DTA").
     """
+    sources = []
     # copy all relevant files for Bruker bes3t format (DSC/DTA + optional YGF)
     if fmt == "bruker_bes3t" or fmt == "cw_epr":
-        raw_data_1 = Path(raw_data_path).with_suffix(".DSC")
-        raw_data_2 = Path(raw_data_path).with_suffix(".DTA")
-        raw_data_3 = Path(raw_data_path).with_suffix(".YGF")
+        raw_data_1 = _with_suffix(Path(raw_data_path), ".DSC")
+        raw_data_2 = _with_suffix(Path(raw_data_path), ".DTA")
+        raw_data_3 = _with_suffix(Path(raw_data_path), ".YGF")
         if not raw_data_1.exists():
             raise FileNotFoundError(f"Raw data not found at {raw_data_1}!")
         if not raw_data_2.exists():
             raise FileNotFoundError(f"Raw data not found at {raw_data_2}!")
 
-        _new_file_to_archive(archive_obj, raw_data_1, ms_id, "raw", update=True)
-        _new_file_to_archive(archive_obj, raw_data_2, ms_id, "raw", update=True)
+        sources = [raw_data_1, raw_data_2]
         if raw_data_3.exists():
-            _new_file_to_archive(archive_obj, raw_data_3, ms_id, "raw", update=True)
+            sources.append(raw_data_3)
 
     # copy all UVvis files
     elif fmt == "uvvis_ulm" or fmt == "uvvis_freiburg":
-        raw_data = Path(raw_data_path).with_suffix(".txt")
+        raw_data = _with_suffix(Path(raw_data_path), ".txt")
         if not raw_data.exists():
             raise FileNotFoundError(f"Raw data not found at {raw_data}!")
 
-        _new_file_to_archive(archive_obj, raw_data, ms_id, "raw", update=True)
+        sources = [raw_data]
 
     else:
         raise ValueError(f"Data type: {fmt} unknown!")
 
-    return
+    return {
+        f"raw/{src.name}": _new_file_to_archive(
+            archive_obj, src, ms_id, "raw", update=True, deduplicate=deduplicate
+        )
+        for src in sources
+    }
 
 
 def raw_data_to_folder(
@@ -342,6 +505,8 @@ def _raw_data_to_hdf5(
     archive_obj,
     ms_id: Union[str, int],
     fmt: Literal["bruker_bes3t", "cw_epr", "uvvis_ulm", "uvvis_freiburg"],
+    layout: Optional[Literal["indexed", "stacked"]] = None,
+    progress: Optional[Callable[[float, str], None]] = None,
 ) -> None:
     """
     Write all data from the raw data datafiles in the archive at
@@ -349,7 +514,13 @@ def _raw_data_to_hdf5(
     to the hdf5-file
     <base_dir>/data/M<ms_id>/measurement.h5
 
-    The datasets are saved as arrays in the group 'raw_data'.
+    The datasets are saved as arrays in the group 'raw_data'. Downsampled
+    overviews of the main datasets are saved in the group 'overview'. For
+    homogeneous series (all raw files with the same shape) the stacked
+    layout stores one resizable dataset per quantity with one row per raw
+    file (data_real[n], xaxis[n], ...) and the index datasets
+    raw_data/series_index and raw_data/series_sources; appending a file then writes only its row and a
+    series is read as one contiguous array.
 
     Parameters
     ----------
@@ -359,172 +530,307 @@ def _raw_data_to_hdf5(
         Measurement ID number.
     fmt : Literal["bruker_bes3t", "cw_epr", "uvvis_ulm", "uvvis_freiburg"]
         Data format identifier.
+    layout : Optional[Literal["indexed", "stacked"]], optional
+        Layout of the raw data. The default is None (the configured
+        raw_data_layout, "indexed" if not set).
+    progress : Optional[Callable[[float, str], None]], optional
+        Called with the fraction of converted raw files and a message after
+        every file (e.g. JobContext.report). The default is None.
 
     Raises
     ------
     ValueError
-        If format is unknown or required files are missing.
+        If format or layout is unknown, required files are missing or (in
+        the stacked layout) the raw files differ in shape.
 
     Returns
     -------
     None
     """
-    # set the path
-    path = archive_obj.measurement_path(ms_id)
-    raw_path = path / "raw"
-    hdf5_path = path / f"measurement_M{ms_id}.h5"
+    layout = layout or RAW_DATA_LAYOUT
+    if layout not in RAW_DATA_LAYOUTS:
+        raise ValueError(
+            f"Unknown raw data layout '{layout}'. Valid: {', '.join(RAW_DATA_LAYOUTS)}."
+        )
 
-    # load and save data from Bruker bes3t format
-    if fmt == "bruker_bes3t":
-        files = archive_obj.list_files(raw_path)
+    # all metadata calls below are answered from one directory snapshot
+    with archive_obj.metadata_snapshot():
+        # set the path
+        path = archive_obj.measurement_path(ms_id)
+        raw_path = path / "raw"
+        hdf5_path = mst.find_measurement_file(archive_obj, ms_id)
+
+        if fmt in ("bruker_bes3t", "cw_epr"):
+            suffix = ".DSC"
+        elif fmt in ("uvvis_ulm", "uvvis_freiburg"):
+            suffix = ".txt"
+        else:
+            raise ValueError(f"Data type: {fmt} unknown!")
+
+        # suffixes in upper or lower case (e.g. .DSC or .dsc)
+        files = {filename.lower() for filename in archive_obj.list_files(raw_path)}
         bases = sorted(
             Path(filename).with_suffix("")
-            for filename in files
-            if Path(filename).suffix == ".DSC"
+            for filename in archive_obj.list_files(raw_path)
+            if Path(filename).suffix.lower() == suffix.lower()
         )
         if not bases:
             raise ValueError(f"No raw data at {raw_path}!")
 
-        for base in bases:
-            if not archive_obj.exists(raw_path / base.with_suffix(".DTA")):
-                raise ValueError(f"{base.name}.DTA not available!")
-
-            # load data to arrays using the loader function
-            with archive_obj.temporary_path(raw_path) as data_path:
-                data, x, params = l.load_bruker_bes3t(data_path / base, "DSC", "")
-                # write intensities to dataset
-                with archive_obj.open_measurement_h5_file(hdf5_path, "a") as h5_file:
-                    idx = _get_next_rawdata_index(h5_file, "raw_data", "data_real")
-
-                    new_dataset_to_hdf5(data, h5_file, "raw_data", f"data_{idx}")
-                    new_dataset_to_hdf5(
-                        data.real, h5_file, "raw_data", f"data_real_{idx}"
-                    )
-                    new_dataset_to_hdf5(
-                        data.imag, h5_file, "raw_data", f"data_imag_{idx}"
-                    )
-
-                    # write axes-data
-                    if type(x) is list:  # multiple axes
-                        for n in range(len(x)):
-                            new_dataset_to_hdf5(
-                                x[n], h5_file, "raw_data", f"axis_{idx}_{n}"
-                            )
-                    else:  # only one xaxis
-                        new_dataset_to_hdf5(x, h5_file, "raw_data", f"xaxis_{idx}")
-
-                    # add metadata as attributes
-                    grp = h5_file.require_group("raw_data")
-                    for key, value in params.items():
-                        grp.attrs[key] = value
+        # check all data files before anything is written
+        if suffix == ".DSC":
+            for base in bases:
+                if f"{base.name}.dta".lower() not in files:
+                    raise ValueError(f"{base.name}.DTA not available!")
+
+        # the raw data are fetched and the hdf5-file is opened only once
+        with (
+            archive_obj.temporary_path(raw_path) as data_path,
+            archive_obj.open_measurement_file(hdf5_path, "a") as h5_file,
+        ):
+            for n, base in enumerate(bases, 1):
+                _raw_file_to_hdf5(data_path / base, fmt, h5_file, layout)
+                if progress is not None:
+                    progress(n / len(bases), f"{base.name} converted")
+
+    print("Raw data were successfully added to hdf5.")
+    return
+
+
+def _load_raw_file(
+    data_path: Path, fmt: str
+) -> tuple[dict[str, np.ndarray], list[str], dict]:
+    """
+    Loads one raw dataset with the loader of its format.
+
+    Parameters
+    ----------
+    data_path : Path
+        Local path of the raw data file (without extension).
+    fmt : str
+        Data format identifier.
+
+    Raises
+    ------
+    ValueError
+        If the format is unknown.
+
+    Returns
+    -------
+    tuple[dict[str, np.ndarray], list[str], dict]
+        The arrays by quantity name (main dataset first, axes as axis_<n>),
+        the quantities that get an overview and the metadata.
+    """
+    # load and save data from Bruker bes3t format
+    if fmt == "bruker_bes3t":
+        dsc = _with_suffix(data_path, ".DSC")
+        data, x, params = l.load_bruker_bes3t(data_path, dsc.suffix, "")
+        quantities = {"data_real": data.real, "data_imag": data.imag, "data": data}
+        overviews = ["data_real"]
+        if np.iscomplexobj(data):
+            overviews.append("data_imag")
+
+        if type(x) is list:  # multiple axes
+            for n in range(len(x)):
+                quantities[f"axis_{n}"] = x[n]
+        else:  # only one xaxis
+            quantities["xaxis"] = x
 
     elif fmt == "cw_epr":
-        files = archive_obj.list_files(raw_path)
-        bases = sorted(
-            Path(filename).with_suffix("")
-            for filename in files
-            if Path(filename).suffix == ".DSC"
+        spc_real, spc_imag, field, params = l.load_cw_epr(
+            _with_suffix(data_path, ".DTA")
         )
-        if not bases:
-            raise ValueError(f"No raw data at {raw_path}!")
+        quantities = {"data_real": spc_real, "data_imag": spc_imag, "field": field}
+        overviews = ["data_real", "data_imag"]
+        # the DSC-file may contain empty entries
+        params = {
+            key: value
+            for key, value in params.items()
+            if key is not None and value is not None
+        }
 
-        for base in bases:
-            if not archive_obj.exists(raw_path / base.with_suffix(".DTA")):
-                raise ValueError(f"{base.name}.DTA not available!")
-
-            # load data to arrays using the loader function
-            with archive_obj.temporary_path(raw_path) as data_path:
-                spc_real, spc_imag, field, params = l.load_cw_epr(data_path / base)
-
-                with archive_obj.open_measurement_h5_file(hdf5_path, "a") as h5_file:
-                    # write intensities to dataset
-                    idx = _get_next_rawdata_index(h5_file, "raw_data", "data_real")
-                    new_dataset_to_hdf5(
-                        spc_real, h5_file, "raw_data", f"data_real_{idx}"
-                    )
-                    new_dataset_to_hdf5(
-                        spc_imag, h5_file, "raw_data", f"data_imag_{idx}"
-                    )
-                    new_dataset_to_hdf5(field, h5_file, "raw_data", f"field_{idx}")
-
-                    # add metadata from DSC-file as attributes
-
-                    grp = h5_file.require_group("raw_data")
-                    for key, value in params.items():
-                        if key is None or value is None:
-                            continue
-                        grp.attrs[key] = value
-
-    elif fmt == "uvvis_ulm":
-        files = archive_obj.list_files(raw_path)
-        bases = sorted(
-            Path(filename).with_suffix("")
-            for filename in files
-            if Path(filename).suffix == ".txt"
-        )
-        if not bases:
-            raise ValueError(f"No raw data at {raw_path}!")
+    elif fmt == "uvvis_ulm" or fmt == "uvvis_freiburg":
+        if fmt == "uvvis_ulm":
+            wavelength, intensity, params = l.load_uvvis_ulm(
+                _with_suffix(data_path, ".txt")
+            )
+        else:
+            wavelength, intensity, params = l.load_uvvis_freiburg(
+                _with_suffix(data_path, ".txt")
+            )
+        quantities = {"intensity": intensity, "wavelength": wavelength}
+        overviews = ["intensity"]
 
-        for base in bases:
-            with archive_obj.temporary_path(raw_path) as data_path:
-                wavelength, intensity, meta = l.load_uvvis_ulm(
-                    data_path / base.with_suffix(".txt")
-                )
+    else:
+        raise ValueError(f"Data type: {fmt} unknown!")
 
-                with archive_obj.open_measurement_h5_file(hdf5_path, "a") as h5_file:
-                    idx = _get_next_rawdata_index(h5_file, "raw_data", "intensity")
+    return quantities, overviews, params
 
-                    new_dataset_to_hdf5(
-                        intensity, h5_file, "raw_data", f"intensity_{idx}"
-                    )
-                    new_dataset_to_hdf5(
-                        wavelength, h5_file, "raw_data", f"wavelength_{idx}"
-                    )
 
-                    grp = h5_file.require_group("raw_data")
-                    for key, value in meta.items():
-                        grp.attrs[key] = value
+def _indexed_name(quantity: str, idx: int) -> str:
+    """Name of a quantity in the indexed layout (axis_<n> -> axis_<idx>_<n>)."""
+    if quantity.startswith("axis_"):
+        return f"axis_{idx}_{quantity[len('axis_') :]}"
+    return f"{quantity}_{idx}"
 
-    elif fmt == "uvvis_freiburg":
-        files = archive_obj.list_files(raw_path)
-        bases = sorted(
-            Path(filename).with_suffix("")
-            for filename in files
-            if Path(filename).suffix == ".txt"
-        )
-        if not bases:
-            raise ValueError(f"No raw data at {raw_path}!")
 
-        for base in bases:
-            with archive_obj.temporary_path(raw_path) as data_path:
-                wavelength, intensity, meta = l.load_uvvis_freiburg(
-                    data_path / base.with_suffix(".txt")
-                )
+def _append_to_series(
+    h5_file: h5py.File,
+    group_name: str,
+    quantities: dict[str, np.ndarray],
+    source: str,
+) -> int:
+    """
+    Appends one raw dataset as new row to the stacked layout of a group:
+    one resizable dataset per quantity of shape (rows, *shape of the data),
+    chunked by row, and the index datasets SERIES_INDEX (time of addition)
+    and SERIES_SOURCES (name of the source file as UTF-8 string of any
+    length) with one entry per row. Only the new row is written, the
+    existing rows are not read.
+
+    Parameters
+    ----------
+    h5_file : h5py.File
+        Open HDF5 file object.
+    group_name : str
+        Name of the group of the series.
+    quantities : dict[str, np.ndarray]
+        Arrays of the new row by quantity name; None values are skipped. All
+        rows of a series must have the same quantities.
+    source : str
+        Name of the raw data file.
+
+    Raises
+    ------
+    ValueError
+        If the quantities or their shapes differ from the existing rows (the
+        series is not homogeneous); nothing is written in this case.
 
-                with archive_obj.open_measurement_h5_file(hdf5_path, "a") as h5_file:
-                    idx = _get_next_rawdata_index(h5_file, "raw_data", "intensity")
+    Returns
+    -------
+    int
+        Index of the new row.
+    """
+    grp = h5_file.require_group(group_name)
+    index = grp.get(SERIES_INDEX)
+    row = 0 if index is None else index.shape[0]
+    # missing quantities (e.g. data_imag of real spectra) are not stored
+    arrays = {
+        name: np.asarray(data) for name, data in quantities.items() if data is not None
+    }
+
+    # check all quantities before anything is written
+    if row > 0:
+        series = set(grp.keys()) - {SERIES_INDEX, SERIES_SOURCES}
+        if series != set(arrays):
+            raise ValueError(
+                f"{source} does not match the series in {group_name}: it has the "
+                f"quantities {sorted(arrays)} instead of {sorted(series)}. Use the "
+                "indexed layout instead."
+            )
+    for name, data in arrays.items():
+        if row == 0:
+            if name in grp:
+                raise ValueError(f"{group_name}/{name} exists outside of the series.")
+        elif name not in grp or grp[name].shape[1:] != data.shape:
+            raise ValueError(
+                f"{source} does not match the series in {group_name}: '{name}' "
+                f"has the shape {data.shape}. Use the indexed layout instead."
+            )
 
-                    new_dataset_to_hdf5(
-                        intensity, h5_file, "raw_data", f"intensity_{idx}"
-                    )
-                    new_dataset_to_hdf5(
-                        wavelength, h5_file, "raw_data", f"wavelength_{idx}"
-                    )
+    for name, data in arrays.items():
+        if row == 0:
+            grp.create_dataset(
+                name,
+                shape=(0, *data.shape),
+                dtype=data.dtype,
+                maxshape=(None, *data.shape),
+                chunks=(1, *data.shape),
+            )
+        ds = grp[name]
+        ds.resize(row + 1, axis=0)
+        ds[row] = data
+
+    if index is None:
+        for name, dtype in (
+            (SERIES_SOURCES, h5py.string_dtype()),
+            (SERIES_INDEX, "f8"),
+        ):
+            grp.create_dataset(
+                name,
+                shape=(0,),
+                dtype=dtype,
+                maxshape=(None,),
+                chunks=(SERIES_INDEX_CHUNKS,),
+            )
+        index = grp[SERIES_INDEX]
+    # the index is resized last, its length is the number of complete rows
+    sources = grp[SERIES_SOURCES]
+    sources.resize(row + 1, axis=0)
+    sources[row] = source
+    index.resize(row + 1, axis=0)
+    index[row] = time.time()
+    return row
+
+
+def _raw_file_to_hdf5(
+    data_path: Path,
+    fmt: str,
+    h5_file: h5py.File,
+    layout: Literal["indexed", "stacked"] = "indexed",
+) -> None:
+    """
+    Loads one raw dataset and writes it to the group 'raw_data' of an open
+    hdf5-file. In the indexed layout every quantity is a dataset of its own
+    with the next free index (data_real_0, xaxis_0, data_real_1, ...) and
+    overviews are written for the main datasets. In the stacked layout the
+    dataset is appended as new row to one dataset per quantity (data_real,
+    xaxis, ...) and listed in raw_data/series_index and
+    raw_data/series_sources.
 
-                    grp = h5_file.require_group("raw_data")
-                    for key, value in meta.items():
-                        grp.attrs[key] = value
+    Parameters
+    ----------
+    data_path : Path
+        Local path of the raw data file (without extension).
+    fmt : str
+        Data format identifier.
+    h5_file : h5py.File
+        Open HDF5 file object.
+    layout : Literal["indexed", "stacked"], optional
+        Layout of the raw data. The default is "indexed".
 
+    Returns
+    -------
+    None
+    """
+    quantities, overviews, params = _load_raw_file(data_path, fmt)
+
+    if layout == "stacked":
+        _append_to_series(h5_file, "raw_data", quantities, data_path.name)
+    elif layout == "indexed":
+        idx = _get_next_rawdata_index(h5_file, "raw_data", next(iter(quantities)))
+        for name, data in quantities.items():
+            new_dataset_to_hdf5(data, h5_file, "raw_data", _indexed_name(name, idx))
+        for name in overviews:
+            new_overview_to_hdf5(
+                quantities[name], h5_file, "raw_data", _indexed_name(name, idx)
+            )
     else:
-        raise ValueError(f"Data type: {fmt} unknown!")
+        raise ValueError(
+            f"Unknown raw data layout '{layout}'. Valid: {', '.join(RAW_DATA_LAYOUTS)}."
+        )
 
-    print("Raw data were successfully added to hdf5.")
-    return
+    # add metadata as attributes
+    grp = h5_file.require_group("raw_data")
+    for key, value in params.items():
+        grp.attrs[key] = value
 
 
 def raw_data_to_hdf5(
     ms_id: Union[str, int],
     fmt: Literal["bruker_bes3t", "cw_epr", "uvvis_ulm", "uvvis_freiburg"],
+    layout: Optional[Literal["indexed", "stacked"]] = None,
+    progress: Optional[Callable[[float, str], None]] = None,
 ) -> None:
     """
     Write all data from the raw data datafiles in the archive at
@@ -532,7 +838,13 @@ def raw_data_to_hdf5(
     to the hdf5-file
     <base_dir>/data/M<ms_id>/measurement.h5
 
-    The datasets are saved as arrays in the group 'raw_data'.
+    The datasets are saved as arrays in the group 'raw_data'. Downsampled
+    overviews of the main datasets are saved in the group 'overview'. For
+    homogeneous series (all raw files with the same shape) the stacked
+    layout stores one resizable dataset per quantity with one row per raw
+    file (data_real[n], xaxis[n], ...) and the index datasets
+    raw_data/series_index and raw_data/series_sources; appending a file then writes only its row and a
+    series is read as one contiguous array.
 
     Parameters
     ----------
@@ -540,17 +852,24 @@ def raw_data_to_hdf5(
         Measurement ID number.
     fmt : Literal["bruker_bes3t", "cw_epr", "uvvis_ulm", "uvvis_freiburg"]
         Data format identifier.
+    layout : Optional[Literal["indexed", "stacked"]], optional
+        Layout of the raw data. The default is None (the configured
+        raw_data_layout, "indexed" if not set).
+    progress : Optional[Callable[[float, str], None]], optional
+        Called with the fraction of converted raw files and a message after
+        every file (e.g. JobContext.report). The default is None.
 
     Raises
     ------
     ValueError
-        If format is unknown or required files are missing.
+        If format or layout is unknown, required files are missing or (in
+        the stacked layout) the raw files differ in shape.
 
     Returns
     -------
     None
     """
-    _raw_data_to_hdf5(archive, ms_id, fmt)
+    _raw_data_to_hdf5(archive, ms_id, fmt, layout, progress)
 
 
 def _delete_element(
@@ -603,6 +922,7 @@ def _delete_element(
             return
 
     archive_obj.delete_file(file_path)
+    mf._record_files(archive_obj, ms_id, {f"{category}/{filename}": None})
     print(f"Deleted: {file_path}")
 
     return
@@ -660,9 +980,10 @@ def _delete_measurement(archive_obj, ms_id: int, save_delete: bool = True) -> No
     -------
     None
     """
-    path = archive_obj.measurement_path(ms_id)
-    if not archive_obj.exists(path):
-        raise FileNotFoundError(f"Measurement does not exist: {path}")
+    with archive_obj.metadata_snapshot():
+        path = archive_obj.measurement_path(ms_id)
+        if not archive_obj.exists(path):
+            raise FileNotFoundError(f"Measurement does not exist: {path}")
 
     if save_delete:
         confirm = input(f"Delete WHOLE measurement directory? {path} (y/N): ")
@@ -671,6 +992,7 @@ def _delete_measurement(archive_obj, ms_id: int, save_delete: bool = True) -> No
             return
 
     archive_obj.delete_folder(path)
+    mst.forget_measurement_files(archive_obj, [ms_id])
     print(f"Measurement directory deleted: {path}")
     return
 
@@ -730,13 +1052,14 @@ def _list_files(archive_obj, ms_id: Union[str, int], category: str = "") -> list
                              Allowed values are: {CATEGORIES}"
             )
 
-    path = archive_obj.measurement_path(ms_id)
-    folder = path / category
+    with archive_obj.metadata_snapshot():
+        path = archive_obj.measurement_path(ms_id)
+        folder = path / category
 
-    if not archive_obj.exists(folder):  # return empty list
-        return []
+        if not archive_obj.exists(folder):  # return empty list
+            return []
 
-    files = archive_obj.list_files(folder)
+        files = archive_obj.list_files(folder)
 
     return files
 
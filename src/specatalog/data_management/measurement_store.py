@@ -0,0 +1,651 @@
+"""
+Storage formats of the measurement files. Every measurement has one file
+data/M<id>/measurement_M<id>.<suffix> with the groups raw_data,
+corrected_data, evaluations and overview. Two formats are available:
+
+- "hdf5" (.h5): one HDF5 file. Archives without direct file access copy
+  the whole file for every access.
+- "zarr" (.zarr, requires zarr): a Zarr v3 directory store. Every chunk
+  is a file of its own, so reading one dataset fetches only its chunks and
+  writes only upload the changed chunks; writers of different groups do
+  not overwrite each other.
+
+Both formats are opened through SpecatalogArchive.open_measurement_file and
+offer the same h5py-like interface (groups, datasets and attrs), so
+H5Object, load_many and the data loaders work with either. The format of
+new measurements is set by measurement_format in the configuration;
+convert_measurement() converts existing measurements.
+"""
+
+import asyncio
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from pathlib import Path, PurePosixPath
+from typing import Any, AsyncIterator, Iterator, Literal, Optional, Union
+
+import h5py
+import numpy as np
+
+from specatalog.config import MEASUREMENT_FORMAT, MEASUREMENTS_PATH
+
+try:
+    import zarr
+    from zarr.abc.store import (
+        OffsetByteRequest,
+        RangeByteRequest,
+        Store,
+        SuffixByteRequest,
+    )
+except ImportError:  # optional dependency
+    zarr = None
+    Store = object
+
+MEASUREMENT_FORMATS = {"hdf5": ".h5", "zarr": ".zarr"}
+
+
+def measurement_file_name(ms_id: int, fmt: str = "hdf5") -> str:
+    """Name of the measurement file of a measurement in the given format."""
+    if fmt not in MEASUREMENT_FORMATS:
+        raise ValueError(
+            f"Unknown measurement format '{fmt}'. "
+            f"Valid: {', '.join(MEASUREMENT_FORMATS)}."
+        )
+    return f"measurement_M{ms_id}{MEASUREMENT_FORMATS[fmt]}"
+
+
+# measurement files found by find_measurement_file per archive object
+_measurement_files: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+_measurement_files_lock = threading.Lock()
+
+
+def find_measurement_file(archive_obj, ms_id: int) -> Path:
+    """
+    Path of the measurement file of a measurement relative to the archive
+    root. The file in the configured measurement_format is looked for first,
+    then the other format (only if zarr is installed). If there is no file,
+    the path in the configured format is returned. Found files are cached
+    per archive object, so repeated reads need no round trip (see
+    forget_measurement_files).
+    """
+    ms_id = int(ms_id)
+    with _measurement_files_lock:
+        known = _measurement_files.setdefault(archive_obj, {})
+    if ms_id in known:
+        return known[ms_id]
+
+    formats = sorted(MEASUREMENT_FORMATS, key=lambda fmt: fmt != MEASUREMENT_FORMAT)
+    if zarr is None:
+        formats.remove("zarr")
+    base = MEASUREMENTS_PATH / f"M{ms_id}"
+    paths = [base / measurement_file_name(ms_id, fmt) for fmt in formats]
+    if len(paths) == 1:
+        return paths[0]
+    for p in paths:
+        if archive_obj.exists(p):
+            known[ms_id] = p
+            return p
+    return paths[0]
+
+
+def forget_measurement_files(archive_obj, ids=None) -> None:
+    """
+    Removes measurements from the cache of find_measurement_file, e.g. after
+    their directories were deleted or their files were converted by another
+    process.
+
+    Parameters
+    ----------
+    archive_obj
+        Archive object with file operations.
+    ids : Iterable[int], optional
+        Measurement IDs. The default is None (all measurements).
+    """
+    known = _measurement_files.get(archive_obj)
+    if known is None:
+        return
+    if ids is None:
+        known.clear()
+    else:
+        for ms_id in ids:
+            known.pop(int(ms_id), None)
+
+
+def format_of(p: Union[str, Path]) -> str:
+    """Format of a measurement file ("hdf5" or "zarr") from its suffix."""
+    return "zarr" if Path(p).suffix == MEASUREMENT_FORMATS["zarr"] else "hdf5"
+
+
+def is_group(node: Any) -> bool:
+    """True if node is a group of a measurement file of any format."""
+    return isinstance(node, (h5py.Group, ZarrGroup))
+
+
+def is_dataset(node: Any) -> bool:
+    """True if node is a dataset of a measurement file of any format."""
+    return isinstance(node, (h5py.Dataset, ZarrDataset))
+
+
+def _to_json(value: Any) -> Any:
+    """Converts an attribute value to a JSON-compatible value."""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, bytes):
+        return value.decode()
+    if isinstance(value, (list, tuple)):
+        return [_to_json(v) for v in value]
+    return value
+
+
+def _from_json(value: Any) -> Any:
+    """Converts a list attribute back to an array (as h5py returns it)."""
+    if isinstance(value, list):
+        return np.asarray(value)
+    return value
+
+
+class ZarrAttrs(MutableMapping):
+    """Attributes of a Zarr group or array with h5py-like value types."""
+
+    def __init__(self, attrs):
+        self._attrs = attrs
+
+    def __getitem__(self, key: str) -> Any:
+        return _from_json(self._attrs[key])
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._attrs[key] = _to_json(value)
+
+    def __delitem__(self, key: str) -> None:
+        del self._attrs[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._attrs.asdict())
+
+    def __len__(self) -> int:
+        return len(self._attrs.asdict())
+
+
+class ZarrDataset:
+    """h5py-like view of a Zarr array."""
+
+    def __init__(self, array, root: "ZarrGroup"):
+        self._array = array
+        self.file = root
+
+    def __getitem__(self, selection) -> Any:
+        value = self._array[selection]
+        # h5py returns numpy scalars for scalar datasets
+        if isinstance(value, np.ndarray) and value.ndim == 0:
+            return value[()]
+        return value
+
+    def __setitem__(self, selection, value) -> None:
+        self._array[selection] = value
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self._array[...], dtype=dtype)
+
+    @property
+    def name(self) -> str:
+        return self._array.name
+
+    @property
+    def shape(self) -> tuple:
+        return self._array.shape
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._array.dtype
+
+    @property
+    def ndim(self) -> int:
+        return self._array.ndim
+
+    @property
+    def chunks(self) -> tuple:
+        return self._array.chunks
+
+    @property
+    def maxshape(self) -> tuple:
+        # Zarr arrays can be resized along every axis
+        return (None,) * self._array.ndim
+
+    @property
+    def attrs(self) -> ZarrAttrs:
+        return ZarrAttrs(self._array.attrs)
+
+    def resize(self, size: Union[int, tuple], axis: Optional[int] = None) -> None:
+        """Resize the array (same arguments as h5py.Dataset.resize)."""
+        if axis is not None:
+            shape = list(self.shape)
+            shape[axis] = size
+            size = tuple(shape)
+        elif isinstance(size, int):
+            size = (size,)
+        self._array.resize(size)
+
+
+class ZarrGroup:
+    """
+    h5py-like view of a Zarr group. Supports the subset of the h5py.Group
+    interface that is used for measurement files: item access with paths,
+    membership, iteration, attrs, create_group/require_group/create_dataset
+    and deletion.
+    """
+
+    def __init__(self, group, root: Optional["ZarrGroup"] = None):
+        self._group = group
+        self.file = self if root is None else root
+
+    def _wrap(self, node):
+        if isinstance(node, zarr.Group):
+            return ZarrGroup(node, self.file)
+        return ZarrDataset(node, self.file)
+
+    @property
+    def name(self) -> str:
+        return self._group.name
+
+    @property
+    def attrs(self) -> ZarrAttrs:
+        return ZarrAttrs(self._group.attrs)
+
+    def __getitem__(self, key: str):
+        return self._wrap(self._group[key.strip("/")])
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key: str) -> bool:
+        return key.strip("/") in self._group
+
+    def __delitem__(self, key: str) -> None:
+        del self._group[key.strip("/")]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def keys(self) -> list[str]:
+        return sorted(self._group.keys())
+
+    def items(self) -> list[tuple[str, Any]]:
+        return sorted(
+            ((key, self._wrap(node)) for key, node in self._group.members()),
+            key=lambda item: item[0],
+        )
+
+    def create_group(self, name: str) -> "ZarrGroup":
+        if name.strip("/") in self._group:
+            raise ValueError(f"Unable to create group (name already exists): {name}")
+        return ZarrGroup(self._group.create_group(name.strip("/")), self.file)
+
+    def require_group(self, name: str) -> "ZarrGroup":
+        return ZarrGroup(self._group.require_group(name.strip("/")), self.file)
+
+    def create_dataset(
+        self,
+        name: str,
+        shape: Optional[tuple] = None,
+        dtype=None,
+        data=None,
+        chunks: Optional[tuple] = None,
+        maxshape: Optional[tuple] = None,
+        **kwargs,
+    ) -> ZarrDataset:
+        """Create an array (h5py-like arguments; maxshape is ignored because
+        Zarr arrays can always be resized, compression options of h5py are
+        not supported)."""
+        name = name.strip("/")
+        if dtype is not None and h5py.check_string_dtype(np.dtype(dtype)):
+            dtype = str  # variable-length UTF-8 strings
+        parent, _, _ = name.rpartition("/")
+        if parent:
+            self._group.require_group(parent)
+        if data is not None:
+            data = np.asarray(data)
+            if shape is not None and tuple(shape) != data.shape:
+                data = data.reshape(shape)
+            if dtype is not None:
+                data = data.astype(dtype)
+            array = self._group.create_array(name, data=data, chunks=chunks or "auto")
+        else:
+            array = self._group.create_array(
+                name, shape=shape, dtype=dtype, chunks=chunks or "auto"
+            )
+        return ZarrDataset(array, self.file)
+
+    def flush(self) -> None:
+        """Zarr writes every change immediately; nothing to flush."""
+
+    def close(self) -> None:
+        """Nothing to close (for compatibility with h5py.File)."""
+
+
+class _ArchiveZarrStore(Store):
+    """Zarr store in a directory of an archive backend without direct file
+    access (SMB, memory). Every key is one file that is read or written on
+    its own; blocking calls run in threads, so chunks are fetched in
+    parallel."""
+
+    supports_writes = True
+    supports_deletes = True
+    supports_partial_writes = False
+    supports_listing = True
+
+    def __init__(self, backend, root: Union[str, Path], read_only: bool = False):
+        super().__init__(read_only=read_only)
+        self.backend = backend
+        self.root = PurePosixPath(Path(root).as_posix())
+
+    def __eq__(self, other: object) -> bool:
+        return (
+            isinstance(other, _ArchiveZarrStore)
+            and other.backend is self.backend
+            and other.root == self.root
+        )
+
+    def _read(self, key: str) -> Optional[bytes]:
+        try:
+            with self.backend.open(self.root / key, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write(self, key: str, data: bytes) -> None:
+        p = self.root / key
+        self.backend.makedirs(p.parent)
+        with self.backend.open(p, "wb") as f:
+            f.write(data)
+
+    def _walk(self, p: PurePosixPath) -> list[str]:
+        if not self.backend.isdir(p):
+            return []
+        keys = []
+        for entry in self.backend.scandir(p):
+            if entry.is_dir:
+                keys.extend(self._walk(p / entry.name))
+            else:
+                keys.append(str((p / entry.name).relative_to(self.root)))
+        return keys
+
+    async def get(self, key, prototype, byte_range=None):
+        data = await asyncio.to_thread(self._read, key)
+        if data is None:
+            return None
+        if isinstance(byte_range, RangeByteRequest):
+            data = data[byte_range.start : byte_range.end]
+        elif isinstance(byte_range, OffsetByteRequest):
+            data = data[byte_range.offset :]
+        elif isinstance(byte_range, SuffixByteRequest):
+            data = data[-byte_range.suffix :]
+        return prototype.buffer.from_bytes(data)
+
+    async def get_partial_values(self, prototype, key_ranges):
+        return await asyncio.gather(
+            *(self.get(key, prototype, byte_range) for key, byte_range in key_ranges)
+        )
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread(self.backend.isfile, self.root / key)
+
+    async def set(self, key: str, value) -> None:
+        self._check_writable()
+        await asyncio.to_thread(self._write, key, value.to_bytes())
+
+    async def delete(self, key: str) -> None:
+        self._check_writable()
+        p = self.root / key
+        if await asyncio.to_thread(self.backend.isfile, p):
+            await asyncio.to_thread(self.backend.unlink, p)
+
+    async def list(self) -> AsyncIterator[str]:
+        for key in await asyncio.to_thread(self._walk, self.root):
+            yield key
+
+    async def list_prefix(self, prefix: str) -> AsyncIterator[str]:
+        for key in await asyncio.to_thread(self._walk, self.root):
+            if key.startswith(prefix):
+                yield key
+
+    async def list_dir(self, prefix: str) -> AsyncIterator[str]:
+        p = self.root / prefix.strip("/")
+        if await asyncio.to_thread(self.backend.isdir, p):
+            for entry in await asyncio.to_thread(self.backend.scandir, p):
+                yield entry.name
+
+
+class MeasurementStore(ABC):
+    """Opens measurement files of one format in an archive."""
+
+    #: name of the format as used in the configuration
+    name: str = ""
+
+    @abstractmethod
+    def open(self, archive_obj, p: Union[str, Path], mode: str):
+        """Context manager that yields the root group of the measurement
+        file p (h5py.File or an object with the same interface)."""
+
+
+class HDF5Store(MeasurementStore):
+    """Measurement files as single HDF5 files."""
+
+    name = "hdf5"
+
+    def open(self, archive_obj, p, mode):
+        return archive_obj.open_measurement_h5_file(p, mode)
+
+
+class ZarrStore(MeasurementStore):
+    """Measurement files as Zarr v3 directory stores."""
+
+    name = "zarr"
+
+    @contextmanager
+    def open(self, archive_obj, p, mode):
+        if zarr is None:
+            raise ImportError(
+                "Zarr measurement files require zarr (pip install specatalog[zarr])."
+            )
+        local = archive_obj.backend.local_path(p)
+        if local is not None:
+            store = zarr.storage.LocalStore(local, read_only=(mode == "r"))
+        else:
+            store = _ArchiveZarrStore(archive_obj.backend, p, read_only=(mode == "r"))
+        if mode == "r" and not archive_obj.exists(p):
+            raise FileNotFoundError(f"{archive_obj.archive / p} does not exist.")
+        yield ZarrGroup(zarr.open_group(store, mode=mode, zarr_format=3))
+
+
+STORES: dict[str, MeasurementStore] = {"hdf5": HDF5Store(), "zarr": ZarrStore()}
+
+
+def _copy_node(src, dst) -> None:
+    """Copies all attributes, groups and datasets of src into dst."""
+    for key, value in src.attrs.items():
+        dst.attrs[key] = value
+    for key, item in src.items():
+        if is_group(item):
+            _copy_node(item, dst.require_group(key))
+        else:
+            ds = dst.create_dataset(key, data=item[()])
+            for attr, value in item.attrs.items():
+                ds.attrs[attr] = value
+
+
+def _delete_measurement_file(archive_obj, p: Path) -> None:
+    """Deletes a measurement file (HDF5 file or Zarr directory)."""
+    if format_of(p) == "zarr":
+        archive_obj.delete_folder(p)
+    else:
+        archive_obj.delete_file(p)
+
+
+def _convert_measurement(
+    archive_obj, ms_id: int, fmt: Literal["hdf5", "zarr"], keep_source: bool = False
+) -> Path:
+    """
+    Converts the measurement file of a measurement to another format (see
+    convert_measurement).
+
+    Parameters
+    ----------
+    archive_obj
+        Archive object with file operations.
+    ms_id : int
+        Measurement ID number.
+    fmt : Literal["hdf5", "zarr"]
+        Target format.
+    keep_source : bool, optional
+        Keep the original file. The default is False.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the measurement has no measurement file.
+
+    Returns
+    -------
+    Path
+        Path of the new measurement file relative to the archive root.
+    """
+    src = find_measurement_file(archive_obj, ms_id)
+    dst = src.with_name(measurement_file_name(ms_id, fmt))
+    if not archive_obj.exists(src):
+        raise FileNotFoundError(f"{archive_obj.archive / src} does not exist.")
+    if src == dst:
+        print(f"Measurement {ms_id} is already stored as {fmt}.")
+        return dst
+
+    if archive_obj.exists(dst):
+        _delete_measurement_file(archive_obj, dst)
+    with (
+        archive_obj.open_measurement_file(src, "r") as f_src,
+        archive_obj.open_measurement_file(dst, "w") as f_dst,
+    ):
+        _copy_node(f_src, f_dst)
+
+    if not keep_source:
+        _delete_measurement_file(archive_obj, src)
+    forget_measurement_files(archive_obj, [ms_id])
+    print(f"Converted {src} to {dst}.")
+    return dst
+
+
+def convert_measurement(
+    ms_id: int, fmt: Literal["hdf5", "zarr"], keep_source: bool = False
+) -> Path:
+    """
+    Converts the measurement file of a measurement to another format. All
+    groups, datasets and attributes are copied; afterwards the original file
+    is deleted unless keep_source is True (if both files are kept, the one
+    in the configured measurement_format is used).
+
+    Parameters
+    ----------
+    ms_id : int
+        Measurement ID number.
+    fmt : Literal["hdf5", "zarr"]
+        Target format.
+    keep_source : bool, optional
+        Keep the original file. The default is False.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the measurement has no measurement file.
+
+    Returns
+    -------
+    Path
+        Path of the new measurement file relative to the archive root.
+
+    Example
+    -------
+    >>> for ms_id in range(100, 200):
+    >>>     convert_measurement(ms_id, "zarr")
+    """
+    from specatalog.main import archive
+
+    return _convert_measurement(archive, ms_id, fmt, keep_source)
+
+
+def benchmark(
+    n_datasets: int = 20,
+    points: int = 100_000,
+    latency: float = 0.0,
+    bandwidth: Optional[float] = None,
+) -> dict[str, dict[str, float]]:
+    """
+    Compares the formats on a simulated remote archive (MemoryBackend): a
+    measurement with n_datasets datasets in raw_data is written, then one
+    dataset is read (partial read) and one dataset is added (append).
+
+    Parameters
+    ----------
+    n_datasets : int, optional
+        Number of datasets of the measurement. The default is 20.
+    points : int, optional
+        Number of float64 values per dataset. The default is 100000.
+    latency : float, optional
+        Simulated round-trip time in seconds. The default is 0.
+    bandwidth : float, optional
+        Simulated bandwidth in bytes per second. The default is None
+        (unlimited).
+
+    Returns
+    -------
+    dict[str, dict[str, float]]
+        Per format and operation ("partial_read", "append") the keys
+        "seconds", "round_trips" and "bytes" (bytes transferred).
+    """
+    from specatalog.data_management.archive_backends import MemoryBackend
+    from specatalog.data_management.archive_manager import SpecatalogArchive
+
+    rng = np.random.default_rng(0)
+    data = rng.standard_normal((n_datasets, points))
+    formats = [fmt for fmt in MEASUREMENT_FORMATS if fmt != "zarr" or zarr]
+
+    results = {}
+    for fmt in formats:
+        backend = MemoryBackend(latency=latency, bandwidth=bandwidth)
+        archive_obj = SpecatalogArchive(False, backend=backend)
+        archive_obj.make_dir("data/M1")
+        p = MEASUREMENTS_PATH / "M1" / measurement_file_name(1, fmt)
+        with archive_obj.open_measurement_file(p, "w") as f:
+            for n, row in enumerate(data):
+                f.create_dataset(f"raw_data/data_real_{n}", data=row)
+
+        def measure(operation, mode, backend=backend, archive_obj=archive_obj, p=p):
+            backend.reset_stats()
+            start = time.perf_counter()
+            with archive_obj.open_measurement_file(p, mode) as f:
+                operation(f)
+            return {
+                "seconds": time.perf_counter() - start,
+                "round_trips": backend.round_trips,
+                "bytes": backend.bytes_transferred,
+            }
+
+        results[fmt] = {
+            "partial_read": measure(lambda f: f["raw_data/data_real_0"][()], "r"),
+            "append": measure(
+                lambda f: f.create_dataset("raw_data/data_real_new", data=data[0]),
+                "a",
+            ),
+        }
+    return results
@@ -0,0 +1,566 @@
+"""
+Similarity search over the spectra of the archive. Every measurement gets a
+fingerprint: its main spectrum (first raw dataset) resampled to a common
+axis grid of its method, mean-centered and normalized to unit length. The
+cosine similarity of two spectra is then the dot product of their
+fingerprints.
+
+The fingerprints of one method are stored as a compact float32 matrix in
+index/similarity_<method>.npz in the archive. The k nearest neighbours of a
+spectrum are found by a vectorized brute-force search or, approximately, by
+searching only the clusters (k-means on the fingerprints) that are closest
+to the query.
+"""
+
+import argparse
+import io
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+
+import specatalog.data_management.measurement_store as mst
+import specatalog.models.measurements as ms
+from specatalog.main import archive, db_session
+
+INDEX_DIR = Path("index")
+# number of points of the common axis grid of a method
+FINGERPRINT_POINTS = 256
+# intermediate resolution of the spectra while the grid is not yet known
+_BUFFER_POINTS = 2 * FINGERPRINT_POINTS
+# main dataset of a measurement and the names of its possible axes (indexed
+# and stacked raw data layout)
+_SPECTRUM_DATASETS = (
+    ("data_real_0", ("xaxis_0", "field_0", "axis_0_0", "axis_0_1")),
+    ("intensity_0", ("wavelength_0",)),
+    ("data_real", ("xaxis", "field", "axis_0", "axis_1")),
+    ("intensity", ("wavelength",)),
+)
+
+
+def index_path(method: str) -> Path:
+    """Path of the similarity index of a method relative to the archive root."""
+    return INDEX_DIR / f"similarity_{method}.npz"
+
+
+def _spectrum_from_h5(h5_file) -> Optional[tuple[np.ndarray, np.ndarray]]:
+    """
+    Reads the main spectrum (axis, intensity) of an open measurement file.
+    Of two-dimensional data (e.g. trEPR) or stacked series the slice along
+    the last axis with the largest norm is used (with the axis of the first
+    row). Returns None if the file has no raw data.
+    """
+    group = h5_file.get("raw_data")
+    if group is None:
+        return None
+    for data_name, axis_names in _SPECTRUM_DATASETS:
+        if data_name not in group:
+            continue
+        y = np.real(group[data_name][()]).astype(float)
+        if y.ndim > 1:
+            y = y.reshape(-1, y.shape[-1])
+            y = y[np.argmax(np.linalg.norm(y, axis=1))]
+        x = next(
+            (
+                group[name][()].astype(float).reshape(-1, y.size)[0]
+                for name in axis_names
+                if name in group and group[name].shape[-1:] == y.shape
+            ),
+            np.arange(y.size, dtype=float),
+        )
+        return x, y
+    return None
+
+
+def _read_spectrum(archive_obj, ms_id: int) -> Optional[tuple[np.ndarray, np.ndarray]]:
+    """Main spectrum of a measurement (None if it has no hdf5 raw data)."""
+    try:
+        p = mst.find_measurement_file(archive_obj, ms_id)
+        if not archive_obj.exists(p):
+            return None
+        with archive_obj.open_measurement_file(p, "r") as f:
+            return _spectrum_from_h5(f)
+    except (FileNotFoundError, OSError):
+        return None
+
+
+def fingerprint(x: np.ndarray, y: np.ndarray, grid: np.ndarray) -> np.ndarray:
+    """
+    Computes the fingerprint of a spectrum on an axis grid. The spectrum is
+    linearly interpolated (zero outside its axis range), mean-centered and
+    normalized to unit length.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        Axis of the spectrum.
+    y : np.ndarray
+        Intensities of the spectrum.
+    grid : np.ndarray
+        Common axis grid of the method.
+
+    Returns
+    -------
+    np.ndarray
+        float32 vector with len(grid) elements (zero for a flat spectrum).
+    """
+    order = np.argsort(x)
+    v = np.interp(grid, x[order], y[order], left=0.0, right=0.0)
+    v -= v.mean()
+    norm = np.linalg.norm(v)
+    if norm > 0:
+        v /= norm
+    return v.astype(np.float32)
+
+
+@dataclass
+class SimilarityIndex:
+    """
+    Fingerprints of all indexed measurements of one method.
+
+    Attributes
+    ----------
+    method : str
+        Measurement method (e.g. "cwepr").
+    grid : np.ndarray
+        Common axis grid of the fingerprints.
+    ids : np.ndarray
+        Measurement ids (int64), one per row of vectors.
+    vectors : np.ndarray
+        float32 matrix of the fingerprints (len(ids) x len(grid)).
+    centroids : np.ndarray or None
+        Cluster centers for the approximate search (see train()).
+    labels : np.ndarray or None
+        Cluster of every fingerprint.
+    """
+
+    method: str
+    grid: np.ndarray
+    ids: np.ndarray
+    vectors: np.ndarray
+    centroids: Optional[np.ndarray] = None
+    labels: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, ids, vectors: np.ndarray) -> None:
+        """
+        Adds fingerprints; existing entries of the same ids are replaced. The
+        clustering of the approximate search is discarded.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        keep = ~np.isin(self.ids, ids)
+        self.ids = np.concatenate([self.ids[keep], ids])
+        self.vectors = np.vstack([self.vectors[keep], vectors]).astype(np.float32)
+        self.centroids = None
+        self.labels = None
+
+    def remove(self, ids) -> None:
+        """Removes the fingerprints of measurements (e.g. after deletion)."""
+        keep = ~np.isin(self.ids, np.asarray(ids, dtype=np.int64))
+        self.ids = self.ids[keep]
+        self.vectors = self.vectors[keep]
+        if self.labels is not None:
+            self.labels = self.labels[keep]
+
+    def train(
+        self, n_clusters: Optional[int] = None, iterations: int = 10, seed: int = 0
+    ) -> None:
+        """
+        Clusters the fingerprints (spherical k-means) for the approximate
+        search.
+
+        Parameters
+        ----------
+        n_clusters : Optional[int], optional
+            Number of clusters. The default is sqrt(number of fingerprints).
+        iterations : int, optional
+            Number of k-means iterations. The default is 10.
+        seed : int, optional
+            Seed of the random initialization. The default is 0.
+        """
+        n = len(self)
+        if n == 0:
+            return
+        n_clusters = min(n, n_clusters or max(1, int(np.sqrt(n))))
+        rng = np.random.default_rng(seed)
+        centroids = self.vectors[rng.choice(n, n_clusters, replace=False)]
+        for _ in range(iterations):
+            labels = np.argmax(self.vectors @ centroids.T, axis=1)
+            order = np.argsort(labels, kind="stable")
+            present, starts = np.unique(labels[order], return_index=True)
+            sums = np.zeros_like(centroids)
+            sums[present] = np.add.reduceat(self.vectors[order], starts, axis=0)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # empty clusters keep their center
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+        self.centroids = centroids.astype(np.float32)
+        self.labels = np.argmax(self.vectors @ self.centroids.T, axis=1)
+
+    def search(
+        self,
+        vector: np.ndarray,
+        k: int = 10,
+        approximate: bool = False,
+        n_probe: int = 8,
+    ) -> list[tuple[int, float]]:
+        """
+        Finds the k fingerprints that are most similar to a fingerprint.
+
+        Parameters
+        ----------
+        vector : np.ndarray
+            Fingerprint of the query spectrum (see fingerprint()).
+        k : int, optional
+            Number of neighbours. The default is 10.
+        approximate : bool, optional
+            Only search the n_probe clusters closest to the query. The index
+            is trained first if necessary. The default is False.
+        n_probe : int, optional
+            Number of searched clusters. The default is 8.
+
+        Returns
+        -------
+        list[tuple[int, float]]
+            (measurement id, cosine similarity), most similar first.
+        """
+        vector = np.asarray(vector, dtype=np.float32)
+        candidates = np.arange(len(self))
+        if approximate and len(self):
+            if self.centroids is None:
+                self.train()
+            closest = np.argsort(self.centroids @ vector)[::-1][:n_probe]
+            candidates = np.flatnonzero(np.isin(self.labels, closest))
+
+        scores = self.vectors[candidates] @ vector
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(scores[top])[::-1]]
+        return [(int(self.ids[candidates[i]]), float(scores[i])) for i in top]
+
+    def save(self, archive_obj) -> None:
+        """Writes the index to index/similarity_<method>.npz in the archive."""
+        arrays = dict(grid=self.grid, ids=self.ids, vectors=self.vectors)
+        if self.centroids is not None:
+            arrays.update(centroids=self.centroids, labels=self.labels)
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        archive_obj.make_dir(INDEX_DIR)
+        with archive_obj.open_file(index_path(self.method), "wb") as f:
+            f.write(buffer.getvalue())
+
+    @classmethod
+    def load(cls, archive_obj, method: str) -> "SimilarityIndex":
+        """
+        Reads the index of a method from the archive.
+
+        Raises
+        ------
+        FileNotFoundError
+            If the method has not been indexed yet.
+        """
+        p = index_path(method)
+        if not archive_obj.exists(p):
+            raise FileNotFoundError(f"No similarity index for '{method}'.")
+        with archive_obj.open_file(p, "rb") as f:
+            arrays = np.load(io.BytesIO(f.read()))
+            return cls(
+                method,
+                arrays["grid"],
+                arrays["ids"],
+                arrays["vectors"],
+                arrays["centroids"] if "centroids" in arrays else None,
+                arrays["labels"] if "labels" in arrays else None,
+            )
+
+
+def _build_similarity_index(
+    archive_obj,
+    session: db_session,
+    method: str,
+    points: int = FINGERPRINT_POINTS,
+    rebuild: bool = False,
+    progress: Optional[Callable[[float, str], None]] = None,
+) -> SimilarityIndex:
+    """
+    Computes the fingerprints of all measurements of a method and saves the
+    index in the archive. Without rebuild an existing index is updated: only
+    new measurements are read (on the existing grid) and deleted ones are
+    removed.
+
+    Parameters
+    ----------
+    archive_obj
+        Archive object with file operations.
+    session : db_session
+        Object of the class db_session.
+    method : str
+        Measurement method (polymorphic identity, e.g. "cwepr").
+    points : int, optional
+        Number of grid points of a new index. The default is
+        FINGERPRINT_POINTS.
+    rebuild : bool, optional
+        Recompute the grid and all fingerprints. The default is False.
+    progress : Optional[Callable[[float, str], None]], optional
+        Called with the fraction of read spectra and a message (e.g.
+        JobContext.report). The default is None.
+
+    Returns
+    -------
+    SimilarityIndex
+        The saved index.
+    """
+    ids = [
+        row[0]
+        for row in session.query(ms.Measurement.id)
+        .filter(ms.Measurement._method == method)
+        .order_by(ms.Measurement.id)
+    ]
+    index = None
+    if not rebuild:
+        try:
+            index = SimilarityIndex.load(archive_obj, method)
+        except FileNotFoundError:
+            pass
+
+    if index is not None:
+        index.remove(np.setdiff1d(index.ids, ids))
+        known = set(index.ids.tolist())
+        new_ids = [i for i in ids if i not in known]
+        spectra = {}
+        for n, i in enumerate(new_ids, 1):
+            spectra[i] = _read_spectrum(archive_obj, i)
+            if progress is not None:
+                progress(n / len(new_ids), f"M{i} read")
+        spectra = {i: s for i, s in spectra.items() if s is not None}
+        if spectra:
+            index.add(
+                list(spectra),
+                np.array([fingerprint(x, y, index.grid) for x, y in spectra.values()]),
+            )
+    else:
+        # the spectra are buffered on their own axis until the range of the
+        # common grid is known
+        buffered = {}
+        for n, i in enumerate(ids, 1):
+            spectrum = _read_spectrum(archive_obj, i)
+            if progress is not None:
+                progress(n / len(ids), f"M{i} read")
+            if spectrum is None:
+                continue
+            x, y = spectrum
+            own = np.linspace(x.min(), x.max(), min(x.size, _BUFFER_POINTS))
+            order = np.argsort(x)
+            buffered[i] = (own, np.interp(own, x[order], y[order]).astype(np.float32))
+
+        if buffered:
+            start = min(x[0] for x, _ in buffered.values())
+            stop = max(x[-1] for x, _ in buffered.values())
+        else:
+            start, stop = 0.0, 1.0
+        grid = np.linspace(start, stop, points)
+        vectors = np.array(
+            [fingerprint(x, y, grid) for x, y in buffered.values()],
+            dtype=np.float32,
+        ).reshape(-1, points)
+        index = SimilarityIndex(
+            method, grid, np.array(list(buffered), dtype=np.int64), vectors
+        )
+
+    index.train()
+    index.save(archive_obj)
+    print(f"Similarity index of '{method}': {len(index)} measurements.")
+    return index
+
+
+def build_similarity_index(
+    method: str,
+    points: int = FINGERPRINT_POINTS,
+    rebuild: bool = False,
+    progress: Optional[Callable[[float, str], None]] = None,
+) -> SimilarityIndex:
+    """
+    Computes the fingerprints of all measurements of a method and saves the
+    index in the archive (index/similarity_<method>.npz). Without rebuild an
+    existing index is updated with new and deleted measurements.
+
+    Parameters
+    ----------
+    method : str
+        Measurement method (e.g. "cwepr", "trepr", "uvvis").
+    points : int, optional
+        Number of grid points of a new index. The default is 256.
+    rebuild : bool, optional
+        Recompute the grid and all fingerprints, e.g. if new measurements
+        cover a different axis range. The default is False.
+    progress : Optional[Callable[[float, str], None]], optional
+        Called with the fraction of read spectra and a message (e.g.
+        JobContext.report). The default is None.
+
+    Returns
+    -------
+    SimilarityIndex
+        The saved index.
+    """
+    with db_session() as session:
+        return _build_similarity_index(
+            archive, session, method, points, rebuild, progress
+        )
+
+
+def _similar_measurements(
+    archive_obj,
+    session: db_session,
+    ms_id: int,
+    k: int = 10,
+    approximate: bool = False,
+) -> list[tuple[int, float]]:
+    """
+    Finds the k measurements of the same method whose spectra are most
+    similar to the spectrum of a measurement (see similar_measurements).
+    """
+    measurement = session.get(ms.Measurement, ms_id)
+    if measurement is None:
+        raise ValueError(f"No measurement with the id={ms_id} found.")
+    index = SimilarityIndex.load(archive_obj, measurement.method)
+
+    row = np.flatnonzero(index.ids == ms_id)
+    if row.size:
+        vector = index.vectors[row[0]]
+    else:
+        spectrum = _read_spectrum(archive_obj, ms_id)
+        if spectrum is None:
+            raise ValueError(f"Measurement {ms_id} has no raw data.")
+        vector = fingerprint(*spectrum, index.grid)
+
+    neighbours = index.search(vector, k + 1, approximate=approximate)
+    return [n for n in neighbours if n[0] != ms_id][:k]
+
+
+def similar_measurements(
+    ms_id: int, k: int = 10, approximate: bool = False
+) -> list[tuple[int, float]]:
+    """
+    Finds the k measurements of the same method whose spectra are most
+    similar to the spectrum of a measurement. The measurement itself does
+    not have to be indexed yet.
+
+    Parameters
+    ----------
+    ms_id : int
+        Measurement ID.
+    k : int, optional
+        Number of results. The default is 10.
+    approximate : bool, optional
+        Use the faster cluster-based search instead of comparing with all
+        spectra. The default is False.
+
+    Raises
+    ------
+    ValueError
+        If the measurement does not exist or has no raw data.
+    FileNotFoundError
+        If the method of the measurement has not been indexed.
+
+    Returns
+    -------
+    list[tuple[int, float]]
+        (measurement id, cosine similarity), most similar first.
+
+    Example
+    -------
+    >>> build_similarity_index("cwepr")
+    >>> similar_measurements(222, k=5)
+    [(310, 0.98), (17, 0.95), ...]
+    """
+    with db_session() as session:
+        return _similar_measurements(archive, session, ms_id, k, approximate)
+
+
+def benchmark(
+    n: int = 100_000, points: int = FINGERPRINT_POINTS, k: int = 10, queries: int = 20
+) -> dict:
+    """
+    Measures the query time of the brute-force and the approximate search on
+    synthetic spectra (one line of random position and width plus noise)
+    and the recall of the approximate search.
+
+    Returns
+    -------
+    dict
+        Mean seconds per query ("brute_force", "approximate"), training
+        time ("train") and recall of the approximate search.
+    """
+    rng = np.random.default_rng(0)
+    grid = np.linspace(0, 1, points, dtype=np.float32)
+    centers = rng.uniform(0.1, 0.9, (n, 1)).astype(np.float32)
+    widths = rng.uniform(0.01, 0.1, (n, 1)).astype(np.float32)
+    vectors = np.exp(-((grid - centers) ** 2) / (2 * widths**2))
+    vectors += rng.normal(0, 0.05, vectors.shape).astype(np.float32)
+    vectors -= vectors.mean(axis=1, keepdims=True)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    index = SimilarityIndex("benchmark", grid, np.arange(n), vectors)
+
+    start = time.perf_counter()
+    index.train()
+    result = {"train": time.perf_counter() - start}
+
+    hits = 0
+    times = {"brute_force": 0.0, "approximate": 0.0}
+    for q in vectors[rng.choice(n, queries, replace=False)]:
+        start = time.perf_counter()
+        exact = {i for i, _ in index.search(q, k)}
+        times["brute_force"] += time.perf_counter() - start
+        start = time.perf_counter()
+        approx = {i for i, _ in index.search(q, k, approximate=True)}
+        times["approximate"] += time.perf_counter() - start
+        hits += len(exact & approx)
+
+    result.update({key: value / queries for key, value in times.items()})
+    result["recall"] = hits / (queries * k)
+    return result
+
+
+def similarity_cli(argv: Optional[list[str]] = None) -> None:
+    """Command line tool: build similarity indexes / run the benchmark."""
+    parser = argparse.ArgumentParser(
+        description="Build the spectral similarity indexes of the archive."
+    )
+    parser.add_argument(
+        "methods", nargs="*", help="methods to index (default: all in the database)"
+    )
+    parser.add_argument(
+        "--rebuild", action="store_true", help="recompute grid and all fingerprints"
+    )
+    parser.add_argument("--points", type=int, default=FINGERPRINT_POINTS)
+    parser.add_argument(
+        "--benchmark",
+        type=int,
+        metavar="N",
+        help="only benchmark the search on N random spectra",
+    )
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        result = benchmark(args.benchmark, args.points)
+        print(
+            f"{args.benchmark} spectra: brute force "
+            f"{result['brute_force'] * 1e3:.1f} ms, approximate "
+            f"{result['approximate'] * 1e3:.1f} ms per query "
+            f"(recall {result['recall']:.2f}, training {result['train']:.1f} s)"
+        )
+        return
+
+    with db_session() as session:
+        methods = args.methods or sorted(
+            row[0]
+            for row in session.query(ms.Measurement._method).distinct()
+            if row[0] != "base"
+        )
+        for method in methods:
+            _build_similarity_index(archive, session, method, args.points, args.rebuild)
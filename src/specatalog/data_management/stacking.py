@@ -0,0 +1,595 @@
+"""
+Stacking of one dataset of many measurements into a single array file. The
+measurements are selected with a filter model, the dataset (e.g.
+raw_data/data_real_0) is read from their hdf5-files in parallel and, if the
+axes differ, resampled onto a common axis. The result is written to one
+chunked HDF5 file (or a Zarr store, if the zarr package is installed):
+
+- data: array of shape (number of measurements, *shape of the dataset),
+  one chunk per measurement
+- axis: the common axis (only if an axis dataset was given)
+- coordinates/<column>: one entry per measurement with the metadata of the
+  database (id, temperature, series, ...) for selecting and labeling rows
+
+Without copying data, create_virtual_stack() writes the same layout as an
+HDF5 virtual dataset (VDS) in views/<name>.h5 of the archive, which maps the
+datasets of the measurement files. The view stores its filter and is
+regenerated when matching measurements are created or deleted.
+"""
+
+import datetime
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional, Sequence, Union
+
+import h5py
+import numpy as np
+import sqlalchemy as alc
+
+import specatalog.crud_db.read as r
+import specatalog.data_management.measurement_store as mst
+from specatalog.config import READ_WORKERS
+from specatalog.main import archive, db_session
+
+try:
+    import zarr
+except ImportError:
+    zarr = None
+
+# virtual stacks (see create_virtual_stack) relative to the archive root
+VIEWS_DIR = Path("views")
+# database columns that are not useful as coordinates
+_EXCLUDED_COORDINATES = ("path", "additional_info", "created_at", "updated_at")
+
+
+@dataclass
+class StackResult:
+    """
+    Result of stacking a dataset of several measurements.
+
+    Attributes
+    ----------
+    path : Path
+        Written file.
+    ids : list[int]
+        Measurements in the order of the rows of the stack.
+    missing : list[int]
+        Measurements that matched the filter but do not contain the dataset.
+    shape : tuple
+        Shape of the stacked array.
+    resampled : bool
+        True if the data were resampled onto a common axis.
+    seconds : float
+        Duration of reading and writing.
+    """
+
+    path: Path
+    ids: list[int] = field(default_factory=list)
+    missing: list[int] = field(default_factory=list)
+    shape: tuple = ()
+    resampled: bool = False
+    seconds: float = 0.0
+
+
+def _read_datasets(
+    archive_obj, ms_id: int, dataset: str, axis: Optional[str]
+) -> Optional[tuple[np.ndarray, Optional[np.ndarray]]]:
+    """Reads dataset (and axis) of a measurement; None if it is missing."""
+    try:
+        p = mst.find_measurement_file(archive_obj, ms_id)
+        with archive_obj.open_measurement_file(p, "r") as f:
+            if dataset not in f or (axis is not None and axis not in f):
+                return None
+            return f[dataset][()], None if axis is None else f[axis][()]
+    except (FileNotFoundError, OSError):
+        return None
+
+
+def _common_axis(axes: list[np.ndarray], points: Optional[int]) -> np.ndarray:
+    """
+    Common axis of several axes: the range covered by all of them with the
+    number of points of the longest axis (or points).
+    """
+    start = max(a.min() for a in axes)
+    stop = min(a.max() for a in axes)
+    if start >= stop:
+        raise ValueError("The axes of the measurements do not overlap.")
+    return np.linspace(start, stop, points or max(a.size for a in axes))
+
+
+def _resample(data: np.ndarray, axis: np.ndarray, grid: np.ndarray) -> np.ndarray:
+    """Linear interpolation of data along its last dimension onto grid."""
+    order = np.argsort(axis)
+    rows = data.reshape(-1, data.shape[-1])[:, order]
+    resampled = np.array([np.interp(grid, axis[order], row) for row in rows])
+    return resampled.reshape(*data.shape[:-1], grid.size)
+
+
+def _coordinates(measurements: list) -> dict[str, np.ndarray]:
+    """
+    Metadata columns of the measurements as arrays for the stack file. For
+    measurements of different methods the columns of all their classes are
+    used; values of columns a class does not have are empty.
+    """
+    columns = {}
+    for cls in dict.fromkeys(type(m) for m in measurements):
+        for column in alc.inspect(cls).columns:
+            if column.key not in _EXCLUDED_COORDINATES:
+                columns.setdefault(column.key, column)
+    coordinates = {}
+    for name, column in columns.items():
+        values = [getattr(m, name, None) for m in measurements]
+        python_type = column.type.python_type
+        if python_type is bool:
+            coordinates[name] = np.array([bool(v) for v in values])
+        elif python_type in (int, float):
+            coordinates[name] = np.array(
+                [np.nan if v is None else v for v in values], dtype=float
+            )
+            if python_type is int and not np.isnan(coordinates[name]).any():
+                coordinates[name] = coordinates[name].astype(np.int64)
+        elif python_type in (datetime.date, datetime.datetime):
+            coordinates[name] = np.array(
+                ["" if v is None else v.isoformat() for v in values], dtype=object
+            )
+        else:
+            coordinates[name] = np.array(
+                ["" if v is None else str(v) for v in values], dtype=object
+            )
+    coordinates["molecule_name"] = np.array(
+        [m.molecule.name for m in measurements], dtype=object
+    )
+    return coordinates
+
+
+class _StackWriter:
+    """Creates the arrays of a stack in an HDF5 file or a Zarr store."""
+
+    def __init__(self, path: Path):
+        self.zarr = path.suffix == ".zarr"
+        if self.zarr:
+            if zarr is None:
+                raise ImportError("Writing .zarr stacks requires the zarr package.")
+            self.root = zarr.open_group(str(path), mode="w")
+        else:
+            self.root = h5py.File(path, "w")
+
+    def array(self, name: str, data=None, shape=None, dtype=None, chunks=None):
+        if data is not None and data.dtype == object:
+            dtype = str if self.zarr else h5py.string_dtype()
+            shape = data.shape
+        if self.zarr:
+            if dtype is str:
+                array = self.root.create_array(name, shape=shape, dtype=str)
+                array[:] = data
+                return array
+            if data is not None:
+                return self.root.create_array(name, data=data, chunks=chunks or "auto")
+            return self.root.create_array(
+                name, shape=shape, dtype=dtype, chunks=chunks or "auto"
+            )
+        if data is not None and dtype is not None:
+            return self.root.create_dataset(name, data=data.tolist(), dtype=dtype)
+        return self.root.create_dataset(
+            name,
+            data=data,
+            shape=shape,
+            dtype=dtype,
+            chunks=chunks,
+            compression="gzip" if chunks else None,
+        )
+
+    @property
+    def attrs(self):
+        return self.root.attrs
+
+    def close(self) -> None:
+        if not self.zarr:
+            self.root.close()
+
+
+def _stack_datasets(
+    archive_obj,
+    session: db_session,
+    filters: r.filter_model_type,
+    dataset: str,
+    target: Union[str, Path],
+    axis: Optional[str] = None,
+    points: Optional[int] = None,
+    workers: Optional[int] = None,
+) -> StackResult:
+    """
+    Stacks a dataset of all measurements that match a filter model into one
+    file (see stack_datasets).
+
+    Parameters
+    ----------
+    archive_obj
+        Archive object with file operations.
+    session : db_session
+        Object of the class db_session.
+    filters : filter_model
+        Pydantic model from one of the measurement Filter-classes.
+    dataset : str
+        Path of the dataset in the hdf5-files, e.g. "raw_data/data_real_0".
+    target : Union[str, Path]
+        Output file (.h5) or Zarr store (.zarr).
+    axis : Optional[str], optional
+        Path of the axis of the last dimension, e.g. "raw_data/field_0". The
+        default is None (all datasets must have the same shape).
+    points : Optional[int], optional
+        Number of points of the common axis if resampling is needed.
+    workers : Optional[int], optional
+        Number of measurements that are read in parallel (default: configured
+        read_workers).
+
+    Raises
+    ------
+    ValueError
+        If no measurement contains the dataset, the shapes do not match or
+        the axes do not overlap.
+
+    Returns
+    -------
+    StackResult
+        Order of the measurements in the stack and shape of the data.
+    """
+    start = time.perf_counter()
+    target = Path(target)
+    result = StackResult(target)
+    if not hasattr(filters.model, "molecule"):
+        raise ValueError("Only measurements can be stacked.")
+    measurements = r._run_query(filters, r.MeasurementOrdering(id="asc"), session)
+
+    with ThreadPoolExecutor(max_workers=workers or READ_WORKERS) as pool:
+        arrays = list(
+            pool.map(
+                lambda m: _read_datasets(archive_obj, m.id, dataset, axis),
+                measurements,
+            )
+        )
+    found = [(m, a) for m, a in zip(measurements, arrays) if a is not None]
+    result.missing = [m.id for m, a in zip(measurements, arrays) if a is None]
+    if not found:
+        raise ValueError(f"No matching measurement contains '{dataset}'.")
+
+    grid = None
+    if axis is not None:
+        axes = [np.asarray(a[1], dtype=float) for _, a in found]
+        if all(a.shape == axes[0].shape and np.allclose(a, axes[0]) for a in axes):
+            grid = axes[0]
+        else:
+            grid = _common_axis(axes, points)
+            result.resampled = True
+
+    shapes = {a[0].shape[:-1] if result.resampled else a[0].shape for _, a in found}
+    if len(shapes) > 1:
+        raise ValueError(f"'{dataset}' has different shapes: {sorted(shapes)}.")
+
+    row_shape = found[0][1][0].shape
+    if result.resampled:
+        row_shape = (*row_shape[:-1], grid.size)
+    dtype = np.result_type(*(a[0].dtype for _, a in found))
+    result.ids = [m.id for m, _ in found]
+    result.shape = (len(found), *row_shape)
+
+    writer = _StackWriter(target)
+    try:
+        data = writer.array(
+            "data", shape=result.shape, dtype=dtype, chunks=(1, *row_shape)
+        )
+        for row, (_, (values, values_axis)) in enumerate(found):
+            if result.resampled:
+                values = _resample(values, np.asarray(values_axis, dtype=float), grid)
+            data[row] = values
+        if grid is not None:
+            writer.array("axis", data=np.asarray(grid))
+        for name, values in _coordinates([m for m, _ in found]).items():
+            writer.array(f"coordinates/{name}", data=values)
+        writer.attrs["dataset"] = dataset
+        writer.attrs["axis"] = axis or ""
+        writer.attrs["resampled"] = result.resampled
+    finally:
+        writer.close()
+
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def stack_datasets(
+    filters: r.filter_model_type,
+    dataset: str,
+    target: Union[str, Path],
+    axis: Optional[str] = None,
+    points: Optional[int] = None,
+    workers: Optional[int] = None,
+) -> StackResult:
+    """
+    Reads a dataset from all measurements that match a filter model and
+    writes it as one stacked, chunked array to a single file, together with
+    a coordinate table of the measurement metadata. Measurements without the
+    dataset are skipped. If an axis is given and the axes differ, the data
+    are resampled onto the range covered by all axes.
+
+    Parameters
+    ----------
+    filters : filter_model
+        Pydantic model from one of the measurement Filter-classes.
+    dataset : str
+        Path of the dataset in the hdf5-files, e.g. "raw_data/data_real_0".
+    target : Union[str, Path]
+        Output file (.h5) or Zarr store (.zarr, requires zarr).
+    axis : Optional[str], optional
+        Path of the axis of the last dimension, e.g. "raw_data/field_0". The
+        default is None (all datasets must have the same shape).
+    points : Optional[int], optional
+        Number of points of the common axis if resampling is needed. The
+        default is the length of the longest axis.
+    workers : Optional[int], optional
+        Number of measurements that are read in parallel. The default is the
+        configured read_workers.
+
+    Raises
+    ------
+    ValueError
+        If no measurement contains the dataset, the shapes do not match or
+        the axes do not overlap.
+
+    Returns
+    -------
+    StackResult
+        Order of the measurements in the stack and shape of the data.
+
+    Example
+    -------
+    >>> stack_datasets(
+    >>>     r.CWEPRFilter(series="T-series"),
+    >>>     "raw_data/data_real_0",
+    >>>     "t_series.h5",
+    >>>     axis="raw_data/field_0",
+    >>> )
+    >>> with h5py.File("t_series.h5") as f:
+    >>>     plt.plot(f["axis"][()], f["data"][()].T)
+    >>>     temperatures = f["coordinates/temperature"][()]
+    """
+    with db_session() as session:
+        return _stack_datasets(
+            archive, session, filters, dataset, target, axis, points, workers
+        )
+
+
+def _write_coordinates(h5_file: h5py.File, measurements: list) -> None:
+    for name, values in _coordinates(measurements).items():
+        if values.dtype == object:
+            h5_file.create_dataset(
+                f"coordinates/{name}", data=values.tolist(), dtype=h5py.string_dtype()
+            )
+        else:
+            h5_file.create_dataset(f"coordinates/{name}", data=values)
+
+
+def _create_virtual_stack(
+    archive_obj,
+    session: db_session,
+    filters: r.filter_model_type,
+    dataset: str,
+    name: str,
+    axis: Optional[str] = None,
+) -> StackResult:
+    """
+    Writes a virtual dataset that maps a dataset of all measurements that
+    match a filter model to views/<name>.h5 in the archive (see
+    create_virtual_stack).
+
+    Parameters
+    ----------
+    archive_obj
+        Archive object with file operations.
+    session : db_session
+        Object of the class db_session.
+    filters : filter_model
+        Pydantic model from one of the measurement Filter-classes.
+    dataset : str
+        Path of the dataset in the hdf5-files, e.g. "raw_data/data_real_0".
+    name : str
+        Name of the view.
+    axis : Optional[str], optional
+        Path of an axis dataset that is copied from the first measurement.
+
+    Raises
+    ------
+    ValueError
+        If the archive has no direct file access, the filter is not a
+        measurement filter or no measurement contains the dataset.
+
+    Returns
+    -------
+    StackResult
+        Measurements in the view; measurements without the dataset or with
+        another shape than the first one are listed as missing.
+    """
+    start = time.perf_counter()
+    if not hasattr(filters.model, "molecule"):
+        raise ValueError("Only measurements can be stacked.")
+    target = archive_obj.backend.local_path(VIEWS_DIR / f"{name}.h5")
+    if target is None:
+        raise ValueError("Virtual datasets require direct file access to the archive.")
+    archive_obj.make_dir(VIEWS_DIR)
+    result = StackResult(target)
+
+    sources = []
+    for m in r._run_query(filters, r.MeasurementOrdering(id="asc"), session):
+        p = archive_obj.backend.local_path(
+            archive_obj.measurement_path(m.id) / mst.measurement_file_name(m.id)
+        )
+        try:
+            with h5py.File(p, "r") as f:
+                source = f.get(dataset)
+                if isinstance(source, h5py.Dataset) and (
+                    not sources or source.shape == sources[0][2]
+                ):
+                    axis_values = f[axis][()] if axis and not sources else None
+                    sources.append((m, p, source.shape, source.dtype, axis_values))
+                    continue
+        except (FileNotFoundError, OSError):
+            pass
+        result.missing.append(m.id)
+    if not sources:
+        raise ValueError(f"No matching measurement contains '{dataset}'.")
+
+    shape, dtype = sources[0][2], sources[0][3]
+    layout = h5py.VirtualLayout(shape=(len(sources), *shape), dtype=dtype)
+    for row, (_, p, _, _, _) in enumerate(sources):
+        # relative paths keep the view valid wherever the archive is mounted
+        layout[row] = h5py.VirtualSource(
+            os.path.relpath(p, target.parent), dataset, shape=shape
+        )
+    result.ids = [m.id for m, *_ in sources]
+    result.shape = layout.shape
+
+    tmp_path = target.with_name(f".{target.name}.tmp")
+    with h5py.File(tmp_path, "w") as f:
+        fill = np.nan if np.issubdtype(dtype, np.floating) else 0
+        f.create_virtual_dataset("data", layout, fillvalue=fill)
+        if sources[0][4] is not None:
+            f.create_dataset("axis", data=sources[0][4])
+        _write_coordinates(f, [m for m, *_ in sources])
+        f.attrs["dataset"] = dataset
+        f.attrs["axis"] = axis or ""
+        f.attrs["filter_model"] = type(filters).__name__
+        f.attrs["filters"] = filters.model_dump_json(exclude_none=True)
+    os.replace(tmp_path, target)
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def create_virtual_stack(
+    filters: r.filter_model_type,
+    dataset: str,
+    name: str,
+    axis: Optional[str] = None,
+) -> StackResult:
+    """
+    Creates a view of a dataset of all measurements that match a filter model
+    as HDF5 virtual dataset in views/<name>.h5 of the archive. The view has
+    the same layout as the files of stack_datasets ("data", "axis",
+    "coordinates/<column>"), but the rows of "data" are read directly from
+    the measurement files, so no data are copied. All datasets must have the
+    shape of the first one; the axes are not resampled. The view is updated
+    automatically when matching measurements are created or deleted with
+    helpers.full_entry.
+
+    Parameters
+    ----------
+    filters : filter_model
+        Pydantic model from one of the measurement Filter-classes.
+    dataset : str
+        Path of the dataset in the hdf5-files, e.g. "raw_data/data_real_0".
+    name : str
+        Name of the view.
+    axis : Optional[str], optional
+        Path of an axis dataset that is copied from the first measurement,
+        e.g. "raw_data/field_0". The default is None.
+
+    Raises
+    ------
+    ValueError
+        If the archive has no direct file access, the filter is not a
+        measurement filter or no measurement contains the dataset.
+
+    Returns
+    -------
+    StackResult
+        Measurements in the view.
+
+    Example
+    -------
+    >>> create_virtual_stack(
+    >>>     r.CWEPRFilter(series="T-series"), "raw_data/data_real_0", "t_series"
+    >>> )
+    >>> with h5py.File(archive_path / "views" / "t_series.h5") as f:
+    >>>     maxima = f["data"][:, 500]
+    """
+    with db_session() as session:
+        return _create_virtual_stack(archive, session, filters, dataset, name, axis)
+
+
+def _refresh_virtual_stacks(
+    archive_obj,
+    session: db_session,
+    ms_id: Optional[Union[int, Sequence[int]]] = None,
+) -> list[str]:
+    """
+    Regenerates the virtual stacks in views/ of the archive from their stored
+    filters. If ms_id (one ID or several) is given, only views that contain
+    one of the measurements or whose filter matches one of them are
+    regenerated.
+
+    Returns
+    -------
+    list[str]
+        Names of the regenerated views.
+    """
+    views = archive_obj.backend.local_path(VIEWS_DIR)
+    if views is None or not views.is_dir():
+        return []
+    targets = None
+    if ms_id is not None:
+        targets = {int(ms_id)} if isinstance(ms_id, int) else {int(i) for i in ms_id}
+    refreshed = []
+    for path in sorted(views.glob("*.h5")):
+        with h5py.File(path, "r") as f:
+            definition = dict(f.attrs)
+            ids = f["coordinates/id"][()] if "coordinates/id" in f else []
+        filters = r.filters[definition["filter_model"]](
+            **json.loads(definition["filters"])
+        )
+        if targets is not None and targets.isdisjoint(np.asarray(ids).tolist()):
+            model = filters.model
+            match = (
+                session.query(model.id)
+                .filter(*r._filter_conditions(filters), model.id.in_(targets))
+                .first()
+            )
+            if match is None:
+                continue
+        try:
+            _create_virtual_stack(
+                archive_obj,
+                session,
+                filters,
+                definition["dataset"],
+                path.stem,
+                definition["axis"] or None,
+            )
+        except ValueError:  # no measurement left
+            path.unlink()
+        refreshed.append(path.stem)
+    return refreshed
+
+
+def refresh_virtual_stacks(
+    ms_id: Optional[Union[int, Sequence[int]]] = None,
+) -> list[str]:
+    """
+    Regenerates the virtual stacks of the archive, e.g. after measurements
+    were changed without helpers.full_entry. Views without any matching
+    measurement are deleted.
+
+    Parameters
+    ----------
+    ms_id : Optional[Union[int, Sequence[int]]], optional
+        Only regenerate the views that contain one of these measurements or
+        whose filter matches one of them. The default is None (all views).
+
+    Returns
+    -------
+    list[str]
+        Names of the regenerated views.
+    """
+    with db_session() as session:
+        return _refresh_virtual_stacks(archive, session, ms_id)
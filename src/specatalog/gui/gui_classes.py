@@ -61,6 +61,12 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
             self, self.FormFilter, self.filter_fields, r.MeasurementFilter.model_fields
         )
 
+        # Full-text search
+        self.LineSearch = QtWidgets.QLineEdit(parent=self.ButtonQuery.parent())
+        self.LineSearch.setPlaceholderText("Search (Enter)")
+        self.LineSearch.setClearButtonEnabled(True)
+        self.gridLayout_4.addWidget(self.LineSearch, 3, 0, 1, 2)
+
         # New Entry area
         self.tab_index = 1
         self.new_fields = {}
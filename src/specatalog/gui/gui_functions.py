@@ -204,9 +204,29 @@ def on_header_clicked(self):
     load_measurements(self)
 
 
+def run_search(self):
+    query = self.LineSearch.text()
+    if not query.strip():
+        load_measurements(self)
+        return
+    result = r.search(query, self.filter_model.model)
+    show_results(self, result.entries)
+    if result.entries:
+        self.statusbar.showMessage(f"{len(result.entries)} results for '{query}'")
+    elif result.suggestions:
+        self.statusbar.showMessage(
+            "No results. Did you mean: " + ", ".join(result.suggestions) + "?"
+        )
+    else:
+        self.statusbar.showMessage(f"No results for '{query}'")
+
+
 def load_measurements(self):
     results = r.run_query(self.filter_model, self.ordering_model)
+    show_results(self, results)
+
 
+def show_results(self, results):
     if self.RadioMeasurements.isChecked():
         model = MeasurementsTableModel(results, self.ComboModelChoice.currentText())
     else:
@@ -3,6 +3,7 @@ import specatalog.gui.gui_functions as gf
 
 def connect_signal_slot(self) -> None:
     self.ButtonQuery.clicked.connect(lambda: gf.run_query(self))
+    self.LineSearch.returnPressed.connect(lambda: gf.run_search(self))
     self.ButtonClearQuery.clicked.connect(
         lambda: gf.filter_model_changed(self, self.ComboModelChoice.currentText())
     )
@@ -0,0 +1,434 @@
+"""
+Export of the catalog metadata to a columnar file for analyses and
+dashboards. One row per measurement contains the columns of the measurements
+table, of its subclass table (trepr, cwepr, ...) and of its molecule
+(prefixed with "molecule_"). Columns that exist in several subclass tables
+(e.g. frequency_band) are combined into one column. Molecules can be
+exported the same way.
+
+The rows are read from SQL in batches and written directly to Parquet,
+Arrow IPC or Feather files with pyarrow (pip install specatalog[export]).
+The time of the export is stored in the file; an incremental export only
+reads the rows that were created or updated since then, merges them into
+the file and drops deleted entries.
+"""
+
+import argparse
+import datetime
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Union
+
+import sqlalchemy as alc
+
+import specatalog.models.measurements as ms
+import specatalog.models.molecules as mol
+from specatalog.main import db_session
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute  # noqa: F401
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+EXPORT_FORMATS = {".parquet": "parquet", ".arrow": "arrow", ".feather": "feather"}
+EXPORT_BATCH_SIZE = 10000
+# key of the export time in the file metadata
+_EXPORTED_AT_KEY = b"specatalog_exported_at"
+# rows committed shortly after they were stamped are caught by re-reading
+# this period in the next incremental export
+_INCREMENTAL_OVERLAP = datetime.timedelta(minutes=5)
+
+_ARROW_TYPES = {
+    alc.Integer: "int64",
+    alc.Float: "float64",
+    alc.Boolean: "bool_",
+    alc.Date: "date32",
+    alc.String: "string",
+}
+
+
+@dataclass
+class ExportResult:
+    """
+    Result of a catalog export.
+
+    Attributes
+    ----------
+    path : Path
+        Written file.
+    rows : int
+        Number of rows in the file.
+    exported : int
+        Number of rows that were read from the database.
+    removed : int
+        Number of rows of deleted entries that were dropped (incremental).
+    incremental : bool
+        True if an existing file was updated.
+    seconds : float
+        Duration of the export.
+    """
+
+    path: Path
+    rows: int = 0
+    exported: int = 0
+    removed: int = 0
+    incremental: bool = False
+    seconds: float = 0.0
+
+
+def _arrow_type(column_type):
+    if isinstance(column_type, alc.DateTime):
+        return pa.timestamp("us")
+    for sql_type, arrow_type in _ARROW_TYPES.items():
+        if isinstance(column_type, sql_type):
+            return getattr(pa, arrow_type)()
+    return pa.string()
+
+
+def _subclass_columns(base_mapper, prefix: str = "") -> tuple[list, list]:
+    """
+    Columns of all subclass tables of a base class; columns with the same
+    name are coalesced (cast to string if their types differ).
+
+    Returns
+    -------
+    tuple[list, list]
+        Labeled column expressions and their SQL types.
+    """
+    by_name = {}
+    for mapper in base_mapper.self_and_descendants:
+        if mapper is base_mapper:
+            continue
+        for column in mapper.local_table.columns:
+            if not column.primary_key:
+                by_name.setdefault(column.name, []).append(column)
+
+    expressions, types = [], []
+    for name, columns in by_name.items():
+        if len({type(c.type) for c in columns}) > 1:
+            columns = [alc.cast(c, alc.String) for c in columns]
+        expression = columns[0] if len(columns) == 1 else alc.func.coalesce(*columns)
+        expressions.append(expression.label(prefix + name))
+        types.append(columns[0].type)
+    return expressions, types
+
+
+def _outer_join_subclasses(from_clause, base_mapper):
+    for mapper in base_mapper.self_and_descendants:
+        if mapper is not base_mapper:
+            table = mapper.local_table
+            from_clause = from_clause.outerjoin(
+                table, table.c.id == base_mapper.local_table.c.id
+            )
+    return from_clause
+
+
+def _catalog_select(model) -> tuple:
+    """
+    SELECT statement of the joined catalog of a table class and its arrow
+    schema.
+
+    Parameters
+    ----------
+    model
+        ms.Measurement, mol.Molecule or one of their subclasses.
+
+    Returns
+    -------
+    tuple
+        (select, schema, list of timestamp columns for incremental exports)
+    """
+    mapper = alc.inspect(model)
+    base = mapper.base_mapper
+    table = base.local_table
+    # a subclass only needs its own table
+    sub = mapper
+
+    columns = list(table.columns)
+    types = [c.type for c in columns]
+    if sub is base:
+        sub_columns, sub_types = _subclass_columns(base)
+    else:
+        sub_columns = [c for c in sub.local_table.columns if not c.primary_key]
+        sub_types = [c.type for c in sub_columns]
+    columns += sub_columns
+    types += sub_types
+    from_clause = (
+        _outer_join_subclasses(table, base)
+        if sub is base
+        else alc.join(table, sub.local_table, sub.local_table.c.id == table.c.id)
+    )
+    timestamps = [table.c.created_at, table.c.updated_at]
+
+    if base is ms.Measurement.__mapper__:
+        molecules = mol.Molecule.__table__
+        from_clause = _outer_join_subclasses(
+            from_clause.join(molecules, molecules.c.id == table.c.molecular_id),
+            mol.Molecule.__mapper__,
+        )
+        molecule_columns = [c.label(f"molecule_{c.name}") for c in molecules.columns]
+        molecule_sub, molecule_types = _subclass_columns(
+            mol.Molecule.__mapper__, "molecule_"
+        )
+        columns += molecule_columns[1:] + molecule_sub  # molecule id = molecular_id
+        types += [c.type for c in molecules.columns][1:] + molecule_types
+        timestamps += [molecules.c.created_at, molecules.c.updated_at]
+
+    stmt = alc.select(*columns).select_from(from_clause).order_by(table.c.id)
+    if sub is not base:
+        identities = [m.polymorphic_identity for m in sub.self_and_descendants]
+        stmt = stmt.where(base.polymorphic_on.in_(identities))
+
+    schema = pa.schema(
+        [
+            pa.field(column.name, _arrow_type(column_type))
+            for column, column_type in zip(stmt.selected_columns, types)
+        ]
+    )
+    return stmt, schema, timestamps
+
+
+def _export_format(path: Path, fmt: Optional[str]) -> str:
+    fmt = fmt or EXPORT_FORMATS.get(path.suffix.lower())
+    if fmt not in EXPORT_FORMATS.values():
+        raise ValueError(
+            f"Unknown export format for {path.name}; "
+            f"use one of {sorted(EXPORT_FORMATS.values())}."
+        )
+    return fmt
+
+
+def _read_export(path: Path, fmt: str):
+    if fmt == "parquet":
+        return pq.read_table(path)
+    with pa.OSFile(str(path)) as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+class _Writer:
+    """Writes record batches to a Parquet or Arrow IPC (Feather) file."""
+
+    def __init__(self, path: Path, fmt: str, schema):
+        if fmt == "parquet":
+            self._writer = pq.ParquetWriter(path, schema, compression="zstd")
+        else:
+            options = pa.ipc.IpcWriteOptions(
+                compression="lz4" if fmt == "feather" else None
+            )
+            self._writer = pa.ipc.new_file(str(path), schema, options=options)
+
+    def write(self, data) -> None:
+        if isinstance(data, pa.Table):
+            self._writer.write_table(data)
+        else:
+            self._writer.write_batch(data)
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+def _record_batches(session: db_session, stmt, schema, batch_size: int):
+    """Streams the rows of stmt as record batches of at most batch_size rows."""
+    result = session.execute(stmt.execution_options(yield_per=batch_size))
+    for rows in result.partitions(batch_size):
+        yield pa.RecordBatch.from_arrays(
+            [
+                pa.array(values, type=field.type)
+                for values, field in zip(zip(*rows), schema)
+            ],
+            schema=schema,
+        )
+
+
+def _export_catalog(
+    session: db_session,
+    path: Union[str, Path],
+    model=ms.Measurement,
+    fmt: Optional[str] = None,
+    incremental: bool = False,
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> ExportResult:
+    """
+    Writes the joined catalog metadata of a table to a columnar file (see
+    export_catalog).
+
+    Parameters
+    ----------
+    session : db_session
+        Object of the class db_session.
+    path : Union[str, Path]
+        Target file.
+    model, optional
+        Exported table class. The default is ms.Measurement.
+    fmt : Optional[str], optional
+        "parquet", "arrow" or "feather". The default is taken from the suffix
+        of path.
+    incremental : bool, optional
+        Update an existing export. The default is False.
+    batch_size : int, optional
+        Number of rows per batch. The default is EXPORT_BATCH_SIZE.
+
+    Raises
+    ------
+    ImportError
+        If pyarrow is not installed.
+    ValueError
+        If the format is unknown.
+
+    Returns
+    -------
+    ExportResult
+        Number of rows and duration of the export.
+    """
+    if pa is None:
+        raise ImportError(
+            "The export requires pyarrow (pip install specatalog[export])."
+        )
+    start = time.perf_counter()
+    path = Path(path)
+    fmt = _export_format(path, fmt)
+    stmt, schema, timestamps = _catalog_select(model)
+    exported_at = datetime.datetime.now(datetime.UTC)
+    schema = schema.with_metadata({_EXPORTED_AT_KEY: exported_at.isoformat()})
+    result = ExportResult(path)
+
+    ids_stmt = stmt.with_only_columns(stmt.selected_columns[0]).order_by(None)
+
+    existing = None
+    if incremental and path.exists():
+        existing = _read_export(path, fmt)
+        since = (existing.schema.metadata or {}).get(_EXPORTED_AT_KEY)
+        if since is None or existing.schema.remove_metadata() != (
+            schema.remove_metadata()
+        ):
+            existing = None  # unknown or outdated layout: full export
+        else:
+            since = datetime.datetime.fromisoformat(since.decode())
+            since -= _INCREMENTAL_OVERLAP
+            stmt = stmt.where(alc.or_(*(t >= since for t in timestamps)))
+            result.incremental = True
+
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    writer = _Writer(tmp_path, fmt, schema)
+    try:
+        if existing is None:
+            for batch in _record_batches(session, stmt, schema, batch_size):
+                writer.write(batch)
+                result.exported += batch.num_rows
+            result.rows = result.exported
+        else:
+            changed = pa.Table.from_batches(
+                list(_record_batches(session, stmt, schema, batch_size)),
+                schema=schema,
+            )
+            current = pa.array(session.execute(ids_stmt).scalars(), pa.int64())
+            ids = existing.column(0)
+            deleted = pa.compute.invert(pa.compute.is_in(ids, current))
+            keep = pa.compute.and_not(
+                pa.compute.invert(pa.compute.is_in(ids, changed.column(0))), deleted
+            )
+            merged = pa.concat_tables(
+                [
+                    existing.filter(keep).replace_schema_metadata(schema.metadata),
+                    changed,
+                ]
+            )
+            writer.write(merged.sort_by(schema.names[0]))
+            result.exported = changed.num_rows
+            result.removed = pa.compute.sum(deleted).as_py() or 0
+            result.rows = pa.compute.sum(keep).as_py() + changed.num_rows
+    except BaseException:
+        writer.close()
+        tmp_path.unlink(missing_ok=True)
+        raise
+    writer.close()
+    # readers never see a half-written file
+    os.replace(tmp_path, path)
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def export_catalog(
+    path: Union[str, Path],
+    model=ms.Measurement,
+    fmt: Optional[str] = None,
+    incremental: bool = False,
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> ExportResult:
+    """
+    Writes the catalog metadata to a columnar file: one row per entry with
+    the columns of the table, of the subclass tables and, for measurements,
+    of the molecule (prefixed with "molecule_"). The rows are streamed from
+    the database in batches.
+
+    Parameters
+    ----------
+    path : Union[str, Path]
+        Target file (.parquet, .arrow or .feather).
+    model, optional
+        Exported table class, e.g. ms.Measurement, ms.CWEPR or mol.Molecule.
+        The default is ms.Measurement.
+    fmt : Optional[str], optional
+        "parquet", "arrow" or "feather". The default is taken from the suffix
+        of path.
+    incremental : bool, optional
+        If the file exists, only entries that were created or updated since
+        its export are read from the database; deleted entries are removed.
+        The default is False.
+    batch_size : int, optional
+        Number of rows per batch. The default is 10000.
+
+    Raises
+    ------
+    ImportError
+        If pyarrow is not installed.
+    ValueError
+        If the format is unknown.
+
+    Returns
+    -------
+    ExportResult
+        Number of rows and duration of the export.
+
+    Example
+    -------
+    >>> export_catalog("catalog.parquet", incremental=True)
+    >>> df = pandas.read_parquet("catalog.parquet")
+    """
+    with db_session() as session:
+        return _export_catalog(session, path, model, fmt, incremental, batch_size)
+
+
+def export_cli(argv: Optional[list[str]] = None) -> None:
+    """Command line tool: export the catalog to a columnar file."""
+    parser = argparse.ArgumentParser(
+        description="Export the catalog metadata to Parquet, Arrow or Feather."
+    )
+    parser.add_argument("path", help="target file (.parquet, .arrow, .feather)")
+    parser.add_argument(
+        "--molecules", action="store_true", help="export molecules instead"
+    )
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS.values()))
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only read entries that changed since the last export",
+    )
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    result = export_catalog(
+        args.path,
+        mol.Molecule if args.molecules else ms.Measurement,
+        args.format,
+        args.incremental,
+        args.batch_size,
+    )
+    print(
+        f"{result.rows} rows written to {result.path} in {result.seconds:.2f} s "
+        f"({result.exported} read, {result.removed} removed)."
+    )
@@ -1,13 +1,21 @@
 import tempfile
+import uuid
 from pathlib import Path
 from dataclasses import dataclass
-from typing import Optional
+from typing import Callable, Optional, Union
 import specatalog.data_management.measurement_management as mm
+import specatalog.data_management.manifest as mf
+import specatalog.data_management.deduplication as dd
+import specatalog.data_management.measurement_store as mst
+import specatalog.data_management.stacking as st
 import specatalog.crud_db.create as cr
 from specatalog.data_management.archive_manager import SpecatalogArchive
+from specatalog.data_management.archive_backends import TransferStats
 from specatalog.main import db_session
 from specatalog.models.measurements import Measurement
-from specatalog.crud_db.delete import _delete_object
+from specatalog.crud_db.delete import _delete_object, _delete_where, DeleteWhereResult
+import specatalog.crud_db.read as r
+from specatalog.config import MEASUREMENTS_PATH, MOLECULES_PATH, TRASH_PATH
 from specatalog.main import archive
 
 
@@ -26,11 +34,15 @@ class CreateMeasurementResult:
     error : Exception, optional
         Exception raised during the creation process. This value is only set
         if `success` is False.
+    transfer : TransferStats, optional
+        Statistics (files, bytes, duration, throughput) of the upload to the
+        archive. This value is only set if `success` is True.
     """
 
     success: bool
     measurement_id: Optional[int] = None
     error: Optional[Exception] = None
+    transfer: Optional[TransferStats] = None
 
 
 @dataclass
@@ -55,8 +67,22 @@ class CreateMoleculeResult:
     error: Optional[Exception] = None
 
 
+def _refresh_views(ms_id: Union[int, list[int]]) -> None:
+    """Updates the virtual stacks that contain or match a measurement (or one
+    of several). A failure is reported but does not undo the creation or
+    deletion."""
+    try:
+        with db_session() as session:
+            st._refresh_virtual_stacks(archive, session, ms_id)
+    except Exception as e:
+        print(f"Virtual stacks could not be updated: {e}")
+
+
 def create_full_measurement(
-    data: cr.measurement_model_pyd, raw_data_path: list[str], fmt: str
+    data: cr.measurement_model_pyd,
+    raw_data_path: list[str],
+    fmt: str,
+    progress: Optional[Callable[[float, str], None]] = None,
 ) -> CreateMeasurementResult:
     """Create a complete measurement entry with atomic database and file operations.
 
@@ -65,7 +91,8 @@ def create_full_measurement(
     2. Sets up temporary directory
     3. Copies raw data files
     4. Converts to HDF5 format
-    5. Commits to final archive location
+    5. Commits to final archive location and writes the manifest with the
+       hashes computed during the upload
 
     Parameters
     ----------
@@ -75,6 +102,9 @@ def create_full_measurement(
         List of paths to raw data files
     fmt : str
         Format identifier for raw data
+    progress : Optional[Callable[[float, str], None]], optional
+        Called with the fraction of completed steps and a message after
+        every step (e.g. JobContext.report)
 
     Returns
     -------
@@ -83,6 +113,7 @@ def create_full_measurement(
         - success: bool indicating operation status
         - measurement_id: int (on success)
         - error: Exception (on failure)
+        - transfer: TransferStats of the upload (on success)
 
     Notes
     -----
@@ -90,30 +121,56 @@ def create_full_measurement(
     - Rolls back database and file operations if any step fails
     - Cleans up temporary files on completion
     """
+
+    def report(fraction: float, message: str) -> None:
+        if progress is not None:
+            progress(fraction, message)
+
     try:
         with db_session() as session:
             measurement = cr._create_new_measurement(data, session)
             ms_id = measurement.id
+            report(0.05, "database entry created")
 
             with tempfile.TemporaryDirectory() as temp_dir:
                 temp_archive = SpecatalogArchive(False, temp_dir)
                 mm._create_measurement_dir(temp_archive, ms_id)
 
-                for file in raw_data_path:
-                    mm._raw_data_to_folder(temp_archive, file, fmt, measurement.id)
-
-                mm._raw_data_to_hdf5(temp_archive, ms_id, fmt)
+                # plain copies in the temporary archive, the hashes are
+                # reused for the blobs during the upload
+                hashes = {}
+                for n, file in enumerate(raw_data_path, 1):
+                    hashes.update(
+                        mm._raw_data_to_folder(
+                            temp_archive, file, fmt, ms_id, deduplicate=False
+                        )
+                    )
+                    report(0.05 + 0.15 * n / len(raw_data_path), f"{file} copied")
+
+                mm._raw_data_to_hdf5(
+                    temp_archive,
+                    ms_id,
+                    fmt,
+                    progress=lambda f, message: report(0.2 + 0.4 * f, message),
+                )
 
                 src = Path(temp_dir) / str(temp_archive.measurement_path(ms_id))
-                archive.copy_directory_to_archive(
-                    src, temp_archive.measurement_path(ms_id)
+                transfer = dd._upload_measurement(
+                    archive, src, temp_archive.measurement_path(ms_id), digests=hashes
                 )
+                report(0.9, f"{transfer.files} files uploaded")
+                mf._create_manifest(archive, ms_id, transfer.hashes)
 
-        return CreateMeasurementResult(success=True, measurement_id=measurement.id)
+        _refresh_views(ms_id)
+        report(1.0, f"measurement M{ms_id} created")
+        return CreateMeasurementResult(
+            success=True, measurement_id=measurement.id, transfer=transfer
+        )
 
     except Exception as e:
         if archive.exists(f"data/M{ms_id}"):
             archive.delete_folder(f"data/M{ms_id}")
+            mst.forget_measurement_files(archive, [ms_id])
         return CreateMeasurementResult(success=False, error=e)
 
 
@@ -158,12 +215,104 @@ def delete_full_measurement(ms_id: int) -> CreateMeasurementResult:
 
             mm.delete_measurement(ms_id, save_delete=False)
 
+        _refresh_views(ms_id)
         return CreateMeasurementResult(success=True, measurement_id=ms_id)
 
     except Exception as e:
         return CreateMeasurementResult(success=False, error=e)
 
 
+def _trash_folders(archive_obj, paths: list[str]) -> Path:
+    """Moves the existing folders to a new directory in TRASH_PATH. If a
+    folder cannot be moved, the moved folders are restored and the error is
+    raised."""
+    trash = TRASH_PATH / uuid.uuid4().hex
+    moved = []
+    try:
+        with archive_obj.metadata_snapshot():
+            for path in paths:
+                if archive_obj.exists(path):
+                    archive_obj.make_dir(trash / Path(path).parent)
+                    archive_obj.rename(path, trash / path)
+                    moved.append(path)
+    except Exception:
+        _restore_folders(archive_obj, trash, moved)
+        raise
+    return trash
+
+
+def _restore_folders(archive_obj, trash: Path, paths: list[str]) -> None:
+    """Moves folders back from the trash (see _trash_folders)."""
+    for path in paths:
+        if archive_obj.exists(trash / path):
+            archive_obj.rename(trash / path, path)
+    if archive_obj.exists(trash):
+        archive_obj.delete_folder(trash)
+
+
+def _purge_trash(archive_obj, trash: Path) -> bool:
+    """Deletes a trash directory. Returns False (and keeps the rest of the
+    directory) if this fails."""
+    if not archive_obj.exists(trash):
+        return True
+    try:
+        archive_obj.delete_folder(trash)
+    except Exception as e:
+        print(f"Could not delete {trash} from the archive ({e}). Delete it manually.")
+        return False
+    return True
+
+
+def delete_full_where(
+    filters: r.filter_model_type, dry_run: bool = False
+) -> DeleteWhereResult:
+    """Delete all database entries that match a filter model and their
+    directories in the archive.
+
+    The database entries are deleted with a constant number of statements
+    (see crud_db.delete.delete_where); deleting molecules deletes their
+    measurements, too. The directories of all deleted measurements and
+    molecules are moved to the trash directory of the archive before the
+    database changes are committed; if moving or the commit fails, they are
+    moved back and nothing is deleted. Afterwards the trash directory is
+    purged (if this fails, a message is printed and the directory is kept)
+    and the virtual stacks that contained the measurements are updated.
+
+    Parameters
+    ----------
+    filters : r.filter_model_type
+        Filter model from crud_db.read. The class of the filter model
+        determines the table (e.g. CWEPRFilter -> only cwEPR measurements).
+    dry_run : bool, optional
+        If True, nothing is deleted and the entries that would be deleted are
+        returned. The default is False.
+
+    Returns
+    -------
+    DeleteWhereResult
+        IDs of the deleted molecules and measurements.
+    """
+    with db_session() as session:
+        result = _delete_where(filters, session, dry_run)
+        if dry_run:
+            return result
+
+        paths = [f"{MEASUREMENTS_PATH}/M{i}" for i in result.measurement_ids]
+        paths += [f"{MOLECULES_PATH}/MOL{i}" for i in result.molecule_ids]
+        trash = _trash_folders(archive, paths)
+        try:
+            session.commit()
+        except Exception:
+            _restore_folders(archive, trash, paths)
+            raise
+
+    _purge_trash(archive, trash)
+    mst.forget_measurement_files(archive, result.measurement_ids)
+    if result.measurement_ids:
+        _refresh_views(result.measurement_ids)
+    return result
+
+
 def create_full_molecule(
     data: cr.molecule_model_pyd, molecular_formula_path: list[str], fmt: str
 ) -> CreateMoleculeResult:
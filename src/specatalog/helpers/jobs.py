@@ -0,0 +1,721 @@
+"""
+Persistent job queue for long-running archive operations. Jobs are rows of
+the table "jobs" in a separate database (SQLite by default, configurable with
+job_database_url, e.g. the PostgreSQL database of the catalog). Callers
+submit an operation with its arguments and get a job ID back immediately;
+worker processes (specatalog-worker) claim queued jobs, run them and record
+progress, result, error and timing. The table is a permanent record of the
+throughput of the operations (see JobQueue.statistics).
+
+While a job runs, its worker updates the heartbeat of the job regularly (and
+with every progress report). A running job whose heartbeat is older than the
+lease (job_lease_seconds) belongs to a killed worker: it is requeued when the
+next job is claimed, or fails if it was already started job_max_attempts
+times.
+
+Operations are registered by name with register_operation (modules with
+further operations are loaded by the workers with --module). The arguments
+must be JSON serializable; pydantic models of
+specatalog.models.creation_pydantic_measurements and
+specatalog.models.creation_pydantic_molecules are converted automatically.
+"""
+
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Optional
+
+import sqlalchemy as alc
+from pydantic import BaseModel
+
+import specatalog.data_management.measurement_management as mm
+import specatalog.data_management.similarity as similarity
+import specatalog.models.creation_pydantic_measurements as cpm
+import specatalog.models.creation_pydantic_molecules as cpmol
+from specatalog.config import JOB_DATABASE_URL, JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS
+from specatalog.helpers import full_entry
+
+_metadata = alc.MetaData()
+
+jobs_table = alc.Table(
+    "jobs",
+    _metadata,
+    alc.Column("id", alc.Integer, primary_key=True, autoincrement=True),
+    alc.Column("operation", alc.String(100), nullable=False),
+    alc.Column("arguments", alc.Text, nullable=False),
+    alc.Column("status", alc.String(20), nullable=False, index=True),
+    alc.Column("progress", alc.Float, nullable=False, default=0.0),
+    alc.Column("message", alc.Text),
+    alc.Column("result", alc.Text),
+    alc.Column("error", alc.Text),
+    alc.Column("worker", alc.String(100)),
+    alc.Column("submitted", alc.DateTime, nullable=False),
+    alc.Column("started", alc.DateTime),
+    alc.Column("finished", alc.DateTime),
+    alc.Column("heartbeat", alc.DateTime),
+    alc.Column("attempts", alc.Integer, nullable=False, default=0, server_default="0"),
+)
+
+OPERATIONS: dict[str, Callable] = {}
+
+
+def register_operation(name: str) -> Callable:
+    """
+    Decorator that registers a function as operation of the job queue. The
+    function is called with a JobContext as first argument and the keyword
+    arguments of the job; its return value (JSON serializable) is stored as
+    result of the job.
+
+    Example
+    -------
+    >>> @register_operation("recalculate")
+    >>> def recalculate(ctx, ms_id):
+    >>>     ctx.report(0.5, "half done")
+    >>>     return {"ms_id": ms_id}
+    """
+
+    def decorator(func: Callable) -> Callable:
+        OPERATIONS[name] = func
+        return func
+
+    return decorator
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return {
+            "__model__": type(value).__name__,
+            "data": value.model_dump(mode="json"),
+        }
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    return value
+
+
+def _decode(value: Any) -> Any:
+    if isinstance(value, dict) and "__model__" in value:
+        name = value["__model__"]
+        model = getattr(cpm, name, None) or getattr(cpmol, name, None)
+        if model is None:
+            raise ValueError(f"Model {name} unknown!")
+        return model(**value["data"])
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _decode(v) for k, v in value.items()}
+    return value
+
+
+@dataclass
+class JobInfo:
+    """
+    State of a job.
+
+    Attributes
+    ----------
+    id : int
+        Job ID.
+    operation : str
+        Name of the operation.
+    status : str
+        "queued", "running", "done", "failed" or "cancelled".
+    progress : float
+        Progress between 0 and 1 reported by the operation.
+    message : str, optional
+        Last message reported by the operation.
+    result : Any, optional
+        Return value of the operation (status "done").
+    error : str, optional
+        Error message (status "failed").
+    worker : str, optional
+        Host and process ID of the worker.
+    submitted, started, finished : datetime, optional
+        Timestamps (UTC).
+    heartbeat : datetime, optional
+        Last sign of life of the worker (UTC).
+    attempts : int
+        Number of times the job was started.
+    """
+
+    id: int
+    operation: str
+    status: str
+    progress: float
+    message: Optional[str]
+    result: Any
+    error: Optional[str]
+    worker: Optional[str]
+    submitted: datetime
+    started: Optional[datetime]
+    finished: Optional[datetime]
+    heartbeat: Optional[datetime] = None
+    attempts: int = 0
+
+    @property
+    def succeeded(self) -> bool:
+        """True if the job was completed successfully."""
+        return self.status == "done"
+
+    @property
+    def completed(self) -> bool:
+        """True if the job will not change anymore."""
+        return self.status in ("done", "failed", "cancelled")
+
+    @property
+    def duration(self) -> Optional[float]:
+        """Run time in seconds (None if the job did not finish)."""
+        if self.started is None or self.finished is None:
+            return None
+        return (self.finished - self.started).total_seconds()
+
+
+class JobContext:
+    """Handle of a running job that is passed to the operation."""
+
+    def __init__(self, job_queue: "JobQueue", job_id: int):
+        self.job_queue = job_queue
+        self.job_id = job_id
+
+    def report(self, progress: float, message: Optional[str] = None) -> None:
+        """
+        Records the progress of the job (and updates its heartbeat).
+
+        Parameters
+        ----------
+        progress : float
+            Progress between 0 and 1.
+        message : str, optional
+            Short description of the current step.
+        """
+        with self.job_queue.engine.begin() as conn:
+            conn.execute(
+                jobs_table.update()
+                .where(jobs_table.c.id == self.job_id)
+                .values(progress=progress, message=message, heartbeat=_now())
+            )
+
+
+class _Heartbeat:
+    """Updates the heartbeat of a running job in a background thread."""
+
+    def __init__(self, job_queue: "JobQueue", job_id: int, interval: float):
+        self.job_queue = job_queue
+        self.job_id = job_id
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            with self.job_queue.engine.begin() as conn:
+                conn.execute(
+                    jobs_table.update()
+                    .where(jobs_table.c.id == self.job_id)
+                    .values(heartbeat=_now())
+                )
+
+    def __enter__(self) -> "_Heartbeat":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+class JobQueue:
+    """
+    Job queue in the table "jobs" of a database.
+
+    Parameters
+    ----------
+    url : str, optional
+        SQLAlchemy URL of the database. The default is the configured
+        job_database_url (~/.specatalog/jobs.sqlite).
+    lease_seconds : float, optional
+        Running jobs without a heartbeat for this time are lost. The
+        heartbeat is sent every quarter of the lease. The default is the
+        configured job_lease_seconds.
+    max_attempts : int, optional
+        Lost jobs are requeued until they were started this often, then
+        they fail. The default is the configured job_max_attempts.
+
+    Example
+    -------
+    >>> jobs = JobQueue()
+    >>> job_id = jobs.submit("raw_data_to_hdf5", ms_id=222, fmt="bruker_bes3t")
+    >>> jobs.wait(job_id).status
+    'done'
+    """
+
+    def __init__(
+        self,
+        url: str = JOB_DATABASE_URL,
+        lease_seconds: float = JOB_LEASE_SECONDS,
+        max_attempts: int = JOB_MAX_ATTEMPTS,
+    ):
+        self.url = url
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        connect_args = {"timeout": 30} if url.startswith("sqlite") else {}
+        self.engine = alc.create_engine(url, connect_args=connect_args)
+        _metadata.create_all(self.engine)
+        self._add_missing_columns()
+
+    def _add_missing_columns(self) -> None:
+        """Adds columns of newer versions to an existing jobs table."""
+        existing = {c["name"] for c in alc.inspect(self.engine).get_columns("jobs")}
+        with self.engine.begin() as conn:
+            for column in jobs_table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE jobs ADD COLUMN {column.name} "
+                ddl += column.type.compile(dialect=self.engine.dialect)
+                if column.server_default is not None:
+                    ddl += f" NOT NULL DEFAULT {column.server_default.arg}"
+                conn.execute(alc.text(ddl))
+
+    def submit(self, operation: str, **kwargs) -> int:
+        """
+        Adds a job to the queue.
+
+        Parameters
+        ----------
+        operation : str
+            Name of a registered operation.
+        **kwargs
+            Arguments of the operation.
+
+        Raises
+        ------
+        ValueError
+            If the operation is unknown.
+
+        Returns
+        -------
+        int
+            Job ID.
+        """
+        if operation not in OPERATIONS:
+            raise ValueError(f"Operation {operation} unknown!")
+        with self.engine.begin() as conn:
+            result = conn.execute(
+                jobs_table.insert().values(
+                    operation=operation,
+                    arguments=json.dumps(_encode(kwargs)),
+                    status="queued",
+                    progress=0.0,
+                    submitted=_now(),
+                )
+            )
+            return result.inserted_primary_key[0]
+
+    def status(self, job_id: int) -> JobInfo:
+        """
+        Returns the current state of a job.
+
+        Raises
+        ------
+        KeyError
+            If there is no job with this ID.
+        """
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                jobs_table.select().where(jobs_table.c.id == job_id)
+            ).first()
+        if row is None:
+            raise KeyError(f"No job with the ID {job_id}.")
+        return self._info(row)
+
+    def list_jobs(self, status: Optional[str] = None) -> list[JobInfo]:
+        """Returns all jobs (optionally only those with the given status)."""
+        query = jobs_table.select().order_by(jobs_table.c.id)
+        if status is not None:
+            query = query.where(jobs_table.c.status == status)
+        with self.engine.connect() as conn:
+            return [self._info(row) for row in conn.execute(query)]
+
+    def wait(
+        self, job_id: int, timeout: Optional[float] = None, poll_interval: float = 0.5
+    ) -> JobInfo:
+        """
+        Waits until a job is completed.
+
+        Parameters
+        ----------
+        job_id : int
+            Job ID.
+        timeout : float, optional
+            Maximal waiting time in seconds. The default is None (no limit).
+        poll_interval : float, optional
+            Seconds between two status requests. The default is 0.5.
+
+        Raises
+        ------
+        TimeoutError
+            If the job is not completed within timeout.
+
+        Returns
+        -------
+        JobInfo
+            Final state of the job.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            info = self.status(job_id)
+            if info.completed:
+                return info
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"Job {job_id} is still {info.status}.")
+            time.sleep(poll_interval)
+
+    def cancel(self, job_id: int) -> bool:
+        """
+        Cancels a job that has not started yet.
+
+        Returns
+        -------
+        bool
+            True if the job was cancelled.
+        """
+        with self.engine.begin() as conn:
+            result = conn.execute(
+                jobs_table.update()
+                .where(jobs_table.c.id == job_id, jobs_table.c.status == "queued")
+                .values(status="cancelled", finished=_now())
+            )
+        return result.rowcount == 1
+
+    def _recover_lost(self) -> None:
+        """Requeues (or fails) running jobs whose heartbeat is older than
+        the lease."""
+        stale = datetime.fromtimestamp(
+            time.time() - self.lease_seconds, timezone.utc
+        ).replace(tzinfo=None)
+        lost = (
+            jobs_table.c.status == "running",
+            alc.func.coalesce(jobs_table.c.heartbeat, jobs_table.c.started) < stale,
+        )
+        with self.engine.begin() as conn:
+            conn.execute(
+                jobs_table.update()
+                .where(*lost, jobs_table.c.attempts >= self.max_attempts)
+                .values(
+                    status="failed",
+                    finished=_now(),
+                    error="WorkerLost: no heartbeat of worker "
+                    + alc.func.coalesce(jobs_table.c.worker, ""),
+                )
+            )
+            conn.execute(
+                jobs_table.update()
+                .where(*lost)
+                .values(status="queued", worker=None, progress=0.0, message=None)
+            )
+
+    def _claim(self, worker: str) -> Optional[int]:
+        """Requeues lost jobs, then marks the oldest queued job as running;
+        returns its ID."""
+        self._recover_lost()
+        while True:
+            with self.engine.begin() as conn:
+                job_id = conn.execute(
+                    alc.select(jobs_table.c.id)
+                    .where(jobs_table.c.status == "queued")
+                    .order_by(jobs_table.c.id)
+                    .limit(1)
+                ).scalar()
+                if job_id is None:
+                    return None
+                # only one worker gets the job if several try at the same time
+                claimed = conn.execute(
+                    jobs_table.update()
+                    .where(jobs_table.c.id == job_id, jobs_table.c.status == "queued")
+                    .values(
+                        status="running",
+                        worker=worker,
+                        started=_now(),
+                        heartbeat=_now(),
+                        attempts=jobs_table.c.attempts + 1,
+                    )
+                ).rowcount
+            if claimed:
+                return job_id
+
+    def run_next(self) -> Optional[JobInfo]:
+        """
+        Runs the oldest queued job in the current process.
+
+        Returns
+        -------
+        Optional[JobInfo]
+            Final state of the job, None if the queue is empty.
+        """
+        worker = f"{os.uname().nodename}:{os.getpid()}"
+        job_id = self._claim(worker)
+        if job_id is None:
+            return None
+
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                jobs_table.select().where(jobs_table.c.id == job_id)
+            ).one()
+        try:
+            func = OPERATIONS[row.operation]
+            kwargs = _decode(json.loads(row.arguments))
+            with _Heartbeat(self, job_id, self.lease_seconds / 4):
+                result = func(JobContext(self, job_id), **kwargs)
+            values = dict(status="done", progress=1.0, result=json.dumps(result))
+        except Exception as e:
+            values = dict(status="failed", error=f"{type(e).__name__}: {e}")
+
+        # the job may have been requeued meanwhile if the heartbeat was lost
+        with self.engine.begin() as conn:
+            conn.execute(
+                jobs_table.update()
+                .where(
+                    jobs_table.c.id == job_id,
+                    jobs_table.c.status == "running",
+                    jobs_table.c.worker == worker,
+                )
+                .values(finished=_now(), **values)
+            )
+        return self.status(job_id)
+
+    def work(self, poll_interval: float = 1.0, once: bool = False) -> int:
+        """
+        Runs queued jobs until interrupted.
+
+        Parameters
+        ----------
+        poll_interval : float, optional
+            Seconds to wait when the queue is empty. The default is 1.
+        once : bool, optional
+            If True, return as soon as the queue is empty. The default is
+            False.
+
+        Returns
+        -------
+        int
+            Number of jobs that were run.
+        """
+        count = 0
+        while True:
+            if self.run_next() is not None:
+                count += 1
+                continue
+            if once:
+                return count
+            time.sleep(poll_interval)
+
+    def statistics(self) -> dict[str, dict]:
+        """
+        Throughput of the finished jobs per operation.
+
+        Returns
+        -------
+        dict[str, dict]
+            Operation -> {"done": int, "failed": int, "mean_seconds": float,
+            "total_seconds": float}; the times refer to successful jobs.
+        """
+        stats: dict[str, dict] = {}
+        for info in self.list_jobs():
+            if info.status not in ("done", "failed"):
+                continue
+            entry = stats.setdefault(
+                info.operation,
+                {"done": 0, "failed": 0, "mean_seconds": 0.0, "total_seconds": 0.0},
+            )
+            entry[info.status] += 1
+            if info.succeeded:
+                entry["total_seconds"] += info.duration
+        for entry in stats.values():
+            if entry["done"]:
+                entry["mean_seconds"] = entry["total_seconds"] / entry["done"]
+        return stats
+
+    @staticmethod
+    def _info(row) -> JobInfo:
+        return JobInfo(
+            id=row.id,
+            operation=row.operation,
+            status=row.status,
+            progress=row.progress,
+            message=row.message,
+            result=None if row.result is None else json.loads(row.result),
+            error=row.error,
+            worker=row.worker,
+            submitted=row.submitted,
+            started=row.started,
+            finished=row.finished,
+            heartbeat=row.heartbeat,
+            attempts=row.attempts,
+        )
+
+
+_job_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    """Returns the job queue of the configured job database."""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue()
+    return _job_queue
+
+
+def submit(operation: str, **kwargs) -> int:
+    """
+    Adds a job to the configured job queue and returns its ID immediately.
+
+    Parameters
+    ----------
+    operation : str
+        "create_full_measurement", "delete_full_measurement",
+        "raw_data_to_hdf5" or another registered operation.
+    **kwargs
+        Arguments of the operation.
+
+    Returns
+    -------
+    int
+        Job ID.
+
+    Example
+    -------
+    >>> job_id = submit(
+    >>>     "create_full_measurement",
+    >>>     data=model, raw_data_path=["/data/spectrum"], fmt="bruker_bes3t"
+    >>> )
+    """
+    return get_job_queue().submit(operation, **kwargs)
+
+
+def job_status(job_id: int) -> JobInfo:
+    """Returns the current state of a job of the configured job queue."""
+    return get_job_queue().status(job_id)
+
+
+def wait(job_id: int, timeout: Optional[float] = None) -> JobInfo:
+    """
+    Waits until a job of the configured job queue is completed.
+
+    Raises
+    ------
+    TimeoutError
+        If the job is not completed within timeout seconds.
+    """
+    return get_job_queue().wait(job_id, timeout)
+
+
+@register_operation("create_full_measurement")
+def _create_full_measurement(ctx: JobContext, data, raw_data_path, fmt) -> dict:
+    result = full_entry.create_full_measurement(
+        data, raw_data_path, fmt, progress=ctx.report
+    )
+    if not result.success:
+        raise result.error
+    transfer = result.transfer
+    return {
+        "measurement_id": result.measurement_id,
+        "files": transfer.files,
+        "bytes": transfer.bytes,
+        "upload_seconds": transfer.seconds,
+    }
+
+
+@register_operation("delete_full_measurement")
+def _delete_full_measurement(ctx: JobContext, ms_id) -> dict:
+    ctx.report(0.0, f"deleting measurement M{ms_id}")
+    result = full_entry.delete_full_measurement(ms_id)
+    if not result.success:
+        raise result.error
+    return {"measurement_id": result.measurement_id}
+
+
+@register_operation("raw_data_to_hdf5")
+def _raw_data_to_hdf5(ctx: JobContext, ms_id, fmt) -> dict:
+    mm.raw_data_to_hdf5(ms_id, fmt, progress=ctx.report)
+    return {"measurement_id": ms_id}
+
+
+@register_operation("build_similarity_index")
+def _build_similarity_index(ctx: JobContext, method, rebuild=False) -> dict:
+    index = similarity.build_similarity_index(
+        method, rebuild=rebuild, progress=ctx.report
+    )
+    return {"method": method, "measurements": len(index)}
+
+
+def _worker_process(
+    url: str, poll_interval: float, once: bool, modules: list[str]
+) -> None:
+    # operations of other modules are registered when they are imported
+    for module in modules:
+        importlib.import_module(module)
+    try:
+        JobQueue(url).work(poll_interval, once)
+    except KeyboardInterrupt:
+        pass
+
+
+def worker_cli(argv: Optional[list[str]] = None) -> None:
+    """Command line tool: run worker processes of the job queue."""
+    parser = argparse.ArgumentParser(description="Run the jobs of the job queue.")
+    parser.add_argument(
+        "-n", "--processes", type=int, default=1, help="number of worker processes"
+    )
+    parser.add_argument(
+        "--once", action="store_true", help="stop when the queue is empty"
+    )
+    parser.add_argument(
+        "--poll-interval", type=float, default=1.0, help="seconds between polls"
+    )
+    parser.add_argument(
+        "--module",
+        action="append",
+        default=[],
+        help="import this module to register further operations",
+    )
+    parser.add_argument(
+        "--stats", action="store_true", help="print the throughput and exit"
+    )
+    args = parser.parse_args(argv)
+
+    if args.stats:
+        for operation, entry in get_job_queue().statistics().items():
+            print(
+                f"{operation}: {entry['done']} done, {entry['failed']} failed, "
+                f"{entry['mean_seconds']:.1f} s per job"
+            )
+        return
+
+    print(f"Starting {args.processes} workers for {JOB_DATABASE_URL}.")
+    ctx = multiprocessing.get_context("spawn")
+    processes = [
+        ctx.Process(
+            target=_worker_process,
+            args=(JOB_DATABASE_URL, args.poll_interval, args.once, args.module),
+        )
+        for _ in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.join()
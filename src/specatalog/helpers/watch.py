@@ -0,0 +1,567 @@
+"""
+Background ingest of new measurements from drop folders. The spectrometer
+PCs copy their raw files into a configured folder; the watcher waits until a
+measurement is complete (DSC + DTA (+ XGF/YGF/ZGF) or .txt) and its files did
+not change for settle_time seconds, and then creates the full measurement
+(database entry and archive directory) in a worker thread. Ingested files are
+moved to <folder>/ingested/<base>.M<id>.<suffix>, files that still fail after
+max_retries attempts to <folder>/failed/<base>.<time>.<suffix> together with
+an .error.txt. If the files of an ingested measurement cannot be moved (e.g.
+still locked by the spectrometer software), only the move is retried.
+
+The folders are read from ~/.specatalog/watch.json::
+
+    {
+     "settle_time": 30,
+     "workers": 2,
+     "folders": [
+      {"path": "/mnt/drop/emx", "fmt": "cw_epr", "model": "CWEPRModel",
+       "metadata": {"measured_by": "...", "location": "...", "device": "..."}}
+     ]
+    }
+
+The metadata of a folder can be extended or overwritten per measurement by a
+sidecar file <base>.json next to the raw files (e.g. with molecular_id,
+solvent, temperature). "model" and "fmt" can be set in the sidecar as well.
+If the date is missing, the modification date of the raw files is used. For
+Bruker data, missing temperature (STMP), frequency band (MWFQ) and number of
+scans (AVGS) are read from the header of the DSC file.
+
+File system events are received via watchdog (inotify) if the package is
+installed; otherwise the folders are polled every poll_interval seconds.
+"""
+
+import argparse
+import json
+import queue
+import shutil
+import threading
+import time
+import traceback
+from dataclasses import dataclass, field
+from datetime import date
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+import specatalog.data_management.data_loader as dl
+import specatalog.data_management.measurement_management as mm
+import specatalog.models.creation_pydantic_measurements as cpm
+from specatalog.helpers import full_entry
+from specatalog.main import ALLOWED_VALUES as av
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+WATCH_CONFIG = Path.home() / ".specatalog" / "watch.json"
+INGESTED_DIR = "ingested"
+FAILED_DIR = "failed"
+
+# suffix of the file that identifies a measurement in a drop folder
+_MAIN_SUFFIX = {
+    "bruker_bes3t": ".DSC",
+    "cw_epr": ".DSC",
+    "uvvis_ulm": ".txt",
+    "uvvis_freiburg": ".txt",
+}
+
+# frequency bands by microwave frequency (MWFQ) in GHz; used only if the
+# band is one of the allowed values (FrequencyBands) of the archive
+_FREQUENCY_BANDS = (("s", 2, 4), ("x", 8, 12), ("q", 33, 50), ("w", 75, 110))
+
+
+@dataclass
+class WatchFolder:
+    """
+    Drop folder of a spectrometer.
+
+    Attributes
+    ----------
+    path : Path
+        Folder that is watched (not recursive).
+    fmt : str
+        Format of the raw data ("bruker_bes3t", "cw_epr", "uvvis_ulm" or
+        "uvvis_freiburg").
+    model : str
+        Name of the measurement model in
+        specatalog.models.creation_pydantic_measurements (e.g. "CWEPRModel").
+    metadata : dict
+        Metadata that is common to all measurements of the folder.
+    """
+
+    path: Path
+    fmt: str
+    model: str
+    metadata: dict = field(default_factory=dict)
+
+    def __post_init__(self):
+        self.path = Path(self.path)
+        if self.fmt not in _MAIN_SUFFIX:
+            raise ValueError(f"Data type: {self.fmt} unknown!")
+
+
+@dataclass
+class MeasurementGroup:
+    """
+    Raw files of one measurement in a drop folder.
+
+    Attributes
+    ----------
+    folder : WatchFolder
+        Drop folder of the measurement.
+    base : Path
+        Path of the raw files without suffix.
+    files : list[Path]
+        Raw files of the measurement.
+    """
+
+    folder: WatchFolder
+    base: Path
+    files: list[Path]
+
+    @property
+    def sidecar(self) -> Path:
+        return self.base.with_suffix(".json")
+
+    @property
+    def all_files(self) -> list[Path]:
+        return self.files + ([self.sidecar] if self.sidecar.exists() else [])
+
+
+def _group_files(base: Path, fmt: str) -> Optional[list[Path]]:
+    """
+    Returns all raw files of the measurement base if they are complete,
+    otherwise None.
+    """
+    if fmt in ("bruker_bes3t", "cw_epr"):
+        dsc = mm._with_suffix(base, ".DSC")
+        files = [dsc, mm._with_suffix(base, ".DTA")]
+        try:
+            params = dl.read_dsc_file(dsc)
+        except OSError:  # not (completely) written yet
+            return None
+        # non-linear axes are stored in extra files
+        for axis in ("X", "Y", "Z"):
+            axis_file = mm._with_suffix(base, f".{axis}GF")
+            if params.get(f"{axis}TYP") == "IGD" or axis_file.exists():
+                files.append(axis_file)
+    else:
+        files = [mm._with_suffix(base, ".txt")]
+    if not all(f.is_file() for f in files):
+        return None
+    return files
+
+
+def _frequency_band(frequency: float) -> Optional[str]:
+    """
+    Allowed frequency band (FrequencyBands of the allowed values) of a
+    microwave frequency in Hz; None if its band is not allowed.
+    """
+    for band, low, high in _FREQUENCY_BANDS:
+        if low <= frequency / 1e9 <= high:
+            for allowed in av.FrequencyBands:
+                if band in (allowed.name.lower(), str(allowed.value).lower()):
+                    return allowed.value
+    return None
+
+
+def _header_metadata(dsc: Path) -> dict:
+    """
+    Reads temperature, frequency band and number of scans from the header of
+    Bruker raw files. Only the DSC file is read, not the data.
+    """
+    params, _ = dl.read_bruker_header(dsc)
+    header = {}
+    temperature = params.get("STMP")
+    if isinstance(temperature, (int, float)) and temperature > 0:
+        header["temperature"] = float(temperature)
+    frequency = params.get("MWFQ")
+    if isinstance(frequency, (int, float)):
+        band = _frequency_band(frequency)
+        if band is not None:
+            header["frequency_band"] = band
+    scans = params.get("AVGS")
+    if isinstance(scans, int) and scans > 0:
+        header["number_of_scans"] = scans
+    return header
+
+
+def _measurement_data(group: MeasurementGroup) -> tuple:
+    """
+    Collects the metadata of a group from the folder configuration, the
+    sidecar file and, for Bruker data, the header of the raw files.
+
+    Returns
+    -------
+    tuple
+        Validated measurement model, fmt.
+    """
+    metadata = dict(group.folder.metadata)
+    if group.sidecar.exists():
+        metadata.update(json.loads(group.sidecar.read_text()))
+    model_name = metadata.pop("model", group.folder.model)
+    fmt = metadata.pop("fmt", group.folder.fmt)
+    if "date" not in metadata:
+        mtime = max(f.stat().st_mtime for f in group.files)
+        metadata["date"] = date.fromtimestamp(mtime)
+
+    model = getattr(cpm, model_name, None)
+    if model is None:
+        raise ValueError(f"Measurement model {model_name} unknown!")
+    if fmt in ("bruker_bes3t", "cw_epr"):
+        for key, value in _header_metadata(group.files[0]).items():
+            if key in model.model_fields:
+                metadata.setdefault(key, value)
+    return model(**metadata), fmt
+
+
+def ingest_group(group: MeasurementGroup) -> int:
+    """
+    Creates the full measurement of a group of raw files.
+
+    Returns
+    -------
+    int
+        ID of the new measurement.
+    """
+    data, fmt = _measurement_data(group)
+    result = full_entry.create_full_measurement(data, [str(group.base)], fmt)
+    if not result.success:
+        raise result.error
+    return result.measurement_id
+
+
+class _WakeHandler(FileSystemEventHandler):
+    def __init__(self, wake: threading.Event):
+        super().__init__()
+        self.wake = wake
+
+    def on_any_event(self, event):
+        self.wake.set()
+
+
+class FolderWatcher:
+    """
+    Watches drop folders and ingests complete measurements in the background.
+
+    The scanner puts complete, stable groups into a bounded queue. If the
+    workers cannot keep up, the queue is full and the scanner waits
+    (backpressure) instead of collecting more work. Failed groups are retried
+    after retry_delay * 2**(attempt - 1) seconds.
+
+    Parameters
+    ----------
+    folders : list[WatchFolder]
+        Drop folders.
+    ingest : Callable[[MeasurementGroup], int], optional
+        Function that ingests a group and returns the measurement ID. The
+        default is ingest_group.
+    poll_interval : float, optional
+        Seconds between two scans of the folders. The default is 5.
+    settle_time : float, optional
+        Seconds the files of a measurement must be unchanged before they are
+        ingested. The default is 30.
+    workers : int, optional
+        Number of worker threads. The default is 2.
+    queue_size : int, optional
+        Maximal number of waiting groups. The default is 8.
+    max_retries : int, optional
+        Number of retries of a failed group. The default is 3.
+    retry_delay : float, optional
+        Delay before the first retry in seconds. The default is 60.
+
+    Example
+    -------
+    >>> folder = WatchFolder("/mnt/drop/emx", "cw_epr", "CWEPRModel", {...})
+    >>> FolderWatcher([folder]).run()
+    """
+
+    def __init__(
+        self,
+        folders: list[WatchFolder],
+        ingest: Optional[Callable[[MeasurementGroup], int]] = None,
+        poll_interval: float = 5,
+        settle_time: float = 30,
+        workers: int = 2,
+        queue_size: int = 8,
+        max_retries: int = 3,
+        retry_delay: float = 60,
+    ):
+        self.folders = folders
+        self.ingest = ingest or ingest_group
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.workers = workers
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._seen: dict[Path, tuple] = {}  # base -> (signature, since)
+        self._active: set[Path] = set()  # queued or in progress
+        self._attempts: dict[Path, int] = {}
+        self._retry_at: dict[Path, float] = {}
+        # ingested groups whose files could not be moved yet -> measurement ID
+        self._unmoved: dict[Path, tuple[MeasurementGroup, int]] = {}
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._observer = None
+
+    def _candidates(self, folder: WatchFolder):
+        # Bruker software saves .DSC/.DTA or .dsc/.dta
+        suffix = _MAIN_SUFFIX[folder.fmt].lower()
+        bases = (
+            p.with_suffix("")
+            for p in sorted(folder.path.iterdir())
+            if p.suffix.lower() == suffix and p.is_file()
+        )
+        yield from dict.fromkeys(bases)
+
+    def scan(self) -> int:
+        """
+        Scans all folders once and queues the measurements that are complete
+        and stable. Blocks while the queue is full.
+
+        Returns
+        -------
+        int
+            Number of queued measurements.
+        """
+        queued = 0
+        for folder in self.folders:
+            for base in self._candidates(folder):
+                now = time.monotonic()
+                with self._lock:
+                    if base in self._active or self._retry_at.get(base, 0) > now:
+                        continue
+                    unmoved = self._unmoved.get(base)
+                    if unmoved is not None:
+                        self._active.add(base)
+                if unmoved is not None:  # only the files are moved again
+                    if not self._put(unmoved[0]):
+                        return queued
+                    queued += 1
+                    continue
+
+                files = _group_files(base, folder.fmt)
+                if files is None:
+                    self._seen.pop(base, None)
+                    continue
+                group = MeasurementGroup(folder, base, files)
+                try:
+                    signature = tuple(
+                        (f.name, f.stat().st_size, f.stat().st_mtime_ns)
+                        for f in group.all_files
+                    )
+                except FileNotFoundError:  # moved in the meantime
+                    continue
+
+                previous = self._seen.get(base)
+                if previous is None or previous[0] != signature:
+                    self._seen[base] = (signature, now)
+                    if self.settle_time > 0:
+                        continue
+                elif now - previous[1] < self.settle_time:
+                    continue
+
+                del self._seen[base]
+                with self._lock:
+                    self._active.add(base)
+                if not self._put(group):
+                    return queued
+                queued += 1
+        return queued
+
+    def _put(self, group: MeasurementGroup) -> bool:
+        """Waits for a free place in the queue (False if stopped)."""
+        while True:
+            try:
+                self._queue.put(group, timeout=0.5)
+                return True
+            except queue.Full:
+                if self._stop.is_set():
+                    with self._lock:
+                        self._active.discard(group.base)
+                    return False
+
+    def process(self, group: MeasurementGroup) -> Optional[int]:
+        """
+        Ingests one group and moves its files to ingested/ or, after the last
+        retry, to failed/. A group that was already ingested, but whose files
+        could not be moved, is not ingested again.
+
+        Returns
+        -------
+        Optional[int]
+            ID of the new measurement, None if the ingest failed.
+        """
+        base = group.base
+        with self._lock:
+            ms_id = self._unmoved.get(base, (None, None))[1]
+        try:
+            if ms_id is None:
+                ms_id = self.ingest(group)
+        except Exception as e:
+            with self._lock:
+                attempt = self._attempts.get(base, 0) + 1
+                self._attempts[base] = attempt
+                if attempt <= self.max_retries:
+                    delay = self.retry_delay * 2 ** (attempt - 1)
+                    self._retry_at[base] = time.monotonic() + delay
+                    self._active.discard(base)
+                    print(f"{base.name}: ingest failed ({e}), retry in {delay:.0f} s")
+                    return None
+            name = self._move(group, FAILED_DIR, time.strftime("%Y%m%d-%H%M%S"))
+            (group.folder.path / FAILED_DIR / f"{name}.error.txt").write_text(
+                "".join(traceback.format_exception(e))
+            )
+            print(f"{base.name}: ingest failed, moved to {FAILED_DIR}/")
+            self._forget(base)
+            return None
+
+        try:
+            self._move(group, INGESTED_DIR, f"M{ms_id}")
+        except OSError as e:
+            with self._lock:
+                self._unmoved[base] = (group, ms_id)
+                self._retry_at[base] = time.monotonic() + self.retry_delay
+                self._active.discard(base)
+            print(f"{base.name}: ingested as M{ms_id}, files not moved ({e})")
+            return ms_id
+        with self._lock:
+            self._unmoved.pop(base, None)
+        print(f"{base.name}: ingested as M{ms_id}")
+        self._forget(base)
+        return ms_id
+
+    def _forget(self, base: Path) -> None:
+        with self._lock:
+            self._active.discard(base)
+            self._attempts.pop(base, None)
+            self._retry_at.pop(base, None)
+
+    def _move(self, group: MeasurementGroup, subdir: str, tag: str) -> str:
+        """
+        Moves the files of a group to subdir as <base>.<tag>.<suffix> (with a
+        counter if the names exist). The main file is moved last, so a group
+        whose move failed is found again by the scan. Returns the new base
+        name.
+        """
+        target = group.folder.path / subdir
+        target.mkdir(exist_ok=True)
+        main = _MAIN_SUFFIX[group.folder.fmt].lower()
+        files = sorted(
+            (f for f in group.all_files if f.exists()),
+            key=lambda f: f.suffix.lower() == main,
+        )
+        suffixes = [f.name[len(group.base.name) :] for f in files]
+        name = f"{group.base.name}.{tag}"
+        n = 1
+        while any((target / f"{name}{suffix}").exists() for suffix in suffixes):
+            n += 1
+            name = f"{group.base.name}.{tag}_{n}"
+        for f, suffix in zip(files, suffixes):
+            shutil.move(f, target / f"{name}{suffix}")
+        return name
+
+    def _work(self) -> None:
+        while not self._stop.is_set():
+            try:
+                group = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                self.process(group)
+            except Exception as e:  # e.g. files could not be moved
+                print(f"{group.base.name}: {e}")
+                self._forget(group.base)
+            finally:
+                self._queue.task_done()
+
+    def _scan_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.scan()
+            except OSError as e:  # folder temporarily not available
+                print(f"Scan failed: {e}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def start(self) -> None:
+        """Starts the watcher threads in the background."""
+        self._stop.clear()
+        if Observer is not None:
+            self._observer = Observer()
+            for folder in self.folders:
+                self._observer.schedule(_WakeHandler(self._wake), str(folder.path))
+            self._observer.start()
+        self._threads = [
+            threading.Thread(target=self._work, daemon=True)
+            for _ in range(self.workers)
+        ]
+        self._threads.append(threading.Thread(target=self._scan_loop, daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        """Stops the watcher; running ingests are finished first."""
+        self._stop.set()
+        self._wake.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def run(self) -> None:
+        """Runs the watcher until it is interrupted (Ctrl+C)."""
+        self.start()
+        try:
+            while not self._stop.wait(1):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+
+def load_watch_config(path: Union[str, Path] = WATCH_CONFIG) -> FolderWatcher:
+    """
+    Creates a FolderWatcher from a configuration file (see module
+    description).
+
+    Parameters
+    ----------
+    path : Union[str, Path], optional
+        JSON configuration. The default is ~/.specatalog/watch.json.
+
+    Returns
+    -------
+    FolderWatcher
+    """
+    with open(path, "r") as f:
+        config = json.load(f)
+    folders = [WatchFolder(**folder) for folder in config.pop("folders")]
+    return FolderWatcher(folders, **config)
+
+
+def watch_cli(argv: Optional[list[str]] = None) -> None:
+    """Command line tool: watch the drop folders and ingest new measurements."""
+    parser = argparse.ArgumentParser(
+        description="Ingest new measurements from spectrometer drop folders."
+    )
+    parser.add_argument(
+        "--config", default=WATCH_CONFIG, help="configuration (JSON) of the folders"
+    )
+    args = parser.parse_args(argv)
+
+    watcher = load_watch_config(args.config)
+    mode = "inotify" if Observer is not None else "polling"
+    print(f"Watching {len(watcher.folders)} folders ({mode}), stop with Ctrl+C.")
+    watcher.run()
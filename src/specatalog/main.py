@@ -15,7 +15,7 @@ Key Components:
 
 2. Archive Access:
    - SpecatalogArchive instance for file operations
-   - Support for both local and remote archives
+   - Support for local, remote (SMB) and in-memory archive backends
 
 3. Configuration:
    - Allowed values loading from external module
@@ -25,6 +25,7 @@ Configuration:
 - DATABASE_URL_USR: Database connection URL
 - BASE_PATH: Base path for archive
 - REMOTE_ARCHIVE: Flag for remote archive usage
+- ARCHIVE_BACKEND: Storage backend of the archive ("local", "smb", "memory")
 
 Usage:
 - Use db_session() context manager for database operations
@@ -39,7 +40,12 @@ from contextlib import contextmanager
 import importlib.util
 import sys
 
-from specatalog.config import DATABASE_URL_USR, BASE_PATH, REMOTE_ARCHIVE
+from specatalog.config import (
+    DATABASE_URL_USR,
+    BASE_PATH,
+    REMOTE_ARCHIVE,
+    ARCHIVE_BACKEND,
+)
 from specatalog.data_management.archive_manager import SpecatalogArchive
 
 # Database Engine Configuration
@@ -89,7 +95,7 @@ if REMOTE_ARCHIVE:
 else:
     remote = False
 
-archive = SpecatalogArchive(remote, BASE_PATH)
+archive = SpecatalogArchive(remote, BASE_PATH, backend=ARCHIVE_BACKEND)
 
 # Allowed Values Configuration
 _ALLOWED_VALUES_MODULE = None
@@ -11,6 +11,10 @@ Model = orm.declarative_base()
 Model.query = Session.query_property()
 
 
+def _utc_now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.UTC)
+
+
 class TimeStampedModel(Model):
     """
     Abstract base class providing automatic timestamp fields for all
@@ -73,8 +77,8 @@ class TimeStampedModel(Model):
 
     __abstract__ = True
 
-    created_at = alc.Column(alc.DateTime, default=datetime.datetime.now(datetime.UTC))
-    updated_at = alc.Column(alc.DateTime, onupdate=datetime.datetime.now(datetime.UTC))
+    created_at = alc.Column(alc.DateTime, default=_utc_now)
+    updated_at = alc.Column(alc.DateTime, onupdate=_utc_now)
 
 
 @event.listens_for(TimeStampedModel, "before_update", propagate=True)
@@ -67,6 +67,7 @@ def engine():
 
 @pytest.fixture
 def db_session(engine):
+    from specatalog.crud_db.read import forget_measurements
     from specatalog.models.base import Model
 
     Model.metadata.create_all(engine)
@@ -78,6 +79,35 @@ def db_session(engine):
 
     session.close()
     Model.metadata.drop_all(engine)
+    # ids are reused by the next test database
+    forget_measurements()
+
+
+def _new_archive(backend, tmp_path):
+    from specatalog.data_management.archive_backends import MemoryBackend
+    from specatalog.data_management.archive_manager import SpecatalogArchive
+
+    if backend == "local":
+        (tmp_path / "archive").mkdir()
+        archive = SpecatalogArchive(False, str(tmp_path / "archive"))
+    else:
+        archive = SpecatalogArchive(False, backend=MemoryBackend())
+    archive.make_dir("data")
+    return archive
+
+
+@pytest.fixture(params=["local", "memory"])
+def archive(request, tmp_path):
+    """Empty archive (with the directory data) on the local filesystem and
+    in memory."""
+    return _new_archive(request.param, tmp_path)
+
+
+@pytest.fixture
+def local_archive(tmp_path):
+    """Empty archive (with the directory data) on the local filesystem, for
+    tests that write files with h5py directly into archive.archive."""
+    return _new_archive("local", tmp_path)
 
 
 @pytest.fixture
@@ -125,6 +155,29 @@ def measurement_instance(entry_factory, molecule_instance):
     return ms
 
 
+@pytest.fixture
+def cwepr_entry(entry_factory, molecule_instance):
+    """Creates CWEPR measurements of molecule_instance; keyword arguments
+    override the default values."""
+
+    def create(**kwargs):
+        data = dict(
+            molecule=molecule_instance,
+            temperature=80,
+            solvent="toluene",
+            date=date(2026, 1, 1),
+            measured_by="richert",
+            path="cwepr",
+            corrected=False,
+            evaluated=False,
+            frequency_band="x",
+            attenuation="20dB",
+        )
+        return entry_factory(ms.CWEPR, **{**data, **kwargs})
+
+    return create
+
+
 @pytest.fixture(params=list(MOLECULE_SPECS.keys()))
 def model_spec(request):
     return MOLECULE_SPECS[request.param]
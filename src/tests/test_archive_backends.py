@@ -0,0 +1,363 @@
+import inspect
+import io
+import threading
+from types import SimpleNamespace
+
+import h5py
+import numpy as np
+import pytest
+from smbprotocol.exceptions import SMBConnectionClosed
+import specatalog.data_management.archive_manager as am
+from specatalog.data_management.archive_manager import SpecatalogArchive
+from specatalog.data_management.archive_backends import (
+    MemoryBackend,
+    _write_pipelined,
+)
+import specatalog.data_management.hdf5_reader as hr
+import specatalog.data_management.measurement_management as mm
+
+
+@pytest.fixture
+def uvvis_file(tmp_path):
+    (tmp_path / "src").mkdir()
+    path = tmp_path / "src" / "spectrum.txt"
+    path.write_text("sample\nWavelength (nm)\tAbs\n500.0\t0.1\n499.5\t0.2\n")
+    return path
+
+
+def test_files(archive, uvvis_file):
+    archive.make_dir("data/M1/raw")
+    archive.copy_to_archive(uvvis_file, "data/M1/raw/spectrum.txt")
+    assert archive.exists("data/M1/raw/spectrum.txt")
+    assert archive.list_files("data/M1/raw") == ["spectrum.txt"]
+    with archive.open_file("data/M1/raw/spectrum.txt") as f:
+        assert f.readline() == "sample\n"
+    archive.delete_file("data/M1/raw/spectrum.txt")
+    assert not archive.exists("data/M1/raw/spectrum.txt")
+
+
+def test_rename(archive, uvvis_file):
+    archive.copy_directory_to_archive(uvvis_file.parent, "data/M1")
+    archive.copy_to_archive(uvvis_file, "data/M1/copy.txt")
+    archive.rename("data/M1/copy.txt", "data/M1/spectrum.txt")
+    assert archive.list_files("data/M1") == ["spectrum.txt"]
+
+    archive.make_dir("trash")
+    archive.rename("data/M1", "trash/M1")
+    assert not archive.exists("data/M1")
+    assert archive.list_files("trash/M1") == ["spectrum.txt"]
+    with archive.open_file("trash/M1/spectrum.txt") as f:
+        assert f.readline() == "sample\n"
+
+
+def test_directories(archive, uvvis_file):
+    archive.copy_directory_to_archive(uvvis_file.parent, "data/M2")
+    assert archive.measurement_path(2).as_posix() == "data/M2"
+    with archive.temporary_path("data/M2") as local:
+        assert (local / "spectrum.txt").read_text().startswith("sample")
+    archive.delete_folder("data/M2")
+    with pytest.raises(FileNotFoundError):
+        archive.measurement_path(2)
+
+
+def test_measurement_ingest(archive, uvvis_file):
+    mm._create_measurement_dir(archive, 3)
+    mm._raw_data_to_folder(archive, uvvis_file, "uvvis_freiburg", 3)
+    mm._raw_data_to_hdf5(archive, 3, "uvvis_freiburg")
+    with archive.open_measurement_h5_file("data/M3/measurement_M3.h5", "r") as f:
+        assert list(f["raw_data/intensity_0"][()]) == [0.1, 0.2]
+
+
+def test_measurement_ingest_stacked(archive, uvvis_file, monkeypatch):
+    mm._create_measurement_dir(archive, 4)
+    second = uvvis_file.with_name("spectrum_2.txt")
+    second.write_text("sample\nWavelength (nm)\tAbs\n500.0\t0.3\n499.5\t0.4\n")
+    for path in (uvvis_file, second):
+        mm._raw_data_to_folder(archive, path, "uvvis_freiburg", 4)
+    mm._raw_data_to_hdf5(archive, 4, "uvvis_freiburg", layout="stacked")
+
+    monkeypatch.setattr(hr, "archive", archive)
+    data, sources = hr.load_series(4, "intensity")
+    assert data.tolist() == [[0.1, 0.2], [0.3, 0.4]]
+    assert sources == ["spectrum", "spectrum_2"]
+    data, sources = hr.load_series(4, "wavelength", rows=slice(1, 2))
+    assert data.tolist() == [[500.0, 499.5]]
+    assert sources == ["spectrum_2"]
+    with pytest.raises(KeyError):
+        hr.load_series(4, "data_real")
+
+    # rows of another shape do not fit the series
+    other = uvvis_file.with_name("spectrum_3.txt")
+    other.write_text("sample\nWavelength (nm)\tAbs\n500\t0.3\n499\t0.4\n498\t0.5\n")
+    with archive.open_measurement_h5_file("data/M4/measurement_M4.h5", "a") as f:
+        with pytest.raises(ValueError):
+            mm._raw_file_to_hdf5(other.with_suffix(""), "uvvis_freiburg", f, "stacked")
+        assert f["raw_data/intensity"].shape == (2, 2)
+        assert f["raw_data/series_index"].shape == (2,)
+
+
+def write_bes3t(folder, name, data):
+    np.asarray(data, dtype=">f8").tofile(folder / f"{name}.DTA")
+    (folder / f"{name}.DSC").write_text(
+        f"#DESC\t1.2\nBSEQ\tBIG\nIKKF\tREAL\nIRFMT\tD\nXTYP\tIDX\n"
+        f"XPTS\t{len(data)}\nXMIN\t3300\nXWID\t100\n"
+    )
+    return folder / name
+
+
+@pytest.mark.parametrize("fmt", ["cw_epr", "bruker_bes3t"])
+def test_bruker_ingest_stacked(tmp_path, fmt):
+    # real spectra have no imaginary part (data_imag None for cw_epr)
+    paths = [write_bes3t(tmp_path, f"scan_{n}", np.full(5, n)) for n in range(2)]
+    with h5py.File(tmp_path / "measurement.h5", "w") as f:
+        for path in paths:
+            mm._raw_file_to_hdf5(path, fmt, f, "stacked")
+        grp = f["raw_data"]
+        assert grp["data_real"][()].tolist() == [[0.0] * 5, [1.0] * 5]
+        assert grp["data_real"].dtype == np.float64
+        assert ("data_imag" in grp) == (fmt == "bruker_bes3t")
+        assert grp["series_index"].shape == (2,)
+        assert grp.attrs["XPTS"] == 5
+
+        # a complex spectrum has other quantities than the series
+        data = np.arange(10.0)
+        data.astype(">f8").tofile(tmp_path / "cplx.DTA")
+        (tmp_path / "cplx.DSC").write_text(
+            "BSEQ\tBIG\nIKKF\tCPLX\nIRFMT\tD\nXPTS\t5\nXMIN\t3300\nXWID\t100\n"
+        )
+        if fmt == "cw_epr":
+            with pytest.raises(ValueError):
+                mm._raw_file_to_hdf5(tmp_path / "cplx", fmt, f, "stacked")
+            assert grp["series_index"].shape == (2,)
+
+
+def test_bruker_ingest_lower_case(archive, tmp_path):
+    path = write_bes3t(tmp_path, "scan", np.arange(5.0))
+    for suffix in (".DSC", ".DTA"):
+        path.with_suffix(suffix).rename(path.with_suffix(suffix.lower()))
+    mm._create_measurement_dir(archive, 5)
+    hashes = mm._raw_data_to_folder(archive, path, "cw_epr", 5)
+    assert sorted(hashes) == ["raw/scan.dsc", "raw/scan.dta"]
+    mm._raw_data_to_hdf5(archive, 5, "cw_epr")
+    with archive.open_measurement_h5_file("data/M5/measurement_M5.h5", "r") as f:
+        assert f["raw_data/data_real_0"][()].tolist() == [0, 1, 2, 3, 4]
+
+
+def test_memory_backend_round_trips(uvvis_file):
+    backend = MemoryBackend()
+    archive = SpecatalogArchive(False, backend=backend)
+    archive.make_dir("data")
+    archive.exists("data")
+    assert backend.round_trips == 2
+    archive.copy_to_archive(uvvis_file, "data/spectrum.txt")
+    assert backend.bytes_transferred == uvvis_file.stat().st_size
+
+
+def test_scandir(archive, uvvis_file):
+    archive.make_dir("data/M4/raw")
+    archive.copy_to_archive(uvvis_file, "data/M4/raw/spectrum.txt")
+    entries = {e.name: e for e in archive.scandir("data/M4")}
+    assert entries["raw"].is_dir
+    (entry,) = archive.scandir("data/M4/raw")
+    assert entry.name == "spectrum.txt"
+    assert not entry.is_dir
+    assert entry.size == uvvis_file.stat().st_size
+    assert entry.mtime > 0
+
+
+def test_metadata_snapshot_round_trips(uvvis_file):
+    backend = MemoryBackend()
+    archive = SpecatalogArchive(False, backend=backend)
+    archive.make_dir("data/M1/raw")
+    archive.copy_to_archive(uvvis_file, "data/M1/raw/a.txt")
+    backend.reset_stats()
+
+    with archive.metadata_snapshot():
+        assert archive.list_files("data/M1/raw") == ["a.txt"]
+        assert archive.exists("data/M1/raw/a.txt")
+        assert archive.isfile("data/M1/raw/a.txt")
+        assert not archive.exists("data/M1/raw/b.txt")
+        assert archive.isdir("data/M1/raw")
+        archive.measurement_path(1)
+        archive.measurement_path(1)
+    assert backend.round_trips == 2
+
+    archive.exists("data/M1/raw/a.txt")
+    assert backend.round_trips == 3
+
+
+def test_metadata_snapshot_invalidation(archive, uvvis_file):
+    archive.make_dir("data/M1/raw")
+    with archive.metadata_snapshot():
+        assert archive.list_files("data/M1/raw") == []
+        assert not archive.exists("data/M1/raw/a.txt")
+        archive.copy_to_archive(uvvis_file, "data/M1/raw/a.txt")
+        assert archive.exists("data/M1/raw/a.txt")
+        assert archive.list_files("data/M1/raw") == ["a.txt"]
+        archive.delete_folder("data/M1")
+        assert not archive.exists("data/M1/raw/a.txt")
+        assert not archive.exists("data/M1")
+
+
+def test_missing_dta_aborts_before_writing(archive, tmp_path):
+    mm._create_measurement_dir(archive, 5)
+    (tmp_path / "a.DSC").write_text("XPTS\t2\n")
+    archive.copy_to_archive(tmp_path / "a.DSC", "data/M5/raw/a.DSC")
+    with pytest.raises(ValueError, match="a.DTA not available"):
+        mm._raw_data_to_hdf5(archive, 5, "bruker_bes3t")
+    with archive.open_measurement_h5_file("data/M5/measurement_M5.h5", "r") as f:
+        assert "data_real_0" not in f["raw_data"]
+
+
+def test_parallel_upload(tmp_path):
+    src = tmp_path / "M1"
+    for category in ("raw", "scripts", "figures"):
+        (src / category).mkdir(parents=True)
+        for n in range(3):
+            (src / category / f"{n}.dat").write_bytes(bytes(100 * (n + 1)))
+    backend = MemoryBackend()
+    archive = SpecatalogArchive(False, backend=backend)
+    stats = archive.copy_directory_to_archive(src, "data/M1", workers=4)
+    assert stats.files == 9
+    assert stats.bytes == 3 * 600
+    assert stats.throughput > 0
+    assert archive.list_files("data/M1") == ["figures", "raw", "scripts"]
+    with archive.open_file("data/M1/raw/2.dat", "rb") as f:
+        assert f.read() == bytes(300)
+    with pytest.raises(FileExistsError):
+        archive.copy_directory_to_archive(src, "data/M1", workers=4)
+
+
+class _FakeSMBConnection:
+    max_write_size = 4
+
+    def __init__(self):
+        self.sequence_window = {"low": 0, "high": 8}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def send(self, message, sid, tid, credit_request):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        return message
+
+
+class _FakeSMBFile:
+    def __init__(self):
+        connection = _FakeSMBConnection()
+        self.fd = self
+        self.connection = connection
+        self.tree_connect = SimpleNamespace(
+            session=SimpleNamespace(session_id=1), tree_connect_id=2
+        )
+        self.content = bytearray()
+
+    def write(self, data, offset, send):
+        def receive(message):
+            self.connection.in_flight -= 1
+            self.content[offset : offset + len(data)] = data
+            return len(data)
+
+        return (offset, data), receive
+
+
+def test_pipelined_write():
+    fdst = _FakeSMBFile()
+    data = bytes(range(30))
+    _write_pipelined(io.BytesIO(data), fdst, chunk_size=16, depth=3)
+    assert bytes(fdst.content) == data
+    assert fdst.connection.max_in_flight == 3
+
+
+def test_pipelined_write_fallback():
+    # without the smbprotocol internals the file is written sequentially
+    class PlainFile(io.BytesIO):
+        def write(self, data):
+            return super().write(bytes(data[:5]))
+
+    fdst = PlainFile()
+    data = bytes(range(30))
+    _write_pipelined(io.BytesIO(data), fdst, chunk_size=16, depth=3)
+    assert fdst.getvalue() == data
+
+    fdst = _FakeSMBFile()
+    del fdst.connection.sequence_window
+    fdst.write = lambda data: fdst.content.extend(data) or len(data)
+    _write_pipelined(io.BytesIO(data), fdst, chunk_size=16, depth=3)
+    assert bytes(fdst.content) == data
+    assert fdst.connection.max_in_flight == 0
+
+
+def test_smbprotocol_internals():
+    # internals of smbprotocol that _write_pipelined relies on
+    from smbprotocol.connection import Connection
+    from smbprotocol.open import Open
+
+    assert "send" in inspect.signature(Open.write).parameters
+    assert callable(Connection.send)
+    assert "sequence_window" in inspect.getsource(Connection.__init__)
+
+
+@pytest.fixture
+def smb_sessions(monkeypatch):
+    """Replaces the SMB session setup by fake sessions and records them."""
+    sessions = []
+
+    def register_session(host, username, password, connection_cache):
+        session = SimpleNamespace(
+            session_id=len(sessions),
+            connection=SimpleNamespace(echo=lambda sid, timeout: None),
+        )
+        connection_cache["session"] = session
+        sessions.append(session)
+        return session
+
+    monkeypatch.setattr(am, "register_session", register_session)
+    monkeypatch.setattr(am, "reset_connection_cache", lambda **kwargs: None)
+    return sessions
+
+
+def test_connection_pool_thread_affinity(smb_sessions):
+    manager = am.SMBConnectionManager(pool_size=2)
+    caches = []
+    for _ in range(3):
+        thread = threading.Thread(target=lambda: caches.append(manager.session()))
+        thread.start()
+        thread.join()
+    assert caches[0] is not caches[1]
+    assert caches[0] is caches[2]
+    assert len(smb_sessions) == 2
+    assert manager.session() is manager.session()
+
+
+def test_connection_retry(smb_sessions):
+    manager = am.SMBConnectionManager(pool_size=1, backoff=0)
+    calls = []
+
+    def flaky(path, connection_cache):
+        calls.append(connection_cache["session"].session_id)
+        if len(calls) < 3:
+            raise SMBConnectionClosed("connection lost")
+        return path
+
+    assert manager.call(flaky, "x") == "x"
+    assert calls == [0, 1, 2]
+
+    def missing(path, connection_cache):
+        raise FileNotFoundError(path)
+
+    with pytest.raises(FileNotFoundError):
+        manager.call(missing, "x")
+    assert len(smb_sessions) == 3
+
+
+def test_connection_health_check(smb_sessions):
+    manager = am.SMBConnectionManager(pool_size=1, health_check_interval=0)
+    manager.session()
+
+    def echo(sid, timeout):
+        raise SMBConnectionClosed("connection lost")
+
+    smb_sessions[0].connection.echo = echo
+    manager.session()
+    assert len(smb_sessions) == 2
@@ -1,6 +1,7 @@
 import pytest
 import specatalog.crud_db.create as cr
 from specatalog.models.molecules import Molecule
+from specatalog.models.creation_pydantic_molecules import SingleMoleculeModel
 
 
 #  TODO: Hinzufügen von Ausnahme, falls ein MoleculeModel in der create-Funktion verwendet wurde (= nicht erlaubt) oder sogar ein nicht erlaubter Wert
@@ -61,3 +62,70 @@ def test_no_molecule(measurement_instance_pyd, db_session):
     if hasattr(measurement_instance_pyd, "measurement_class"):
         with pytest.raises(ValueError):
             cr._create_new_measurement(measurement_instance_pyd, db_session)
+
+
+def test_create_new_measurements(entry_factory, measurement_instance_pyd, db_session):
+    if not hasattr(measurement_instance_pyd, "measurement_class"):
+        return
+    molecule = entry_factory(
+        Molecule,
+        name="TestMol",
+        molecular_formula="C10H10",
+        structural_formula="/tmp/test",
+        group="base",
+    )
+    measurement_instance_pyd.molecular_id = molecule.id
+    second = measurement_instance_pyd.model_copy(update={"temperature": 77})
+
+    ids = cr._create_new_measurements([measurement_instance_pyd, second], db_session)
+    assert len(set(ids)) == 2
+    cls = measurement_instance_pyd.measurement_class
+    measurements = db_session.query(cls).order_by(cls.id).all()
+    assert [m.id for m in measurements] == ids
+    assert [m.path for m in measurements] == [f"data/M{i}" for i in ids]
+    assert measurements[1].temperature == 77
+    assert type(measurements[0].solvent) is str
+    assert measurements[0].molecule.id == molecule.id
+
+
+def test_create_new_measurements_no_molecule(measurement_instance_pyd, db_session):
+    if hasattr(measurement_instance_pyd, "measurement_class"):
+        with pytest.raises(ValueError):
+            cr._create_new_measurements([measurement_instance_pyd], db_session)
+        with pytest.raises(TypeError):
+            cr._create_new_measurements([object()], db_session)
+
+
+def test_create_new_molecules(model_instance, db_session):
+    if hasattr(model_instance, "model_class"):
+        other = SingleMoleculeModel(name="other", molecular_formula="C2H6")
+        ids = cr._create_new_molecules([model_instance, other], db_session)
+        molecules = [db_session.get(Molecule, i) for i in ids]
+        assert [m.name for m in molecules] == [model_instance.name, "other"]
+        assert molecules[1].structural_formula == f"molecules/MOL{ids[1]}"
+        assert isinstance(molecules[0], model_instance.model_class)
+
+
+def test_create_new_measurements_statement_count(entry_factory, engine, db_session):
+    from sqlalchemy import event
+    from fixtures import MEASUREMENT_SPECS
+
+    molecule = entry_factory(
+        Molecule,
+        name="TestMol",
+        molecular_formula="C10H10",
+        structural_formula="/tmp/test",
+        group="base",
+    )
+    spec = MEASUREMENT_SPECS["CWEPR"]
+    models = [
+        spec["class"](**{**spec["factory"](), "molecular_id": molecule.id})
+        for _ in range(20)
+    ]
+    statements = []
+    event.listen(
+        engine, "before_cursor_execute", lambda *args: statements.append(args[2])
+    )
+    cr._create_new_measurements(models, db_session)
+    # molecule check, insert measurements, insert cwepr, update paths
+    assert len(statements) == 4
@@ -0,0 +1,162 @@
+import numpy as np
+import pytest
+import specatalog.data_management.data_loader as dl
+
+
+DSC_CONTENT = """#DESC	1.2 * DESCRIPTOR INFORMATION ***********************
+*	Dataset Type and Format:
+BSEQ	BIG
+IKKF	REAL
+XPTS	1024
+XMIN	3300.000000
+TITL	'my sample'
+MULTI	first part \\
+second part
+#SPL	1.2 * STANDARD PARAMETER LAYER
+OPER	xuser
+#MHL	1.0 * MANIPULATION HISTORY LAYER by BRUKER
+AFTER	1
+"""
+
+
+def write_dsc(tmp_path, content=DSC_CONTENT):
+    path = tmp_path / "spectrum.DSC"
+    path.write_text(content, encoding="latin-1")
+    return path
+
+
+def test_read_dsc_values(tmp_path):
+    params = dl.read_dsc_file(write_dsc(tmp_path))
+    assert params["BSEQ"] == "BIG"
+    assert params["TITL"] == "my sample"
+    assert params["OPER"] == "xuser"
+    assert "DSRC" not in params
+
+
+def test_read_dsc_continuation(tmp_path):
+    params = dl.read_dsc_file(write_dsc(tmp_path))
+    assert params["MULTI"] == "first part second part"
+
+
+def test_read_dsc_stops_at_mhl(tmp_path):
+    params = dl.read_dsc_file(write_dsc(tmp_path))
+    assert "AFTER" not in params
+
+
+def test_read_par_file(tmp_path):
+    path = tmp_path / "spectrum.par"
+    path.write_text("JEX field-sweep\nJUN G\nHCF 3400\n1XX skipped\n", "latin-1")
+    params = dl.read_par_file(path)
+    assert params["XAXIS_NAME"] == "field-sweep"
+    assert params["XAXIS_UNIT"] == "G"
+    assert params["HCF"] == "3400"
+    assert "1XX" not in params
+
+
+def test_parse_field_params():
+    params = dl.parse_field_params(
+        {"a": "12", "b": "-1.5e3", "c": ".5", "d": "BIG", "e": "1.2.3", "f": 7}
+    )
+    assert params == {"a": 12, "b": -1500.0, "c": 0.5, "d": "BIG", "e": "1.2.3", "f": 7}
+    assert isinstance(params["a"], int)
+
+
+def test_read_bruker_header_without_data_file(tmp_path):
+    content = "IRFMT\tD\nXPTS\t11\nXMIN\t3300\nXWID\t100\nMWFQ\t9.5e9\n"
+    write_dsc(tmp_path, content)
+    params, abscissa = dl.read_bruker_header(tmp_path / "spectrum")
+    assert not (tmp_path / "spectrum.DTA").exists()
+    assert params["MWFQ"] == 9.5e9
+    assert abscissa[0] == 3300.0
+    assert abscissa[-1] == 3400.0
+    assert len(abscissa) == 11
+
+
+def test_load_uvvis_ulm(tmp_path):
+    path = tmp_path / "uvvis.txt"
+    path.write_text(
+        "TITLE\tsample\nXUNITS\tNM\nXYDATA\n500.0\t0.1\n499.0\t0.2\n"
+        "##### Extended Information\n[Comments]\nSpeed\tMedium\n"
+    )
+    wavelength, intensity, meta = dl.load_uvvis_ulm(path)
+    assert list(wavelength) == [500.0, 499.0]
+    assert list(intensity) == [0.1, 0.2]
+    assert meta == {"TITLE": "sample", "XUNITS": "NM", "Speed": "Medium"}
+
+
+def test_load_uvvis_freiburg(tmp_path):
+    path = tmp_path / "uvvis.txt"
+    path.write_text("sample\nWavelength (nm)\tAbs\n500.0\t0.1\n499.5\t0.2\n")
+    wavelength, intensity, meta = dl.load_uvvis_freiburg(path)
+    assert list(wavelength) == [500.0, 499.5]
+    assert list(intensity) == [0.1, 0.2]
+    assert meta["npoints"] == 2
+    assert meta["y name"] == "Abs"
+
+
+def write_bes3t(tmp_path, data, bseq="BIG", irfmt="D", ikkf="REAL"):
+    dtype = {"D": "f8", "F": "f4", "I": "i4", "S": "i2"}[irfmt]
+    order = ">" if bseq == "BIG" else "<"
+    raw = np.asarray(data)
+    if np.iscomplexobj(raw):
+        raw = np.column_stack([raw.real, raw.imag]).ravel()
+    raw.astype(f"{order}{dtype}").tofile(tmp_path / "spectrum.DTA")
+    write_dsc(
+        tmp_path,
+        f"#DESC\t1.2\nBSEQ\t{bseq}\nIKKF\t{ikkf}\nIRFMT\t{irfmt}\n"
+        f"XPTS\t{len(data)}\nXMIN\t3300\nXWID\t100\n#MHL\t1.0\nAFTER\t1\n",
+    )
+    return tmp_path / "spectrum"
+
+
+@pytest.mark.parametrize("byte_order", ["ieee-be", "ieee-le"])
+@pytest.mark.parametrize("fmt", ["f8", "f4", "i4", "i2"])
+def test_get_matrix_byte_order(tmp_path, byte_order, fmt):
+    values = np.arange(-6, 6).reshape(3, 4)
+    order = ">" if byte_order == "ieee-be" else "<"
+    path = tmp_path / "data.DTA"
+    values.astype(f"{order}{fmt}").tofile(path)
+
+    data = dl.get_matrix(path, [4, 3, 1], fmt, byte_order, False)
+    assert data.dtype == np.dtype(fmt)
+    assert data.dtype.isnative
+    assert np.array_equal(data, values)
+
+
+@pytest.mark.parametrize("fmt", ["f8", "f4", "i2"])
+def test_get_matrix_complex(tmp_path, fmt):
+    values = np.arange(5) - 1j * np.arange(5)
+    path = tmp_path / "data.DTA"
+    np.column_stack([values.real, values.imag]).astype(f">{fmt}").tofile(path)
+
+    data = dl.get_matrix(path, [5, 1, 1], fmt, "ieee-be", np.array([True]))
+    assert np.iscomplexobj(data)
+    assert np.array_equal(data, values)
+    if fmt == "f4":
+        assert data.dtype == np.complex64
+
+
+def test_load_cw_epr_real(tmp_path):
+    spectrum = np.sin(np.linspace(0, 3, 11))
+    path = write_bes3t(tmp_path, spectrum)
+    spc_real, spc_imag, field, meta = dl.load_cw_epr(path)
+    assert spc_imag is None
+    assert np.array_equal(spc_real, spectrum)
+    assert np.array_equal(field, np.linspace(3300, 3400, 11))
+    assert meta["XPTS"] == 11
+    assert "AFTER" not in meta
+
+
+def test_load_cw_epr_complex(tmp_path):
+    spectrum = np.linspace(0, 1, 8) + 1j * np.linspace(1, 2, 8)
+    path = write_bes3t(tmp_path, spectrum, bseq="LIT", irfmt="F", ikkf="CPLX")
+    spc_real, spc_imag, field, meta = dl.load_cw_epr(path)
+    # the data keep the format of the file (IRFMT F -> float32)
+    assert spc_real.dtype == np.float32
+    assert np.allclose(spc_real, spectrum.real)
+    assert np.allclose(spc_imag, spectrum.imag)
+    assert field[0] == 3300.0 and field[-1] == 3400.0
+
+    data, abscissa, params = dl.load_bruker_bes3t(path, "DSC", "")
+    assert np.allclose(data, spectrum)
+    assert params["IKKF"] == "CPLX"
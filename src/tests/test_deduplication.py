@@ -0,0 +1,155 @@
+import hashlib
+
+import pytest
+import specatalog.data_management.deduplication as dd
+import specatalog.data_management.manifest as mf
+import specatalog.data_management.measurement_management as mm
+from specatalog.data_management.archive_manager import SpecatalogArchive
+
+
+@pytest.fixture(autouse=True)
+def deduplicate(monkeypatch):
+    monkeypatch.setattr(dd, "DEDUPLICATE_RAW_DATA", True)
+    monkeypatch.setattr(mm, "DEDUPLICATE_RAW_DATA", True)
+
+
+@pytest.fixture
+def raw_file(tmp_path):
+    path = tmp_path / "src" / "spectrum.DTA"
+    path.parent.mkdir()
+    path.write_bytes(b"raw data" * 100)
+    return path
+
+
+def _read(archive, p):
+    with archive.open_file(p, "rb") as f:
+        return f.read()
+
+
+def test_raw_files_stored_once(archive, raw_file):
+    for ms_id in (1, 2):
+        archive.make_dir(f"data/M{ms_id}")
+        mm._new_file_to_archive(archive, raw_file, ms_id, "raw")
+
+    blob = dd.blob_path(dd._hash_local_file(raw_file))
+    assert archive.nlink(blob) == 3
+    assert _read(archive, "blobs/algorithm") == mf.HASH_ALGORITHM.encode()
+    assert _read(archive, "data/M2/raw/spectrum.DTA") == raw_file.read_bytes()
+
+
+def test_update_does_not_change_other_measurements(archive, raw_file, tmp_path):
+    for ms_id in (1, 2):
+        archive.make_dir(f"data/M{ms_id}")
+        mm._new_file_to_archive(archive, raw_file, ms_id, "raw")
+    raw_file.write_bytes(b"new data")
+    mm._new_file_to_archive(archive, raw_file, 2, "raw", update=True)
+
+    assert _read(archive, "data/M1/raw/spectrum.DTA") == b"raw data" * 100
+    assert _read(archive, "data/M2/raw/spectrum.DTA") == b"new data"
+
+
+def test_upload_measurement_skips_duplicates(archive, raw_file, tmp_path):
+    src = tmp_path / "M1"
+    (src / "raw").mkdir(parents=True)
+    (src / "raw" / "a.DTA").write_bytes(raw_file.read_bytes())
+    (src / "raw" / "b.DTA").write_bytes(raw_file.read_bytes())
+    (src / "measurement_M1.h5").write_bytes(b"h5")
+
+    stats = dd._upload_measurement(archive, src, "data/M1")
+    assert stats.files == 3
+    assert stats.deduplicated == 1
+    assert stats.bytes == 2 + raw_file.stat().st_size
+    assert stats.hashes["raw/a.DTA"] == stats.hashes["raw/b.DTA"]
+
+    mf._create_manifest(archive, 1, stats.hashes)
+    assert mf._verify_manifest(archive, 1, full=True).ok
+
+    stats = dd._upload_measurement(archive, src, "data/M2")
+    assert stats.deduplicated == 2
+
+
+def test_blob_store_keeps_its_algorithm(archive, raw_file, tmp_path, monkeypatch):
+    new_hasher = mf.new_hasher
+    monkeypatch.setattr(
+        mf, "new_hasher", lambda a=None: hashlib.md5() if a == "md5" else new_hasher(a)
+    )
+    # blob store created by a client with another algorithm
+    archive.make_dir("blobs")
+    with archive.open_file("blobs/algorithm", "w") as f:
+        f.write("md5")
+
+    src = tmp_path / "M1"
+    (src / "raw").mkdir(parents=True)
+    (src / "raw" / "a.DTA").write_bytes(raw_file.read_bytes())
+    stats = dd._upload_measurement(archive, src, "data/M1")
+    md5 = hashlib.md5(raw_file.read_bytes()).hexdigest()
+    assert archive.nlink(dd.blob_path(md5)) == 2
+    # the manifest uses the configured algorithm
+    assert stats.hashes["raw/a.DTA"] == dd._hash_local_file(raw_file)
+
+    archive.make_dir("data/M2")
+    mm._new_file_to_archive(archive, raw_file, 2, "raw")
+    assert archive.nlink(dd.blob_path(md5)) == 3
+
+
+def test_migrate_and_prune(archive, raw_file):
+    for ms_id in (1, 2):
+        archive.make_dir(f"data/M{ms_id}/raw")
+        archive.copy_to_archive(raw_file, f"data/M{ms_id}/raw/spectrum.DTA")
+
+    result = dd._migrate_to_blob_store(archive)
+    assert (result.files, result.linked) == (2, 2)
+    assert result.saved_bytes == raw_file.stat().st_size
+    assert dd._migrate_to_blob_store(archive).linked == 0
+
+    archive.delete_folder("data/M1")
+    assert dd._prune_blobs(archive) == 0
+    archive.delete_folder("data/M2")
+    assert dd._prune_blobs(archive) == 1
+
+
+def test_no_hard_links(archive, raw_file, tmp_path, monkeypatch):
+    def no_link(src, p):
+        raise OSError("Operation not supported")
+
+    monkeypatch.setattr(archive.backend, "link", no_link)
+    archive.make_dir("data/M1")
+    mm._new_file_to_archive(archive, raw_file, 1, "raw")
+    assert _read(archive, "data/M1/raw/spectrum.DTA") == raw_file.read_bytes()
+
+    # the raw data are stored only once, without blobs
+    src = tmp_path / "M2"
+    (src / "raw").mkdir(parents=True)
+    (src / "raw" / "a.DTA").write_bytes(raw_file.read_bytes())
+    stats = dd._upload_measurement(archive, src, "data/M2")
+    assert stats.deduplicated == 0
+    assert archive.list_files("data/M2/raw") == ["a.DTA"]
+    assert archive.list_files("blobs") == []
+
+    # the old file is kept if the link cannot be created
+    with pytest.raises(OSError):
+        dd._link_blob(archive, "0" * 64, "data/M1/raw/spectrum.DTA")
+    assert _read(archive, "data/M1/raw/spectrum.DTA") == raw_file.read_bytes()
+    assert archive.list_files("data/M1/raw") == ["spectrum.DTA"]
+
+
+def test_upload_measurement_reuses_hashes(archive, raw_file, tmp_path, monkeypatch):
+    raw_file.with_suffix(".DSC").write_text("#DESC")
+    temp_archive = SpecatalogArchive(False, str(tmp_path / "temp"))
+    mm._create_measurement_dir(temp_archive, 1)
+    hashes = mm._raw_data_to_folder(
+        temp_archive, raw_file, "bruker_bes3t", 1, deduplicate=False
+    )
+    assert sorted(hashes) == ["raw/spectrum.DSC", "raw/spectrum.DTA"]
+    assert temp_archive.nlink("data/M1/raw/spectrum.DTA") == 1
+
+    hash_file = dd._hash_local_file
+    hashed = []
+    monkeypatch.setattr(
+        dd, "_hash_local_file", lambda f: hashed.append(f) or hash_file(f)
+    )
+    src = tmp_path / "temp" / "data" / "M1"
+    stats = dd._upload_measurement(archive, src, "data/M1", digests=hashes)
+    assert hashed == []
+    assert stats.hashes["raw/spectrum.DTA"] == hash_file(raw_file)
+    assert archive.nlink(dd.blob_path(hash_file(raw_file))) == 2
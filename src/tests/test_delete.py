@@ -2,6 +2,7 @@ import specatalog.crud_db.delete as d
 import specatalog.crud_db.read as r
 from contextlib import contextmanager
 import pytest
+from sqlalchemy import text
 
 
 def test_delete_object(db_with_content, db_session):
@@ -77,3 +78,69 @@ def test_delete_non_existent_measurement(db_with_content):
 
     with pytest.raises(ValueError):
         de.delete_measurement(26)
+
+
+def test_delete_where(db_with_content):
+    import specatalog.models.measurements as ms
+
+    filters = r.MeasurementFilter(temperature__lt=150)
+    result = d._delete_where(filters, db_with_content, dry_run=True)
+    assert sorted(result.measurement_ids) == [2, 4, 5]
+    assert db_with_content.query(ms.Measurement).count() == 6
+    assert r._measurement_exists(2, db_with_content)
+
+    result = d._delete_where(filters, db_with_content)
+    assert result.molecule_ids == []
+    assert db_with_content.query(ms.Measurement).count() == 3
+    assert not r._measurement_exists(2, db_with_content)
+
+
+def test_delete_where_cascade(db_with_content):
+    import specatalog.models.measurements as ms
+
+    result = d._delete_where(r.MoleculeFilter(id=1), db_with_content)
+    assert result.molecule_ids == [1]
+    assert sorted(result.measurement_ids) == [1, 2, 3, 4, 6]
+    assert db_with_content.query(ms.Measurement).count() == 1
+    assert db_with_content.query(ms.CWEPR).count() == 0
+    assert db_with_content.execute(text("SELECT count(*) FROM cwepr")).scalar() == 0
+
+
+@pytest.fixture
+def full_entry(db_with_content, archive, monkeypatch):
+    import specatalog.helpers.full_entry as fe
+
+    @contextmanager
+    def session_context():
+        yield db_with_content
+        db_with_content.commit()
+
+    for ms_id in range(1, 7):
+        archive.make_dir(f"data/M{ms_id}/raw")
+    monkeypatch.setattr(fe, "db_session", session_context)
+    monkeypatch.setattr(fe, "archive", archive)
+    return fe
+
+
+def test_delete_full_where(full_entry, archive, monkeypatch):
+    refreshed = []
+    monkeypatch.setattr(full_entry, "_refresh_views", refreshed.append)
+    result = full_entry.delete_full_where(r.MeasurementFilter(temperature__lt=150))
+    assert sorted(result.measurement_ids) == [2, 4, 5]
+    assert refreshed == [result.measurement_ids]
+    assert sorted(archive.list_files("data")) == ["M1", "M3", "M6"]
+    assert archive.list_files("trash") == []
+
+
+def test_delete_full_where_commit_fails(
+    full_entry, archive, db_with_content, monkeypatch
+):
+    def fail():
+        raise RuntimeError("database not available")
+
+    monkeypatch.setattr(db_with_content, "commit", fail)
+    with pytest.raises(RuntimeError):
+        full_entry.delete_full_where(r.MeasurementFilter(temperature__lt=150))
+    assert len(archive.list_files("data")) == 6
+    assert archive.isdir("data/M2/raw")
+    assert archive.list_files("trash") == []
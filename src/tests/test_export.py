@@ -0,0 +1,73 @@
+import datetime
+
+import pytest
+import specatalog.helpers.export as ex
+import specatalog.models.measurements as ms
+import specatalog.models.molecules as mol
+
+pa = pytest.importorskip("pyarrow")
+
+
+@pytest.fixture(autouse=True)
+def no_overlap(monkeypatch):
+    monkeypatch.setattr(ex, "_INCREMENTAL_OVERLAP", datetime.timedelta(0))
+
+
+def read(path):
+    return ex._read_export(path, ex._export_format(path, None))
+
+
+@pytest.mark.parametrize("suffix", [".parquet", ".arrow", ".feather"])
+def test_export_measurements(db_with_content, tmp_path, suffix):
+    path = tmp_path / f"catalog{suffix}"
+    result = ex._export_catalog(db_with_content, path, batch_size=4)
+    assert result.rows == result.exported == 6
+    assert not result.incremental
+
+    table = read(path)
+    assert table.column("id").to_pylist() == [1, 2, 3, 4, 5, 6]
+    rows = {row["path"]: row for row in table.to_pylist()}
+    assert rows["m5"]["frequency_band"] == "x"
+    assert rows["m5"]["method"] == "cwepr"
+    assert rows["m1"]["molecule_name"] == "TestMol2"
+    assert rows["m4"]["frequency_band"] is None
+    assert table.schema.field("date").type == pa.date32()
+    assert table.schema.field("excitation_wl").type == pa.string()
+    assert "molecule_linker" in table.column_names
+
+
+def test_export_subclass_and_molecules(db_with_content, tmp_path):
+    ex._export_catalog(db_with_content, tmp_path / "cwepr.parquet", ms.CWEPR)
+    table = read(tmp_path / "cwepr.parquet")
+    assert table.column("path").to_pylist() == ["m5"]
+    assert "dim_cuvette" not in table.column_names
+
+    ex._export_catalog(db_with_content, tmp_path / "molecules.parquet", mol.Molecule)
+    table = read(tmp_path / "molecules.parquet")
+    assert table.num_rows == 4
+    assert table.column("chromophore").to_pylist() == [None, None, None, "per"]
+
+
+def test_incremental_export(db_with_content, tmp_path):
+    path = tmp_path / "catalog.parquet"
+    ex._export_catalog(db_with_content, path)
+
+    db_with_content.get(ms.Measurement, 2).temperature = 77
+    db_with_content.delete(db_with_content.get(ms.Measurement, 3))
+    db_with_content.commit()
+
+    result = ex._export_catalog(db_with_content, path, incremental=True)
+    assert result.incremental
+    assert result.exported == 1
+    assert result.removed == 1
+    assert result.rows == 5
+    table = read(path)
+    rows = {row["id"]: row for row in table.to_pylist()}
+    assert rows[2]["temperature"] == 77
+    assert 3 not in rows
+    assert table.column("id").to_pylist() == [1, 2, 4, 5, 6]
+
+
+def test_unknown_format(db_with_content, tmp_path):
+    with pytest.raises(ValueError):
+        ex._export_catalog(db_with_content, tmp_path / "catalog.csv")
@@ -0,0 +1,168 @@
+import h5py
+import numpy as np
+import pytest
+import specatalog.data_management.hdf5_reader as hr
+import specatalog.data_management.measurement_management as mm
+
+
+@pytest.fixture
+def archive(archive, tmp_path, db_with_content):
+    for ms_id in range(1, 7):
+        archive.make_dir(f"data/M{ms_id}")
+        local = tmp_path / f"measurement_M{ms_id}.h5"
+        with h5py.File(local, "w") as f:
+            f["raw_data/data_real_0"] = np.arange(5) * ms_id
+            f["raw_data"].attrs["MWFQ"] = 9.6e9 + ms_id
+            f.attrs["operator"] = "richert"
+        archive.copy_to_archive(local, f"data/M{ms_id}/measurement_M{ms_id}.h5")
+    return archive
+
+
+def test_load_many(archive, db_with_content):
+    values = hr._load_many(
+        archive,
+        db_with_content,
+        [3, 1, 3],
+        datasets=["raw_data/data_real_0", "raw_data/missing"],
+        attrs=["raw_data/MWFQ", "operator", "missing/attr"],
+        workers=2,
+    )
+    assert list(values) == [3, 1]
+    assert np.array_equal(values[3]["raw_data/data_real_0"], np.arange(5) * 3)
+    assert values[1]["raw_data/MWFQ"] == 9.6e9 + 1
+    assert values[1]["operator"] == "richert"
+    assert values[1]["raw_data/missing"] is None
+    assert values[1]["missing/attr"] is None
+
+
+def test_load_many_unknown_ids(archive, db_with_content):
+    with pytest.raises(ValueError, match=r"\[7, 8\]"):
+        hr._load_many(archive, db_with_content, [1, 7, 8], attrs=["operator"])
+
+
+def test_load_from_id_trust_archive(archive, monkeypatch):
+    monkeypatch.setattr(hr, "archive", archive)
+    with hr.load_from_id(4, trust_archive=True) as (obj, f):
+        assert obj.raw_data.MWFQ == 9.6e9 + 4
+    with pytest.raises(ValueError):
+        with hr.load_from_id(9, trust_archive=True):
+            pass
+
+
+@pytest.fixture
+def cache():
+    hr.enable_dataset_cache(1024)
+    yield
+    hr.disable_dataset_cache()
+
+
+def test_dataset_cache(archive, monkeypatch, cache):
+    monkeypatch.setattr(hr, "archive", archive)
+    for _ in range(2):
+        with hr.load_from_id(2, trust_archive=True) as (obj, f):
+            data = obj.raw_data.data_real_0
+    assert np.array_equal(data, np.arange(5) * 2)
+    assert not data.flags.writeable
+    with pytest.raises(ValueError):
+        data[0] = 1
+    stats = hr.dataset_cache_stats()
+    assert (stats.hits, stats.misses, stats.entries) == (1, 1, 1)
+    assert stats.bytes == data.nbytes
+    assert stats.hit_rate == 0.5
+
+    values = hr._read_keys(archive, 2, ["raw_data/data_real_0"], [])
+    assert values["raw_data/data_real_0"] is data
+
+    # writable objects are not cached
+    with hr.load_from_id(2, mode="a", trust_archive=True) as (obj, f):
+        assert obj.raw_data.data_real_0.flags.writeable
+    assert hr.dataset_cache_stats().hits == 2
+
+
+def test_dataset_cache_file_changed(archive, monkeypatch, cache):
+    monkeypatch.setattr(hr, "archive", archive)
+    monkeypatch.setattr(hr, "_file_version", lambda archive_obj, p: version)
+    version = (1, 1)
+    hr._read_keys(archive, 3, ["raw_data/data_real_0"], [])
+    version = (2, 1)
+    hr._read_keys(archive, 3, ["raw_data/data_real_0"], [])
+    assert hr.dataset_cache_stats().misses == 2
+
+
+def test_dataset_cache_eviction():
+    cache = hr.DatasetCache(100)
+    cache.put(("a", "/x", 1), np.zeros(5))
+    cache.put(("b", "/x", 1), np.zeros(5))
+    assert cache.get(("a", "/x", 1)) is not None
+    cache.put(("c", "/x", 1), np.zeros(5))
+    assert cache.get(("b", "/x", 1)) is None
+    assert cache.get(("a", "/x", 1)) is not None
+    large = cache.put(("d", "/x", 1), np.zeros(50))
+    assert not large.flags.writeable
+    stats = cache.stats()
+    assert (stats.entries, stats.bytes, stats.evictions) == (2, 80, 1)
+    cache.clear()
+    assert cache.stats().entries == 0
+
+
+def test_overview_levels():
+    data = np.arange(1000.0).reshape(2, 500)
+    levels = mm._overview_levels(data)
+    assert [lv["mean"].shape for lv in levels] == [(2, 250)]
+    assert list(levels[0]["bin_size"]) == [1, 2]
+    assert np.array_equal(levels[0]["min"], data[:, ::2])
+    assert np.array_equal(levels[0]["max"], data[:, 1::2])
+    assert np.array_equal(levels[0]["mean"], data[:, ::2] + 0.5)
+
+    levels = mm._overview_levels(np.arange(1025.0))
+    assert [lv["mean"].shape for lv in levels] == [(513,), (257,), (129,)]
+    assert list(levels[-1]["bin_size"]) == [8]
+    assert levels[-1]["max"][-1] == 1024
+    assert mm._overview_levels(np.arange(256.0)) == []
+
+
+def test_get_overview(archive, monkeypatch):
+    data = np.sin(np.linspace(0, 10, 2048))
+    with archive.open_measurement_file("data/M1/measurement_M1.h5", "a") as f:
+        f["raw_data/big"] = data
+        mm.new_overview_to_hdf5(data, f, "raw_data", "big")
+        mm.new_overview_to_hdf5(data + 1j, f, "raw_data", "complex")
+        assert list(f["overview/raw_data/big"]) == ["level_0", "level_1", "level_2"]
+        assert "complex" not in f["overview/raw_data"]
+
+    monkeypatch.setattr(hr, "archive", archive)
+    ov = hr.get_overview(1, "raw_data/big", 400)
+    assert ov["mean"].shape == (512,)
+    assert list(ov["bin_size"]) == [4]
+    assert ov["min"].min() == data.min()
+
+    full = hr.get_overview(1, "raw_data/big", 2000)
+    assert np.array_equal(full["mean"], data)
+    with pytest.raises(KeyError):
+        hr.get_overview(1, "raw_data/missing", 10)
+
+    with hr.load_from_id(1, trust_archive=True) as (obj, f):
+        assert not hasattr(obj, mm.OVERVIEW_GROUP)
+        ov = obj.raw_data.get_overview("big", 400)
+        assert list(ov["bin_size"]) == [4]
+
+
+def test_overview_follows_dataset(archive, monkeypatch):
+    with archive.open_measurement_file("data/M1/measurement_M1.h5", "a") as f:
+        for name in ("big", "other"):
+            f[f"raw_data/{name}"] = np.zeros(2048)
+            mm.new_overview_to_hdf5(np.zeros(2048), f, "raw_data", name)
+        f["raw_data/small"] = np.zeros(10)
+
+    monkeypatch.setattr(hr, "archive", archive)
+    with hr.load_from_id(1, mode="a", trust_archive=True) as (obj, f):
+        obj.raw_data.set_dataset("big", np.ones(4096))
+        obj.raw_data.set_dataset("small", np.ones(4096))
+        obj.raw_data.delete_dataset("other")
+        obj.sync()
+        assert "other" not in f["overview/raw_data"]
+        assert "small" not in f["overview/raw_data"]  # had no overview
+
+    ov = hr.get_overview(1, "raw_data/big", 400)
+    assert ov["mean"].shape == (512,)
+    assert ov["max"].max() == 1.0
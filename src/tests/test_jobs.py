@@ -0,0 +1,174 @@
+import sqlite3
+import threading
+import time
+from datetime import date
+
+import pytest
+import specatalog.helpers.jobs as jobs
+import specatalog.models.creation_pydantic_measurements as cpm
+
+
+@jobs.register_operation("test_add")
+def add(ctx, a, b):
+    ctx.report(0.5, "adding")
+    return {"sum": a + b}
+
+
+@jobs.register_operation("test_fail")
+def fail(ctx):
+    raise RuntimeError("archive not available")
+
+
+@jobs.register_operation("test_model")
+def model_date(ctx, data):
+    return data.date.isoformat()
+
+
+@jobs.register_operation("test_slow")
+def slow(ctx, seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return jobs.JobQueue(f"sqlite:///{tmp_path / 'jobs.sqlite'}")
+
+
+def test_submit_and_run(queue):
+    job_id = queue.submit("test_add", a=1, b=2)
+    info = queue.status(job_id)
+    assert info.status == "queued"
+    assert info.duration is None
+
+    info = queue.run_next()
+    assert info.id == job_id
+    assert info.succeeded
+    assert info.result == {"sum": 3}
+    assert info.progress == 1.0
+    assert info.message == "adding"
+    assert info.duration >= 0
+    assert queue.run_next() is None
+
+
+def test_failed_job(queue):
+    job_id = queue.submit("test_fail")
+    assert queue.work(once=True) == 1
+    info = queue.status(job_id)
+    assert info.status == "failed"
+    assert info.error == "RuntimeError: archive not available"
+
+
+def test_unknown_operation_and_job(queue):
+    with pytest.raises(ValueError):
+        queue.submit("does_not_exist")
+    with pytest.raises(KeyError):
+        queue.status(99)
+
+
+def test_model_arguments(queue):
+    data = cpm.CWEPRModel(
+        molecular_id=1,
+        temperature=80,
+        solvent="toluene",
+        date=date(2026, 5, 5),
+        measured_by="richert",
+        corrected=False,
+        evaluated=False,
+        frequency_band="x",
+        attenuation="20dB",
+    )
+    job_id = queue.submit("test_model", data=data)
+    queue.work(once=True)
+    assert queue.status(job_id).result == "2026-05-05"
+
+
+def test_cancel_and_order(queue):
+    first = queue.submit("test_add", a=1, b=1)
+    second = queue.submit("test_add", a=2, b=2)
+    assert queue.cancel(first)
+    assert queue.run_next().id == second
+    assert not queue.cancel(second)
+    assert queue.status(first).status == "cancelled"
+    assert [info.id for info in queue.list_jobs("done")] == [second]
+
+
+def test_wait(queue):
+    job_id = queue.submit("test_add", a=1, b=2)
+    with pytest.raises(TimeoutError):
+        queue.wait(job_id, timeout=0, poll_interval=0)
+
+    worker = threading.Thread(target=queue.work, kwargs={"once": True})
+    worker.start()
+    assert queue.wait(job_id, timeout=10, poll_interval=0.01).result == {"sum": 3}
+    worker.join()
+
+
+def test_statistics(queue):
+    queue.submit("test_add", a=1, b=2)
+    queue.submit("test_add", a=1, b=2)
+    queue.submit("test_fail")
+    queue.work(once=True)
+    stats = queue.statistics()
+    assert stats["test_add"]["done"] == 2
+    assert stats["test_fail"] == {
+        "done": 0,
+        "failed": 1,
+        "mean_seconds": 0.0,
+        "total_seconds": 0.0,
+    }
+
+
+def test_lost_job_is_requeued(tmp_path):
+    queue = jobs.JobQueue(f"sqlite:///{tmp_path / 'jobs.sqlite'}", lease_seconds=0.2)
+    job_id = queue.submit("test_add", a=1, b=2)
+    assert queue._claim("killed:1") == job_id
+    assert queue.run_next() is None
+
+    time.sleep(0.3)
+    info = queue.run_next()
+    assert info.id == job_id
+    assert info.succeeded
+    assert info.attempts == 2
+
+    job_id = queue.submit("test_add", a=1, b=2)
+    queue._claim("killed:1")
+    time.sleep(0.3)
+    queue._recover_lost()
+    queue._claim("killed:2")
+    time.sleep(0.3)
+    assert queue.run_next() is None
+    info = queue.status(job_id)
+    assert info.status == "failed"
+    assert info.error == "WorkerLost: no heartbeat of worker killed:2"
+
+
+def test_heartbeat_keeps_job(tmp_path):
+    queue = jobs.JobQueue(f"sqlite:///{tmp_path / 'jobs.sqlite'}", lease_seconds=0.4)
+    job_id = queue.submit("test_slow", seconds=1.0)
+    worker = threading.Thread(target=queue.run_next)
+    worker.start()
+    for _ in range(8):
+        time.sleep(0.1)
+        queue._recover_lost()
+    worker.join()
+    info = queue.status(job_id)
+    assert info.succeeded
+    assert info.attempts == 1
+    assert info.heartbeat > info.started
+
+
+def test_old_jobs_table(tmp_path):
+    path = tmp_path / "jobs.sqlite"
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE jobs (id INTEGER PRIMARY KEY, operation VARCHAR(100) "
+            "NOT NULL, arguments TEXT NOT NULL, status VARCHAR(20) NOT NULL, "
+            "progress FLOAT NOT NULL, message TEXT, result TEXT, error TEXT, "
+            "worker VARCHAR(100), submitted DATETIME NOT NULL, started DATETIME, "
+            "finished DATETIME)"
+        )
+    queue = jobs.JobQueue(f"sqlite:///{path}")
+    job_id = queue.submit("test_add", a=1, b=2)
+    assert queue.run_next().attempts == 1
+    assert queue.status(job_id).heartbeat is not None
@@ -0,0 +1,136 @@
+import os
+
+import numpy as np
+import pytest
+import specatalog.data_management.manifest as mf
+import specatalog.data_management.measurement_management as mm
+import specatalog.data_management.measurement_store as mst
+from specatalog.data_management.archive_manager import SpecatalogArchive
+
+
+@pytest.fixture
+def measurement(archive, tmp_path):
+    src = tmp_path / "M1"
+    (src / "raw").mkdir(parents=True)
+    (src / "raw" / "a.txt").write_text("first")
+    (src / "raw" / "b.txt").write_text("second")
+    archive.make_dir("data")
+    transfer = archive.copy_directory_to_archive(
+        src, "data/M1", hasher_factory=mf.new_hasher
+    )
+    mf._create_manifest(archive, 1, transfer.hashes)
+    return archive
+
+
+def _hash(data: bytes) -> str:
+    hasher = mf.new_hasher()
+    hasher.update(data)
+    return hasher.hexdigest()
+
+
+def test_hashes_computed_during_upload(measurement):
+    manifest = mf._read_manifest(measurement, 1)
+    assert manifest["algorithm"] == mf.HASH_ALGORITHM
+    assert list(manifest["files"]) == ["raw/a.txt", "raw/b.txt"]
+    assert manifest["files"]["raw/a.txt"]["hash"] == _hash(b"first")
+    assert manifest["files"]["raw/b.txt"]["size"] == 6
+
+
+def test_verify_unchanged(measurement):
+    result = mf._verify_manifest(measurement, 1)
+    assert result.ok
+    assert result.rehashed == 0
+    assert mf._verify_manifest(measurement, 1, full=True).rehashed == 2
+
+
+def test_verify_changes(measurement):
+    with measurement.open_file("data/M1/raw/a.txt", "w") as f:
+        f.write("changed content")
+    measurement.delete_file("data/M1/raw/b.txt")
+    with measurement.open_file("data/M1/raw/c.txt", "w") as f:
+        f.write("new")
+
+    result = mf._verify_manifest(measurement, 1, update=True)
+    assert result.modified == ["raw/a.txt"]
+    assert result.missing == ["raw/b.txt"]
+    assert result.untracked == ["raw/c.txt"]
+    assert not result.ok
+    assert mf._verify_manifest(measurement, 1).ok
+
+
+def test_manifest_keeps_its_algorithm(measurement, monkeypatch):
+    expected = _hash(b"first")
+    # another client configured with another algorithm
+    monkeypatch.setattr(mf, "HASH_ALGORITHM", "xxh3_128")
+    mf._record_files(measurement, 1, {"raw/a.txt": "digest of xxh3_128"})
+    manifest = mf._read_manifest(measurement, 1)
+    assert manifest["algorithm"] == "blake2b"
+    assert manifest["files"]["raw/a.txt"]["hash"] == expected
+    assert mf._verify_manifest(measurement, 1, full=True).ok
+
+    manifest["algorithm"] = "blake3"
+    mf._write_manifest(measurement, 1, manifest)
+    if mf.blake3 is None:
+        with pytest.raises(ValueError, match="blake3"):
+            mf._verify_manifest(measurement, 1, full=True)
+    with pytest.raises(ValueError, match="unknown"):
+        mf.new_hasher("md5")
+
+
+def test_verify_finds_corruption(tmp_path):
+    archive = SpecatalogArchive(False, str(tmp_path))
+    archive.make_dir("data/M1/raw")
+    path = tmp_path / "data" / "M1" / "raw" / "a.txt"
+    path.write_text("first")
+    mf._create_manifest(archive, 1)
+
+    stat = path.stat()
+    path.write_text("frist")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert mf._verify_manifest(archive, 1).ok
+    assert mf._verify_manifest(archive, 1, full=True).corrupted == ["raw/a.txt"]
+
+
+def test_manifest_follows_new_and_deleted_files(measurement, tmp_path):
+    (tmp_path / "script.py").write_text("print(1)")
+    mm._new_file_to_archive(measurement, tmp_path / "script.py", 1, "scripts")
+    mm._delete_element(measurement, 1, "raw", "a.txt", save_delete=False)
+
+    files = mf._read_manifest(measurement, 1)["files"]
+    assert files["scripts/script.py"]["hash"] == _hash(b"print(1)")
+    assert "raw/a.txt" not in files
+    assert mf._verify_manifest(measurement, 1).ok
+
+
+def test_verify_without_manifest(archive):
+    archive.make_dir("data/M2")
+    with pytest.raises(FileNotFoundError):
+        mf._verify_manifest(archive, 2)
+
+
+@pytest.mark.parametrize("fmt", ["hdf5", "zarr"])
+def test_measurement_file_not_tracked(measurement, fmt):
+    if fmt == "zarr":
+        pytest.importorskip("zarr")
+    p = f"data/M1/{mst.measurement_file_name(1, fmt)}"
+    with measurement.open_measurement_file(p, "w") as f:
+        f.create_group("evaluations")
+    mf._create_manifest(measurement, 1)
+    assert list(mf._read_manifest(measurement, 1)["files"]) == [
+        "raw/a.txt",
+        "raw/b.txt",
+    ]
+
+    with measurement.open_measurement_file(p, "a") as f:
+        f["evaluations"].create_dataset("fit", data=np.ones(100))
+    assert mf._verify_manifest(measurement, 1, full=True).ok
+
+
+def test_old_manifest_with_measurement_file(measurement):
+    manifest = mf._read_manifest(measurement, 1)
+    record = dict(manifest["files"]["raw/a.txt"])
+    manifest["files"]["measurement_M1.h5"] = record
+    mf._write_manifest(measurement, 1, manifest)
+
+    assert mf._verify_manifest(measurement, 1, update=True).ok
+    assert "measurement_M1.h5" not in mf._read_manifest(measurement, 1)["files"]
@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+import specatalog.data_management.hdf5_reader as hr
+import specatalog.data_management.measurement_management as mm
+import specatalog.data_management.measurement_store as mst
+
+pytest.importorskip("zarr")
+
+
+def write_measurement(archive, ms_id, fmt):
+    archive.make_dir(f"data/M{ms_id}")
+    p = f"data/M{ms_id}/{mst.measurement_file_name(ms_id, fmt)}"
+    with archive.open_measurement_file(p, "w") as f:
+        f.create_group("evaluations")
+        grp = f.require_group("raw_data")
+        grp.create_dataset("data_real_0", data=np.arange(6.0).reshape(2, 3))
+        grp.create_dataset("xaxis_0", data=np.arange(3))
+        grp.attrs["MWFQ"] = np.float64(9.6e9)
+        grp.attrs["bin_size"] = np.array([1, 2])
+        f.attrs["operator"] = "richert"
+    return p
+
+
+def test_zarr_measurement(archive, monkeypatch):
+    p = write_measurement(archive, 1, "zarr")
+    assert mst.find_measurement_file(archive, 1).as_posix() == p
+
+    monkeypatch.setattr(hr, "archive", archive)
+    with hr.load_from_id(1, trust_archive=True) as (obj, f):
+        assert np.array_equal(obj.raw_data.data_real_0, np.arange(6.0).reshape(2, 3))
+        assert obj.raw_data.MWFQ == 9.6e9
+        assert list(obj.raw_data.bin_size) == [1, 2]
+        assert obj.operator == "richert"
+
+    with hr.load_from_id(1, mode="a", trust_archive=True) as (obj, f):
+        obj.evaluations.set_dataset("fit", np.ones(3))
+        obj.raw_data.delete_attr("bin_size")
+        obj.sync()
+    values = hr._read_keys(archive, 1, ["evaluations/fit"], ["raw_data/bin_size"])
+    assert np.array_equal(values["evaluations/fit"], np.ones(3))
+    assert values["raw_data/bin_size"] is None
+
+
+def test_convert_measurement(archive):
+    write_measurement(archive, 2, "hdf5")
+    dst = mst._convert_measurement(archive, 2, "zarr")
+    assert dst.suffix == ".zarr"
+    assert not archive.exists("data/M2/measurement_M2.h5")
+
+    mst._convert_measurement(archive, 2, "hdf5")
+    assert not archive.exists(dst)
+    with archive.open_measurement_file("data/M2/measurement_M2.h5", "r") as f:
+        assert f["raw_data/data_real_0"].shape == (2, 3)
+        assert f["raw_data"].attrs["MWFQ"] == 9.6e9
+        assert "evaluations" in f
+
+    with pytest.raises(FileNotFoundError):
+        mst._convert_measurement(archive, 3, "zarr")
+
+
+def test_find_measurement_file(archive, monkeypatch):
+    write_measurement(archive, 3, "hdf5")
+    checks = []
+    exists = archive.exists
+    monkeypatch.setattr(archive, "exists", lambda p: checks.append(p) or exists(p))
+    assert mst.find_measurement_file(archive, 3).name == "measurement_M3.h5"
+    assert mst.find_measurement_file(archive, 3).name == "measurement_M3.h5"
+    assert len(checks) == 1
+
+    mst._convert_measurement(archive, 3, "zarr")
+    assert mst.find_measurement_file(archive, 3).name == "measurement_M3.zarr"
+
+    monkeypatch.setattr(mst, "MEASUREMENT_FORMAT", "zarr")
+    assert mst.find_measurement_file(archive, 4).name == "measurement_M4.zarr"
+    mst.forget_measurement_files(archive)
+    assert mst._measurement_files[archive] == {}
+
+
+def test_zarr_measurement_ingest(archive, monkeypatch, tmp_path):
+    monkeypatch.setattr(mm, "MEASUREMENT_FORMAT", "zarr")
+    raw = tmp_path / "spectrum.txt"
+    raw.write_text("sample\nWavelength (nm)\tAbs\n500.0\t0.1\n499.5\t0.2\n")
+    mm._create_measurement_dir(archive, 4)
+    mm._raw_data_to_folder(archive, raw, "uvvis_freiburg", 4)
+    reports = []
+    mm._raw_data_to_hdf5(
+        archive, 4, "uvvis_freiburg", progress=lambda *r: reports.append(r)
+    )
+    assert reports == [(1.0, "spectrum converted")]
+    with archive.open_measurement_file("data/M4/measurement_M4.zarr", "r") as f:
+        assert list(f["raw_data/intensity_0"][()]) == [0.1, 0.2]
+
+
+@pytest.mark.parametrize("ms_id, fmt", [(5, "zarr"), (6, "hdf5")])
+def test_series(archive, ms_id, fmt):
+    # names of any length and encoding are stored without truncation
+    names = ["a", "Messung_ä" * 40, "b"]
+    archive.make_dir(f"data/M{ms_id}")
+    p = f"data/M{ms_id}/{mst.measurement_file_name(ms_id, fmt)}"
+    with archive.open_measurement_file(p, "w") as f:
+        for n, name in enumerate(names):
+            row = mm._append_to_series(
+                f, "raw_data", {"data_real": np.full(4, n), "xaxis": np.arange(4)}, name
+            )
+        assert row == 2
+        assert f["raw_data/data_real"][1:].tolist() == [[1] * 4, [2] * 4]
+        assert f["raw_data/series_index"].shape == (3,)
+    data, sources = hr._load_series(archive, ms_id, "data_real", slice(1, None))
+    assert data.shape == (2, 4)
+    assert sources == names[1:]
+
+
+def test_benchmark():
+    results = mst.benchmark(n_datasets=5, points=10_000)
+    assert set(results) == {"hdf5", "zarr"}
+    for fmt in ("partial_read", "append"):
+        assert results["zarr"][fmt]["bytes"] < results["hdf5"][fmt]["bytes"]
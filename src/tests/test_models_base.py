@@ -61,3 +61,15 @@ def test_no_update_does_not_change_timestamp(db_session):
     db_session.commit()  # no change
 
     assert obj.updated_at == created_updated
+
+
+def test_created_at_is_insert_time(db_session):
+    first = Dummy(name="first")
+    db_session.add(first)
+    db_session.commit()
+    time.sleep(0.01)
+    second = Dummy(name="second")
+    db_session.add(second)
+    db_session.commit()
+
+    assert second.created_at > first.created_at
@@ -97,3 +97,43 @@ def test_enum_conversion(db_with_content):
 # TODO: In den Pydantic-Filter-Modellen fehlen für die Strings alle Operatoren wie z.B. like/ne... das korrigieren & passende tests für die str-Methoden schreiben
 
 # TODO: Tests für like, ilike, contains
+
+
+def test_search(db_with_content):
+    result = r._search("toluene", r.ms.Measurement, db_with_content)
+    assert [x.path for x in result.entries] == ["m4"]
+    assert result.suggestions == []
+
+    result = r._search("testmol2 C10", r.mol.Molecule, db_with_content)
+    assert [x.name for x in result.entries] == ["TestMol2"]
+    assert r._search("  ", r.mol.Molecule, db_with_content).entries == []
+
+
+def test_search_suggestions(db_with_content):
+    result = r._search("TestMoll", r.mol.Molecule, db_with_content)
+    assert result.entries == []
+    assert "TestMol" in result.suggestions
+
+
+def test_measurement_exists(db_with_content):
+    assert r._measurement_exists(2, db_with_content)
+    assert not r._measurement_exists(99, db_with_content)
+    assert 2 in r._existing_measurements
+    assert 99 not in r._existing_measurements
+
+    db_with_content.delete(db_with_content.get(r.ms.Measurement, 2))
+    db_with_content.commit()
+    assert not r._measurement_exists(2, db_with_content)
+
+
+def test_measurement_exists_molecule_deleted(db_with_content):
+    assert r._measurement_exists(1, db_with_content)
+    db_with_content.delete(db_with_content.get(r.mol.Molecule, 1))
+    db_with_content.commit()
+    assert not r._measurement_exists(1, db_with_content)
+
+
+def test_measurements_exist(db_with_content):
+    assert r._measurements_exist([3, 99, 1, 98], db_with_content) == [99, 98]
+    assert {1, 3} <= r._existing_measurements
+    assert r._measurements_exist([1, 3], db_with_content) == []
@@ -0,0 +1,87 @@
+import h5py
+import numpy as np
+import pytest
+import specatalog.data_management.similarity as sim
+import specatalog.models.measurements as ms
+
+
+def gaussian(x, center, width=5.0):
+    return np.exp(-((x - center) ** 2) / (2 * width**2))
+
+
+def write_spectrum(archive, ms_id, x, y, axis="field_0"):
+    archive.make_dir(f"data/M{ms_id}")
+    path = archive.archive / f"data/M{ms_id}/measurement_M{ms_id}.h5"
+    with h5py.File(path, "w") as f:
+        f.create_dataset("raw_data/data_real_0", data=y)
+        f.create_dataset(f"raw_data/{axis}", data=x)
+
+
+@pytest.fixture
+def indexed(local_archive, db_session, cwepr_entry):
+    x = np.linspace(300, 400, 500)
+    for center in (330, 332, 370, 372, 350):
+        m = cwepr_entry(path=f"c{center}")
+        write_spectrum(local_archive, m.id, x, gaussian(x, center))
+    return local_archive, db_session
+
+
+def test_fingerprint():
+    x = np.linspace(0, 10, 50)
+    grid = np.linspace(-5, 15, 64)
+    v = sim.fingerprint(x[::-1], np.sin(x)[::-1], grid)
+    assert v.dtype == np.float32 and v.shape == (64,)
+    assert np.isclose(np.linalg.norm(v), 1)
+    assert np.isclose(v.mean(), 0, atol=1e-6)
+    assert not sim.fingerprint(x, np.ones_like(x), x).any()
+
+
+def test_spectrum_from_2d(tmp_path):
+    with h5py.File(tmp_path / "a.h5", "w") as f:
+        data = np.zeros((3, 20))
+        data[1] = np.arange(20)
+        f.create_dataset("raw_data/data_real_0", data=data)
+        f.create_dataset("raw_data/axis_0_0", data=np.arange(3))
+        f.create_dataset("raw_data/axis_0_1", data=np.linspace(0, 1, 20))
+        x, y = sim._spectrum_from_h5(f)
+    assert np.array_equal(y, np.arange(20))
+    assert x[-1] == 1
+
+
+def test_build_and_query(indexed):
+    archive, session = indexed
+    index = sim._build_similarity_index(archive, session, "cwepr", points=128)
+    assert len(index) == 5
+    assert index.vectors.shape == (5, 128)
+    assert archive.exists(sim.index_path("cwepr"))
+
+    ids = {m.path: m.id for m in session.query(ms.CWEPR)}
+    neighbours = sim._similar_measurements(archive, session, ids["c330"], k=2)
+    assert [n[0] for n in neighbours] == [ids["c332"], ids["c350"]]
+    assert neighbours[0][1] > neighbours[1][1]
+
+
+def test_incremental_update(indexed):
+    archive, session = indexed
+    sim._build_similarity_index(archive, session, "cwepr")
+    first = session.query(ms.CWEPR).first()
+    session.delete(first)
+    session.commit()
+    index = sim._build_similarity_index(archive, session, "cwepr")
+    assert first.id not in index.ids
+    assert len(sim.SimilarityIndex.load(archive, "cwepr")) == 4
+
+
+def test_approximate_search():
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((2000, 32)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    index = sim.SimilarityIndex("x", np.arange(32), np.arange(2000) + 10, vectors)
+    exact = index.search(vectors[5], k=5)
+    assert exact[0] == (15, pytest.approx(1.0))
+    approx = index.search(vectors[5], k=5, approximate=True, n_probe=4)
+    assert approx[0][0] == 15
+    assert index.centroids.shape[0] == 44
+    # probing all clusters is exact
+    everything = index.search(vectors[5], k=5, approximate=True, n_probe=44)
+    assert [i for i, _ in everything] == [i for i, _ in exact]
@@ -0,0 +1,226 @@
+from datetime import date
+
+import h5py
+import numpy as np
+import pytest
+import specatalog.crud_db.read as r
+import specatalog.data_management.stacking as st
+import specatalog.models.measurements as ms
+
+
+@pytest.fixture
+def series(local_archive, cwepr_entry):
+    def make(temperature, field, spectrum=True):
+        m = cwepr_entry(
+            temperature=temperature, path=f"t{temperature}", series="T-series"
+        )
+        local_archive.make_dir(f"data/M{m.id}")
+        if spectrum:
+            path = local_archive.archive / f"data/M{m.id}/measurement_M{m.id}.h5"
+            with h5py.File(path, "w") as f:
+                f["raw_data/data_real_0"] = np.sin(field / 10) * temperature
+                f["raw_data/field_0"] = field
+        return m
+
+    return make
+
+
+def test_stack_same_axis(local_archive, db_session, series, tmp_path):
+    field = np.linspace(300, 400, 101)
+    ids = [series(t, field).id for t in (80, 120, 160)]
+    series(200, field, spectrum=False)
+
+    target = tmp_path / "stack.h5"
+    result = st._stack_datasets(
+        local_archive,
+        db_session,
+        r.CWEPRFilter(series="T-series"),
+        "raw_data/data_real_0",
+        target,
+        axis="raw_data/field_0",
+        workers=2,
+    )
+    assert result.ids == ids
+    assert len(result.missing) == 1
+    assert result.shape == (3, 101)
+    assert not result.resampled
+
+    with h5py.File(target) as f:
+        assert f["data"].chunks == (1, 101)
+        assert np.allclose(f["data"][1], np.sin(field / 10) * 120)
+        assert np.array_equal(f["axis"][()], field)
+        assert list(f["coordinates/temperature"][()]) == [80, 120, 160]
+        assert f["coordinates/id"].dtype == np.int64
+        assert f["coordinates/series"].asstr()[0] == "T-series"
+        assert f["coordinates/frequency_band"].asstr()[0] == "x"
+        assert f["coordinates/molecule_name"].asstr()[0] == "TestMol"
+        assert f.attrs["dataset"] == "raw_data/data_real_0"
+
+
+def test_stack_resampled(local_archive, db_session, series, tmp_path):
+    series(80, np.linspace(300, 400, 101))
+    series(120, np.linspace(310, 420, 56))
+    result = st._stack_datasets(
+        local_archive,
+        db_session,
+        r.MeasurementFilter(),
+        "raw_data/data_real_0",
+        tmp_path / "stack.h5",
+        axis="raw_data/field_0",
+        points=50,
+    )
+    assert result.resampled
+    assert result.shape == (2, 50)
+    with h5py.File(tmp_path / "stack.h5") as f:
+        axis = f["axis"][()]
+        assert axis[0] == 310 and axis[-1] == 400
+        assert np.allclose(f["data"][0], np.sin(axis / 10) * 80, atol=0.2)
+
+
+def test_stack_errors(local_archive, db_session, series, tmp_path):
+    series(80, np.linspace(300, 400, 101))
+    series(120, np.linspace(300, 400, 50))
+    with pytest.raises(ValueError):  # different shapes without axis
+        st._stack_datasets(
+            local_archive,
+            db_session,
+            r.MeasurementFilter(),
+            "raw_data/data_real_0",
+            tmp_path / "a.h5",
+        )
+    with pytest.raises(ValueError):
+        st._stack_datasets(
+            local_archive,
+            db_session,
+            r.MeasurementFilter(),
+            "raw_data/missing",
+            tmp_path / "a.h5",
+        )
+    with pytest.raises(ValueError):
+        st._stack_datasets(
+            local_archive,
+            db_session,
+            r.MoleculeFilter(),
+            "raw_data/data_real_0",
+            tmp_path / "a.h5",
+        )
+
+
+def test_stack_zarr(local_archive, db_session, series, tmp_path):
+    zarr = pytest.importorskip("zarr")
+    field = np.linspace(300, 400, 11)
+    series(80, field)
+    series(120, field)
+    st._stack_datasets(
+        local_archive,
+        db_session,
+        r.MeasurementFilter(),
+        "raw_data/data_real_0",
+        tmp_path / "stack.zarr",
+    )
+    root = zarr.open_group(str(tmp_path / "stack.zarr"), mode="r")
+    assert root["data"].shape == (2, 11)
+    assert list(root["coordinates/solvent"][:]) == ["toluene", "toluene"]
+
+
+def test_virtual_stack(local_archive, db_session, series):
+    field = np.linspace(300, 400, 11)
+    first = series(80, field)
+    series(120, field)
+    series(160, np.linspace(300, 400, 5))  # other shape
+    result = st._create_virtual_stack(
+        local_archive,
+        db_session,
+        r.CWEPRFilter(series="T-series"),
+        "raw_data/data_real_0",
+        "t_series",
+        axis="raw_data/field_0",
+    )
+    assert result.shape == (2, 11)
+    assert len(result.missing) == 1
+    view = local_archive.archive / "views" / "t_series.h5"
+    with h5py.File(view) as f:
+        assert f["data"].is_virtual
+        assert np.allclose(f["data"][:, 3], np.sin(field[3] / 10) * np.array([80, 120]))
+        assert np.array_equal(f["axis"][()], field)
+        assert f.attrs["filter_model"] == "CWEPRFilter"
+
+    # new matching measurement
+    new = series(200, field)
+    assert st._refresh_virtual_stacks(local_archive, db_session, new.id) == ["t_series"]
+    with h5py.File(view) as f:
+        assert list(f["coordinates/temperature"][()]) == [80, 120, 200]
+
+    # unrelated measurement
+    other = series(240, field)
+    other.series = "other"
+    db_session.commit()
+    assert st._refresh_virtual_stacks(local_archive, db_session, other.id) == []
+
+    db_session.delete(first)
+    db_session.commit()
+    refreshed = st._refresh_virtual_stacks(
+        local_archive, db_session, [other.id, first.id]
+    )
+    assert refreshed == ["t_series"]
+    with h5py.File(view) as f:
+        assert f["data"].shape == (2, 11)
+
+
+def test_virtual_stack_moved_archive(local_archive, db_session, series, tmp_path):
+    series(80, np.linspace(300, 400, 11))
+    st._create_virtual_stack(
+        local_archive, db_session, r.MeasurementFilter(), "raw_data/data_real_0", "all"
+    )
+    moved = tmp_path / "moved"
+    (local_archive.archive).rename(moved)
+    with h5py.File(moved / "views" / "all.h5") as f:
+        assert np.allclose(f["data"][0, 0], np.sin(30) * 80)
+
+
+def test_stack_mixed_methods(
+    local_archive, db_session, series, entry_factory, tmp_path
+):
+    field = np.linspace(300, 400, 11)
+    series(80, field)
+    uvvis = entry_factory(
+        ms.UVVis,
+        molecule=series(120, field).molecule,
+        temperature=295,
+        solvent="toluene",
+        date=date(2026, 1, 2),
+        measured_by="richert",
+        path="uvvis",
+        corrected=False,
+        evaluated=False,
+        dim_cuvette="10mm",
+    )
+    local_archive.make_dir(f"data/M{uvvis.id}")
+    with h5py.File(
+        local_archive.archive / f"data/M{uvvis.id}/measurement_M{uvvis.id}.h5", "w"
+    ) as f:
+        f["raw_data/data_real_0"] = np.zeros(11)
+
+    result = st._stack_datasets(
+        local_archive,
+        db_session,
+        r.MeasurementFilter(),
+        "raw_data/data_real_0",
+        tmp_path / "s.h5",
+    )
+    assert result.shape == (3, 11)
+    with h5py.File(tmp_path / "s.h5") as f:
+        assert list(f["coordinates/frequency_band"].asstr()[()]) == ["x", "x", ""]
+        assert list(f["coordinates/dim_cuvette"].asstr()[()]) == ["", "", "10mm"]
+        assert list(f["coordinates/temperature"][()]) == [80, 120, 295]
+
+    st._create_virtual_stack(
+        local_archive,
+        db_session,
+        r.MeasurementFilter(),
+        "raw_data/data_real_0",
+        "mixed",
+    )
+    with h5py.File(local_archive.archive / "views" / "mixed.h5") as f:
+        assert f["data"].shape == (3, 11)
+        assert f["coordinates/dim_cuvette"].asstr()[2] == "10mm"
@@ -1,3 +1,4 @@
+import pytest
 import specatalog.crud_db.update as up
 import specatalog.models.measurements as ms
 import specatalog.models.molecules as mol
@@ -44,3 +45,46 @@ def test_update_name(db_with_content):
 
 # TODO: _automatic_name_update testen
 # TODO: read/update von date-Feldern?
+
+
+def test_update_where(db_with_content):
+    import specatalog.crud_db.read as r
+
+    filters = r.MeasurementFilter(solvent="water")
+    update = up.MeasurementUpdate(solvent="toluene")
+    assert up._update_where(filters, update, db_with_content, dry_run=True) == 5
+    assert db_with_content.query(ms.Measurement).filter_by(solvent="water").count()
+
+    assert up._update_where(filters, update, db_with_content) == 5
+    db_with_content.expire_all()
+    assert (
+        db_with_content.query(ms.Measurement).filter_by(solvent="toluene").count() == 6
+    )
+
+
+def test_update_where_joined_tables(db_with_content):
+    import specatalog.crud_db.read as r
+
+    filters = r.CWEPRFilter(attenuation="20dB")
+    update = up.CWEPRUpdate(attenuation="25dB", temperature=77)
+    assert up._update_where(filters, update, db_with_content) == 1
+    db_with_content.expire_all()
+    entry = db_with_content.query(ms.CWEPR).first()
+    assert entry.attenuation == "25dB"
+    assert entry.temperature == 77
+    assert entry.updated_at is not None
+    assert db_with_content.query(ms.Measurement).filter_by(temperature=77).count() == 1
+
+
+def test_update_where_invalid(db_with_content):
+    import specatalog.crud_db.read as r
+    import specatalog.helpers.allowed_values_not_adapted as av
+
+    with pytest.raises(ValueError):
+        up._update_where(
+            r.MeasurementFilter(), up.CWEPRUpdate(attenuation="1dB"), db_with_content
+        )
+    with pytest.raises(ValueError):
+        up._update_where(
+            r.TDPFilter(), up.TDPUpdate(linker=av.Linker.bi), db_with_content
+        )
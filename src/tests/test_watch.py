@@ -0,0 +1,257 @@
+import json
+from enum import Enum
+from types import SimpleNamespace
+
+import pytest
+import specatalog.helpers.watch as w
+
+
+@pytest.fixture
+def drop(tmp_path):
+    return w.WatchFolder(
+        tmp_path,
+        "cw_epr",
+        "CWEPRModel",
+        {"device": "emx_nano", "measured_by": "richert", "frequency_band": "x"},
+    )
+
+
+BRUKER_DSC = "XTYP\tIDX\nYTYP\tNODATA\nXPTS\t2\nXMIN\t3400\nXWID\t10\n"
+
+
+def write_bruker(folder, name, dsc=BRUKER_DSC, dta=True):
+    (folder / f"{name}.DSC").write_text(dsc)
+    if dta:
+        (folder / f"{name}.DTA").write_bytes(bytes(16))
+
+
+def test_group_files(tmp_path):
+    write_bruker(tmp_path, "a", dta=False)
+    assert w._group_files(tmp_path / "a", "bruker_bes3t") is None
+    write_bruker(tmp_path, "a")
+    assert [f.name for f in w._group_files(tmp_path / "a", "bruker_bes3t")] == [
+        "a.DSC",
+        "a.DTA",
+    ]
+
+    write_bruker(tmp_path, "b", dsc="XTYP\tIDX\nYTYP\tIGD\n")
+    assert w._group_files(tmp_path / "b", "bruker_bes3t") is None
+    (tmp_path / "b.YGF").write_bytes(bytes(8))
+    assert len(w._group_files(tmp_path / "b", "bruker_bes3t")) == 3
+
+    (tmp_path / "c.txt").write_text("sample\n")
+    assert w._group_files(tmp_path / "c", "uvvis_freiburg") == [tmp_path / "c.txt"]
+
+
+def test_lower_case_suffixes(drop):
+    (drop.path / "a.dsc").write_text(BRUKER_DSC)
+    (drop.path / "a.dta").write_bytes(bytes(16))
+    watcher = w.FolderWatcher([drop], settle_time=0)
+    assert list(watcher._candidates(drop)) == [drop.path / "a"]
+    files = w._group_files(drop.path / "a", "cw_epr")
+    assert [f.name for f in files] == ["a.dsc", "a.dta"]
+
+
+def test_scan_waits_until_stable(drop):
+    watcher = w.FolderWatcher([drop], settle_time=0.2)
+    write_bruker(drop.path, "a")
+    assert watcher.scan() == 0
+    (drop.path / "a.DTA").write_bytes(bytes(32))  # still growing
+    assert watcher.scan() == 0
+    assert watcher.scan() == 0
+    watcher._seen[drop.path / "a"] = (watcher._seen[drop.path / "a"][0], -1)
+    assert watcher.scan() == 1
+    assert watcher.scan() == 0  # already queued
+
+
+def test_process_moves_files(drop):
+    ingested = []
+
+    def ingest(group):
+        ingested.append(w._measurement_data(group))
+        return 7
+
+    watcher = w.FolderWatcher([drop], ingest=ingest, settle_time=0)
+    write_bruker(drop.path, "a")
+    (drop.path / "a.json").write_text(
+        json.dumps(
+            {
+                "molecular_id": 1,
+                "temperature": 80,
+                "solvent": "toluene",
+                "attenuation": "20dB",
+                "corrected": False,
+                "evaluated": False,
+            }
+        )
+    )
+    assert watcher.scan() == 1
+    group = watcher._queue.get_nowait()
+    assert watcher.process(group) == 7
+    data, fmt = ingested[0]
+    assert fmt == "cw_epr"
+    assert data.device == "emx_nano"
+    assert data.temperature == 80
+    assert sorted(p.name for p in (drop.path / w.INGESTED_DIR).iterdir()) == [
+        "a.M7.DSC",
+        "a.M7.DTA",
+        "a.M7.json",
+    ]
+    assert not (drop.path / "a.DSC").exists()
+
+
+def test_move_failure_does_not_ingest_twice(drop, monkeypatch):
+    ingested = []
+    watcher = w.FolderWatcher(
+        [drop], ingest=lambda g: ingested.append(g) or 7, settle_time=0, retry_delay=0
+    )
+    move = w.shutil.move
+
+    def locked(src, dst):
+        if src.suffix == ".DTA":
+            raise PermissionError("file is locked")
+        return move(src, dst)
+
+    write_bruker(drop.path, "a")
+    monkeypatch.setattr(w.shutil, "move", locked)
+    assert watcher.scan() == 1
+    assert watcher.process(watcher._queue.get_nowait()) == 7
+    assert (drop.path / "a.DSC").exists()  # the main file is moved last
+
+    monkeypatch.setattr(w.shutil, "move", move)
+    assert watcher.scan() == 1
+    assert watcher.process(watcher._queue.get_nowait()) == 7
+    assert len(ingested) == 1
+    assert not (drop.path / "a.DSC").exists()
+    assert watcher.scan() == 0
+
+    # a reused name does not overwrite the files of the earlier measurement
+    write_bruker(drop.path, "a")
+    watcher.ingest = lambda g: 8
+    assert watcher.scan() == 1
+    watcher.process(watcher._queue.get_nowait())
+    assert sorted(p.name for p in (drop.path / w.INGESTED_DIR).iterdir()) == [
+        "a.M7.DSC",
+        "a.M7.DTA",
+        "a.M8.DSC",
+        "a.M8.DTA",
+    ]
+
+
+def test_sidecar_overrides_metadata(drop):
+    write_bruker(drop.path, "a")
+    (drop.path / "a.json").write_text(json.dumps({"device": "elexsys"}))
+    group = w.MeasurementGroup(drop, drop.path / "a", [drop.path / "a.DSC"])
+    with pytest.raises(ValueError) as e:  # incomplete metadata
+        w._measurement_data(group)
+    invalid = {error["loc"][0] for error in e.value.errors()}
+    assert "molecular_id" in invalid
+    assert "device" not in invalid
+
+
+def test_header_metadata(drop):
+    drop.metadata.pop("frequency_band")
+    write_bruker(drop.path, "a", dsc=BRUKER_DSC + "MWFQ\t9.6e9\nSTMP\t80\nAVGS\t4\n")
+    (drop.path / "a.json").write_text(
+        json.dumps(
+            {
+                "molecular_id": 1,
+                "solvent": "toluene",
+                "attenuation": "20dB",
+                "corrected": False,
+                "evaluated": False,
+            }
+        )
+    )
+    assert w._header_metadata(drop.path / "a.DSC") == {
+        "temperature": 80.0,
+        "frequency_band": "x",
+        "number_of_scans": 4,
+    }
+    group = w.MeasurementGroup(drop, drop.path / "a", [drop.path / "a.DSC"])
+    data, _ = w._measurement_data(group)  # CWEPRModel has no number_of_scans
+    assert data.temperature == 80.0
+    assert data.frequency_band == "x"
+
+    (drop.path / "a.json").write_text(
+        json.dumps({**json.loads((drop.path / "a.json").read_text()), "temperature": 5})
+    )
+    assert w._measurement_data(group)[0].temperature == 5
+
+
+def test_header_frequency_band(monkeypatch):
+    class Bands(str, Enum):
+        X = "X-band"
+        q = "q"
+
+    monkeypatch.setattr(w, "av", SimpleNamespace(FrequencyBands=Bands))
+    assert w._frequency_band(9.6e9) == "X-band"
+    assert w._frequency_band(34e9) == "q"
+    assert w._frequency_band(94e9) is None  # w-band not allowed
+
+
+def test_retry_and_fail(drop):
+    calls = []
+
+    def ingest(group):
+        calls.append(group.base)
+        raise RuntimeError("database not available")
+
+    watcher = w.FolderWatcher(
+        [drop], ingest=ingest, settle_time=0, max_retries=1, retry_delay=0
+    )
+    write_bruker(drop.path, "a")
+    assert watcher.scan() == 1
+    assert watcher.process(watcher._queue.get_nowait()) is None
+    assert (drop.path / "a.DSC").exists()  # retried later
+
+    assert watcher.scan() == 1
+    assert watcher.process(watcher._queue.get_nowait()) is None
+    assert len(calls) == 2
+    failed = drop.path / w.FAILED_DIR
+    assert len(list(failed.glob("a.*.DSC"))) == 1
+    (error,) = failed.glob("a.*.error.txt")
+    assert "database not available" in error.read_text()
+    assert watcher.scan() == 0
+
+
+def test_backpressure(drop):
+    watcher = w.FolderWatcher([drop], settle_time=0, queue_size=1)
+    write_bruker(drop.path, "a")
+    write_bruker(drop.path, "b")
+    watcher._stop.set()  # a full queue would block otherwise
+    assert watcher.scan() == 1
+    assert watcher._queue.full()
+
+
+def test_watcher_threads(drop):
+    watcher = w.FolderWatcher([drop], ingest=lambda g: 1, settle_time=0)
+    watcher.poll_interval = 0.05
+    write_bruker(drop.path, "a")
+    watcher.start()
+    try:
+        for _ in range(100):
+            if (drop.path / w.INGESTED_DIR / "a.M1.DTA").exists():
+                break
+            watcher._stop.wait(0.05)
+    finally:
+        watcher.stop()
+    assert (drop.path / w.INGESTED_DIR / "a.M1.DTA").exists()
+
+
+def test_load_watch_config(tmp_path):
+    config = tmp_path / "watch.json"
+    config.write_text(
+        json.dumps(
+            {
+                "settle_time": 10,
+                "folders": [{"path": str(tmp_path), "fmt": "cw_epr", "model": "X"}],
+            }
+        )
+    )
+    watcher = w.load_watch_config(config)
+    assert watcher.settle_time == 10
+    assert watcher.folders[0].path == tmp_path
+    config.write_text(json.dumps({"folders": [{"path": ".", "fmt": "x", "model": ""}]}))
+    with pytest.raises(ValueError):
+        w.load_watch_config(config)